@@ -5,6 +5,7 @@ Management command to add users to the Krystal Group expense system.
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from apps.accounts.models import User
+from apps.accounts.staff_import import import_staff
 from django.core.exceptions import ValidationError
 
 
@@ -191,50 +192,19 @@ class Command(BaseCommand):
             }
         ]
 
-        created_count = 0
         for user_data in sample_users:
-            try:
-                # Check if user already exists
-                if User.objects.filter(username=user_data['username']).exists():
-                    self.stdout.write(
-                        self.style.WARNING(f'User {user_data["username"]} already exists, skipping')
-                    )
-                    continue
+            user_data['is_staff'] = str(user_data['role'] in ['manager', 'admin'])
+            user_data['is_superuser'] = str(user_data['role'] == 'admin')
 
-                if User.objects.filter(employee_id=user_data['employee_id']).exists():
-                    self.stdout.write(
-                        self.style.WARNING(f'Employee ID {user_data["employee_id"]} already exists, skipping')
-                    )
-                    continue
-
-                user = User.objects.create_user(
-                    username=user_data['username'],
-                    email=user_data['email'],
-                    password=user_data['password'],
-                    employee_id=user_data['employee_id'],
-                    first_name=user_data['first_name'],
-                    last_name=user_data['last_name'],
-                    department=user_data['department'],
-                    position=user_data['position'],
-                    role=user_data['role'],
-                    location=user_data['location'],
-                    phone=user_data['phone'],
-                    is_staff=(user_data['role'] in ['manager', 'admin']),
-                    is_superuser=(user_data['role'] == 'admin')
-                )
-                
-                created_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'Created user: {user.username} ({user.get_full_name()})')
-                )
-
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error creating user {user_data["username"]}: {e}')
-                )
+        report = import_staff(enumerate(sample_users, start=1))
+        for change in report.changes:
+            if change.action == 'created':
+                self.stdout.write(self.style.SUCCESS(f'Created user: {change.username}'))
+            else:
+                self.stdout.write(self.style.WARNING(f'User {change.username}: {change.message}, skipping'))
 
         self.stdout.write(
-            self.style.SUCCESS(f'\nSuccessfully created {created_count} users')
+            self.style.SUCCESS(f'\nSuccessfully created {report.counts["created"]} users')
         )
 
         # Display all users
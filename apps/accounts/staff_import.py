@@ -0,0 +1,348 @@
+"""
+Bulk staff import
+
+One engine behind ``import_staff``, ``import_employees`` and ``add_users``.
+Rows are streamed in fixed-size chunks. For each chunk the users already
+holding one of its usernames, emails or employee IDs are fetched with a
+single query, new users are written with ``bulk_create`` and changed ones
+with ``bulk_update``.
+
+Password hashing is deliberately slow, so it is never done per row in the
+writer: everyone getting the shared default password gets the same hash,
+computed once, and individual passwords are hashed in a process pool.
+Every row ends up in a change report saying what happened to it.
+"""
+import csv
+import datetime
+import json
+import os
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows looked up and written per round trip
+IMPORT_CHUNK_SIZE = getattr(settings, 'STAFF_IMPORT_CHUNK_SIZE', 1000)
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y')
+
+TRUE_VALUES = ('true', '1', 'yes', 'y')
+
+LOCATIONS = {'hk': 'hk', 'cn': 'cn'}
+
+# Columns compared and written for existing users
+UPDATE_FIELDS = (
+    'email', 'first_name', 'last_name', 'location', 'department', 'position', 'phone', 'role',
+    'is_staff', 'is_superuser', 'date_joined',
+)
+
+
+@dataclass
+class StaffChange:
+    """What the import did with one row"""
+    row: int
+    username: str
+    action: str  # created, updated, unchanged, skipped or error
+    fields: list = field(default_factory=list)
+    message: str = ''
+
+
+@dataclass
+class StaffImportReport:
+    dry_run: bool = False
+    changes: list = field(default_factory=list)
+
+    @property
+    def counts(self):
+        counts = Counter(change.action for change in self.changes)
+        return {action: counts[action] for action in ('created', 'updated', 'unchanged', 'skipped', 'error')}
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'counts': self.counts,
+            'changes': [asdict(change) for change in self.changes],
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(self.as_dict(), fh, indent=2)
+
+
+def read_staff_csv(path):
+    """Yield ``(line number, row)`` from a staff CSV without loading it whole"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as fh:
+        for row_num, row in enumerate(csv.DictReader(fh), start=2):  # header is line 1
+            yield row_num, row
+
+
+def clean(value):
+    """Strip whitespace and the line breaks spreadsheet exports leave in cells"""
+    return str(value if value is not None else '').replace('\r', '').replace('\n', '').strip()
+
+
+def parse_location(value):
+    """'HK'/'CN' region codes (or a location) to User.location"""
+    return LOCATIONS.get(clean(value).lower(), 'other') if clean(value) else None
+
+
+def parse_bool(value):
+    value = clean(value)
+    return value.lower() in TRUE_VALUES if value else None
+
+
+def parse_date_joined(value):
+    value = clean(value)
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            day = datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        return timezone.make_aware(day)
+    raise ValueError(f'Invalid date {value!r}. Use YYYY-MM-DD or DD/MM/YYYY')
+
+
+def parse_row(row, defaults):
+    """
+    Normalise one CSV row or dict to User field values.
+
+    Blank cells are left out so they fall back to ``defaults`` for new users
+    and never clear the data of existing ones.
+    """
+    values = {
+        'username': clean(row.get('username')),
+        'email': clean(row.get('email')),
+        'first_name': clean(row.get('first_name')),
+        'last_name': clean(row.get('last_name')),
+        'employee_id': clean(row.get('employee_id')),
+        'department': clean(row.get('department')),
+        'position': clean(row.get('position')),
+        'phone': clean(row.get('phone')),
+        'role': clean(row.get('role')).lower(),
+        'location': parse_location(row.get('location') or row.get('region')),
+        'is_staff': parse_bool(row.get('is_staff')),
+        'is_superuser': parse_bool(row.get('is_superuser')),
+        'date_joined': parse_date_joined(row.get('date_joined')),
+        'password': row.get('password') or None,
+    }
+    values = {name: value for name, value in values.items() if value not in ('', None)}
+
+    if not values.get('username'):
+        raise ValueError('Missing username')
+    if 'email' in values:
+        try:
+            validate_email(values['email'])
+        except ValidationError:
+            raise ValueError(f"Invalid email {values['email']!r}")
+    if len(values.get('employee_id', '')) > 20:
+        raise ValueError(f"Employee ID {values['employee_id']!r} is longer than 20 characters")
+    if values.get('role', 'staff') not in dict(get_user_model().ROLE_CHOICES):
+        raise ValueError(f"Unknown role {values['role']!r}")
+
+    return {**defaults, **values}
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash passwords in a process pool; ``workers=0`` hashes in this process"""
+    passwords = list(passwords)
+    if workers == 0 or len(passwords) <= 1:
+        return [make_password(password) for password in passwords]
+
+    workers = workers or os.cpu_count()
+    # Workers set Django up themselves in case processes are spawned rather than forked
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def import_staff(records, default_password=None, update_existing=False, dry_run=False,
+                 defaults=None, workers=None, chunk_size=None):
+    """
+    Create or update users from ``(line number, row)`` records.
+
+    New users without a password of their own get ``default_password``
+    (unusable if None). Existing users, matched by username, keep their
+    password and are only changed when ``update_existing`` is set. A row
+    whose email or employee ID belongs to another user is skipped.
+
+    Returns:
+        StaffImportReport
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    defaults = defaults or {}
+    report = StaffImportReport(dry_run=dry_run)
+    shared_hash = None
+    seen = set()
+
+    records = iter(records)
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            if shared_hash is None and not dry_run:
+                shared_hash = make_password(default_password)
+            _import_chunk(chunk, report, seen, shared_hash, update_existing, dry_run, defaults, workers)
+
+    report.changes.sort(key=lambda change: change.row)
+    logger.info(f'Staff import{" (dry run)" if dry_run else ""}: {report.counts}')
+    return report
+
+
+def _import_chunk(chunk, report, seen, shared_hash, update_existing, dry_run, defaults, workers):
+    User = get_user_model()
+
+    parsed = []
+    for row_num, row in chunk:
+        try:
+            values = parse_row(row, defaults)
+        except ValueError as e:
+            report.changes.append(StaffChange(row_num, clean(row.get('username')), 'error', message=str(e)))
+            continue
+        if values['username'] in seen:
+            report.changes.append(StaffChange(
+                row_num, values['username'], 'skipped', message='Username repeated earlier in the file'
+            ))
+            continue
+        seen.add(values['username'])
+        parsed.append((row_num, values))
+
+    usernames = [values['username'] for _, values in parsed]
+    emails = [values['email'].lower() for _, values in parsed if 'email' in values]
+    employee_ids = [values['employee_id'] for _, values in parsed if 'employee_id' in values]
+    # Emails are compared case-insensitively, like the owner map below
+    existing = list(User.objects.annotate(email_lower=Lower('email')).filter(
+        Q(username__in=usernames) | Q(email_lower__in=emails) | Q(employee_id__in=employee_ids)
+    ).order_by())
+    by_username = {user.username: user for user in existing}
+    by_email = {user.email.lower(): user for user in existing if user.email}
+    by_employee_id = {user.employee_id: user for user in existing}
+
+    to_create, to_update, update_fields = [], [], set()
+    for row_num, values in parsed:
+        username = values['username']
+        user = by_username.get(username)
+
+        # Emails and employee IDs must not end up on two accounts
+        owner = by_email.get(values.get('email', '').lower())
+        if owner is not None and owner.username != username:
+            report.changes.append(StaffChange(
+                row_num, username, 'skipped', message=f"Email {values['email']} belongs to {owner.username}"
+            ))
+            continue
+        owner = by_employee_id.get(values.get('employee_id'))
+        if owner is not None and owner.username != username:
+            report.changes.append(StaffChange(
+                row_num, username, 'skipped',
+                message=f"Employee ID {values['employee_id']} belongs to {owner.username}"
+            ))
+            continue
+
+        if user is None:
+            to_create.append((row_num, values))
+            if values.get('employee_id'):
+                by_employee_id[values['employee_id']] = User(username=username)
+            if values.get('email'):
+                by_email[values['email'].lower()] = User(username=username)
+            continue
+
+        if not update_existing:
+            report.changes.append(StaffChange(row_num, username, 'skipped', message='User already exists'))
+            continue
+
+        changed = [name for name in UPDATE_FIELDS if name in values and getattr(user, name) != values[name]]
+        if 'employee_id' in values and values['employee_id'] != user.employee_id:
+            changed.append('employee_id')
+        for name in changed:
+            setattr(user, name, values[name])
+        if changed:
+            to_update.append(user)
+            update_fields.update(changed)
+        report.changes.append(StaffChange(row_num, username, 'updated' if changed else 'unchanged', changed))
+
+    report.changes.extend(_create_users(to_create, shared_hash, dry_run, workers))
+
+    if to_update and not dry_run:
+        User.objects.bulk_update(to_update, sorted(update_fields), batch_size=500)
+
+
+def _create_users(to_create, shared_hash, dry_run, workers):
+    User = get_user_model()
+    changes = [
+        StaffChange(row_num, values['username'], 'created', sorted(name for name in values if name != 'password'))
+        for row_num, values in to_create
+    ]
+    if dry_run or not to_create:
+        return changes
+
+    own_passwords = [values['password'] for _, values in to_create if 'password' in values]
+    hashes = iter(hash_passwords(own_passwords, workers))
+
+    users = []
+    for _, values in to_create:
+        fields = {name: value for name, value in values.items() if name != 'password'}
+        # Unique placeholder until the primary key is known
+        fields.setdefault('employee_id', f'IMPORT-{uuid.uuid4().hex[:13]}')
+        user = User(**fields)
+        user.password = next(hashes) if 'password' in values else shared_hash
+        users.append(user)
+    User.objects.bulk_create(users, batch_size=500)
+
+    if any(user.pk is None for user in users):
+        # Backends that cannot return primary keys from a bulk insert
+        pks = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+        for user in users:
+            user.pk = pks[user.username]
+
+    # date_joined is auto_now_add, so the imported date goes in with the employee IDs
+    for user, (_, values) in zip(users, to_create):
+        if 'employee_id' not in values:
+            user.employee_id = f'EMP{user.pk:04d}'
+        if 'date_joined' in values:
+            user.date_joined = values['date_joined']
+    User.objects.bulk_update(users, ['employee_id', 'date_joined'], batch_size=500)
+    return changes
+
+
+def write_report(command, report, report_path=None, verbosity=1):
+    """Print the row messages and summary of ``report`` from a management command"""
+    style = command.style
+    for change in report.changes:
+        if change.action == 'error':
+            command.stdout.write(style.ERROR(f'Row {change.row}: Error processing {change.username or "unknown"}: {change.message}'))
+        elif change.action == 'skipped':
+            command.stdout.write(style.WARNING(f'Row {change.row}: Skipped {change.username}: {change.message}'))
+        elif verbosity > 1:
+            fields = f' ({", ".join(change.fields)})' if change.fields else ''
+            command.stdout.write(f'Row {change.row}: {change.action.capitalize()} {change.username}{fields}')
+
+    counts = report.counts
+    command.stdout.write(style.SUCCESS('\n' + '='*60))
+    command.stdout.write(style.SUCCESS('IMPORT SUMMARY' + (' (DRY RUN - no changes made)' if report.dry_run else '')))
+    command.stdout.write(style.SUCCESS('='*60))
+    command.stdout.write(style.SUCCESS(f'Users created:   {counts["created"]}'))
+    command.stdout.write(style.SUCCESS(f'Users updated:   {counts["updated"]}'))
+    command.stdout.write(f'Users unchanged: {counts["unchanged"]}')
+    command.stdout.write(style.WARNING(f'Users skipped:   {counts["skipped"]}'))
+    command.stdout.write(style.ERROR(f'Errors:          {counts["error"]}'))
+    command.stdout.write(style.SUCCESS('='*60))
+
+    if report_path:
+        report.write_json(report_path)
+        command.stdout.write(f'Change report written to {report_path}')
@@ -1,3 +1,102 @@
+import datetime
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import User
+from .staff_import import import_staff, read_staff_csv
+
+HEADER = 'username,email,first_name,last_name,region,is_staff,date_joined\n'
+
+
+class StaffImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.existing = User.objects.create_user(
+            username='amy.chan', email='amy@example.com', employee_id='EMP0001', first_name='Amy'
+        )
+
+    def write_csv(self, rows):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(HEADER + ''.join(rows))
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_bulk_import_report(self):
+        path = self.write_csv(
+            [f'staff{index},staff{index}@example.com,Staff,No {index},HK,TRUE,2020-03-0{index % 9 + 1}\n'
+             for index in range(50)]
+            + [
+                'amy.chan,amy@example.com,Amy,Chan,CN,TRUE,2019-01-02\n',
+                'staff1,again@example.com,Staff,Again,HK,TRUE,\n',
+                'ben,amy@example.com,Ben,Lee,HK,TRUE,\n',
+                'carl,not-an-email,Carl,Ho,HK,TRUE,\n',
+                'dora,dora@example.com,Dora,Ng,HK,TRUE,31/12/2021\n',
+            ]
+        )
+
+        # Lookup, insert, employee IDs and dates, update of the existing user
+        with CaptureQueriesContext(connection) as queries:
+            report = import_staff(read_staff_csv(path), default_password='Welcome1!', update_existing=True)
+        statements = [q for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertLessEqual(len(statements), 6)
+
+        self.assertEqual(report.counts, {'created': 51, 'updated': 1, 'unchanged': 0, 'skipped': 2, 'error': 1})
+        by_username = {change.username: change for change in report.changes}
+        self.assertEqual(by_username['amy.chan'].fields, ['last_name', 'location', 'is_staff', 'date_joined'])
+        self.assertIn('belongs to amy.chan', by_username['ben'].message)
+        self.assertEqual(by_username['carl'].action, 'error')
+        self.assertEqual([change.row for change in report.changes], sorted(change.row for change in report.changes))
+
+        dora = User.objects.get(username='dora')
+        self.assertEqual(dora.employee_id, f'EMP{dora.pk:04d}')
+        self.assertEqual(timezone.localtime(dora.date_joined).date(), datetime.date(2021, 12, 31))
+        self.assertTrue(dora.is_staff)
+        self.assertTrue(dora.check_password('Welcome1!'))
+        # The shared default password was hashed once
+        self.assertEqual(User.objects.filter(username__startswith='staff').values('password').distinct().count(), 1)
+
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.location, self.existing.last_name), ('cn', 'Chan'))
+        self.assertEqual(self.existing.employee_id, 'EMP0001')
+
+    def test_own_passwords_and_dry_run(self):
+        rows = [
+            (1, {'username': 'mary', 'email': 'mary@example.com', 'password': 'temp123', 'employee_id': 'KI001'}),
+            (2, {'username': 'david', 'email': 'david@example.com', 'password': 'temp456', 'employee_id': 'KI001'}),
+            (3, {'username': 'amy.chan', 'email': 'amy@example.com'}),
+        ]
+        report = import_staff(rows, dry_run=True, workers=0)
+        self.assertEqual(report.counts['created'], 1)
+        self.assertFalse(User.objects.filter(username='mary').exists())
+
+        report = import_staff(rows, workers=0)
+        self.assertEqual([change.action for change in report.changes], ['created', 'skipped', 'skipped'])
+        self.assertTrue(User.objects.get(username='mary').check_password('temp123'))
+
+    def test_emails_match_case_insensitively(self):
+        report = import_staff([(2, {'username': 'ben', 'email': 'AMY@example.com'})], workers=0)
+
+        self.assertEqual(report.changes[0].action, 'skipped')
+        self.assertIn('belongs to amy.chan', report.changes[0].message)
+        self.assertFalse(User.objects.filter(username='ben').exists())
+
+    def test_command_writes_json_report(self):
+        path = self.write_csv(['eva,eva@example.com,Eva,Wu,HK,FALSE,2022-05-01\n'])
+        report_path = path + '.json'
+        self.addCleanup(lambda: os.path.exists(report_path) and os.remove(report_path))
 
-# Create your tests here.
+        call_command('import_staff', file=path, report=report_path, stdout=io.StringIO())
+        with open(report_path) as fh:
+            data = json.load(fh)
+        self.assertEqual(data['counts']['created'], 1)
+        self.assertFalse(User.objects.get(username='eva').is_staff)
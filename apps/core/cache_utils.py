@@ -9,6 +9,7 @@ from django.core.cache import cache
 from django.conf import settings
 from django.utils import timezone
 from functools import wraps
+from apps.core.periods import period_filter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -193,8 +194,8 @@ class ExpenseSystemCache:
                     ).count()
                     
                     monthly_stats = ExpenseClaim.objects.filter(
-                        created_at__month=timezone.now().month,
-                        status='approved'
+                        status='approved',
+                        **period_filter('month')
                     ).aggregate(
                         total_amount=Sum('total_amount_hkd'),
                         claim_count=Count('id')
@@ -207,7 +208,7 @@ class ExpenseSystemCache:
                     ).count()
                     
                     monthly_stats = user_claims.filter(
-                        created_at__month=timezone.now().month
+                        **period_filter('month')
                     ).aggregate(
                         total_amount=Sum('total_amount_hkd'),
                         claim_count=Count('id')
@@ -242,6 +243,19 @@ class ExpenseSystemCache:
         cache.delete_many(cache_keys)
         logger.info(f"Invalidated cache for user {user_id}")
     
+    @classmethod
+    def invalidate_users_cache(cls, user_ids):
+        """Invalidate all cache entries for several users in one call."""
+        user_ids = set(user_ids)
+        cache_keys = []
+        for user_id in user_ids:
+            cache_keys.append(cls.get_cache_key(cls.PREFIX_USER_PERMS, user_id))
+            for role in ('employee', 'manager', 'admin'):
+                cache_keys.append(cls.get_cache_key(cls.PREFIX_DASHBOARD, user_id, role))
+        
+        cache.delete_many(cache_keys)
+        logger.info(f"Invalidated cache for {len(user_ids)} users")
+    
     @classmethod
     def invalidate_claim_related_cache(cls):
         """Invalidate cache when claims are modified."""
@@ -0,0 +1,61 @@
+"""
+Reporting period helpers.
+
+Dashboard and summary queries filter on half-open datetime ranges
+(``created_at__gte=start, created_at__lt=end``) instead of ``__month`` or
+``__year`` lookups. Ranges are correct across years and let the database
+use a range scan on the indexed column.
+"""
+
+import datetime
+import zoneinfo
+
+from django.utils import timezone
+
+PERIODS = ('month', 'quarter', 'year')
+
+
+def _get_timezone(tz):
+    if tz is None:
+        return timezone.get_current_timezone()
+    if isinstance(tz, str):
+        return zoneinfo.ZoneInfo(tz)
+    return tz
+
+
+def period_bounds(period='month', tz=None, when=None):
+    """
+    Return ``(start, end)`` aware datetimes for the period containing ``when``.
+
+    Args:
+        period: One of 'month', 'quarter' or 'year'
+        tz: Timezone name or tzinfo the period is defined in, e.g. a
+            company's ``timezone``; defaults to the current timezone
+        when: Aware datetime inside the period; defaults to now
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}', expected one of {', '.join(PERIODS)}")
+
+    tzinfo = _get_timezone(tz)
+    local_now = timezone.localtime(when or timezone.now(), tzinfo)
+
+    if period == 'month':
+        start_month, months = local_now.month, 1
+    elif period == 'quarter':
+        start_month, months = (local_now.month - 1) // 3 * 3 + 1, 3
+    else:
+        start_month, months = 1, 12
+
+    start_year = local_now.year
+    end_year, end_month = divmod(start_month - 1 + months, 12)
+    end_year += start_year
+
+    start = datetime.datetime(start_year, start_month, 1, tzinfo=tzinfo)
+    end = datetime.datetime(end_year, end_month + 1, 1, tzinfo=tzinfo)
+    return start, end
+
+
+def period_filter(period='month', field='created_at', tz=None, when=None):
+    """Return queryset filter kwargs restricting ``field`` to the period."""
+    start, end = period_bounds(period, tz=tz, when=when)
+    return {f'{field}__gte': start, f'{field}__lt': end}
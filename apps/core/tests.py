@@ -0,0 +1,95 @@
+"""
+Tests for core helpers.
+"""
+
+import datetime
+import zoneinfo
+
+from django.test import SimpleTestCase, override_settings
+
+from .periods import period_bounds, period_filter
+
+HONG_KONG = zoneinfo.ZoneInfo('Asia/Hong_Kong')
+LONDON = zoneinfo.ZoneInfo('Europe/London')
+
+
+def local(year, month, day, hour=0, minute=0, tz=HONG_KONG):
+    return datetime.datetime(year, month, day, hour, minute, tzinfo=tz)
+
+
+@override_settings(TIME_ZONE='Asia/Hong_Kong')
+class PeriodBoundsTests(SimpleTestCase):
+
+    def test_month_is_half_open_from_local_midnight(self):
+        start, end = period_bounds('month', when=local(2025, 3, 15, 13, 30))
+
+        self.assertEqual(start, local(2025, 3, 1))
+        self.assertEqual(end, local(2025, 4, 1))
+
+    def test_december_rolls_over_into_january(self):
+        start, end = period_bounds('month', when=local(2025, 12, 31, 23, 59))
+
+        self.assertEqual(start, local(2025, 12, 1))
+        self.assertEqual(end, local(2026, 1, 1))
+
+    def test_january_starts_the_new_year(self):
+        start, end = period_bounds('month', when=local(2026, 1, 1))
+
+        self.assertEqual(start, local(2026, 1, 1))
+        self.assertEqual(end, local(2026, 2, 1))
+
+    def test_quarter_boundaries(self):
+        quarters = [
+            ((2025, 1, 1), (2025, 1, 1), (2025, 4, 1)),
+            ((2025, 3, 31), (2025, 1, 1), (2025, 4, 1)),
+            ((2025, 4, 1), (2025, 4, 1), (2025, 7, 1)),
+            ((2025, 6, 30), (2025, 4, 1), (2025, 7, 1)),
+            ((2025, 7, 1), (2025, 7, 1), (2025, 10, 1)),
+            ((2025, 9, 30), (2025, 7, 1), (2025, 10, 1)),
+            ((2025, 10, 1), (2025, 10, 1), (2026, 1, 1)),
+            ((2025, 12, 31), (2025, 10, 1), (2026, 1, 1)),
+        ]
+        for day, expected_start, expected_end in quarters:
+            with self.subTest(day=day):
+                start, end = period_bounds('quarter', when=local(*day, 12))
+
+                self.assertEqual(start, local(*expected_start))
+                self.assertEqual(end, local(*expected_end))
+
+    def test_year(self):
+        start, end = period_bounds('year', when=local(2025, 12, 31, 23))
+
+        self.assertEqual(start, local(2025, 1, 1))
+        self.assertEqual(end, local(2026, 1, 1))
+
+    def test_timezone_name_decides_the_period(self):
+        # 07:30 on 1 January in Hong Kong is still 31 December in London
+        when = local(2026, 1, 1, 7, 30)
+
+        start, end = period_bounds('month', tz='Europe/London', when=when)
+
+        self.assertEqual(start, local(2025, 12, 1, tz=LONDON))
+        self.assertEqual(end, local(2026, 1, 1, tz=LONDON))
+        self.assertEqual(start.tzinfo, LONDON)
+
+        hk_start, _ = period_bounds('month', when=when)
+        self.assertEqual(hk_start, local(2026, 1, 1))
+
+    def test_timezone_name_quarter_boundary(self):
+        # 23:30 on 30 June in London is 06:30 on 1 July in Hong Kong
+        when = local(2025, 6, 30, 23, 30, tz=LONDON)
+
+        start, end = period_bounds('quarter', tz='Europe/London', when=when)
+
+        self.assertEqual((start, end), (local(2025, 4, 1, tz=LONDON), local(2025, 7, 1, tz=LONDON)))
+        self.assertEqual(period_bounds('quarter', when=when)[0], local(2025, 7, 1))
+
+    def test_unknown_period(self):
+        with self.assertRaises(ValueError):
+            period_bounds('week')
+
+    def test_period_filter(self):
+        self.assertEqual(
+            period_filter('month', field='submitted_at', when=local(2025, 2, 10)),
+            {'submitted_at__gte': local(2025, 2, 1), 'submitted_at__lt': local(2025, 3, 1)},
+        )
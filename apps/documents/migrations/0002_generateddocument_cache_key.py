@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generateddocument',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Identifies the source and version this document was rendered from, for reuse', max_length=200, verbose_name='Cache Key'),
+        ),
+        migrations.AlterField(
+            model_name='generateddocument',
+            name='generated_by',
+            field=models.ForeignKey(blank=True, help_text='Empty for documents generated by scheduled jobs', null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Generated By'),
+        ),
+    ]
@@ -285,7 +285,18 @@ class GeneratedDocument(models.Model):
     generated_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        verbose_name=_("Generated By")
+        null=True,
+        blank=True,
+        verbose_name=_("Generated By"),
+        help_text=_("Empty for documents generated by scheduled jobs")
+    )
+    
+    cache_key = models.CharField(
+        _("Cache Key"),
+        max_length=200,
+        blank=True,
+        db_index=True,
+        help_text=_("Identifies the source and version this document was rendered from, for reuse")
     )
     
     generated_at = models.DateTimeField(
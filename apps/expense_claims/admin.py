@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Company, ExpenseCategory, Currency, ExchangeRate, ExpenseClaim, ClaimComment, ClaimStatusHistory
+from .models import Company, ExpenseCategory, Currency, ExchangeRate, ExpenseClaim, ClaimComment, ClaimStatusHistory, PrintJob
 
 
 @admin.register(Company)
@@ -89,3 +89,13 @@ class ClaimStatusHistoryAdmin(admin.ModelAdmin):
             return obj.notes[:50] + '...' if len(obj.notes) > 50 else obj.notes
         return '-'
     notes_preview.short_description = 'Notes Preview'
+
+
+@admin.register(PrintJob)
+class PrintJobAdmin(admin.ModelAdmin):
+    """Admin interface for monitoring bulk print jobs."""
+    list_display = ['job_id', 'requested_by', 'status', 'progress', 'total_claims', 'with_receipts', 'created_at']
+    list_filter = ['status', 'with_receipts', 'created_at']
+    search_fields = ['job_id', 'requested_by__username']
+    readonly_fields = ['job_id', 'created_at', 'started_at', 'completed_at']
+    ordering = ['-created_at']
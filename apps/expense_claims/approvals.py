@@ -0,0 +1,129 @@
+"""
+Approval queue for expense claims.
+
+Managers see the claims awaiting a decision from the employees they manage
+(admins and users with ``can_view_all_claims`` see every company), and can
+approve or reject any number of them in a single transaction.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.cache_utils import ExpenseSystemCache
+from .models import ClaimComment, ClaimStatusHistory, ExpenseClaim
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Statuses a claim can be approved or rejected from; matches claims_awaiting_approval_idx
+AWAITING_APPROVAL_STATUSES = ['submitted', 'under_review']
+
+APPROVAL_ACTIONS = {
+    'approve': 'approved',
+    'reject': 'rejected',
+}
+
+
+def can_use_approval_queue(user):
+    """Check if the user may approve or reject claims."""
+    return user.has_perm('expense_claims.can_approve_claims') or user.can_approve_claims()
+
+
+def approval_queue(approver, company_ids=None):
+    """
+    Claims awaiting a decision from ``approver``, oldest first.
+
+    Args:
+        approver: The approving user
+        company_ids: Optional iterable of company ids to narrow the queue
+    """
+    queryset = ExpenseClaim.objects.filter(status__in=AWAITING_APPROVAL_STATUSES)
+
+    if not (approver.is_staff or approver.is_admin()
+            or approver.has_perm('expense_claims.can_view_all_claims')):
+        queryset = queryset.filter(claimant__manager=approver)
+
+    if company_ids:
+        queryset = queryset.filter(company_id__in=company_ids)
+
+    # Approvers never decide on their own claims
+    return queryset.exclude(claimant=approver).order_by('created_at')
+
+
+def apply_batch_decision(approver, claim_ids, action, reason=''):
+    """
+    Approve or reject a batch of claims in one transaction.
+
+    Claims outside the approver's queue (wrong status, not managed, own
+    claims) are skipped rather than failing the batch.
+
+    Returns:
+        dict with ``processed`` and ``skipped`` lists of claim ids
+    """
+    if action not in APPROVAL_ACTIONS:
+        raise ValueError(f"Unknown approval action '{action}'")
+    if action == 'reject' and not reason:
+        raise ValueError('Rejection reason is required.')
+
+    new_status = APPROVAL_ACTIONS[action]
+    requested_ids = {int(claim_id) for claim_id in claim_ids}
+    now = timezone.now()
+
+    with transaction.atomic():
+        claims = list(
+            approval_queue(approver)
+            .filter(id__in=requested_ids)
+            .select_for_update()
+            .only('id', 'claim_number', 'claimant_id', 'status')
+        )
+
+        history = []
+        comments = []
+        for claim in claims:
+            history.append(ClaimStatusHistory(
+                expense_claim=claim,
+                changed_by=approver,
+                old_status=claim.status,
+                new_status=new_status,
+                notes=reason,
+            ))
+            if reason:
+                comments.append(ClaimComment(
+                    expense_claim=claim,
+                    author=approver,
+                    comment=reason,
+                ))
+
+            claim.status = new_status
+            claim.approved_by = approver
+            claim.approved_at = now
+            if action == 'reject':
+                claim.rejection_reason = reason
+
+        update_fields = ['status', 'approved_by', 'approved_at', 'updated_at']
+        if action == 'reject':
+            update_fields.append('rejection_reason')
+        for claim in claims:
+            claim.updated_at = now
+
+        ExpenseClaim.objects.bulk_update(claims, update_fields)
+        ClaimStatusHistory.objects.bulk_create(history)
+        ClaimComment.objects.bulk_create(comments)
+
+        # bulk_update skips post_save; claim stats are refreshed by the queryset,
+        # the cached user data is cleared here, once for the batch
+        claimant_ids = {claim.claimant_id for claim in claims}
+        transaction.on_commit(lambda: _after_batch(approver.id, claimant_ids))
+
+    processed = [claim.id for claim in claims]
+    skipped = sorted(requested_ids - set(processed))
+
+    logger.info(
+        f"{approver.username} {new_status} {len(processed)} claims "
+        f"({len(skipped)} skipped)"
+    )
+    return {'processed': processed, 'skipped': skipped}
+
+
+def _after_batch(approver_id, claimant_ids):
+    ExpenseSystemCache.invalidate_users_cache([approver_id, *claimant_ids])
@@ -6,3 +6,6 @@ class ExpenseClaimsConfig(AppConfig):
     name = "apps.expense_claims"
     label = "expense_claims"  # App label without dots
     verbose_name = "Expense Claims Management"
+
+    def ready(self):
+        from . import signals  # noqa: F401
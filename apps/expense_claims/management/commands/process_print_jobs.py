@@ -0,0 +1,45 @@
+"""
+Management command to render pending bulk print jobs.
+
+Run this from a dedicated worker (cron or supervisor) so large print jobs
+never compete with web workers, and to pick up jobs left pending or
+abandoned in processing by a restarted web process.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from apps.expense_claims.print_jobs import process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Render pending bulk print jobs for expense claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of jobs to process per pass'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new jobs instead of exiting'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=5,
+            help='Seconds between polls when running with --loop (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_jobs(limit=options['limit'])
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Processed {processed} print job(s)'))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+"""
+Management command to rebuild denormalized per-user claim statistics.
+"""
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from apps.expense_claims.models import UserClaimStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild UserClaimStats rows for all users with claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            help='Only rebuild statistics for this username'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = get_user_model().objects.filter(
+                username=options['user']
+            ).values_list('id', flat=True)
+
+        # One grouped aggregate for all users
+        count = len(UserClaimStats.refresh_for_users(user_ids))
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt claim statistics for {count} user(s)'))
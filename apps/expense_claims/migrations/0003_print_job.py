@@ -0,0 +1,44 @@
+# Generated migration for bulk print jobs
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('expense_claims', '0002_add_claim_for_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrintJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Job ID')),
+                ('claim_ids', models.JSONField(default=list, help_text='Claims included in this job, in print order', verbose_name='Claim IDs')),
+                ('with_receipts', models.BooleanField(default=False, verbose_name='With Receipts')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20, verbose_name='Status')),
+                ('total_claims', models.PositiveIntegerField(default=0, verbose_name='Total Claims')),
+                ('processed_claims', models.PositiveIntegerField(default=0, verbose_name='Processed Claims')),
+                ('progress', models.PositiveIntegerField(default=0, help_text='Progress percentage (0-100)', validators=[django.core.validators.MaxValueValidator(100)], verbose_name='Progress')),
+                ('output_file', models.FileField(blank=True, upload_to='generated/print_jobs/%Y/%m/', verbose_name='Output File')),
+                ('error_message', models.TextField(blank=True, verbose_name='Error Message')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='Completed At')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='print_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Requested By')),
+            ],
+            options={
+                'verbose_name': 'Print Job',
+                'verbose_name_plural': 'Print Jobs',
+                'db_table': 'claims_printjob',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='claims_prin_status_372890_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated migration for per-user claim statistics
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0001_initial'),
+        ('expense_claims', '0003_print_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserClaimStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='claim_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+                ('total_claims', models.PositiveIntegerField(default=0, verbose_name='Total Claims')),
+                ('draft_claims', models.PositiveIntegerField(default=0, verbose_name='Draft Claims')),
+                ('submitted_claims', models.PositiveIntegerField(default=0, verbose_name='Submitted Claims')),
+                ('under_review_claims', models.PositiveIntegerField(default=0, verbose_name='Under Review Claims')),
+                ('approved_claims', models.PositiveIntegerField(default=0, verbose_name='Approved Claims')),
+                ('rejected_claims', models.PositiveIntegerField(default=0, verbose_name='Rejected Claims')),
+                ('paid_claims', models.PositiveIntegerField(default=0, verbose_name='Paid Claims')),
+                ('total_amount_hkd', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Total Amount (HKD)')),
+                ('approved_amount_hkd', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Approved Amount (HKD)')),
+                ('month_start', models.DateField(blank=True, null=True, verbose_name='Month Start')),
+                ('month_claims', models.PositiveIntegerField(default=0, verbose_name='Claims This Month')),
+                ('month_amount_hkd', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Amount This Month (HKD)')),
+                ('year', models.PositiveIntegerField(blank=True, null=True, verbose_name='Year')),
+                ('year_amount_hkd', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Amount This Year (HKD)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User Claim Statistics',
+                'verbose_name_plural': 'User Claim Statistics',
+                'db_table': 'claims_userclaimstats',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated migration for hot ExpenseClaim query indexes
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('expense_claims', '0004_user_claim_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expenseclaim',
+            index=models.Index(fields=['claimant', 'status'], name='claims_claimant_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenseclaim',
+            index=models.Index(fields=['claimant', '-created_at'], name='claims_claimant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenseclaim',
+            index=models.Index(fields=['status', '-created_at'], name='claims_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenseclaim',
+            index=models.Index(fields=['company', '-created_at'], name='claims_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenseclaim',
+            index=models.Index(fields=['-created_at'], name='claims_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenseclaim',
+            index=models.Index(condition=models.Q(('status__in', ['submitted', 'under_review'])), fields=['created_at'], name='claims_awaiting_approval_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expenseclaim',
+            index=models.Index(fields=['claim_number'], name='claims_number_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -332,6 +332,26 @@ class ExchangeRate(models.Model):
         return f"{self.currency.code} = {self.rate_to_base} HKD ({self.effective_date.date()})"
 
 
+class ExpenseClaimQuerySet(models.QuerySet):
+    """Claim querysets whose bulk writes keep UserClaimStats in sync.
+    
+    ``update()`` (which ``bulk_update()`` also goes through) skips
+    post_save, so it schedules the stats refresh of every claimant the
+    updated claims had before and after the write.
+    """
+    
+    def update(self, **kwargs):
+        claims = dict(self.values_list('pk', 'claimant_id'))
+        rows = super().update(**kwargs)
+        claimant_ids = set(claims.values())
+        if claims and ('claimant' in kwargs or 'claimant_id' in kwargs):
+            claimant_ids.update(
+                ExpenseClaim.objects.filter(pk__in=list(claims)).values_list('claimant_id', flat=True)
+            )
+        UserClaimStats.schedule_refresh(claimant_ids)
+        return rows
+
+
 class ExpenseClaim(models.Model):
     """Main expense claim model."""
     
@@ -467,6 +487,8 @@ class ExpenseClaim(models.Model):
         blank=True
     )
 
+    objects = ExpenseClaimQuerySet.as_manager()
+
     class Meta:
         db_table = 'claims_expenseclaim'
         verbose_name = _("Expense Claim")
@@ -476,6 +498,28 @@ class ExpenseClaim(models.Model):
             ('can_approve_claims', 'Can approve expense claims'),
             ('can_view_all_claims', 'Can view all expense claims'),
         ]
+        indexes = [
+            # Claim list, print selection and per-user dashboards
+            models.Index(fields=['claimant', 'status'], name='claims_claimant_status_idx'),
+            models.Index(fields=['claimant', '-created_at'], name='claims_claimant_created_idx'),
+            # Manager dashboards and status-filtered reports
+            models.Index(fields=['status', '-created_at'], name='claims_status_created_idx'),
+            models.Index(fields=['company', '-created_at'], name='claims_company_created_idx'),
+            # Period range filters across all claimants
+            models.Index(fields=['-created_at'], name='claims_created_idx'),
+            # Approval queue: only claims awaiting a decision
+            models.Index(
+                fields=['created_at'],
+                name='claims_awaiting_approval_idx',
+                condition=models.Q(status__in=['submitted', 'under_review']),
+            ),
+            # claim_number__startswith in generate_claim_number (LIKE 'prefix%' on PostgreSQL)
+            models.Index(
+                fields=['claim_number'],
+                name='claims_number_prefix_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
     
     def __str__(self):
         return f"{self.claim_number} - {self.claimant.get_full_name()}"
@@ -744,3 +788,260 @@ class ClaimStatusHistory(models.Model):
     
     def __str__(self):
         return f"{self.expense_claim.claim_number}: {self.old_status} → {self.new_status}"
+
+
+class PrintJob(models.Model):
+    """Background job rendering a selection of claims into one merged PDF."""
+    
+    STATUS_CHOICES = [
+        ('pending', _('Pending')),
+        ('processing', _('Processing')),
+        ('completed', _('Completed')),
+        ('failed', _('Failed')),
+    ]
+    
+    job_id = models.UUIDField(
+        _("Job ID"),
+        default=uuid.uuid4,
+        unique=True,
+        editable=False
+    )
+    
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='print_jobs',
+        verbose_name=_("Requested By")
+    )
+    
+    claim_ids = models.JSONField(
+        _("Claim IDs"),
+        default=list,
+        help_text=_("Claims included in this job, in print order")
+    )
+    
+    with_receipts = models.BooleanField(
+        _("With Receipts"),
+        default=False
+    )
+    
+    status = models.CharField(
+        _("Status"),
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    
+    total_claims = models.PositiveIntegerField(_("Total Claims"), default=0)
+    processed_claims = models.PositiveIntegerField(_("Processed Claims"), default=0)
+    
+    progress = models.PositiveIntegerField(
+        _("Progress"),
+        default=0,
+        validators=[MaxValueValidator(100)],
+        help_text=_("Progress percentage (0-100)")
+    )
+    
+    output_file = models.FileField(
+        _("Output File"),
+        upload_to='generated/print_jobs/%Y/%m/',
+        blank=True
+    )
+    
+    error_message = models.TextField(
+        _("Error Message"),
+        blank=True
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(_("Started At"), null=True, blank=True)
+    completed_at = models.DateTimeField(_("Completed At"), null=True, blank=True)
+
+    class Meta:
+        db_table = 'claims_printjob'
+        verbose_name = _("Print Job")
+        verbose_name_plural = _("Print Jobs")
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Print job {self.job_id} ({self.get_status_display()})"
+    
+    @property
+    def is_finished(self):
+        """Check if the job has reached a terminal state."""
+        return self.status in ('completed', 'failed')
+
+
+class UserClaimStats(models.Model):
+    """Denormalized per-user claim counters for the platform home and dashboard.
+    
+    Rows are refreshed from a single conditional aggregate whenever one of the
+    user's claims is saved, updated in bulk or deleted, so readers never scan
+    the claims table.
+    """
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='claim_stats',
+        verbose_name=_("User")
+    )
+    
+    # Counts per status
+    total_claims = models.PositiveIntegerField(_("Total Claims"), default=0)
+    draft_claims = models.PositiveIntegerField(_("Draft Claims"), default=0)
+    submitted_claims = models.PositiveIntegerField(_("Submitted Claims"), default=0)
+    under_review_claims = models.PositiveIntegerField(_("Under Review Claims"), default=0)
+    approved_claims = models.PositiveIntegerField(_("Approved Claims"), default=0)
+    rejected_claims = models.PositiveIntegerField(_("Rejected Claims"), default=0)
+    paid_claims = models.PositiveIntegerField(_("Paid Claims"), default=0)
+    
+    # Amount totals (HKD)
+    total_amount_hkd = models.DecimalField(
+        _("Total Amount (HKD)"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    
+    approved_amount_hkd = models.DecimalField(
+        _("Approved Amount (HKD)"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    
+    # Period totals; only valid while the stored period start is current
+    month_start = models.DateField(_("Month Start"), null=True, blank=True)
+    month_claims = models.PositiveIntegerField(_("Claims This Month"), default=0)
+    month_amount_hkd = models.DecimalField(
+        _("Amount This Month (HKD)"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    
+    year = models.PositiveIntegerField(_("Year"), null=True, blank=True)
+    year_amount_hkd = models.DecimalField(
+        _("Amount This Year (HKD)"),
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'claims_userclaimstats'
+        verbose_name = _("User Claim Statistics")
+        verbose_name_plural = _("User Claim Statistics")
+    
+    def __str__(self):
+        return f"Claim stats for {self.user}"
+    
+    @property
+    def pending_claims(self):
+        """Claims waiting for a decision."""
+        return self.submitted_claims + self.under_review_claims
+    
+    @classmethod
+    def refresh_for_user(cls, user_id):
+        """Recompute a user's statistics with one aggregate query."""
+        return cls.refresh_for_users([user_id])[user_id]
+    
+    @classmethod
+    def refresh_for_users(cls, user_ids=None):
+        """Recompute the statistics of many users with one grouped aggregate query.
+        
+        ``None`` rebuilds every claimant plus every user with a stats row.
+        Returns the rows by user id.
+        """
+        from django.db.models import Count, Q, Sum
+        from django.utils import timezone
+        from apps.core.periods import period_bounds
+        
+        month_start, _month_end = period_bounds('month')
+        year_start, _year_end = period_bounds('year')
+        
+        claims = ExpenseClaim.objects.order_by()
+        if user_ids is not None:
+            user_ids = set(user_ids)
+            claims = claims.filter(claimant_id__in=user_ids)
+        
+        status_counts = {
+            f'{status}_claims': Count('id', filter=Q(status=status))
+            for status, _label in ExpenseClaim.STATUS_CHOICES
+        }
+        rows = {
+            row['claimant_id']: row
+            for row in claims.values('claimant_id').annotate(
+                total_claims=Count('id'),
+                month_claims=Count('id', filter=Q(created_at__gte=month_start)),
+                total_amount=Sum('total_amount_hkd'),
+                approved_amount=Sum('total_amount_hkd', filter=Q(status='approved')),
+                month_amount=Sum('total_amount_hkd', filter=Q(created_at__gte=month_start)),
+                year_amount=Sum('total_amount_hkd', filter=Q(created_at__gte=year_start)),
+                **status_counts
+            )
+        }
+        
+        existing = cls.objects.all() if user_ids is None else cls.objects.filter(user_id__in=user_ids)
+        existing = set(existing.values_list('user_id', flat=True))
+        if user_ids is None:
+            user_ids = existing | set(rows)
+        
+        count_fields = ['total_claims', 'month_claims', *status_counts]
+        amount_fields = ['total_amount', 'approved_amount', 'month_amount', 'year_amount']
+        now = timezone.now()
+        stats = {}
+        for user_id in user_ids:
+            # Users without claims left get zeroed rows
+            row = rows.get(user_id, {})
+            values = {key: row.get(key) or 0 for key in count_fields}
+            for key in amount_fields:
+                values[f'{key}_hkd'] = row.get(key) or Decimal('0.00')
+            stats[user_id] = cls(
+                user_id=user_id, month_start=month_start.date(), year=month_start.year, updated_at=now, **values
+            )
+        
+        fields = [*count_fields, *(f'{key}_hkd' for key in amount_fields), 'month_start', 'year', 'updated_at']
+        cls.objects.bulk_update([row for user_id, row in stats.items() if user_id in existing], fields, batch_size=500)
+        cls.objects.bulk_create(
+            [row for user_id, row in stats.items() if user_id not in existing], batch_size=500, ignore_conflicts=True
+        )
+        return stats
+    
+    @classmethod
+    def schedule_refresh(cls, user_ids):
+        """Refresh the users' statistics once the current transaction commits."""
+        from django.db import transaction
+        
+        user_ids = set(user_ids) - {None}
+        if user_ids:
+            # After commit so the aggregate sees the final state of the claims
+            transaction.on_commit(lambda: cls.refresh_for_users(user_ids))
+    
+    def as_display_stats(self):
+        """Return the stats dict used by the home and dashboard templates."""
+        from apps.core.periods import period_bounds
+        
+        month_start, _month_end = period_bounds('month')
+        # No claim saved since the period rolled over means nothing was filed in it
+        month_current = self.month_start == month_start.date()
+        year_current = self.year == month_start.year
+        
+        return {
+            'total_claims': self.total_claims,
+            'approved_claims': self.approved_claims,
+            'pending_claims': self.pending_claims,
+            'rejected_claims': self.rejected_claims,
+            'total_amount': self.total_amount_hkd,
+            'approved_amount': self.approved_amount_hkd,
+            'this_month_claims': self.month_claims if month_current else 0,
+            'this_month_amount': self.month_amount_hkd if month_current else Decimal('0.00'),
+            'this_year_amount': self.year_amount_hkd if year_current else Decimal('0.00'),
+        }
@@ -0,0 +1,343 @@
+"""
+Background bulk printing for expense claims.
+
+A print job renders its claims in chunks to temporary PDF files, appending
+receipt PDFs after each claim, then merges the chunk files into a single
+output document. Claims are laid out by weasyprint one at a time, and the
+merge writes each chunk's pages into the output file before reading the
+next chunk, so memory does not grow with the number of claims or pages.
+Progress is written back to the ``PrintJob`` row after every chunk so the
+status page can poll it.
+
+Jobs left in processing by a worker that died are put back to pending by
+``process_pending_jobs`` once they exceed ``EXPENSE_PRINT_JOB_TIMEOUT``.
+"""
+
+import gc
+import io
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import ExpenseClaim, ExpenseItem, PrintJob
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Claims written per temporary chunk file. Each claim is its own weasyprint
+# pass; the chunk bounds how many rendered claims are held before writing.
+PRINT_JOB_CHUNK_SIZE = getattr(settings, 'EXPENSE_PRINT_JOB_CHUNK_SIZE', 25)
+
+# Concurrent print jobs handled by the in-process worker pool.
+PRINT_JOB_WORKERS = getattr(settings, 'EXPENSE_PRINT_JOB_WORKERS', 2)
+
+# Seconds a job may stay in processing before it is considered abandoned;
+# must exceed the longest job a live worker takes.
+PRINT_JOB_TIMEOUT = getattr(settings, 'EXPENSE_PRINT_JOB_TIMEOUT', 2 * 60 * 60)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Lazily create the shared worker pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=PRINT_JOB_WORKERS,
+                thread_name_prefix='print-job'
+            )
+    return _executor
+
+
+def submit_print_job(user, claim_ids, with_receipts=False):
+    """
+    Create a print job for the claims the user may print and queue it.
+
+    Returns the job, or None when none of the requested claims are printable
+    by the user.
+    """
+    claims = ExpenseClaim.objects.filter(id__in=claim_ids)
+    if not user.has_perm('expense_claims.can_view_all_claims'):
+        claims = claims.filter(claimant=user)
+    allowed_ids = list(claims.order_by('claim_number').values_list('id', flat=True))
+
+    if not allowed_ids:
+        return None
+
+    job = PrintJob.objects.create(
+        requested_by=user,
+        claim_ids=allowed_ids,
+        with_receipts=with_receipts,
+        total_claims=len(allowed_ids),
+    )
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, job.pk))
+
+    logger.info(f"Queued print job {job.job_id} for {len(allowed_ids)} claims by {user.username}")
+    return job
+
+
+def _run_in_worker(job_pk):
+    """Executor entry point; worker threads need their own DB connections."""
+    close_old_connections()
+    try:
+        run_print_job(job_pk)
+    finally:
+        close_old_connections()
+
+
+def run_print_job(job_pk):
+    """Render and merge all claims of a print job. Safe to call from any worker."""
+    # Claim the job atomically so two workers never render the same one
+    claimed = PrintJob.objects.filter(pk=job_pk, status='pending').update(
+        status='processing',
+        started_at=timezone.now(),
+    )
+    if not claimed:
+        return
+
+    job = PrintJob.objects.get(pk=job_pk)
+    work_dir = tempfile.mkdtemp(prefix=f'print_job_{job.job_id}_')
+
+    try:
+        chunk_paths = []
+        claim_ids = job.claim_ids
+
+        for start in range(0, len(claim_ids), PRINT_JOB_CHUNK_SIZE):
+            chunk_ids = claim_ids[start:start + PRINT_JOB_CHUNK_SIZE]
+            chunk_path = os.path.join(work_dir, f'chunk_{start:06d}.pdf')
+            _render_chunk(chunk_ids, job.with_receipts, chunk_path)
+            chunk_paths.append(chunk_path)
+
+            processed = min(start + len(chunk_ids), len(claim_ids))
+            PrintJob.objects.filter(pk=job.pk).update(
+                processed_claims=processed,
+                # Keep the last percent for the merge step
+                progress=min(99, processed * 100 // len(claim_ids)),
+            )
+
+        merged_path = os.path.join(work_dir, 'merged.pdf')
+        _merge_pdfs(chunk_paths, merged_path)
+
+        with open(merged_path, 'rb') as fh:
+            job.output_file.save(f'claims_{job.job_id}.pdf', File(fh), save=False)
+
+        job.status = 'completed'
+        job.progress = 100
+        job.processed_claims = len(claim_ids)
+        job.completed_at = timezone.now()
+        job.save(update_fields=['output_file', 'status', 'progress', 'processed_claims', 'completed_at'])
+        logger.info(f"Print job {job.job_id} completed ({len(claim_ids)} claims)")
+
+    except Exception as e:
+        logger.error(f"Print job {job.job_id} failed: {e}")
+        PrintJob.objects.filter(pk=job.pk).update(
+            status='failed',
+            error_message=str(e),
+            completed_at=timezone.now(),
+        )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _render_chunk(claim_ids, with_receipts, output_path):
+    """Render one chunk of claims to a PDF file, receipt PDFs appended per claim."""
+    import weasyprint
+    from pypdf import PdfWriter
+    from .print_views import build_claim_print_data
+
+    claims = ExpenseClaim.objects.filter(id__in=claim_ids).select_related(
+        'claimant', 'company'
+    ).prefetch_related(
+        Prefetch(
+            'expense_items',
+            queryset=ExpenseItem.objects.select_related(
+                'category', 'currency'
+            ).prefetch_related('documents').order_by('expense_date', 'created_at')
+        )
+    ).order_by('claim_number')
+
+    template_name = 'claims/print_with_receipts.html' if with_receipts else 'claims/print_claims.html'
+    writer = PdfWriter()
+
+    for claim in claims:
+        claim_data = build_claim_print_data(claim, list(claim.expense_items.all()))
+        html = render_to_string(template_name, {
+            'claims_data': [claim_data],
+            'is_print': True,
+            'is_combined': False,
+        })
+        pdf_bytes = weasyprint.HTML(
+            string=html,
+            base_url=str(settings.BASE_DIR),
+            url_fetcher=_media_url_fetcher,
+        ).write_pdf()
+        writer.append(io.BytesIO(pdf_bytes))
+
+        if with_receipts:
+            # PDF receipts cannot be shown as <img>; append their pages instead
+            for item in claim_data['expense_items']:
+                for doc in item.documents.all():
+                    if doc.is_pdf and doc.file and os.path.isfile(doc.file.path):
+                        writer.append(doc.file.path)
+
+    with open(output_path, 'wb') as fh:
+        writer.write(fh)
+    writer.close()
+
+
+def _merge_pdfs(paths, output_path):
+    """Merge the chunk files into the final document, one chunk in memory at a time."""
+    with open(output_path, 'wb') as fh:
+        appender = _PdfAppender(fh)
+        for path in paths:
+            appender.append(path)
+        appender.close()
+
+
+class _PdfAppender:
+    """
+    Write the pages of PDF files into one output file as they are appended.
+
+    Each page and the objects it references are renumbered and written out
+    straight away, so only the file being appended is held in memory; the
+    page tree, catalog and cross-reference table are written on ``close``.
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, fh):
+        self.fh = fh
+        # Byte offset of every object, indexed by object number - 1
+        self.offsets = [None, None]
+        self.page_numbers = []
+        fh.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def append(self, path):
+        self._copy_pages(path)
+        # The reader and its objects reference each other; free them before the next file
+        gc.collect()
+
+    def _copy_pages(self, path):
+        from pypdf import PdfReader
+        from pypdf.generic import IndirectObject, NameObject
+
+        reader = PdfReader(path)
+        numbers = {}
+        queue = []
+
+        def renumber(reference):
+            key = (reference.idnum, reference.generation)
+            if key not in numbers:
+                self.offsets.append(None)
+                numbers[key] = len(self.offsets)
+                queue.append(reference)
+            return IndirectObject(numbers[key], 0, None)
+
+        for page in reader.pages:
+            # Inherited attributes are already copied onto the page by the reader
+            page[NameObject('/Parent')] = IndirectObject(self.PAGES, 0, None)
+            self.page_numbers.append(renumber(page.indirect_reference).idnum)
+
+        while queue:
+            reference = queue.pop()
+            obj = reference.get_object()
+            self._write_object(numbers[(reference.idnum, reference.generation)], self._remap(obj, renumber))
+
+    def close(self):
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+        pages = DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(number, 0, None) for number in self.page_numbers),
+            NameObject('/Count'): NumberObject(len(self.page_numbers)),
+        })
+        self._write_object(self.PAGES, pages)
+        self._write_object(self.CATALOG, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(self.PAGES, 0, None),
+        }))
+
+        xref_offset = self.fh.tell()
+        self.fh.write(f'xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n'.encode())
+        for offset in self.offsets:
+            self.fh.write(f'{offset:010d} 00000 n \n'.encode())
+        self.fh.write(
+            f'trailer\n<< /Size {len(self.offsets) + 1} /Root {self.CATALOG} 0 R >>\n'
+            f'startxref\n{xref_offset}\n%%EOF\n'.encode()
+        )
+
+    def _write_object(self, number, obj):
+        self.offsets[number - 1] = self.fh.tell()
+        self.fh.write(f'{number} 0 obj\n'.encode())
+        obj.write_to_stream(self.fh)
+        self.fh.write(b'\nendobj\n')
+
+    @classmethod
+    def _remap(cls, obj, renumber):
+        """Point the references inside a direct object at the renumbered objects."""
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+        if isinstance(obj, IndirectObject):
+            # Objects shared between pages are only renumbered once
+            return obj if obj.pdf is None else renumber(obj)
+        if isinstance(obj, DictionaryObject):
+            for key, value in obj.items():
+                obj[key] = cls._remap(value, renumber)
+        elif isinstance(obj, ArrayObject):
+            obj[:] = [cls._remap(value, renumber) for value in obj]
+        return obj
+
+
+def _media_url_fetcher(url, *args, **kwargs):
+    """Serve MEDIA_URL references from MEDIA_ROOT instead of over HTTP."""
+    import weasyprint
+
+    # Root-relative "/media/..." URLs resolve to file:///media/... against a file base_url
+    if url.startswith('file://'):
+        path = unquote(url[len('file://'):])
+        if path.startswith(settings.MEDIA_URL):
+            local_path = os.path.join(settings.MEDIA_ROOT, path[len(settings.MEDIA_URL):])
+            return weasyprint.default_url_fetcher(f'file://{local_path}', *args, **kwargs)
+    return weasyprint.default_url_fetcher(url, *args, **kwargs)
+
+
+def reclaim_stale_jobs():
+    """Put jobs stuck in processing past ``PRINT_JOB_TIMEOUT`` back to pending."""
+    cutoff = timezone.now() - timedelta(seconds=PRINT_JOB_TIMEOUT)
+    reclaimed = PrintJob.objects.filter(status='processing', started_at__lt=cutoff).update(
+        status='pending',
+        started_at=None,
+        processed_claims=0,
+        progress=0,
+    )
+    if reclaimed:
+        logger.warning(f"Reclaimed {reclaimed} print job(s) abandoned in processing")
+    return reclaimed
+
+
+def process_pending_jobs(limit=None):
+    """Run pending jobs synchronously; used by the ``process_print_jobs`` command."""
+    reclaim_stale_jobs()
+
+    pending = PrintJob.objects.filter(status='pending').order_by('created_at')
+    if limit:
+        pending = pending[:limit]
+
+    processed = 0
+    for job_pk in list(pending.values_list('pk', flat=True)):
+        run_print_job(job_pk)
+        processed += 1
+    return processed
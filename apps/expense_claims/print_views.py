@@ -2,35 +2,21 @@
 Print views for expense claims.
 """
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from .models import ExpenseClaim, ExpenseItem
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from .models import ExpenseClaim, ExpenseItem, PrintJob
+from .print_jobs import submit_print_job
 from decimal import Decimal
 
+# Selections larger than this are printed through a background print job
+BULK_PRINT_THRESHOLD = 20
 
-@login_required
-def print_claim_view(request, pk):
-    """Print a single expense claim."""
-    claim = get_object_or_404(
-        ExpenseClaim.objects.prefetch_related(
-            'expense_items__category',
-            'expense_items__currency',
-            'expense_items__documents'
-        ),
-        pk=pk
-    )
-    
-    # Check permissions
-    if claim.claimant != request.user and not request.user.has_perm('expense_claims.can_view_all_claims'):
-        messages.error(request, 'You do not have permission to print this claim.')
-        return redirect('expense_claims:claim_detail', pk=pk)
-    
-    # Prepare data structure that matches template expectations
-    # Sort by expense_date for chronological order (oldest first), then by item_number for consistency
-    expense_items = list(claim.expense_items.all().order_by('expense_date', 'created_at'))
-    
-    # Find unique categories used in this claim  
+
+def build_claim_print_data(claim, expense_items):
+    """Build the per-claim structure expected by the print templates."""
+    # Find unique categories used in this claim
     used_categories = []
     for item in expense_items:
         if item.category:
@@ -56,13 +42,37 @@ def print_claim_view(request, pk):
         if item.category and item.amount_hkd and item.category.code in category_totals:
             category_totals[item.category.code] += item.amount_hkd
     
-    claim_data = {
+    return {
         'claim': claim,
         'expense_items': expense_items,
         'category_totals': category_totals,
         'present_categories': present_categories,
         'total_hkd': claim.total_amount_hkd or Decimal('0.00'),
     }
+
+
+@login_required
+def print_claim_view(request, pk):
+    """Print a single expense claim."""
+    claim = get_object_or_404(
+        ExpenseClaim.objects.prefetch_related(
+            'expense_items__category',
+            'expense_items__currency',
+            'expense_items__documents'
+        ),
+        pk=pk
+    )
+    
+    # Check permissions
+    if claim.claimant != request.user and not request.user.has_perm('expense_claims.can_view_all_claims'):
+        messages.error(request, 'You do not have permission to print this claim.')
+        return redirect('expense_claims:claim_detail', pk=pk)
+    
+    # Prepare data structure that matches template expectations
+    # Sort by expense_date for chronological order (oldest first), then by item_number for consistency
+    expense_items = list(claim.expense_items.all().order_by('expense_date', 'created_at'))
+    
+    claim_data = build_claim_print_data(claim, expense_items)
     
     context = {
         'claims_data': [claim_data],  # Template expects a list
@@ -191,36 +201,7 @@ def print_claim_with_receipts_view(request, pk):
     # Prepare data structure that matches template expectations
     expense_items = claim.expense_items.all().order_by('item_number')
     
-    # Find unique categories used in this claim  
-    used_categories = []
-    for item in expense_items:
-        if item.category:
-            category_info = {
-                'code': item.category.code,
-                'zh_label': item.category.name,
-                'en_label': item.category.name,
-            }
-            if not any(cat['code'] == category_info['code'] for cat in used_categories):
-                used_categories.append(category_info)
-    
-    present_categories = used_categories
-    
-    # Calculate category totals for present categories only
-    category_totals = {}
-    for cat in present_categories:
-        category_totals[cat['code']] = Decimal('0.00')
-    
-    for item in expense_items:
-        if item.category and item.amount_hkd and item.category.code in category_totals:
-            category_totals[item.category.code] += item.amount_hkd
-    
-    claim_data = {
-        'claim': claim,
-        'expense_items': expense_items,
-        'category_totals': category_totals,
-        'present_categories': present_categories,
-        'total_hkd': claim.total_amount_hkd or Decimal('0.00'),
-    }
+    claim_data = build_claim_print_data(claim, expense_items)
     
     context = {
         'claims_data': [claim_data],
@@ -329,7 +310,13 @@ def select_claims_for_print_view(request):
         selected_claims = request.POST.getlist('selected_claims')
         print_with_receipts = request.POST.get('print_with_receipts') == 'on'
         
-        if selected_claims:
+        if len(selected_claims) > BULK_PRINT_THRESHOLD:
+            # Large selections are rendered to a merged PDF in the background
+            job = submit_print_job(request.user, selected_claims, print_with_receipts)
+            if job:
+                return redirect('expense_claims:print_job_status', job_id=job.job_id)
+            messages.error(request, 'You do not have permission to print these claims.')
+        elif selected_claims:
             # Redirect to appropriate print view with selected claims
             claim_ids = '&'.join([f'claims={cid}' for cid in selected_claims])
             if print_with_receipts:
@@ -350,3 +337,53 @@ def select_claims_for_print_view(request):
         'page_title': 'Select Claims for Printing',
     }
     return render(request, 'claims/select_claims_print.html', context)
+
+
+def _get_print_job_for_user(request, job_id):
+    job = get_object_or_404(PrintJob, job_id=job_id)
+    if job.requested_by != request.user and not request.user.has_perm('expense_claims.can_view_all_claims'):
+        raise Http404("Print job not found")
+    return job
+
+
+@login_required
+def print_job_status_view(request, job_id):
+    """Show progress of a bulk print job; returns JSON for polling requests."""
+    job = _get_print_job_for_user(request, job_id)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'job_id': str(job.job_id),
+            'status': job.status,
+            'progress': job.progress,
+            'processed_claims': job.processed_claims,
+            'total_claims': job.total_claims,
+            'error_message': job.error_message,
+            'download_url': (
+                reverse('expense_claims:print_job_download', args=[job.job_id])
+                if job.status == 'completed' else None
+            ),
+        })
+    
+    context = {
+        'job': job,
+        'page_title': 'Preparing Print Job',
+    }
+    return render(request, 'claims/print_job_status.html', context)
+
+
+@login_required
+def print_job_download_view(request, job_id):
+    """Download the merged PDF of a completed print job."""
+    job = _get_print_job_for_user(request, job_id)
+    
+    if job.status != 'completed' or not job.output_file:
+        messages.error(request, 'This print job is not ready yet.')
+        return redirect('expense_claims:print_job_status', job_id=job.job_id)
+    
+    return FileResponse(
+        job.output_file.open('rb'),
+        as_attachment=False,
+        filename=f'expense_claims_{job.job_id}.pdf',
+        content_type='application/pdf'
+    )
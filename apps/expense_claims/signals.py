@@ -0,0 +1,35 @@
+"""
+Signal handlers keeping denormalized claim data in sync.
+
+Queryset updates and bulk_update skip these; ExpenseClaimQuerySet
+schedules their refresh instead.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import ExpenseClaim, UserClaimStats
+
+
+@receiver(pre_save, sender=ExpenseClaim)
+def remember_previous_claimant(sender, instance, **kwargs):
+    """Keep the claimant the claim had before an edit."""
+    instance._previous_claimant_id = None
+    if instance.pk:
+        instance._previous_claimant_id = ExpenseClaim.objects.filter(
+            pk=instance.pk
+        ).values_list('claimant_id', flat=True).first()
+
+
+@receiver(post_save, sender=ExpenseClaim)
+def refresh_stats_on_claim_save(sender, instance, **kwargs):
+    """Refresh the statistics of the claimant, and of the previous one when it changed."""
+    UserClaimStats.schedule_refresh(
+        {instance.claimant_id, getattr(instance, '_previous_claimant_id', None)}
+    )
+
+
+@receiver(post_delete, sender=ExpenseClaim)
+def refresh_stats_on_claim_delete(sender, instance, **kwargs):
+    """Refresh the claimant's statistics when a claim is deleted."""
+    UserClaimStats.schedule_refresh({instance.claimant_id})
@@ -1,3 +1,495 @@
-from django.test import TestCase
+"""
+Tests for expense claims.
+"""
 
-# Create your tests here.
+import datetime
+import io
+import re
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.core.cache_utils import ExpenseSystemCache
+from . import print_jobs
+from .approvals import approval_queue, apply_batch_decision
+from .models import (
+    ClaimStatusHistory, Company, Currency, ExpenseCategory, ExpenseClaim, ExpenseItem, PrintJob, UserClaimStats
+)
+from .views import OptimizedExpenseClaimListView, get_user_claims_summary
+
+
+class HotQueryPlanTests(TestCase):
+    """Fail when a hot ExpenseClaim query falls back to a full table scan.
+
+    Plans are taken from the querysets the list views and approval queue
+    build, and from the SQL the dashboard, summary and claim numbering code
+    actually executes. On PostgreSQL sequential scans are disabled so the
+    planner reports an index whenever one is usable, independent of the
+    tiny test table size.
+    """
+
+    table = ExpenseClaim._meta.db_table
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='employee', employee_id='E001', password='x')
+        cls.manager = User.objects.create_user(username='manager', employee_id='M001', password='x', role='manager')
+        cls.admin = User.objects.create_superuser(username='admin', employee_id='A001', password='x', email='a@x.com')
+        User.objects.filter(pk=cls.user.pk).update(manager=cls.manager)
+        cls.company = Company.objects.create(name='CG Global', code='CGGE')
+        hkd = Currency.objects.create(code='HKD', name='Hong Kong Dollar', is_base_currency=True)
+        category = ExpenseCategory.objects.create(code='transportation', name='Transportation', name_chinese='交通')
+
+        for index, status in enumerate(['draft', 'submitted', 'under_review', 'approved', 'rejected', 'paid'] * 3):
+            claim = ExpenseClaim.objects.create(
+                claimant=cls.user,
+                company=cls.company,
+                period_from=datetime.date(2025, 1, 1),
+                period_to=datetime.date(2025, 1, 31),
+                status=status,
+            )
+            ExpenseItem.objects.create(
+                expense_claim=claim,
+                item_number=1,
+                expense_date=datetime.date(2025, 1, 2),
+                description=f'Taxi {index}',
+                category=category,
+                original_amount=Decimal('10.00'),
+                currency=hkd,
+                exchange_rate=Decimal('1'),
+                amount_hkd=Decimal('10.00'),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def explain(self, sql=None, queryset=None):
+        """Plan of a queryset or of executed SQL"""
+        if queryset is not None:
+            return queryset.explain()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def get_plan(self, **source):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                return self.explain(**source)
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET enable_seqscan')
+        return self.explain(**source)
+
+    def assertNoFullScan(self, queryset=None, sql=None, allow_index_scan=False):
+        """Assert the claims table is searched through an index.
+
+        ``allow_index_scan`` accepts walking a whole index in order, which is
+        what an unfiltered ``ORDER BY ... LIMIT`` should do.
+        """
+        if connection.vendor == 'sqlite':
+            if allow_index_scan:
+                full_scan = re.compile(rf'\bSCAN {self.table}\b(?! USING)')
+            else:
+                full_scan = re.compile(rf'\bSCAN {self.table}\b')
+        elif connection.vendor == 'postgresql':
+            full_scan = re.compile(rf'Seq Scan on {self.table}\b')
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}')
+
+        plan = self.get_plan(queryset=queryset, sql=sql)
+        self.assertIsNone(
+            full_scan.search(plan),
+            f'Full table scan on {self.table}:\n{sql or queryset.query}\n{plan}'
+        )
+
+    def assertExecutedQueriesUseIndexes(self, func, allow_index_scan=False):
+        """Run ``func`` and check the plan of every claims query it executes."""
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        executed = [query['sql'] for query in queries if f'"{self.table}"' in query['sql']]
+        self.assertTrue(executed, f'{func} ran no query on {self.table}')
+        for sql in executed:
+            self.assertNoFullScan(sql=sql, allow_index_scan=allow_index_scan)
+
+    def list_queryset(self, user, **params):
+        request = RequestFactory().get('/expense-claims/', params)
+        request.user = user
+        view = OptimizedExpenseClaimListView()
+        view.setup(request)
+        return view.get_queryset()
+
+    # Claim list and print selection
+
+    def test_claim_list_for_claimant(self):
+        self.assertNoFullScan(self.list_queryset(self.user))
+
+    def test_claim_list_status_filter(self):
+        self.assertNoFullScan(self.list_queryset(self.user, status='approved'))
+
+    def test_claim_list_company_filter(self):
+        self.assertNoFullScan(self.list_queryset(self.admin, company=self.company.id))
+
+    def test_claim_list_all_claims(self):
+        self.assertNoFullScan(self.list_queryset(self.admin)[:20], allow_index_scan=True)
+
+    # Dashboards
+
+    def test_employee_dashboard(self):
+        self.assertExecutedQueriesUseIndexes(lambda: ExpenseSystemCache.get_dashboard_data(self.user.id, 'employee'))
+
+    def test_manager_dashboard(self):
+        self.assertExecutedQueriesUseIndexes(lambda: ExpenseSystemCache.get_dashboard_data(self.manager.id, 'manager'))
+
+    def test_user_claims_summary(self):
+        self.assertExecutedQueriesUseIndexes(lambda: get_user_claims_summary(self.user.id, 'month'))
+
+    # Approval queue
+
+    def test_pending_approvals(self):
+        self.assertNoFullScan(approval_queue(self.manager))
+        self.assertNoFullScan(approval_queue(self.admin, company_ids=[self.company.id]))
+
+    # Claim numbering
+
+    def test_claim_number_prefix_lookup(self):
+        # SQLite's case-insensitive LIKE cannot seek, but walks the index backwards
+        self.assertExecutedQueriesUseIndexes(
+            lambda: ExpenseClaim(company=self.company).generate_claim_number(),
+            allow_index_scan=True
+        )
+
+
+class ApprovalQueueTests(TestCase):
+    """Approval queue scoping and batch decisions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager', employee_id='M001', password='x', role='manager')
+        cls.employee = User.objects.create_user(username='employee', employee_id='E001', password='x', manager=cls.manager)
+        cls.other = User.objects.create_user(username='other', employee_id='E002', password='x')
+        cls.company = Company.objects.create(name='CG Global', code='CGGE')
+
+    def create_claim(self, claimant, status='submitted'):
+        return ExpenseClaim.objects.create(
+            claimant=claimant,
+            company=self.company,
+            period_from=datetime.date(2025, 1, 1),
+            period_to=datetime.date(2025, 1, 31),
+            status=status,
+        )
+
+    def test_queue_is_scoped_to_managed_employees(self):
+        managed = self.create_claim(self.employee)
+        self.create_claim(self.employee, status='draft')
+        self.create_claim(self.other)
+
+        self.assertEqual(list(approval_queue(self.manager)), [managed])
+
+    def test_batch_approve(self):
+        claims = [self.create_claim(self.employee) for _ in range(3)]
+        unmanaged = self.create_claim(self.other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = apply_batch_decision(self.manager, [c.id for c in claims] + [unmanaged.id], 'approve')
+
+        self.assertEqual(sorted(result['processed']), [c.id for c in claims])
+        self.assertEqual(result['skipped'], [unmanaged.id])
+        self.assertEqual(ExpenseClaim.objects.filter(status='approved', approved_by=self.manager).count(), 3)
+        self.assertEqual(ClaimStatusHistory.objects.filter(new_status='approved').count(), 3)
+        self.assertEqual(self.employee.claim_stats.approved_claims, 3)
+
+    def test_batch_reject_requires_reason(self):
+        claim = self.create_claim(self.employee)
+
+        with self.assertRaises(ValueError):
+            apply_batch_decision(self.manager, [claim.id], 'reject')
+
+        apply_batch_decision(self.manager, [claim.id], 'reject', reason='Missing receipts')
+        claim.refresh_from_db()
+        self.assertEqual(claim.status, 'rejected')
+        self.assertEqual(claim.rejection_reason, 'Missing receipts')
+
+
+class ClaimStatsTests(TestCase):
+    """UserClaimStats follow saves, queryset writes and claimant changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice', employee_id='E101', password='x')
+        cls.bob = User.objects.create_user(username='bob', employee_id='E102', password='x')
+        cls.company = Company.objects.create(name='CG Global', code='CGGE')
+
+    def create_claim(self, claimant, status='submitted'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ExpenseClaim.objects.create(
+                claimant=claimant,
+                company=self.company,
+                period_from=datetime.date(2025, 1, 1),
+                period_to=datetime.date(2025, 1, 31),
+                status=status,
+            )
+
+    def stats(self, user):
+        return UserClaimStats.objects.get(user=user)
+
+    def test_save_and_delete_refresh_stats(self):
+        claim = self.create_claim(self.alice)
+        self.assertEqual((self.stats(self.alice).total_claims, self.stats(self.alice).submitted_claims), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            claim.delete()
+        self.assertEqual(self.stats(self.alice).total_claims, 0)
+
+    def test_claimant_change_refreshes_both_users(self):
+        claim = self.create_claim(self.alice)
+
+        claim.claimant = self.bob
+        with self.captureOnCommitCallbacks(execute=True):
+            claim.save()
+
+        self.assertEqual(self.stats(self.alice).total_claims, 0)
+        self.assertEqual(self.stats(self.bob).total_claims, 1)
+
+    def test_queryset_writes_refresh_stats(self):
+        claims = [self.create_claim(self.alice) for _ in range(2)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpenseClaim.objects.filter(claimant=self.alice).update(status='paid')
+        self.assertEqual((self.stats(self.alice).paid_claims, self.stats(self.alice).submitted_claims), (2, 0))
+
+        for claim in claims:
+            claim.claimant = self.bob
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpenseClaim.objects.bulk_update(claims, ['claimant'])
+        self.assertEqual(self.stats(self.alice).total_claims, 0)
+        self.assertEqual(self.stats(self.bob).paid_claims, 2)
+
+    def test_rebuild_uses_one_grouped_query(self):
+        self.create_claim(self.alice)
+        self.create_claim(self.bob, status='approved')
+        UserClaimStats.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_claim_stats', stdout=io.StringIO())
+        claim_reads = [q for q in queries if 'FROM "claims_expenseclaim"' in q['sql']]
+        self.assertEqual(len(claim_reads), 1)
+        self.assertIn('GROUP BY', claim_reads[0]['sql'])
+        self.assertEqual(self.stats(self.alice).submitted_claims, 1)
+        self.assertEqual(self.stats(self.bob).approved_claims, 1)
+
+
+class PrintJobTests(TestCase):
+    """Bulk print jobs: submission, rendering, recovery, status and download."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice', employee_id='E201', password='x')
+        cls.bob = User.objects.create_user(username='bob', employee_id='E202', password='x')
+        cls.company = Company.objects.create(name='CG Global', code='CGGE')
+        cls.alice_claims = [cls.create_claim(cls.alice, f'Event {n}') for n in range(3)]
+        cls.bob_claim = cls.create_claim(cls.bob, 'Other event')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp(prefix='print_job_tests_')
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    @classmethod
+    def create_claim(cls, claimant, event_name):
+        return ExpenseClaim.objects.create(
+            claimant=claimant,
+            company=cls.company,
+            event_name=event_name,
+            period_from=datetime.date(2025, 1, 1),
+            period_to=datetime.date(2025, 1, 31),
+            status='submitted',
+        )
+
+    def create_job(self, user=None, status='pending', **fields):
+        claim_ids = [claim.pk for claim in self.alice_claims]
+        return PrintJob.objects.create(
+            requested_by=user or self.alice,
+            claim_ids=claim_ids,
+            total_claims=len(claim_ids),
+            status=status,
+            **fields
+        )
+
+    def test_submit_keeps_printable_claims_and_queues_after_commit(self):
+        claim_ids = [claim.pk for claim in self.alice_claims] + [self.bob_claim.pk]
+
+        with mock.patch.object(print_jobs, '_get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = print_jobs.submit_print_job(self.alice, claim_ids, with_receipts=True)
+                get_executor.assert_not_called()
+
+        expected = sorted(self.alice_claims, key=lambda claim: claim.claim_number)
+        self.assertEqual(job.claim_ids, [claim.pk for claim in expected])
+        self.assertEqual((job.total_claims, job.status, job.with_receipts), (3, 'pending', True))
+        get_executor.return_value.submit.assert_called_once_with(print_jobs._run_in_worker, job.pk)
+
+    def test_submit_without_printable_claims(self):
+        self.assertIsNone(print_jobs.submit_print_job(self.alice, [self.bob_claim.pk]))
+        self.assertFalse(PrintJob.objects.exists())
+
+    def test_run_merges_chunks_into_one_pdf(self):
+        from pypdf import PdfReader, PdfWriter
+
+        rendered = []
+
+        def render_chunk(claim_ids, with_receipts, output_path):
+            # One blank page per claim in place of the weasyprint layout
+            rendered.append(list(claim_ids))
+            writer = PdfWriter()
+            for _ in claim_ids:
+                writer.add_blank_page(width=595, height=842)
+            with open(output_path, 'wb') as fh:
+                writer.write(fh)
+
+        job = self.create_job()
+        with mock.patch.object(print_jobs, 'PRINT_JOB_CHUNK_SIZE', 2), \
+                mock.patch.object(print_jobs, '_render_chunk', side_effect=render_chunk):
+            print_jobs.run_print_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.processed_claims), ('completed', 100, 3), job.error_message)
+        self.assertIsNotNone(job.completed_at)
+        self.assertEqual(rendered, [job.claim_ids[:2], job.claim_ids[2:]])
+        with job.output_file.open('rb') as fh:
+            self.assertEqual(len(PdfReader(fh).pages), 3)
+
+        # A job that is no longer pending is never rendered twice
+        print_jobs.run_print_job(job.pk)
+        self.assertEqual(len(rendered), 2)
+
+    def test_merge_writes_chunks_in_order(self):
+        from pypdf import PdfReader, PdfWriter
+        from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+        def write_chunk(path, labels):
+            writer = PdfWriter()
+            # One font object shared by every page of the chunk
+            font = writer._add_object(DictionaryObject({
+                NameObject('/Type'): NameObject('/Font'),
+                NameObject('/Subtype'): NameObject('/Type1'),
+                NameObject('/BaseFont'): NameObject('/Helvetica'),
+            }))
+            for label in labels:
+                page = writer.add_blank_page(width=595, height=842)
+                page[NameObject('/Resources')] = DictionaryObject({
+                    NameObject('/Font'): DictionaryObject({NameObject('/F1'): font}),
+                })
+                content = DecodedStreamObject()
+                content.set_data(f'BT /F1 12 Tf 72 720 Td ({label}) Tj ET'.encode())
+                page[NameObject('/Contents')] = writer._add_object(content)
+            with open(path, 'wb') as fh:
+                writer.write(fh)
+
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, ignore_errors=True)
+        paths = []
+        for chunk, labels in enumerate([['Claim 1', 'Claim 2'], ['Claim 3'], ['Claim 4', 'Claim 5']]):
+            paths.append(f'{work_dir}/chunk_{chunk}.pdf')
+            write_chunk(paths[-1], labels)
+
+        print_jobs._merge_pdfs(paths, f'{work_dir}/merged.pdf')
+
+        reader = PdfReader(f'{work_dir}/merged.pdf', strict=True)
+        self.assertEqual(
+            [page.extract_text() for page in reader.pages],
+            ['Claim 1', 'Claim 2', 'Claim 3', 'Claim 4', 'Claim 5'],
+        )
+
+    def test_render_error_fails_job(self):
+        job = self.create_job()
+        with mock.patch.object(print_jobs, '_render_chunk', side_effect=OSError('disk full')):
+            print_jobs.run_print_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error_message), ('failed', 'disk full'))
+
+    def test_process_pending_jobs_reclaims_abandoned_jobs(self):
+        now = timezone.now()
+        abandoned = self.create_job(
+            status='processing', started_at=now - datetime.timedelta(seconds=print_jobs.PRINT_JOB_TIMEOUT + 60),
+            processed_claims=2, progress=66,
+        )
+        running = self.create_job(status='processing', started_at=now - datetime.timedelta(minutes=1))
+
+        with mock.patch.object(print_jobs, 'run_print_job') as run_print_job:
+            processed = print_jobs.process_pending_jobs()
+
+        self.assertEqual(processed, 1)
+        run_print_job.assert_called_once_with(abandoned.pk)
+        abandoned.refresh_from_db()
+        self.assertEqual((abandoned.status, abandoned.started_at, abandoned.progress), ('pending', None, 0))
+        running.refresh_from_db()
+        self.assertEqual(running.status, 'processing')
+
+    def test_status_json(self):
+        job = self.create_job(status='processing', processed_claims=1, progress=33)
+        url = reverse('expense_claims:print_job_status', args=[job.job_id])
+        self.client.force_login(self.alice, backend='django.contrib.auth.backends.ModelBackend')
+
+        data = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual((data['status'], data['progress'], data['processed_claims']), ('processing', 33, 1))
+        self.assertIsNone(data['download_url'])
+
+        PrintJob.objects.filter(pk=job.pk).update(status='completed', progress=100)
+        data = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(data['download_url'], reverse('expense_claims:print_job_download', args=[job.job_id]))
+
+    def test_status_and_download_hidden_from_other_users(self):
+        job = self.create_job(status='completed')
+        # Staff status alone does not grant access to other people's claims
+        staff = User.objects.create_user(username='clerk', employee_id='E203', password='x', is_staff=True)
+
+        for user in (self.bob, staff):
+            self.client.force_login(user, backend='django.contrib.auth.backends.ModelBackend')
+            for name in ('print_job_status', 'print_job_download'):
+                with self.subTest(user=user.username, view=name):
+                    response = self.client.get(reverse(f'expense_claims:{name}', args=[job.job_id]))
+                    self.assertEqual(response.status_code, 404)
+
+        staff.user_permissions.add(Permission.objects.get(codename='can_view_all_claims'))
+        staff = User.objects.get(pk=staff.pk)
+        self.client.force_login(staff, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('expense_claims:print_job_status', args=[job.job_id]), {'format': 'json'})
+        self.assertEqual(response.json()['status'], 'completed')
+
+    def test_download(self):
+        job = self.create_job()
+        url = reverse('expense_claims:print_job_download', args=[job.job_id])
+        self.client.force_login(self.alice, backend='django.contrib.auth.backends.ModelBackend')
+
+        response = self.client.get(url)
+        self.assertRedirects(
+            response, reverse('expense_claims:print_job_status', args=[job.job_id]), fetch_redirect_response=False
+        )
+
+        job.output_file.save('claims.pdf', ContentFile(b'%PDF-1.4 test'), save=False)
+        job.status = 'completed'
+        job.save(update_fields=['output_file', 'status'])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 test')
+        response.close()
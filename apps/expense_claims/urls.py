@@ -29,8 +29,13 @@ urlpatterns = [
     path('print/combined-receipts/', print_views.print_combined_claims_with_receipts_view, name='print_combined_claims_receipts'),
     path('<int:pk>/print-receipts/', print_views.print_claim_with_receipts_view, name='print_claim_receipts'),
     
+    # Bulk print jobs
+    path('print/jobs/<uuid:job_id>/', print_views.print_job_status_view, name='print_job_status'),
+    path('print/jobs/<uuid:job_id>/download/', print_views.print_job_download_view, name='print_job_download'),
+    
     # Approval workflows
     path('pending/', views.pending_approvals_view, name='pending_approvals'),
+    path('pending/batch/', views.batch_approval_view, name='batch_approval'),
     path('<int:pk>/approve/', views.approve_claim_view, name='approve_claim'),
     path('<int:pk>/reject/', views.reject_claim_view, name='reject_claim'),
     
@@ -36,6 +36,8 @@ except ImportError:
     ExpenseClaimForm = None
     ExpenseItemForm = None
 from apps.core.cache_utils import ExpenseSystemCache, cache_result
+from apps.core.periods import PERIODS, period_bounds
+from .approvals import approval_queue, apply_batch_decision, can_use_approval_queue
 import logging
 
 logger = logging.getLogger(__name__)
@@ -324,21 +326,15 @@ def ajax_exchange_rate(request):
 def get_user_claims_summary(user_id, period='month'):
     """Cached function for user claims summary."""
     from django.db.models import Sum, Count
-    from datetime import datetime, timedelta
     
-    now = timezone.now()
-    
-    if period == 'month':
-        start_date = now.replace(day=1)
-    elif period == 'quarter':
-        quarter_start = (now.month - 1) // 3 * 3 + 1
-        start_date = now.replace(month=quarter_start, day=1)
-    else:  # year
-        start_date = now.replace(month=1, day=1)
+    if period not in PERIODS:
+        period = 'year'
+    start_date, end_date = period_bounds(period)
     
     claims = ExpenseClaim.objects.filter(
         claimant_id=user_id,
-        created_at__gte=start_date
+        created_at__gte=start_date,
+        created_at__lt=end_date
     ).aggregate(
         total_amount=Sum('total_amount_hkd'),
         claim_count=Count('id'),
@@ -674,86 +670,112 @@ def claim_delete_view(request, pk):
 
 @login_required
 def pending_approvals_view(request):
-    """View for pending approvals."""
-    if not request.user.has_perm('expense_claims.can_approve_claims'):
+    """Approval queue: claims awaiting a decision from the current user."""
+    if not can_use_approval_queue(request.user):
         messages.error(request, 'You do not have permission to view pending approvals.')
         return redirect('expense_claims:claim_list')
     
-    claims = ExpenseClaim.objects.filter(
-        status='pending'
-    ).select_related(
+    company_id = request.GET.get('company')
+    company_ids = [company_id] if company_id and company_id.isdigit() else None
+    
+    claims = approval_queue(request.user, company_ids=company_ids).select_related(
         'claimant', 'company'
-    ).prefetch_related(
-        'expense_items'
-    ).order_by('-created_at')
+    )
+    
+    paginator = Paginator(claims, 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     context = {
-        'claims': claims,
+        'page_obj': page_obj,
+        'claims': page_obj.object_list,
+        'companies': ExpenseSystemCache.get_active_companies(),
+        'selected_company': company_id or '',
         'page_title': 'Pending Approvals',
     }
     return render(request, 'claims/pending_approvals.html', context)
 
 
 @login_required
-def approve_claim_view(request, pk):
-    """Approve a claim."""
-    claim = get_object_or_404(ExpenseClaim, pk=pk)
+def batch_approval_view(request):
+    """Approve or reject the selected claims from the approval queue."""
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    
+    if request.method != 'POST':
+        return redirect('expense_claims:pending_approvals')
     
-    if not request.user.has_perm('expense_claims.can_approve_claims'):
+    if not can_use_approval_queue(request.user):
+        if is_ajax:
+            return JsonResponse({'error': 'Permission denied'}, status=403)
         messages.error(request, 'You do not have permission to approve claims.')
-        return redirect('expense_claims:claim_detail', pk=pk)
+        return redirect('expense_claims:claim_list')
     
-    if request.method == 'POST':
-        comment = request.POST.get('comment', '')
-        
-        claim.status = 'approved'
-        claim.approved_by = request.user
-        claim.approved_at = timezone.now()
-        claim.save()
-        
-        if comment:
-            ClaimComment.objects.create(
-                claim=claim,
-                author=request.user,
-                comment=comment,
-                comment_type='approval'
-            )
-        
-        messages.success(request, f'Claim {claim.claim_number} approved successfully.')
-        return redirect('expense_claims:claim_detail', pk=pk)
+    claim_ids = [claim_id for claim_id in request.POST.getlist('claim_ids') if claim_id.isdigit()]
+    action = request.POST.get('action', '')
+    reason = request.POST.get('reason', '').strip()
     
-    return render(request, 'claims/approve_claim.html', {'claim': claim})
+    if not claim_ids:
+        error = 'Please select at least one claim.'
+        result = None
+    else:
+        try:
+            result = apply_batch_decision(request.user, claim_ids, action, reason)
+            error = None
+        except ValueError as e:
+            result = None
+            error = str(e)
+    
+    if is_ajax:
+        if error:
+            return JsonResponse({'error': error}, status=400)
+        return JsonResponse(result)
+    
+    if error:
+        messages.error(request, error)
+    else:
+        verb = 'approved' if action == 'approve' else 'rejected'
+        messages.success(request, f"{len(result['processed'])} claims {verb}.")
+        if result['skipped']:
+            messages.warning(
+                request,
+                f"{len(result['skipped'])} claims were skipped because they are no longer awaiting your approval."
+            )
+    return redirect('expense_claims:pending_approvals')
 
 
-@login_required
-def reject_claim_view(request, pk):
-    """Reject a claim."""
+def _single_claim_decision(request, pk, action, reason):
+    """Apply an approval decision to one claim and redirect back to it."""
     claim = get_object_or_404(ExpenseClaim, pk=pk)
     
-    if not request.user.has_perm('expense_claims.can_approve_claims'):
-        messages.error(request, 'You do not have permission to reject claims.')
+    if not can_use_approval_queue(request.user):
+        messages.error(request, f'You do not have permission to {action} claims.')
         return redirect('expense_claims:claim_detail', pk=pk)
     
-    if request.method == 'POST':
-        reason = request.POST.get('reason', '')
-        
-        if not reason:
-            messages.error(request, 'Rejection reason is required.')
-            return render(request, 'claims/reject_claim.html', {'claim': claim})
-        
-        claim.status = 'rejected'
-        claim.approved_by = request.user
-        claim.approved_at = timezone.now()
-        claim.save()
-        
-        ClaimComment.objects.create(
-            claim=claim,
-            author=request.user,
-            comment=reason,
-            comment_type='rejection'
-        )
-        
-        messages.success(request, f'Claim {claim.claim_number} rejected.')
+    if request.method != 'POST':
+        return redirect('expense_claims:claim_detail', pk=pk)
+    
+    try:
+        result = apply_batch_decision(request.user, [claim.pk], action, reason)
+    except ValueError as e:
+        messages.error(request, str(e))
         return redirect('expense_claims:claim_detail', pk=pk)
     
-    return render(request, 'claims/reject_claim.html', {'claim': claim})
\ No newline at end of file
+    if not result['processed']:
+        messages.error(request, f'Claim {claim.claim_number} is not awaiting your approval.')
+    elif action == 'approve':
+        messages.success(request, f'Claim {claim.claim_number} approved successfully.')
+    else:
+        messages.success(request, f'Claim {claim.claim_number} rejected.')
+    return redirect('expense_claims:claim_detail', pk=pk)
+
+
+@login_required
+def approve_claim_view(request, pk):
+    """Approve a claim."""
+    return _single_claim_decision(request, pk, 'approve', request.POST.get('comment', '').strip())
+
+
+@login_required
+def reject_claim_view(request, pk):
+    """Reject a claim."""
+    reason = request.POST.get('reason') or request.POST.get('rejection_reason', '')
+    return _single_claim_decision(request, pk, 'reject', reason.strip())
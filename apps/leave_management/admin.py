@@ -6,18 +6,24 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.contrib import messages
 from .models import (
-    LeaveType, LeaveApplication, LeaveBalance,
-    SpecialWorkClaim, SpecialLeaveApplication, SpecialLeaveBalance
+    LeaveType, LeaveEntitlementRule, LeaveApplication, LeaveBalance,
+    SpecialWorkClaim, SpecialLeaveApplication, SpecialLeaveBalance, LeaveLedgerEntry, PublicHoliday
 )
 
 User = get_user_model()
 
 
+class LeaveEntitlementRuleInline(admin.TabularInline):
+    model = LeaveEntitlementRule
+    extra = 1
+
+
 @admin.register(LeaveType)
 class LeaveTypeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'max_days_per_year', 'requires_approval', 'is_active']
+    list_display = ['name', 'max_days_per_year', 'max_carry_forward', 'requires_approval', 'is_active']
     list_filter = ['requires_approval', 'is_active']
     search_fields = ['name', 'description']
+    inlines = [LeaveEntitlementRuleInline]
 
 
 @admin.register(LeaveApplication)
@@ -81,3 +87,33 @@ class SpecialLeaveBalanceAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('user')
+
+
+@admin.register(LeaveLedgerEntry)
+class LeaveLedgerEntryAdmin(admin.ModelAdmin):
+    """Append-only: entries are posted by approvals and commands, never edited here"""
+    list_display = ['user', 'leave_type', 'year', 'kind', 'amount', 'note', 'created_at', 'created_by']
+    list_filter = ['kind', 'leave_type', 'year']
+    search_fields = ['user__first_name', 'user__last_name', 'user__username', 'note']
+    date_hierarchy = 'created_at'
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.select_related('user', 'leave_type', 'created_by')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PublicHoliday)
+class PublicHolidayAdmin(admin.ModelAdmin):
+    list_display = ['date', 'name', 'region', 'is_active', 'is_imported']
+    list_filter = ['region', 'is_active', 'is_imported']
+    search_fields = ['name']
+    date_hierarchy = 'date'
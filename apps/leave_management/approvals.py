@@ -0,0 +1,106 @@
+"""
+Approval queue for leave applications.
+
+Managers see the pending applications of the employees they manage
+(admins see everyone's), and can approve or reject any number of them in
+a single transaction: statuses are written with one bulk update, the
+approved days are posted to the ledger in bulk, and the cached occupancy
+and pending counters are invalidated once for the whole batch.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger
+from .dashboard import invalidate_pending_counts
+from .models import LeaveApplication
+from .occupancy import invalidate_occupancy
+import logging
+
+logger = logging.getLogger(__name__)
+
+APPROVAL_ACTIONS = {
+    'approve': 'approved',
+    'reject': 'rejected',
+}
+
+# One page of the queue can be cleared with one submit
+APPROVAL_PAGE_SIZE = 100
+
+
+def can_use_approval_queue(user):
+    """Check if the user may approve or reject leave."""
+    return user.role in ['manager', 'admin'] or user.is_superuser
+
+
+def approval_queue(approver):
+    """Pending applications awaiting a decision from ``approver``, oldest first."""
+    queryset = LeaveApplication.objects.filter(status='pending')
+    if not (approver.role == 'admin' or approver.is_superuser):
+        queryset = queryset.filter(user__in=approver.managed_employees.all())
+
+    # Approvers never decide on their own leave
+    return queryset.exclude(user=approver).order_by('created_at')
+
+
+def apply_batch_decision(approver, application_ids, action, comment=''):
+    """
+    Approve or reject a batch of leave applications in one transaction.
+
+    Applications outside the approver's queue (no longer pending, not
+    managed, own leave) are skipped rather than failing the batch.
+
+    Returns:
+        dict with ``processed`` and ``skipped`` lists of application ids
+    """
+    if action not in APPROVAL_ACTIONS:
+        raise ValueError(f"Unknown approval action '{action}'")
+
+    new_status = APPROVAL_ACTIONS[action]
+    requested_ids = {int(application_id) for application_id in application_ids}
+    now = timezone.now()
+
+    with transaction.atomic():
+        applications = list(
+            approval_queue(approver)
+            .filter(id__in=requested_ids)
+            .select_for_update(of=('self',))
+            .select_related('user')
+        )
+
+        for application in applications:
+            application.status = new_status
+            application.approved_by = approver
+            application.approved_at = now
+            application.updated_at = now
+            if action == 'reject':
+                application.rejection_reason = comment
+
+        update_fields = ['status', 'approved_by', 'approved_at', 'updated_at']
+        if action == 'reject':
+            update_fields.append('rejection_reason')
+        LeaveApplication.objects.bulk_update(applications, update_fields, batch_size=500)
+
+        # bulk_update skips the signals: post ledger entries and drop caches here, once
+        if action == 'approve':
+            ledger.post_entries([
+                entry
+                for application in applications
+                for entry in ledger.taken_entries(application, created_by=approver)
+            ])
+        intervals = [(application.date_from, application.date_to) for application in applications]
+        transaction.on_commit(lambda: _after_batch(intervals))
+
+    processed = [application.id for application in applications]
+    skipped = sorted(requested_ids - set(processed))
+
+    logger.info(
+        f"{approver.username} {new_status} {len(processed)} leave applications "
+        f"({len(skipped)} skipped)"
+    )
+    return {'processed': processed, 'skipped': skipped}
+
+
+def _after_batch(intervals):
+    if intervals:
+        invalidate_occupancy(intervals)
+        invalidate_pending_counts()
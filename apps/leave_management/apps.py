@@ -5,3 +5,6 @@ class LeaveManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.leave_management'
     verbose_name = 'Leave Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,201 @@
+"""
+Business day calendar for leave calculations
+
+A BusinessCalendar keeps, per region and year, a prefix sum of working days
+(weekdays that are not public holidays) and a next-working-day table. Range
+counts are a subtraction per calendar year touched and the next working
+day is a single lookup, however long the leave is.
+
+Leave sessions follow the application forms: AM is 9:00-13:00 and PM is
+14:00-18:00, so a leave starting at 14:00 or ending at 13:00 takes half of
+that day.
+"""
+import datetime
+import threading
+from array import array
+
+from django.conf import settings
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGION = getattr(settings, 'LEAVE_DEFAULT_REGION', 'HK')
+
+AM_START_HOUR = 9
+AM_END_HOUR = 13
+PM_START_HOUR = 14
+PM_END_HOUR = 18
+
+# Guard for next_working_day on a calendar without working days
+MAX_LOOKAHEAD_YEARS = 5
+
+_calendars = {}
+_calendars_lock = threading.Lock()
+
+
+def package_holidays(region, year):
+    """Public holidays from the ``holidays`` package, or none if it is not installed"""
+    try:
+        import holidays
+    except ImportError:
+        logger.warning('holidays package not installed; only weekends are non-working days')
+        return ()
+    try:
+        return holidays.country_holidays(region, years=year).keys()
+    except NotImplementedError:
+        logger.warning(f'No public holidays known for region {region}')
+        return ()
+
+
+def user_region(user):
+    """Holiday region of a user from their work location"""
+    location = (getattr(user, 'location', '') or '').upper()
+    return location if location in ('HK', 'CN') else DEFAULT_REGION
+
+
+class BusinessCalendar:
+    """Working days of one holiday region"""
+
+    def __init__(self, region=DEFAULT_REGION, holiday_provider=package_holidays):
+        self.region = region
+        self.holiday_provider = holiday_provider
+        self._years = {}
+        self._lock = threading.Lock()
+        self._version = None
+
+    def _year(self, year):
+        """(prefix, next_index) of a year, built on first use"""
+        table = self._years.get(year)
+        if table is not None:
+            return table
+
+        first = datetime.date(year, 1, 1)
+        size = (datetime.date(year + 1, 1, 1) - first).days
+        holidays = {(day - first).days for day in self.holiday_provider(self.region, year) if day.year == year}
+
+        # prefix[i] is the number of working days before day index i
+        prefix = array('H', [0]) * (size + 1)
+        for index in range(size):
+            working = (first.weekday() + index) % 7 < 5 and index not in holidays
+            prefix[index + 1] = prefix[index] + working
+
+        # next_index[i] is the first working day index >= i, or size if none
+        next_index = array('H', [size]) * (size + 1)
+        for index in range(size - 1, -1, -1):
+            next_index[index] = index if prefix[index + 1] > prefix[index] else next_index[index + 1]
+
+        with self._lock:
+            table = self._years.setdefault(year, (prefix, next_index))
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._years.clear()
+
+    def sync(self, version):
+        """Drop the year tables when the holidays they were built from have changed"""
+        if version != self._version:
+            with self._lock:
+                self._years.clear()
+                self._version = version
+
+    def is_working_day(self, day):
+        prefix, _ = self._year(day.year)
+        index = day.timetuple().tm_yday - 1
+        return prefix[index + 1] > prefix[index]
+
+    def working_days(self, start, end):
+        """Working days from ``start`` to ``end``, both inclusive"""
+        if end < start:
+            return 0
+        total = 0
+        for year in range(start.year, end.year + 1):
+            prefix, _ = self._year(year)
+            first = start.timetuple().tm_yday - 1 if year == start.year else 0
+            last = end.timetuple().tm_yday if year == end.year else len(prefix) - 1
+            total += prefix[last] - prefix[first]
+        return total
+
+    def next_working_day(self, day):
+        """First working day after ``day``"""
+        year, index = day.year, day.timetuple().tm_yday
+        for _ in range(MAX_LOOKAHEAD_YEARS + 1):
+            _, next_index = self._year(year)
+            size = len(next_index) - 1
+            if index < size and next_index[index] < size:
+                return datetime.date(year, 1, 1) + datetime.timedelta(days=next_index[index])
+            year, index = year + 1, 0
+        raise ValueError(f'No working day within {MAX_LOOKAHEAD_YEARS} years after {day}')
+
+    def leave_days(self, date_from, date_to):
+        """
+        Leave days between two session boundaries, counting half days for
+        a PM start or an AM end and skipping non-working days.
+        """
+        if not date_from or not date_to:
+            return 0
+        date_from, date_to = _local(date_from), _local(date_to)
+        start, end = date_from.date(), date_to.date()
+
+        if start == end:
+            if not self.is_working_day(start):
+                return 0.0
+            full_day = date_from.hour == AM_START_HOUR and date_to.hour == PM_END_HOUR
+            return 1.0 if full_day else 0.5
+
+        days = float(self.working_days(start, end))
+        if date_from.hour == PM_START_HOUR and self.is_working_day(start):
+            days -= 0.5
+        if date_to.hour == AM_END_HOUR and self.is_working_day(end):
+            days -= 0.5
+        return days
+
+    def back_to_office_date(self, date_to):
+        """Day the employee is back: the same afternoon after an AM end, else the next working day"""
+        if not date_to:
+            return None
+        date_to = _local(date_to)
+        if date_to.hour < PM_START_HOUR:
+            return date_to.date()
+        return self.next_working_day(date_to.date())
+
+
+def session_datetime(day, session, is_end=False):
+    """Aware start (or end) of the AM or PM session of a day, as stored on applications"""
+    if is_end:
+        hour = AM_END_HOUR if session == 'AM' else PM_END_HOUR
+    else:
+        hour = AM_START_HOUR if session == 'AM' else PM_START_HOUR
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+
+
+def _local(moment):
+    return timezone.localtime(moment) if timezone.is_aware(moment) else moment
+
+
+def get_business_calendar(region=None):
+    """
+    Shared calendar of a region, using the public holidays of the database.
+    Year tables are reused across requests until the holidays change.
+    """
+    from .public_holidays import holiday_dates, holiday_version
+
+    region = region or DEFAULT_REGION
+    calendar = _calendars.get(region)
+    if calendar is None:
+        with _calendars_lock:
+            calendar = _calendars.setdefault(region, BusinessCalendar(region, holiday_provider=holiday_dates))
+    calendar.sync(holiday_version())
+    return calendar
+
+
+def calendar_for_user(user):
+    return get_business_calendar(user_region(user))
+
+
+def clear_business_calendars():
+    """Drop cached year tables, e.g. after public holidays change"""
+    with _calendars_lock:
+        for calendar in _calendars.values():
+            calendar.clear()
@@ -0,0 +1,49 @@
+"""
+Versioned cache keys for leave data
+
+Cached leave data embeds a version number in its key. Invalidating bumps
+the version, which orphans every entry built on the old one at once
+without having to know or delete their keys.
+
+Versions live in the default cache, so a bump only reaches other processes
+when that cache is shared between them (``CACHE_BACKEND=redis``). With the
+per-process local-memory cache, other processes keep serving entries built
+on their own version until those entries expire.
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_TIMEOUT = None  # versions never expire, entries do
+
+
+def _initial_version():
+    # Time based, so a version evicted from the cache never restarts at a
+    # number that old entries were stored under
+    return int(time.time() * 1000)
+
+
+def get_versions(names):
+    """Current version of each name"""
+    keys = {f'leave_version:{name}': name for name in names}
+    versions = cache.get_many(list(keys))
+    missing = {key: _initial_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, VERSION_TIMEOUT)
+        versions.update(missing)
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_versions(names):
+    """Invalidate everything cached under the given version names"""
+    for name in set(names):
+        key = f'leave_version:{name}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Never read or evicted: any fresh version orphans old entries
+            cache.set(key, _initial_version(), VERSION_TIMEOUT)
@@ -0,0 +1,134 @@
+"""
+Leave conflict detection
+
+Checks a requested leave period against the applicant's own active
+applications and against how many teammates are already off. The own
+overlap check is one indexed interval query; team concurrency is read from
+the cached occupancy bitmaps, so a check costs the same few queries however
+long the leave or large the team.
+"""
+import datetime
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .business_days import calendar_for_user
+from .models import LeaveApplication
+from .occupancy import ACTIVE_STATUSES, interval_mask, month_start, period_occupancy
+
+# Share of a team (applicant included) that may be on approved leave at once
+MAX_TEAM_ABSENCE_RATIO = getattr(settings, 'LEAVE_MAX_TEAM_ABSENCE_RATIO', 0.5)
+
+
+@dataclass
+class LeaveConflicts:
+    """Result of checking one requested leave period"""
+    overlaps: list = field(default_factory=list)
+    team_size: int = 0
+    max_team_off: int = 0
+    # (day, teammates on approved leave, teammates with pending leave)
+    busy_days: list = field(default_factory=list)
+
+    @property
+    def team_limit_exceeded(self):
+        return any(approved + 1 > self.max_team_off for _, approved, _ in self.busy_days)
+
+    @property
+    def ok(self):
+        return not self.overlaps and not self.team_limit_exceeded
+
+    def errors(self):
+        errors = []
+        for application in self.overlaps:
+            errors.append(
+                f"Overlaps your {application.get_status_display().lower()} {application.leave_type.name} "
+                f"from {timezone.localtime(application.date_from):%d/%m/%Y} "
+                f"to {timezone.localtime(application.date_to):%d/%m/%Y}."
+            )
+        full_days = [day for day, approved, _ in self.busy_days if approved + 1 > self.max_team_off]
+        if full_days:
+            errors.append(
+                f"Too many teammates are already on leave on {', '.join(f'{day:%d/%m/%Y}' for day in full_days)} "
+                f"(at most {self.max_team_off} of {self.team_size} may be off at once)."
+            )
+        return errors
+
+    def as_dict(self):
+        return {
+            'ok': self.ok,
+            'errors': self.errors(),
+            'overlaps': [
+                {
+                    'id': application.pk,
+                    'leave_type': application.leave_type.name,
+                    'status': application.status,
+                    'date_from': timezone.localtime(application.date_from).isoformat(),
+                    'date_to': timezone.localtime(application.date_to).isoformat(),
+                }
+                for application in self.overlaps
+            ],
+            'team': {
+                'size': self.team_size,
+                'max_off': self.max_team_off,
+                'busy_days': [
+                    {'date': day.isoformat(), 'approved': approved, 'pending': pending}
+                    for day, approved, pending in self.busy_days
+                ],
+            },
+        }
+
+
+def team_member_ids(user):
+    """Active teammates of a user: their department, or colleagues sharing their manager"""
+    users = get_user_model().objects.filter(is_active=True).exclude(pk=user.pk)
+    if user.department:
+        users = users.filter(department=user.department)
+    elif user.manager_id:
+        users = users.filter(manager_id=user.manager_id)
+    else:
+        return []
+    return list(users.values_list('id', flat=True))
+
+
+def check_leave_conflicts(user, date_from, date_to, exclude_id=None):
+    """
+    Conflicts of a requested leave of ``user`` from ``date_from`` to
+    ``date_to``; ``exclude_id`` skips the application being revised.
+    """
+    result = LeaveConflicts()
+
+    overlaps = LeaveApplication.objects.filter(
+        user=user,
+        status__in=ACTIVE_STATUSES,
+        date_from__lt=date_to,
+        date_to__gt=date_from,
+    ).select_related('leave_type').order_by('date_from')
+    if exclude_id:
+        overlaps = overlaps.exclude(pk=exclude_id)
+    result.overlaps = list(overlaps)
+
+    teammates = team_member_ids(user)
+    result.team_size = len(teammates) + 1
+    result.max_team_off = max(1, int(result.team_size * MAX_TEAM_ABSENCE_RATIO))
+    if not teammates:
+        return result
+
+    first_day, last_day = timezone.localtime(date_from).date(), timezone.localtime(date_to).date()
+    occupancies = period_occupancy(teammates, first_day, last_day)
+    calendar = calendar_for_user(user)
+
+    day = first_day
+    while day <= last_day:
+        if calendar.is_working_day(day):
+            occupancy = occupancies[month_start(day)]
+            # Only the sessions requested on this day
+            requested = interval_mask(date_from, date_to, occupancy.first_day, occupancy.days * 2)
+            requested &= 0b11 << (2 * (day - occupancy.first_day).days)
+            approved = sum(1 for mask in occupancy.approved.values() if mask & requested)
+            pending = sum(1 for mask in occupancy.pending.values() if mask & requested)
+            if approved or pending:
+                result.busy_days.append((day, approved, pending))
+        day += datetime.timedelta(days=1)
+    return result
@@ -0,0 +1,184 @@
+"""
+Leave dashboard summary
+
+Everything the leave dashboard shows, gathered into one LeaveDashboard
+shared by the page and its JSON endpoint. A user's application counts
+come from one conditional-aggregation query. The company-wide pending
+counters managers see are cached under a version that is bumped whenever
+an application or claim changes status; other processes see the bump only
+with a shared cache backend (see ``caching``).
+"""
+import datetime
+from dataclasses import asdict, dataclass, field
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .caching import bump_versions, get_version
+from .models import LeaveApplication, LeaveBalance, SpecialLeaveApplication, SpecialLeaveBalance, SpecialWorkClaim
+from .rollover import years_of_service
+
+RECENT_APPLICATIONS = 10
+
+PENDING_VERSION = 'leave_pending'
+PENDING_CACHE_TIMEOUT = 3600
+
+ZERO = Decimal('0')
+
+
+@dataclass
+class BalanceSummary:
+    leave_type: str
+    opening_balance: Decimal
+    carried_forward: Decimal
+    current_year_entitlement: Decimal
+    taken: Decimal
+
+    @property
+    def balance(self):
+        return self.opening_balance + self.carried_forward + self.current_year_entitlement - self.taken
+
+
+@dataclass
+class PendingCounts:
+    """Items waiting for a manager across the company"""
+    leave_applications: int = 0
+    special_claims: int = 0
+    special_applications: int = 0
+
+    @property
+    def total_special(self):
+        return self.special_claims + self.special_applications
+
+
+@dataclass
+class LeaveDashboard:
+    year: int
+    years_of_service: int
+    balances: list = field(default_factory=list)
+    special_earned: Decimal = ZERO
+    special_used: Decimal = ZERO
+    total_applications: int = 0
+    pending_applications: int = 0
+    applications_this_year: int = 0
+    recent_applications: list = field(default_factory=list)
+    # Only filled in for managers and admins
+    pending: PendingCounts = None
+
+    @property
+    def annual_leave(self):
+        return next((balance for balance in self.balances if balance.leave_type == 'Annual Leave'), None)
+
+    @property
+    def special_balance(self):
+        return self.special_earned - self.special_used
+
+    @property
+    def more_applications(self):
+        return self.total_applications > len(self.recent_applications)
+
+    def as_dict(self):
+        return {
+            'year': self.year,
+            'years_of_service': self.years_of_service,
+            'balances': [
+                {**{key: float(value) if isinstance(value, Decimal) else value for key, value in asdict(balance).items()},
+                 'balance': float(balance.balance)}
+                for balance in self.balances
+            ],
+            'special_leave': {
+                'earned': float(self.special_earned),
+                'used': float(self.special_used),
+                'balance': float(self.special_balance),
+            },
+            'applications': {
+                'total': self.total_applications,
+                'pending': self.pending_applications,
+                'this_year': self.applications_this_year,
+            },
+            'recent_applications': [
+                {
+                    'id': application.pk,
+                    'leave_type': application.leave_type.name,
+                    'date_from': timezone.localtime(application.date_from).isoformat(),
+                    'date_to': timezone.localtime(application.date_to).isoformat(),
+                    'days': application.days_applied,
+                    'status': application.status,
+                }
+                for application in self.recent_applications
+            ],
+            'pending': None if self.pending is None else {
+                **asdict(self.pending), 'total_special': self.pending.total_special,
+            },
+        }
+
+
+def pending_counts():
+    """Company-wide pending counters, cached until a status changes"""
+    key = f'leave_pending_counts:v{get_version(PENDING_VERSION)}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = PendingCounts(
+            leave_applications=LeaveApplication.objects.filter(status='pending').count(),
+            special_claims=SpecialWorkClaim.objects.filter(status='pending').count(),
+            special_applications=SpecialLeaveApplication.objects.filter(status='pending').count(),
+        )
+        cache.set(key, counts, PENDING_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_pending_counts():
+    bump_versions([PENDING_VERSION])
+
+
+def leave_dashboard(user, year=None):
+    """
+    Dashboard summary of ``user``: at most four queries, plus the pending
+    counters for managers when they are not cached.
+    """
+    today = timezone.localdate()
+    year = year or today.year
+    year_start = timezone.make_aware(datetime.datetime(year, 1, 1))
+    year_end = timezone.make_aware(datetime.datetime(year + 1, 1, 1))
+
+    counts = LeaveApplication.objects.filter(user=user).aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending')),
+        this_year=Count('id', filter=Q(created_at__gte=year_start, created_at__lt=year_end)),
+    )
+
+    balances = [
+        BalanceSummary(
+            leave_type=balance.leave_type.name,
+            opening_balance=balance.opening_balance,
+            carried_forward=balance.carried_forward,
+            current_year_entitlement=balance.current_year_entitlement,
+            taken=balance.taken,
+        )
+        for balance in LeaveBalance.objects.filter(user=user, year=year).select_related('leave_type').order_by(
+            'leave_type__name'
+        )
+    ]
+    special = SpecialLeaveBalance.objects.filter(user=user).order_by().values_list('earned', 'used').first()
+    special = special or (ZERO, ZERO)
+
+    recent = list(
+        LeaveApplication.objects.filter(user=user)
+        .select_related('leave_type', 'approved_by')
+        .order_by('-created_at')[:RECENT_APPLICATIONS]
+    ) if counts['total'] else []
+
+    return LeaveDashboard(
+        year=year,
+        years_of_service=years_of_service(user.date_joined, today),
+        balances=balances,
+        special_earned=special[0],
+        special_used=special[1],
+        total_applications=counts['total'],
+        pending_applications=counts['pending'],
+        applications_this_year=counts['this_year'],
+        recent_applications=recent,
+        pending=pending_counts() if user.role in ['manager', 'admin'] else None,
+    )
@@ -3,6 +3,8 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.contrib.auth.models import User
 from .models import LeaveApplication, LeaveType, SpecialWorkClaim, SpecialLeaveApplication
+from .business_days import calendar_for_user, session_datetime
+from .conflicts import check_leave_conflicts
 from datetime import datetime, time
 
 class LeaveApplicationForm(forms.ModelForm):
@@ -72,9 +74,22 @@ class LeaveApplicationForm(forms.ModelForm):
             if start_date < timezone.now().date():
                 raise ValidationError("Leave cannot start in the past.")
             
-            # Validate weekend restrictions
-            if start_date.weekday() >= 5 or end_date.weekday() >= 5:
-                raise ValidationError("Leave cannot start or end on weekends.")
+            # Validate weekend and public holiday restrictions
+            calendar = calendar_for_user(self.user)
+            if not calendar.is_working_day(start_date) or not calendar.is_working_day(end_date):
+                raise ValidationError("Leave cannot start or end on weekends or public holidays.")
+
+            if start_session and end_session:
+                date_from = session_datetime(start_date, start_session)
+                date_to = session_datetime(end_date, end_session, is_end=True)
+                if date_to <= date_from:
+                    raise ValidationError("Leave cannot end before it starts.")
+
+                # Overlapping applications and team concurrency
+                if self.user:
+                    conflicts = check_leave_conflicts(self.user, date_from, date_to, exclude_id=self.instance.pk)
+                    if not conflicts.ok:
+                        raise ValidationError(conflicts.errors())
         
         return cleaned_data
     
@@ -85,28 +100,11 @@ class LeaveApplicationForm(forms.ModelForm):
         if self.user:
             application.user = self.user
 
-        # Convert session selections to datetime
-        from datetime import datetime, time
-        from django.utils import timezone as tz
-
-        start_date = self.cleaned_data['start_date']
-        start_session = self.cleaned_data['start_session']
-        end_date = self.cleaned_data['end_date']
-        end_session = self.cleaned_data['end_session']
-
-        # Set start datetime (make timezone-aware)
-        if start_session == 'AM':
-            dt = datetime.combine(start_date, time(9, 0))
-        else:  # PM
-            dt = datetime.combine(start_date, time(14, 0))
-        application.date_from = tz.make_aware(dt)
-
-        # Set end datetime (make timezone-aware)
-        if end_session == 'AM':
-            dt = datetime.combine(end_date, time(13, 0))
-        else:  # PM
-            dt = datetime.combine(end_date, time(18, 0))
-        application.date_to = tz.make_aware(dt)
+        # Convert session selections to timezone-aware datetimes
+        application.date_from = session_datetime(self.cleaned_data['start_date'], self.cleaned_data['start_session'])
+        application.date_to = session_datetime(
+            self.cleaned_data['end_date'], self.cleaned_data['end_session'], is_end=True
+        )
 
         if commit:
             application.save()
@@ -267,9 +265,10 @@ class SpecialLeaveApplicationForm(forms.ModelForm):
             if start_date < timezone.now().date():
                 raise ValidationError("Leave cannot start in the past.")
             
-            # Validate weekend restrictions
-            if start_date.weekday() >= 5 or end_date.weekday() >= 5:
-                raise ValidationError("Leave cannot start or end on weekends.")
+            # Validate weekend and public holiday restrictions
+            calendar = calendar_for_user(self.user)
+            if not calendar.is_working_day(start_date) or not calendar.is_working_day(end_date):
+                raise ValidationError("Leave cannot start or end on weekends or public holidays.")
         
         # Check if user has enough special leave credits
         if self.user:
@@ -277,7 +276,7 @@ class SpecialLeaveApplicationForm(forms.ModelForm):
             try:
                 balance = SpecialLeaveBalance.objects.get(user=self.user)
                 # Calculate required credits
-                temp_app = SpecialLeaveApplication()
+                temp_app = SpecialLeaveApplication(user=self.user)
                 if start_date and start_session:
                     temp_app.date_from = datetime.combine(start_date, time(9, 0) if start_session == 'AM' else time(14, 0))
                 if end_date and end_session:
@@ -0,0 +1,447 @@
+"""
+Leave balance ledger
+
+Every change to a leave balance is a LeaveLedgerEntry. Posting entries
+writes them in bulk and applies their totals to the cached balance rows
+with F() increments, so concurrent approvals add up instead of
+overwriting each other. rebuild_balances recomputes the cached rows from
+the ledger with one grouped query.
+
+Balance columns per entry kind:
+
+    opening        LeaveBalance.opening_balance
+    carry_forward  LeaveBalance.carried_forward
+    entitlement    LeaveBalance.current_year_entitlement
+    taken          LeaveBalance.taken, or SpecialLeaveBalance.used
+    credit         SpecialLeaveBalance.earned
+
+Special leave entries (no leave type) all apply to the user's single
+SpecialLeaveBalance row.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import LeaveBalance, LeaveLedgerEntry, SpecialLeaveBalance
+import logging
+
+logger = logging.getLogger(__name__)
+
+BALANCE_COLUMNS = {
+    'opening': 'opening_balance',
+    'carry_forward': 'carried_forward',
+    'entitlement': 'current_year_entitlement',
+    'taken': 'taken',
+}
+
+SPECIAL_COLUMNS = {
+    'credit': 'earned',
+    'taken': 'used',
+}
+
+ZERO = Decimal('0')
+
+
+def to_days(value):
+    """Decimal number of days, rounded to the half days leave is taken in"""
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def post_entries(entries):
+    """
+    Append ledger entries and apply them to the cached balances, atomically.
+
+    Existing balance rows are incremented with F() expressions, one UPDATE
+    per column for the whole batch; missing rows are inserted in bulk
+    already holding their amounts. Rows from before the ledger are opened
+    first, so a later rebuild keeps what they held.
+    """
+    entries = [entry for entry in entries if entry.amount]
+    if not entries:
+        return []
+
+    balance_deltas = {}
+    special_deltas = {}
+    for entry in entries:
+        if entry.leave_type_id is None:
+            column = SPECIAL_COLUMNS[entry.kind]
+            deltas = special_deltas.setdefault(entry.user_id, {'year': entry.year})
+        else:
+            column = BALANCE_COLUMNS[entry.kind]
+            deltas = balance_deltas.setdefault((entry.user_id, entry.leave_type_id, entry.year), {})
+        deltas[column] = deltas.get(column, ZERO) + entry.amount
+
+    with transaction.atomic():
+        existing = _existing_balances(balance_deltas)
+        opening = _unopened_balance_entries(list(existing.values()), list(special_deltas))
+        LeaveLedgerEntry.objects.bulk_create(opening + entries, batch_size=1000)
+
+        # New balance rows are inserted holding their amounts; a row created
+        # concurrently makes the insert fail rather than lose an increment
+        LeaveBalance.objects.bulk_create(
+            [
+                LeaveBalance(user_id=user_id, leave_type_id=leave_type_id, year=year, **deltas)
+                for (user_id, leave_type_id, year), deltas in balance_deltas.items()
+                if (user_id, leave_type_id, year) not in existing
+            ],
+            batch_size=1000,
+        )
+        _increment(LeaveBalance, 'pk', {
+            existing[key].pk: deltas for key, deltas in balance_deltas.items() if key in existing
+        })
+
+        SpecialLeaveBalance.objects.bulk_create(
+            [SpecialLeaveBalance(user_id=user_id, year=deltas.pop('year')) for user_id, deltas in special_deltas.items()],
+            ignore_conflicts=True,
+        )
+        _increment(SpecialLeaveBalance, 'user_id', special_deltas)
+    return entries
+
+
+def _increment(model, field, deltas):
+    """
+    Add ``deltas`` ({row: {column: amount}}, rows identified by ``field``)
+    to the rows' columns with F() expressions: one UPDATE per column
+    however many rows change.
+    """
+    columns = {column for row_deltas in deltas.values() for column in row_deltas}
+    for column in sorted(columns):
+        rows = {row: row_deltas[column] for row, row_deltas in deltas.items() if column in row_deltas}
+        model.objects.filter(**{f'{field}__in': list(rows)}).update(**{
+            column: F(column) + Case(
+                *[When(**{field: row}, then=Value(delta)) for row, delta in rows.items()],
+                default=Value(ZERO),
+                output_field=DecimalField(max_digits=6, decimal_places=2),
+            )
+        })
+
+
+def _unopened_balance_entries(balances, special_user_ids=()):
+    """
+    Opening entries for the LeaveBalance rows among ``balances`` and the
+    special balances of ``special_user_ids`` that predate the ledger: rows
+    that exist but have no ledger entries yet.
+    """
+    opening = []
+    if balances:
+        ledgered = set(LeaveLedgerEntry.objects.order_by().filter(
+            user_id__in={balance.user_id for balance in balances},
+            year__in={balance.year for balance in balances},
+            leave_type__isnull=False,
+        ).values_list('user_id', 'leave_type_id', 'year').distinct())
+        for balance in balances:
+            if (balance.user_id, balance.leave_type_id, balance.year) not in ledgered:
+                opening.extend(_opening_entries(balance, BALANCE_COLUMNS))
+
+    if special_user_ids:
+        for balance in SpecialLeaveBalance.objects.filter(user_id__in=special_user_ids).exclude(
+            user_id__in=LeaveLedgerEntry.objects.filter(leave_type__isnull=True).values('user_id')
+        ):
+            opening.extend(_opening_entries(balance, SPECIAL_COLUMNS))
+    return opening
+
+
+def _existing_balances(keys):
+    """LeaveBalance rows of (user, leave type, year) keys, for those that exist"""
+    if not keys:
+        return {}
+    return {
+        (balance.user_id, balance.leave_type_id, balance.year): balance
+        for balance in LeaveBalance.objects.filter(
+            user_id__in={key[0] for key in keys}, year__in={key[2] for key in keys}
+        )
+        if (balance.user_id, balance.leave_type_id, balance.year) in keys
+    }
+
+
+def _ensure_balance_rows(keys):
+    """Create the LeaveBalance rows of (user, leave type, year) keys that do not exist yet"""
+    if not keys:
+        return
+    existing = _existing_balances(keys)
+    LeaveBalance.objects.bulk_create(
+        [
+            LeaveBalance(user_id=user_id, leave_type_id=leave_type_id, year=year)
+            for user_id, leave_type_id, year in keys
+            if (user_id, leave_type_id, year) not in existing
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def days_by_year(application):
+    """Working days of an application per calendar year it touches"""
+    calendar = application.business_calendar
+    date_from = timezone.localtime(application.date_from)
+    date_to = timezone.localtime(application.date_to)
+    if date_from.year == date_to.year:
+        return {date_from.year: to_days(calendar.leave_days(date_from, date_to))}
+
+    # Split at year ends; full days on the inner boundaries
+    days = {}
+    start = date_from
+    for year in range(date_from.year, date_to.year + 1):
+        end = date_to if year == date_to.year else timezone.make_aware(datetime.datetime(year, 12, 31, 18))
+        days[year] = to_days(calendar.leave_days(start, end))
+        start = timezone.make_aware(datetime.datetime(year + 1, 1, 1, 9))
+    return days
+
+
+def taken_entries(application, created_by=None):
+    """Entries charging an approved leave application to its balance"""
+    return [
+        LeaveLedgerEntry(
+            user_id=application.user_id,
+            leave_type_id=application.leave_type_id,
+            year=year,
+            kind='taken',
+            amount=days,
+            leave_application=application,
+            note=f'Leave application #{application.pk}',
+            created_by=created_by,
+        )
+        for year, days in days_by_year(application).items()
+    ]
+
+
+def reversal_entries(entries, note, created_by=None):
+    """Entries cancelling out the given entries, per balance and kind"""
+    totals = {}
+    sources = {}
+    for entry in entries:
+        key = (entry.user_id, entry.leave_type_id, entry.year, entry.kind)
+        totals[key] = totals.get(key, ZERO) + entry.amount
+        sources[key] = entry
+
+    reversals = []
+    for key, amount in totals.items():
+        if not amount:
+            continue
+        source = sources[key]
+        reversals.append(LeaveLedgerEntry(
+            user_id=source.user_id,
+            leave_type_id=source.leave_type_id,
+            year=source.year,
+            kind=source.kind,
+            amount=-amount,
+            leave_application_id=source.leave_application_id,
+            special_leave_application_id=source.special_leave_application_id,
+            special_work_claim_id=source.special_work_claim_id,
+            note=note,
+            created_by=created_by,
+        ))
+    return reversals
+
+
+def _net_amount(entries):
+    return entries.aggregate(total=Sum('amount'))['total'] or ZERO
+
+
+def record_leave_taken(application, created_by=None):
+    """Charge an approved application unless it is already charged"""
+    if _net_amount(application.ledger_entries.all()):
+        return []
+    return post_entries(taken_entries(application, created_by=created_by))
+
+
+def release_leave_taken(application, created_by=None):
+    """Give back the days of an application that is no longer approved"""
+    return post_entries(reversal_entries(
+        application.ledger_entries.all(), f'Leave application #{application.pk} {application.status}', created_by
+    ))
+
+
+def record_special_credit(claim, created_by=None):
+    """Credit the special leave earned by an approved special work claim"""
+    if _net_amount(claim.ledger_entries.all()):
+        return []
+    return post_entries([LeaveLedgerEntry(
+        user_id=claim.user_id,
+        year=claim.work_date.year,
+        kind='credit',
+        amount=to_days(claim.credits_earned),
+        special_work_claim=claim,
+        note=f'Special work: {claim.event_name}'[:255],
+        created_by=created_by,
+    )])
+
+
+def release_special_credit(claim, created_by=None):
+    return post_entries(reversal_entries(
+        claim.ledger_entries.all(), f'Special work claim #{claim.pk} {claim.status}', created_by
+    ))
+
+
+def record_special_leave_taken(application, created_by=None):
+    """Use special leave credits for an approved special leave application"""
+    if _net_amount(application.ledger_entries.all()):
+        return []
+    return post_entries([LeaveLedgerEntry(
+        user_id=application.user_id,
+        year=timezone.localtime(application.date_from).year,
+        kind='taken',
+        amount=to_days(application.calculate_days()),
+        special_leave_application=application,
+        note=f'Special leave application #{application.pk}',
+        created_by=created_by,
+    )])
+
+
+def release_special_leave_taken(application, created_by=None):
+    return post_entries(reversal_entries(
+        application.ledger_entries.all(), f'Special leave application #{application.pk} {application.status}', created_by
+    ))
+
+
+def set_balance_column(user, leave_type, year, kind, amount, note='', created_by=None):
+    """Post the entry that brings a balance column to ``amount``"""
+    return set_balance_columns({(user.pk, leave_type.pk, year, kind): amount}, note=note, created_by=created_by)
+
+
+def set_balance_columns(targets, note='', created_by=None):
+    """
+    Bring many balance columns to target values at once.
+
+    ``targets`` maps (user id, leave type id, year, kind) to the amount the
+    column should hold. Current ledger totals are read with one grouped
+    query and only the differences are posted.
+    """
+    if not targets:
+        return []
+    keys = {key[:3] for key in targets}
+
+    with transaction.atomic():
+        # Balances from before the ledger: open them so their other columns survive a rebuild
+        LeaveLedgerEntry.objects.bulk_create(
+            _unopened_balance_entries(list(_existing_balances(keys).values())), batch_size=1000
+        )
+
+        current = {
+            (row['user'], row['leave_type'], row['year'], row['kind']): row['total']
+            for row in LeaveLedgerEntry.objects.order_by().filter(
+                user_id__in={key[0] for key in keys},
+                leave_type_id__in={key[1] for key in keys},
+                year__in={key[2] for key in keys},
+            ).values('user', 'leave_type', 'year', 'kind').annotate(total=Sum('amount'))
+        }
+        entries = [
+            LeaveLedgerEntry(
+                user_id=user_id, leave_type_id=leave_type_id, year=year, kind=kind,
+                amount=to_days(amount) - current.get((user_id, leave_type_id, year, kind), ZERO),
+                note=note, created_by=created_by,
+            )
+            for (user_id, leave_type_id, year, kind), amount in targets.items()
+        ]
+        return post_entries(entries)
+
+
+def _column_sums(columns):
+    return {
+        column: Sum('amount', filter=Q(kind=kind), default=ZERO)
+        for kind, column in columns.items()
+    }
+
+
+def rebuild_balances(year=None):
+    """
+    Recompute cached balances from the ledger: one grouped query per balance
+    model, then bulk writes. Balance rows without ledger entries are left
+    alone.
+
+    Returns:
+        (leave balance rows written, special balance rows written)
+    """
+    entries = LeaveLedgerEntry.objects.order_by()
+    if year:
+        entries = entries.filter(year=year)
+
+    totals = {
+        (row['user'], row['leave_type'], row['year']): row
+        for row in entries.filter(leave_type__isnull=False).values('user', 'leave_type', 'year').annotate(
+            **_column_sums(BALANCE_COLUMNS)
+        )
+    }
+    columns = list(BALANCE_COLUMNS.values())
+
+    with transaction.atomic():
+        _ensure_balance_rows(totals)
+        changed = []
+        balances = LeaveBalance.objects.filter(user_id__in={key[0] for key in totals})
+        if year:
+            balances = balances.filter(year=year)
+        for balance in balances:
+            row = totals.get((balance.user_id, balance.leave_type_id, balance.year))
+            if row is None:
+                continue
+            for column in columns:
+                setattr(balance, column, row[column])
+            changed.append(balance)
+        LeaveBalance.objects.bulk_update(changed, columns, batch_size=1000)
+
+        # Special balances hold all years
+        special_totals = {
+            row['user']: row
+            for row in LeaveLedgerEntry.objects.order_by().filter(leave_type__isnull=True).values('user').annotate(
+                **_column_sums(SPECIAL_COLUMNS)
+            )
+        }
+        SpecialLeaveBalance.objects.bulk_create(
+            [SpecialLeaveBalance(user_id=user_id, year=year or timezone.localdate().year) for user_id in special_totals],
+            ignore_conflicts=True,
+        )
+        special_changed = []
+        for balance in SpecialLeaveBalance.objects.filter(user_id__in=special_totals):
+            row = special_totals[balance.user_id]
+            balance.earned, balance.used = row['earned'], row['used']
+            special_changed.append(balance)
+        SpecialLeaveBalance.objects.bulk_update(special_changed, ['earned', 'used'], batch_size=1000)
+
+    logger.info(f'Rebuilt {len(changed)} leave balances and {len(special_changed)} special leave balances')
+    return len(changed), len(special_changed)
+
+
+def _opening_entries(balance, columns):
+    """Entries matching the current columns of a balance row, for the ledger only"""
+    return [
+        LeaveLedgerEntry(
+            user_id=balance.user_id,
+            leave_type_id=getattr(balance, 'leave_type_id', None),
+            year=balance.year,
+            kind=kind,
+            amount=getattr(balance, column),
+            note='Opened from existing balance',
+        )
+        for kind, column in columns.items()
+        if getattr(balance, column)
+    ]
+
+
+def seed_ledger_from_balances(year=None):
+    """
+    Open the ledger for balances that predate it: post opening, carry
+    forward, entitlement and taken entries equal to the columns of every
+    balance row of a (user, leave type, year) without ledger entries.
+    """
+    balances = LeaveBalance.objects.all()
+    if year:
+        balances = balances.filter(year=year)
+    ledgered = set(LeaveLedgerEntry.objects.filter(leave_type__isnull=False).values_list(
+        'user_id', 'leave_type_id', 'year'
+    ).distinct())
+
+    entries = []
+    for balance in balances:
+        if (balance.user_id, balance.leave_type_id, balance.year) not in ledgered:
+            entries.extend(_opening_entries(balance, BALANCE_COLUMNS))
+
+    special_ledgered = set(LeaveLedgerEntry.objects.filter(leave_type__isnull=True).values_list('user_id', flat=True))
+    for balance in SpecialLeaveBalance.objects.exclude(user_id__in=special_ledgered):
+        entries.extend(_opening_entries(balance, SPECIAL_COLUMNS))
+
+    # The balances already hold these amounts; only the ledger is written
+    LeaveLedgerEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
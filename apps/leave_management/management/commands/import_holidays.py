@@ -1,87 +1,56 @@
-from django.core.management.base import BaseCommand
-from leave.models import PublicHoliday
-import holidays
-from datetime import datetime
+"""
+Management command to import public holidays.
+
+Holidays come from the ``holidays`` package for each region and year, or
+from a local CSV/JSON file with ``--file``, and are written in bulk.
+Usage: python manage.py import_holidays --regions HK CN --years 2025 2026
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.leave_management.public_holidays import (
+    REGIONS, fetch_package_holidays, import_holidays, read_holiday_file
+)
 
 
 class Command(BaseCommand):
     help = 'Import holidays for specified regions and years'
-    
+
     def add_arguments(self, parser):
-        parser.add_argument('--regions', nargs='+', default=['HK', 'CN'], 
+        parser.add_argument('--regions', nargs='+', default=REGIONS,
                           help='Regions to import holidays for (HK, CN)')
-        parser.add_argument('--years', nargs='+', type=int, 
-                          default=[datetime.now().year], 
+        parser.add_argument('--years', nargs='+', type=int,
+                          default=[timezone.localdate().year],
                           help='Years to import holidays for')
+        parser.add_argument('--file', type=str,
+                          help='CSV (date,name[,region]) or JSON file to import instead of the holidays package; '
+                               'rows without a region use the first of --regions')
         parser.add_argument('--force', action='store_true',
-                          help='Force reimport even if holidays exist')
-    
+                          help='Also delete imported holidays no longer listed for the years imported')
+
     def handle(self, *args, **options):
-        regions = options['regions']
-        years = options['years']
-        force = options['force']
-        
-        for region in regions:
-            for year in years:
-                self.stdout.write(f'Importing holidays for {region} {year}...')
-                
-                # Check if holidays already exist
-                existing_count = PublicHoliday.objects.filter(
-                    region=region, year=year
-                ).count()
-                
-                if existing_count > 0 and not force:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'  Holidays for {region} {year} already exist ({existing_count} holidays). '
-                            'Use --force to reimport.'
-                        )
-                    )
-                    continue
-                
-                if force and existing_count > 0:
-                    # Delete existing holidays
-                    PublicHoliday.objects.filter(
-                        region=region, year=year
-                    ).delete()
-                    self.stdout.write(f'  Deleted {existing_count} existing holidays')
-                
-                try:
-                    # Get holidays from the holidays library
-                    if region == 'HK':
-                        region_holidays = holidays.HongKong(years=year)
-                    elif region == 'CN':
-                        region_holidays = holidays.China(years=year)
-                    else:
-                        self.stdout.write(
-                            self.style.ERROR(f'  Unknown region: {region}')
-                        )
-                        continue
-                    
-                    # Import holidays
-                    imported_count = 0
-                    for date, name in region_holidays.items():
-                        PublicHoliday.objects.get_or_create(
-                            name=name,
-                            date=date,
-                            region=region,
-                            year=year,
-                            defaults={
-                                'is_active': True,
-                                'is_imported': True
-                            }
-                        )
-                        imported_count += 1
-                    
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'  Successfully imported {imported_count} holidays for {region} {year}'
-                        )
-                    )
-                    
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f'  Error importing holidays for {region} {year}: {e}')
-                    )
-        
-        self.stdout.write(self.style.SUCCESS('Holiday import completed!'))
+        regions = [region.upper() for region in options['regions']]
+        unknown = sorted(set(regions) - set(REGIONS))
+        if unknown:
+            raise CommandError(f'Unknown region: {", ".join(unknown)}')
+
+        if options['file']:
+            self.stdout.write(f'Reading holidays from {options["file"]}...')
+            try:
+                holidays = read_holiday_file(options['file'], region=regions[0])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Error reading holiday file: {e}')
+        else:
+            holidays = []
+            for region in regions:
+                for year in options['years']:
+                    try:
+                        holidays.extend(fetch_package_holidays(region, year))
+                    except ImportError:
+                        raise CommandError('The holidays package is not installed; use --file instead')
+
+        result = import_holidays(holidays, replace=options['force'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Holiday import completed! {result.created} created, {result.updated} updated, '
+            f'{result.unchanged} unchanged, {result.removed} removed'
+        ))
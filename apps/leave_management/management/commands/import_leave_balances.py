@@ -7,6 +7,8 @@ import os
 from decimal import Decimal
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from apps.leave_management.ledger import set_balance_columns
 from apps.leave_management.models import LeaveType, LeaveBalance
 
 User = get_user_model()
@@ -25,8 +27,8 @@ class Command(BaseCommand):
         parser.add_argument(
             '--year',
             type=int,
-            default=2025,
-            help='Year for leave balances (default: 2025)'
+            default=timezone.localdate().year,
+            help='Year for leave balances (default: current year)'
         )
 
     def handle(self, *args, **options):
@@ -70,88 +72,74 @@ class Command(BaseCommand):
 
         try:
             with open(file_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-
-                for row_num, row in enumerate(reader, start=2):
-                    try:
-                        username = row.get('username', '').strip().replace('\n', '')
-                        if not username:
-                            stats['skipped'] += 1
-                            continue
-
-                        # Get user
-                        try:
-                            user = User.objects.get(username=username)
-                        except User.DoesNotExist:
-                            self.stdout.write(
-                                self.style.WARNING(f'Row {row_num}: User not found: {username}')
-                            )
-                            stats['skipped'] += 1
-                            continue
-
-                        # Get leave balance values
-                        annual_balance = row.get('annual_leave_balance', '14').strip().replace('\n', '')
-                        sick_balance = row.get('sick_leave_balance', '10').strip().replace('\n', '')
-
-                        try:
-                            annual_balance = Decimal(annual_balance) if annual_balance else Decimal('14')
-                            sick_balance = Decimal(sick_balance) if sick_balance else Decimal('10')
-                        except:
-                            annual_balance = Decimal('14')
-                            sick_balance = Decimal('10')
-
-                        # Create or update Annual Leave balance
-                        annual_obj, created = LeaveBalance.objects.update_or_create(
-                            user=user,
-                            leave_type=annual_leave,
-                            year=year,
-                            defaults={
-                                'opening_balance': Decimal('0'),
-                                'carried_forward': Decimal('0'),
-                                'current_year_entitlement': annual_balance,
-                                'taken': Decimal('0'),
-                            }
-                        )
+                rows = [
+                    (row_num, row, row.get('username', '').strip().replace('\n', ''))
+                    for row_num, row in enumerate(csv.DictReader(csvfile), start=2)
+                ]
+        except Exception as e:
+            raise CommandError(f'Error reading CSV file: {str(e)}')
 
-                        # Create or update Sick Leave balance
-                        sick_obj, sick_created = LeaveBalance.objects.update_or_create(
-                            user=user,
-                            leave_type=sick_leave,
-                            year=year,
-                            defaults={
-                                'opening_balance': Decimal('0'),
-                                'carried_forward': Decimal('0'),
-                                'current_year_entitlement': sick_balance,
-                                'taken': Decimal('0'),
-                            }
+        # One query for all users and one for the balances they already have
+        users = User.objects.in_bulk({username for _, _, username in rows if username}, field_name='username')
+        existing = set(LeaveBalance.objects.filter(
+            user__in=users.values(), leave_type__in=[annual_leave, sick_leave], year=year
+        ).values_list('user_id', 'leave_type_id'))
+
+        targets = {}
+        for row_num, row, username in rows:
+            try:
+                if not username:
+                    stats['skipped'] += 1
+                    continue
+
+                user = users.get(username)
+                if user is None:
+                    self.stdout.write(
+                        self.style.WARNING(f'Row {row_num}: User not found: {username}')
+                    )
+                    stats['skipped'] += 1
+                    continue
+
+                # Get leave balance values
+                annual_balance = row.get('annual_leave_balance', '14').strip().replace('\n', '')
+                sick_balance = row.get('sick_leave_balance', '10').strip().replace('\n', '')
+
+                try:
+                    annual_balance = Decimal(annual_balance) if annual_balance else Decimal('14')
+                    sick_balance = Decimal(sick_balance) if sick_balance else Decimal('10')
+                except:
+                    annual_balance = Decimal('14')
+                    sick_balance = Decimal('10')
+
+                # Entitlements go through the ledger; days already taken are kept
+                targets[(user.pk, annual_leave.pk, year, 'entitlement')] = annual_balance
+                targets[(user.pk, sick_leave.pk, year, 'entitlement')] = sick_balance
+
+                if (user.pk, annual_leave.pk) not in existing or (user.pk, sick_leave.pk) not in existing:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f'Row {row_num}: Created balances for {user.get_full_name()} '
+                            f'(Annual: {annual_balance}, Sick: {sick_balance})'
                         )
-
-                        if created or sick_created:
-                            self.stdout.write(
-                                self.style.SUCCESS(
-                                    f'Row {row_num}: Created balances for {user.get_full_name()} '
-                                    f'(Annual: {annual_balance}, Sick: {sick_balance})'
-                                )
-                            )
-                            stats['created'] += 1
-                        else:
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f'Row {row_num}: Updated balances for {user.get_full_name()}'
-                                )
-                            )
-                            stats['updated'] += 1
-
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.ERROR(
-                                f'Row {row_num}: Error processing {row.get("username", "unknown")}: {str(e)}'
-                            )
+                    )
+                    stats['created'] += 1
+                else:
+                    self.stdout.write(
+                        self.style.WARNING(
+                            f'Row {row_num}: Updated balances for {user.get_full_name()}'
                         )
-                        stats['errors'] += 1
-
-        except Exception as e:
-            raise CommandError(f'Error reading CSV file: {str(e)}')
+                    )
+                    stats['updated'] += 1
+
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f'Row {row_num}: Error processing {row.get("username", "unknown")}: {str(e)}'
+                    )
+                )
+                stats['errors'] += 1
+
+        set_balance_columns(targets, note='Imported from staff list')
 
         # Print summary
         self.stdout.write(self.style.SUCCESS('\n' + '='*60))
@@ -0,0 +1,35 @@
+"""
+Management command to recompute cached leave balances from the ledger.
+Usage: python manage.py rebuild_leave_balances [--year 2025] [--seed-from-balances]
+"""
+from django.core.management.base import BaseCommand
+
+from apps.leave_management.ledger import rebuild_balances, seed_ledger_from_balances
+
+
+class Command(BaseCommand):
+    help = 'Recompute leave balances from the leave ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            help='Only rebuild balances of this year (default: all years)'
+        )
+        parser.add_argument(
+            '--seed-from-balances',
+            action='store_true',
+            help='First open ledger entries for balances that have none, from their current values'
+        )
+
+    def handle(self, *args, **options):
+        year = options['year']
+
+        if options['seed_from_balances']:
+            seeded = seed_ledger_from_balances(year=year)
+            self.stdout.write(self.style.SUCCESS(f'Opened {seeded} ledger entries from existing balances'))
+
+        balances, special_balances = rebuild_balances(year=year)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {balances} leave balances and {special_balances} special leave balances'
+        ))
@@ -0,0 +1,61 @@
+"""
+Management command to open a year's leave balances from the previous year.
+Usage: python manage.py rollover_leave_balances --year 2026 [--dry-run] [--user username ...]
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.leave_management.rollover import rollover
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Carry forward unused leave and set entitlements for a new year'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            default=timezone.localdate().year,
+            help='Year to open (default: current year)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the changes without writing them'
+        )
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help='Only roll over this user (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        year = options['year']
+        dry_run = options['dry_run']
+
+        user_ids = None
+        if options['usernames']:
+            users = User.objects.in_bulk(options['usernames'], field_name='username')
+            missing = sorted(set(options['usernames']) - set(users))
+            if missing:
+                raise CommandError(f'Users not found: {", ".join(missing)}')
+            user_ids = [user.pk for user in users.values()]
+
+        lines = rollover(year, user_ids=user_ids, dry_run=dry_run)
+
+        for line in lines:
+            self.stdout.write(
+                f'{line.username:<20} {line.leave_type:<20} '
+                f'closing {line.closing_balance:>7.2f}  '
+                f'carried forward {line.current_carried_forward:>6.2f} -> {line.carried_forward:<6.2f}  '
+                f'entitlement {line.current_entitlement:>6.2f} -> {line.entitlement:.2f}'
+            )
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'Dry run: {len(lines)} balances would change for {year}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rolled over {len(lines)} balances into {year}'))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:14
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('leave_management', '0002_leave_interval_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='specialleaveapplication',
+            name='credits_used',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=6, verbose_name='Credits Used'),
+        ),
+        migrations.AlterField(
+            model_name='specialleavebalance',
+            name='earned',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), help_text='Credits earned from special work claims', max_digits=6, verbose_name='Earned'),
+        ),
+        migrations.AlterField(
+            model_name='specialleavebalance',
+            name='used',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), help_text='Credits used for special leave', max_digits=6, verbose_name='Used'),
+        ),
+        migrations.AlterField(
+            model_name='specialworkclaim',
+            name='credits_earned',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=6, verbose_name='Credits Earned'),
+        ),
+        migrations.CreateModel(
+            name='LeaveLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField(verbose_name='Year')),
+                ('kind', models.CharField(choices=[('opening', 'Opening Balance'), ('carry_forward', 'Carry Forward'), ('entitlement', 'Entitlement'), ('taken', 'Taken'), ('credit', 'Special Leave Credit')], max_length=20, verbose_name='Kind')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Days added to the balance column of the kind; negative to reverse', max_digits=6, verbose_name='Amount')),
+                ('note', models.CharField(blank=True, max_length=255, verbose_name='Note')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created At')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_leave_ledger_entries', to=settings.AUTH_USER_MODEL)),
+                ('leave_application', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='leave_management.leaveapplication')),
+                ('leave_type', models.ForeignKey(blank=True, help_text='Empty for special leave credits', null=True, on_delete=django.db.models.deletion.PROTECT, to='leave_management.leavetype')),
+                ('special_leave_application', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='leave_management.specialleaveapplication')),
+                ('special_work_claim', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='leave_management.specialworkclaim')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Leave Ledger Entry',
+                'verbose_name_plural': 'Leave Ledger Entries',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['user', 'leave_type', 'year'], name='leave_ledger_balance_idx'), models.Index(fields=['year', 'kind'], name='leave_ledger_year_kind_idx')],
+            },
+        ),
+    ]
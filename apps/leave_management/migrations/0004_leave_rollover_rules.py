@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:18
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave_management', '0003_leave_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leavetype',
+            name='max_carry_forward',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), help_text='Most unused days carried into the next year', max_digits=5, verbose_name='Max Carry Forward'),
+        ),
+        migrations.CreateModel(
+            name='LeaveEntitlementRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_years_of_service', models.PositiveIntegerField(default=0, verbose_name='Min Years of Service')),
+                ('days', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='Days')),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entitlement_rules', to='leave_management.leavetype')),
+            ],
+            options={
+                'verbose_name': 'Leave Entitlement Rule',
+                'verbose_name_plural': 'Leave Entitlement Rules',
+                'ordering': ['leave_type__name', 'min_years_of_service'],
+                'unique_together': {('leave_type', 'min_years_of_service')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leave_management', '0004_leave_rollover_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicHoliday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.CharField(choices=[('HK', 'Hong Kong'), ('CN', 'China')], max_length=10, verbose_name='Region')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('name', models.CharField(max_length=200, verbose_name='Name')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Is Active')),
+                ('is_imported', models.BooleanField(default=False, help_text='Imported from the holidays package or a file rather than added by hand', verbose_name='Is Imported')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Public Holiday',
+                'verbose_name_plural': 'Public Holidays',
+                'ordering': ['region', 'date'],
+                'unique_together': {('region', 'date')},
+            },
+        ),
+    ]
@@ -2,11 +2,13 @@
 Leave Management Models for Integrated Business Platform
 Uses the platform's User model from apps.accounts
 """
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth import get_user_model
-from datetime import datetime, timedelta
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from .business_days import calendar_for_user
 
 User = get_user_model()
 
@@ -16,6 +18,13 @@ class LeaveType(models.Model):
     name = models.CharField(_("Leave Type"), max_length=50)
     description = models.TextField(_("Description"), blank=True)
     max_days_per_year = models.PositiveIntegerField(_("Max Days Per Year"), default=0)
+    max_carry_forward = models.DecimalField(
+        _("Max Carry Forward"),
+        max_digits=5,
+        decimal_places=2,
+        default=Decimal('0'),
+        help_text=_("Most unused days carried into the next year")
+    )
     requires_approval = models.BooleanField(_("Requires Approval"), default=True)
     is_active = models.BooleanField(_("Is Active"), default=True)
 
@@ -28,6 +37,51 @@ class LeaveType(models.Model):
         ordering = ['name']
 
 
+class LeaveEntitlementRule(models.Model):
+    """Yearly entitlement of a leave type from a number of completed years of service"""
+    leave_type = models.ForeignKey(LeaveType, on_delete=models.CASCADE, related_name='entitlement_rules')
+    min_years_of_service = models.PositiveIntegerField(_("Min Years of Service"), default=0)
+    days = models.DecimalField(_("Days"), max_digits=5, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.leave_type} after {self.min_years_of_service} years: {self.days}"
+
+    class Meta:
+        verbose_name = _("Leave Entitlement Rule")
+        verbose_name_plural = _("Leave Entitlement Rules")
+        unique_together = ['leave_type', 'min_years_of_service']
+        ordering = ['leave_type__name', 'min_years_of_service']
+
+
+class PublicHoliday(models.Model):
+    """Public holiday of a holiday region; a non-working day while active"""
+    REGION_CHOICES = [
+        ('HK', _('Hong Kong')),
+        ('CN', _('China')),
+    ]
+
+    region = models.CharField(_("Region"), max_length=10, choices=REGION_CHOICES)
+    date = models.DateField(_("Date"))
+    name = models.CharField(_("Name"), max_length=200)
+    is_active = models.BooleanField(_("Is Active"), default=True)
+    is_imported = models.BooleanField(
+        _("Is Imported"),
+        default=False,
+        help_text=_("Imported from the holidays package or a file rather than added by hand")
+    )
+    created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.region} {self.date})"
+
+    class Meta:
+        verbose_name = _("Public Holiday")
+        verbose_name_plural = _("Public Holidays")
+        unique_together = ['region', 'date']
+        ordering = ['region', 'date']
+
+
 class LeaveApplication(models.Model):
     """Leave application submitted by employees"""
     STATUS_CHOICES = [
@@ -55,60 +109,14 @@ class LeaveApplication(models.Model):
     approved_at = models.DateTimeField(_("Approved At"), null=True, blank=True)
     rejection_reason = models.TextField(_("Rejection Reason"), blank=True)
 
+    @property
+    def business_calendar(self):
+        """Working-day calendar of the applicant's region"""
+        return calendar_for_user(self.user if self.user_id else None)
+
     def calculate_days(self):
         """Calculate the number of leave days based on session logic"""
-        if not self.date_from or not self.date_to:
-            return 0
-
-        # Convert to local time if timezone-aware
-        from django.utils import timezone as tz
-
-        date_from_local = self.date_from
-        date_to_local = self.date_to
-
-        # If timezone-aware, convert to local timezone
-        if tz.is_aware(self.date_from):
-            date_from_local = tz.localtime(self.date_from)
-        if tz.is_aware(self.date_to):
-            date_to_local = tz.localtime(self.date_to)
-
-        # Get the session info from time components
-        start_time = date_from_local.time()
-        end_time = date_to_local.time()
-
-        # Determine if it's AM (9:00) or PM (14:00) sessions
-        is_start_am = start_time.hour == 9
-        is_start_pm = start_time.hour == 14
-        is_end_am = end_time.hour == 13  # End of AM session
-        is_end_pm = end_time.hour == 18  # End of PM session
-
-        # If same day
-        if date_from_local.date() == date_to_local.date():
-            if is_start_am and is_end_pm:
-                return 1.0  # Full day (AM + PM)
-            else:
-                return 0.5  # Half day (AM only or PM only)
-
-        # Multiple days - count business days and adjust for partial days
-        total_days = 0
-        current_date = date_from_local.date()
-        end_date = date_to_local.date()
-
-        while current_date <= end_date:
-            # Skip weekends
-            if current_date.weekday() < 5:  # Monday=0, Friday=4
-                if current_date == date_from_local.date():
-                    # First day - depends on start session
-                    total_days += 0.5 if is_start_pm else 1.0
-                elif current_date == date_to_local.date():
-                    # Last day - depends on end session
-                    total_days += 0.5 if is_end_am else 1.0
-                else:
-                    # Full middle days
-                    total_days += 1.0
-            current_date += timedelta(days=1)
-
-        return total_days
+        return self.business_calendar.leave_days(self.date_from, self.date_to)
 
     @property
     def days_applied(self):
@@ -117,19 +125,7 @@ class LeaveApplication(models.Model):
     @property
     def back_to_office_date(self):
         """Calculate when employee should return to office"""
-        if not self.date_from:
-            return None
-
-        # If leave starts in AM (9:00), return same day
-        if self.date_from.time().hour == 9:
-            return self.date_from.date()
-
-        # If leave is PM only, return next working day
-        next_day = self.date_to.date() + timedelta(days=1)
-        # Skip weekends
-        while next_day.weekday() >= 5:  # Saturday=5, Sunday=6
-            next_day += timedelta(days=1)
-        return next_day
+        return self.business_calendar.back_to_office_date(self.date_to)
 
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.leave_type} ({self.get_status_display()})"
@@ -143,6 +139,11 @@ class LeaveApplication(models.Model):
         verbose_name = _("Leave Application")
         verbose_name_plural = _("Leave Applications")
         ordering = ['-created_at']
+        indexes = [
+            # Interval overlap queries: date_from < end AND date_to > start
+            models.Index(fields=['date_from', 'date_to'], name='leave_app_interval_idx'),
+            models.Index(fields=['user', 'date_from', 'date_to'], name='leave_app_user_interval_idx'),
+        ]
 
 
 class LeaveBalance(models.Model):
@@ -203,7 +204,7 @@ class SpecialWorkClaim(models.Model):
     description = models.TextField(_("Description"))
     priority = models.CharField(_("Priority"), max_length=10, choices=PRIORITY_CHOICES, default='medium')
     status = models.CharField(_("Status"), max_length=20, choices=STATUS_CHOICES, default='pending')
-    credits_earned = models.FloatField(_("Credits Earned"), default=0.0)
+    credits_earned = models.DecimalField(_("Credits Earned"), max_digits=6, decimal_places=2, default=Decimal('0'))
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
     approved_by = models.ForeignKey(
@@ -224,11 +225,11 @@ class SpecialWorkClaim(models.Model):
 
     def calculate_credits(self):
         """Calculate credits based on session and work days"""
-        days = self.get_work_days_count()
+        days = Decimal(self.get_work_days_count())
         if self.session == 'FULL':
-            return float(days)
+            return days
         else:  # AM or PM
-            return float(days * 0.5)
+            return days / 2
 
     def save(self, *args, **kwargs):
         # Auto-calculate credits
@@ -258,7 +259,7 @@ class SpecialLeaveApplication(models.Model):
     date_to = models.DateTimeField(_("End Date/Time"))
     reason = models.TextField(_("Reason"))
     status = models.CharField(_("Status"), max_length=20, choices=STATUS_CHOICES, default='pending')
-    credits_used = models.FloatField(_("Credits Used"), default=0.0)
+    credits_used = models.DecimalField(_("Credits Used"), max_digits=6, decimal_places=2, default=Decimal('0'))
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
     updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
     approved_by = models.ForeignKey(
@@ -270,40 +271,13 @@ class SpecialLeaveApplication(models.Model):
     )
     approved_at = models.DateTimeField(_("Approved At"), null=True, blank=True)
 
+    @property
+    def business_calendar(self):
+        return calendar_for_user(self.user if self.user_id else None)
+
     def calculate_days(self):
         """Calculate the number of leave days (same as regular leave)"""
-        if not self.date_from or not self.date_to:
-            return 0
-
-        start_time = self.date_from.time()
-        end_time = self.date_to.time()
-
-        is_start_am = start_time.hour == 9
-        is_start_pm = start_time.hour == 14
-        is_end_am = end_time.hour == 13
-        is_end_pm = end_time.hour == 18
-
-        if self.date_from.date() == self.date_to.date():
-            if is_start_am and is_end_pm:
-                return 1.0
-            else:
-                return 0.5
-
-        total_days = 0
-        current_date = self.date_from.date()
-        end_date = self.date_to.date()
-
-        while current_date <= end_date:
-            if current_date.weekday() < 5:
-                if current_date == self.date_from.date():
-                    total_days += 0.5 if is_start_pm else 1.0
-                elif current_date == self.date_to.date():
-                    total_days += 0.5 if is_end_am else 1.0
-                else:
-                    total_days += 1.0
-            current_date += timedelta(days=1)
-
-        return total_days
+        return self.business_calendar.leave_days(self.date_from, self.date_to)
 
     @property
     def days_applied(self):
@@ -311,7 +285,7 @@ class SpecialLeaveApplication(models.Model):
 
     def save(self, *args, **kwargs):
         # Auto-calculate credits used
-        self.credits_used = self.calculate_days()
+        self.credits_used = Decimal(str(self.calculate_days()))
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -326,8 +300,14 @@ class SpecialLeaveApplication(models.Model):
 class SpecialLeaveBalance(models.Model):
     """Special leave balance tracking"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='special_leave_balance')
-    earned = models.FloatField(_("Earned"), default=0.0, help_text=_("Credits earned from special work claims"))
-    used = models.FloatField(_("Used"), default=0.0, help_text=_("Credits used for special leave"))
+    earned = models.DecimalField(
+        _("Earned"), max_digits=6, decimal_places=2, default=Decimal('0'),
+        help_text=_("Credits earned from special work claims")
+    )
+    used = models.DecimalField(
+        _("Used"), max_digits=6, decimal_places=2, default=Decimal('0'),
+        help_text=_("Credits used for special leave")
+    )
     year = models.IntegerField(_("Year"), default=2025)
 
     @property
@@ -342,3 +322,67 @@ class SpecialLeaveBalance(models.Model):
         verbose_name_plural = _("Special Leave Balances")
         ordering = ['user__last_name']
         unique_together = ['user', 'year']
+
+
+class LeaveLedgerEntry(models.Model):
+    """
+    Append-only record of a change to a leave balance.
+
+    LeaveBalance and SpecialLeaveBalance rows are caches of these entries:
+    every entry adds its amount to one balance column, so balances can be
+    rebuilt from the ledger at any time. Entries without a leave type
+    are special leave credits. Corrections are new entries, never edits.
+    """
+    KIND_CHOICES = [
+        ('opening', _('Opening Balance')),
+        ('carry_forward', _('Carry Forward')),
+        ('entitlement', _('Entitlement')),
+        ('taken', _('Taken')),
+        ('credit', _('Special Leave Credit')),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leave_ledger_entries')
+    leave_type = models.ForeignKey(
+        LeaveType,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        help_text=_("Empty for special leave credits")
+    )
+    year = models.PositiveIntegerField(_("Year"))
+    kind = models.CharField(_("Kind"), max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(
+        _("Amount"), max_digits=6, decimal_places=2,
+        help_text=_("Days added to the balance column of the kind; negative to reverse")
+    )
+    leave_application = models.ForeignKey(
+        LeaveApplication, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    special_leave_application = models.ForeignKey(
+        SpecialLeaveApplication, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    special_work_claim = models.ForeignKey(
+        SpecialWorkClaim, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    note = models.CharField(_("Note"), max_length=255, blank=True)
+    created_at = models.DateTimeField(_("Created At"), default=timezone.now)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='created_leave_ledger_entries'
+    )
+
+    def __str__(self):
+        leave_type = self.leave_type or _("Special Leave")
+        return f"{self.user} - {leave_type} {self.year} {self.get_kind_display()}: {self.amount}"
+
+    class Meta:
+        verbose_name = _("Leave Ledger Entry")
+        verbose_name_plural = _("Leave Ledger Entries")
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['user', 'leave_type', 'year'], name='leave_ledger_balance_idx'),
+            models.Index(fields=['year', 'kind'], name='leave_ledger_year_kind_idx'),
+        ]
@@ -0,0 +1,213 @@
+"""
+Leave occupancy
+
+Answers "who is off when" for teams. Applications overlapping a period are
+found with one interval query on (date_from, date_to). Each user's month is
+condensed into occupancy bitmaps with two bits per day, AM and PM, one
+bitmap for approved and one for pending leave.
+
+Bitmaps are cached per user and month under a per-month version that is
+bumped whenever an application touching that month changes, so a view of
+any team over any period costs one cache round trip plus, for what was not
+cached yet, a single range query.
+"""
+import datetime
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .business_days import PM_START_HOUR
+from .caching import bump_versions, get_versions
+from .models import LeaveApplication
+
+ACTIVE_STATUSES = ('approved', 'pending')
+
+OCCUPANCY_CACHE_TIMEOUT = 86400
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month_start(day):
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def day_bounds(first_day, last_day):
+    """Aware [start, end) covering the local days first_day..last_day"""
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def overlapping_applications(first_day, last_day, statuses=ACTIVE_STATUSES):
+    """Applications with any part on the local days first_day..last_day"""
+    start, end = day_bounds(first_day, last_day)
+    return LeaveApplication.objects.filter(
+        status__in=statuses,
+        date_from__lt=end,
+        date_to__gt=start,
+    )
+
+
+def session_slot(moment, first_day):
+    """
+    Bit index, relative to first_day, of the session a leave boundary falls
+    in: starts at 9:00 and ends at 13:00 are AM, starts at 14:00 and ends at
+    18:00 are PM.
+    """
+    moment = timezone.localtime(moment)
+    return (moment.date() - first_day).days * 2 + (1 if moment.hour >= PM_START_HOUR else 0)
+
+
+def interval_mask(date_from, date_to, first_day, slots):
+    """Bits of the sessions from date_from to date_to, clipped to ``slots`` sessions from first_day"""
+    low = max(session_slot(date_from, first_day), 0)
+    high = min(session_slot(date_to, first_day), slots - 1)
+    if high < low:
+        return 0
+    return ((1 << (high + 1)) - 1) ^ ((1 << low) - 1)
+
+
+@dataclass
+class MonthOccupancy:
+    """Approved and pending session bitmaps of a set of users for one month"""
+    first_day: datetime.date
+    days: int
+    approved: dict = field(default_factory=dict)
+    pending: dict = field(default_factory=dict)
+
+    def sessions(self, user_id, day):
+        """(AM state, PM state) of a user on a day: 'approved', 'pending' or None"""
+        states = []
+        for slot in (2 * (day - self.first_day).days, 2 * (day - self.first_day).days + 1):
+            bit = 1 << slot
+            if self.approved.get(user_id, 0) & bit:
+                states.append('approved')
+            elif self.pending.get(user_id, 0) & bit:
+                states.append('pending')
+            else:
+                states.append(None)
+        return tuple(states)
+
+    def users_off(self, day, include_pending=True):
+        """Ids of the users with leave in either session of a day"""
+        bits = 0b11 << (2 * (day - self.first_day).days)
+        off = {user_id for user_id, mask in self.approved.items() if mask & bits}
+        if include_pending:
+            off.update(user_id for user_id, mask in self.pending.items() if mask & bits)
+        return off
+
+
+def occupancy_cache_key(first_day, version, user_id):
+    return f'leave_occupancy:{first_day:%Y-%m}:v{version}:{user_id}'
+
+
+def _version_name(first_day):
+    return f'leave_calendar:{first_day:%Y-%m}'
+
+
+def build_occupancy(user_ids, months):
+    """
+    Bitmaps of ``user_ids`` for the months starting on the given days,
+    loaded with one range query.
+    """
+    months = sorted(months)
+    occupancies = {
+        first_day: MonthOccupancy(first_day=first_day, days=(next_month_start(first_day) - first_day).days)
+        for first_day in months
+    }
+    if not months or not user_ids:
+        return occupancies
+
+    rows = overlapping_applications(months[0], next_month_start(months[-1]) - datetime.timedelta(days=1)).filter(
+        user_id__in=user_ids
+    ).order_by().values_list('user_id', 'status', 'date_from', 'date_to')
+    for user_id, status, date_from, date_to in rows:
+        for first_day in months_between(timezone.localtime(date_from).date(), timezone.localtime(date_to).date()):
+            occupancy = occupancies.get(first_day)
+            if occupancy is None:
+                continue
+            masks = occupancy.approved if status == 'approved' else occupancy.pending
+            masks[user_id] = masks.get(user_id, 0) | interval_mask(date_from, date_to, first_day, occupancy.days * 2)
+    return occupancies
+
+
+def period_occupancy(user_ids, first_day, last_day):
+    """
+    Cached bitmaps of ``user_ids`` for every month from first_day to
+    last_day, keyed by the months' first days. One cache round trip, plus
+    one range query covering whatever was not cached.
+    """
+    months = months_between(first_day, last_day)
+    user_ids = list(user_ids)
+    versions = get_versions([_version_name(first) for first in months])
+    keys = {
+        occupancy_cache_key(first, versions[_version_name(first)], user_id): (first, user_id)
+        for first in months
+        for user_id in user_ids
+    }
+    cached = cache.get_many(list(keys))
+
+    occupancies = {
+        first: MonthOccupancy(first_day=first, days=(next_month_start(first) - first).days)
+        for first in months
+    }
+    missing_users, missing_months = set(), set()
+    for key, (first, user_id) in keys.items():
+        if key not in cached:
+            missing_users.add(user_id)
+            missing_months.add(first)
+            continue
+        approved, pending = cached[key]
+        if approved:
+            occupancies[first].approved[user_id] = approved
+        if pending:
+            occupancies[first].pending[user_id] = pending
+
+    if missing_users:
+        loaded = build_occupancy(missing_users, missing_months)
+        to_cache = {}
+        for key, (first, user_id) in keys.items():
+            if key in cached or first not in loaded:
+                continue
+            approved = loaded[first].approved.get(user_id, 0)
+            pending = loaded[first].pending.get(user_id, 0)
+            if approved:
+                occupancies[first].approved[user_id] = approved
+            if pending:
+                occupancies[first].pending[user_id] = pending
+            to_cache[key] = (approved, pending)
+        cache.set_many(to_cache, OCCUPANCY_CACHE_TIMEOUT)
+    return occupancies
+
+
+def month_occupancy(user_ids, year, month):
+    """Cached bitmaps of ``user_ids`` for one month"""
+    first_day = datetime.date(year, month, 1)
+    return period_occupancy(user_ids, first_day, first_day)[first_day]
+
+
+def months_between(first_day, last_day):
+    """First days of the months from first_day's to last_day's"""
+    months = []
+    day = month_start(first_day)
+    while day <= last_day:
+        months.append(day)
+        day = next_month_start(day)
+    return months
+
+
+def invalidate_occupancy(intervals):
+    """
+    Drop cached occupancy of every month touched by the given
+    (date_from, date_to) intervals.
+    """
+    names = set()
+    for date_from, date_to in intervals:
+        if not date_from or not date_to:
+            continue
+        for first_day in months_between(timezone.localtime(date_from).date(), timezone.localtime(date_to).date()):
+            names.add(_version_name(first_day))
+    bump_versions(names)
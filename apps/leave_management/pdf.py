@@ -0,0 +1,171 @@
+"""
+PDF rendering of leave forms
+
+weasyprint is CPU bound and takes from hundreds of milliseconds to seconds
+per document, so it never runs in the request: the request renders the
+form HTML (cheap, and the part that needs the database) and hands it to a
+bounded pool of worker processes. Finished PDFs are cached under the ids
+and ``updated_at`` of the applications they show plus the template
+version, so reprinting an unchanged form is a cache hit and any edit or
+status change gives a new key.
+
+A request waits a few seconds for its document. When that runs out the
+render carries on in the pool and a later request for the same document
+picks it up from the cache instead of starting another one. Joining a
+render still in flight only works within one process: a request served by
+another process starts its own render unless the first one has already
+reached the cache, and finished PDFs are only shared between processes
+with a shared cache backend.
+"""
+import hashlib
+import importlib.util
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the form templates change so cached PDFs are not served any more
+TEMPLATE_VERSION = getattr(settings, 'LEAVE_PDF_TEMPLATE_VERSION', 1)
+
+# Worker processes running weasyprint; 0 renders in the calling process
+PDF_WORKERS = getattr(settings, 'LEAVE_PDF_WORKERS', 2)
+
+# Seconds a request waits for its document before answering "still rendering"
+PDF_WAIT_SECONDS = getattr(settings, 'LEAVE_PDF_WAIT_SECONDS', 5)
+
+# Seconds the browser waits before asking again for a document still rendering
+PDF_RETRY_SECONDS = 3
+
+PDF_CACHE_TIMEOUT = getattr(settings, 'LEAVE_PDF_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+# A5 forms side by side on one landscape A4 sheet
+FORMS_PER_SHEET = 2
+
+_pool = None
+# cache key -> Future of renders running in this process's pool
+_in_flight = {}
+_lock = threading.Lock()
+
+
+def pdf_available():
+    """Whether weasyprint is installed"""
+    return importlib.util.find_spec('weasyprint') is not None
+
+
+def document_key(kind, applications):
+    """Cache key of a document showing ``applications``, in order"""
+    fingerprint = ','.join(
+        f'{application.pk}@{application.updated_at.isoformat()}' for application in applications
+    )
+    digest = hashlib.sha1(fingerprint.encode()).hexdigest()
+    return f'leave_pdf:{kind}:t{TEMPLATE_VERSION}:{digest}'
+
+
+def form_context(application):
+    """What the form templates show of one application, in local time"""
+    return {
+        'application': application,
+        'date_from_local': timezone.localtime(application.date_from),
+        'date_to_local': timezone.localtime(application.date_to),
+        'date_back_to_work': application.back_to_office_date,
+    }
+
+
+def sheets(applications):
+    """Split forms into A4 sheets of FORMS_PER_SHEET"""
+    forms = [form_context(application) for application in applications]
+    return [forms[start:start + FORMS_PER_SHEET] for start in range(0, len(forms), FORMS_PER_SHEET)]
+
+
+def leave_form_html(application, is_pdf=False):
+    return render_to_string('leave/leave_form_print.html', {**form_context(application), 'is_pdf': is_pdf})
+
+
+def combined_html(applications, is_pdf=False):
+    return render_to_string('leave/combined_print.html', {
+        'sheets': sheets(applications),
+        'application_ids_param': ','.join(str(application.pk) for application in applications),
+        'is_pdf': is_pdf,
+    })
+
+
+def html_to_pdf(html, base_url):
+    """Run weasyprint; called in a worker process"""
+    import weasyprint
+
+    return weasyprint.HTML(string=html, base_url=base_url).write_pdf()
+
+
+def leave_form_pdf(application):
+    """PDF of one application's form, or None while it is still rendering"""
+    return _cached_pdf(document_key('form', [application]), lambda: leave_form_html(application, is_pdf=True))
+
+
+def combined_pdf(applications):
+    """PDF of any number of forms, two per A4 sheet, or None while it is still rendering"""
+    return _cached_pdf(document_key('combined', applications), lambda: combined_html(applications, is_pdf=True))
+
+
+def _cached_pdf(key, build_html):
+    content = cache.get(key)
+    if content is not None:
+        return content
+
+    with _lock:
+        future = _in_flight.get(key)
+
+    if future is None:
+        html = build_html()
+        if PDF_WORKERS == 0:
+            content = html_to_pdf(html, str(settings.BASE_DIR))
+            cache.set(key, content, PDF_CACHE_TIMEOUT)
+            return content
+        future = _submit(key, html)
+
+    try:
+        return future.result(timeout=PDF_WAIT_SECONDS)
+    except TimeoutError:
+        logger.info(f'PDF {key} still rendering after {PDF_WAIT_SECONDS}s')
+        return None
+
+
+def _submit(key, html):
+    global _pool
+    with _lock:
+        # Another request may have submitted the same document meanwhile
+        future = _in_flight.get(key)
+        if future is not None:
+            return future
+        if _pool is None:
+            # Workers set Django up themselves in case processes are spawned rather than forked
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=django.setup)
+        future = _pool.submit(html_to_pdf, html, str(settings.BASE_DIR))
+        _in_flight[key] = future
+    # Outside the lock: the callback runs at once if the render already finished
+    future.add_done_callback(lambda done: _finished(key, done))
+    return future
+
+
+def _finished(key, future):
+    """Cache a finished render; runs in the pool's result thread"""
+    global _pool
+    error = future.exception()
+    if error is None:
+        # Cache before leaving the in-flight map so no request renders it again in between
+        cache.set(key, future.result(), PDF_CACHE_TIMEOUT)
+    else:
+        logger.error(f'Rendering PDF {key} failed: {error}')
+
+    with _lock:
+        _in_flight.pop(key, None)
+        if isinstance(error, BrokenProcessPool):
+            # A worker died; start a fresh pool on the next submit
+            _pool = None
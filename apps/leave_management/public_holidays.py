@@ -0,0 +1,172 @@
+"""
+Public holiday calendar
+
+Holidays are PublicHoliday rows per region, imported in bulk from the
+``holidays`` package or a local CSV/JSON file and edited by hand on the
+holiday management page. Business-day calculations read them through
+``holiday_dates``, which keeps a frozenset per region and year in process
+memory. Each set is tagged with the cached holiday version; any change to
+the holidays bumps it, so every process sharing the cache rebuilds its sets
+once after an edit and otherwise never touches the table. Processes only
+see each other's bumps with a shared cache backend (see ``caching``).
+
+Region-years without any imported or added holiday fall back to the
+``holidays`` package.
+"""
+import csv
+import datetime
+import json
+import threading
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .business_days import package_holidays
+from .caching import bump_versions, get_version
+from .models import PublicHoliday
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOLIDAY_VERSION = 'public_holidays'
+
+REGIONS = [region for region, _ in PublicHoliday.REGION_CHOICES]
+
+# (region, year) -> (version, frozenset of dates)
+_holiday_sets = {}
+_holiday_sets_lock = threading.Lock()
+
+
+@dataclass
+class HolidayImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+
+def holiday_version():
+    return get_version(HOLIDAY_VERSION)
+
+
+def invalidate_holidays():
+    bump_versions([HOLIDAY_VERSION])
+
+
+def holiday_dates(region, year, version=None):
+    """Active public holidays of a region in a year; the holiday provider of business calendars"""
+    version = holiday_version() if version is None else version
+    cached = _holiday_sets.get((region, year))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    rows = list(
+        PublicHoliday.objects.filter(
+            region=region, date__gte=datetime.date(year, 1, 1), date__lt=datetime.date(year + 1, 1, 1)
+        ).order_by().values_list('date', 'is_active')
+    )
+    if rows:
+        dates = frozenset(day for day, is_active in rows if is_active)
+    else:
+        dates = frozenset(package_holidays(region, year))
+
+    with _holiday_sets_lock:
+        _holiday_sets[(region, year)] = (version, dates)
+    return dates
+
+
+def is_holiday(region, day):
+    return day in holiday_dates(region, day.year)
+
+
+def fetch_package_holidays(region, year):
+    """``(region, date, name)`` of a year from the ``holidays`` package; raises ImportError without it"""
+    import holidays
+
+    return [(region, day, name) for day, name in sorted(holidays.country_holidays(region, years=year).items())]
+
+
+def read_holiday_file(path, region=None):
+    """
+    ``(region, date, name)`` from a CSV file with ``date``, ``name`` and
+    optional ``region`` columns, or a JSON list of such objects. Rows
+    without a region get ``region``.
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as fh:
+        rows = json.load(fh) if path.lower().endswith('.json') else list(csv.DictReader(fh))
+
+    holidays = []
+    for number, row in enumerate(rows, start=1):
+        row_region = (row.get('region') or region or '').strip().upper()
+        if row_region not in REGIONS:
+            raise ValueError(f'Row {number}: unknown region {row_region!r}')
+        try:
+            day = datetime.date.fromisoformat((row.get('date') or '').strip())
+        except ValueError:
+            raise ValueError(f"Row {number}: invalid date {row.get('date')!r}, use YYYY-MM-DD")
+        holidays.append((row_region, day, (row.get('name') or '').strip() or 'Public holiday'))
+    return holidays
+
+
+def import_holidays(holidays, replace=False):
+    """
+    Write ``(region, date, name)`` holidays in bulk.
+
+    Existing imported holidays are renamed when the name changed; holidays
+    added by hand are left alone. With ``replace``, imported holidays of the
+    region-years covered that are no longer listed are deleted.
+
+    Returns:
+        HolidayImportResult
+    """
+    incoming = {(region, day): name for region, day, name in holidays}
+    result = HolidayImportResult()
+    if not incoming:
+        return result
+
+    region_years = {(region, day.year) for region, day in incoming}
+    covered = Q()
+    for region, year in region_years:
+        covered |= Q(region=region, date__gte=datetime.date(year, 1, 1), date__lt=datetime.date(year + 1, 1, 1))
+
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {
+            (holiday.region, holiday.date): holiday
+            for holiday in PublicHoliday.objects.filter(covered).select_for_update()
+        }
+
+        to_create, to_update = [], []
+        for key, name in incoming.items():
+            holiday = existing.get(key)
+            if holiday is None:
+                to_create.append(PublicHoliday(region=key[0], date=key[1], name=name, is_imported=True))
+            elif holiday.is_imported and holiday.name != name:
+                holiday.name = name
+                holiday.updated_at = now
+                to_update.append(holiday)
+            else:
+                result.unchanged += 1
+
+        PublicHoliday.objects.bulk_create(to_create, batch_size=500)
+        PublicHoliday.objects.bulk_update(to_update, ['name', 'updated_at'], batch_size=500)
+        result.created, result.updated = len(to_create), len(to_update)
+
+        if replace:
+            stale = [
+                holiday.pk for key, holiday in existing.items()
+                if holiday.is_imported and key not in incoming
+            ]
+            result.removed, _ = PublicHoliday.objects.filter(pk__in=stale).delete()
+
+        # Bulk writes skip the signals
+        if result.created or result.updated or result.removed:
+            transaction.on_commit(invalidate_holidays)
+
+    logger.info(
+        f'Imported holidays for {sorted(region_years)}: {result.created} created, '
+        f'{result.updated} updated, {result.removed} removed'
+    )
+    return result
@@ -0,0 +1,152 @@
+"""
+Year-end leave rollover
+
+Opens a year's leave balances for every active user from the ledger:
+the unused balance of the previous year is carried forward up to the
+leave type's cap, and the entitlement follows the leave type's rules by
+completed years of service. Closing balances and what the new year
+already holds are read with a few grouped queries, and the result is
+posted through the ledger in bulk, so a rollover is a handful of queries
+however many staff there are. Running it again only posts differences.
+Balances of a year from before the ledger close at their row's columns.
+"""
+import datetime
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+
+from .ledger import ZERO, set_balance_columns
+from .models import LeaveBalance, LeaveLedgerEntry, LeaveType
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RolloverLine:
+    """Target carry forward and entitlement of one user's leave type for the new year"""
+    user_id: int
+    username: str
+    leave_type_id: int
+    leave_type: str
+    closing_balance: Decimal
+    carried_forward: Decimal
+    entitlement: Decimal
+    current_carried_forward: Decimal = ZERO
+    current_entitlement: Decimal = ZERO
+
+    @property
+    def changed(self):
+        return (self.carried_forward, self.entitlement) != (self.current_carried_forward, self.current_entitlement)
+
+
+def years_of_service(date_joined, on):
+    """Completed years of service on the date ``on``"""
+    if not date_joined:
+        return 0
+    if isinstance(date_joined, datetime.datetime):
+        date_joined = timezone.localtime(date_joined).date() if timezone.is_aware(date_joined) else date_joined.date()
+    years = on.year - date_joined.year - ((on.month, on.day) < (date_joined.month, date_joined.day))
+    return max(years, 0)
+
+
+def entitlement_for(leave_type, years):
+    """Days of the rule with the highest service threshold reached, else the leave type's yearly maximum"""
+    days = Decimal(leave_type.max_days_per_year)
+    for rule in leave_type.entitlement_rules.all():
+        if rule.min_years_of_service <= years:
+            days = rule.days
+    return days
+
+
+def closing_balances(year, user_ids=None):
+    """
+    Balance of every (user, leave type) at the end of ``year``: the ledger
+    total, in one grouped query, or for balances from before the ledger
+    with no entries that year, the LeaveBalance columns, in one more.
+    """
+    entries = LeaveLedgerEntry.objects.order_by().filter(year=year, leave_type__isnull=False)
+    balances = LeaveBalance.objects.order_by().filter(year=year)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        balances = balances.filter(user_id__in=user_ids)
+    rows = entries.values('user', 'leave_type').annotate(
+        balance=Sum(Case(When(kind='taken', then=-F('amount')), default=F('amount')))
+    )
+    closing = {(row['user'], row['leave_type']): row['balance'] for row in rows}
+
+    unledgered = balances.annotate(
+        closing=F('opening_balance') + F('carried_forward') + F('current_year_entitlement') - F('taken')
+    ).values_list('user_id', 'leave_type_id', 'closing')
+    for user_id, leave_type_id, balance in unledgered:
+        closing.setdefault((user_id, leave_type_id), balance)
+    return closing
+
+
+def opened_columns(year, user_ids=None):
+    """Carry forward and entitlement already posted for ``year``, in one grouped query"""
+    entries = LeaveLedgerEntry.objects.order_by().filter(
+        year=year, leave_type__isnull=False, kind__in=('carry_forward', 'entitlement')
+    )
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    rows = entries.values('user', 'leave_type', 'kind').annotate(total=Sum('amount'))
+    return {(row['user'], row['leave_type'], row['kind']): row['total'] for row in rows}
+
+
+def compute_rollover(year, user_ids=None):
+    """
+    Rollover lines opening ``year`` for active users (or only ``user_ids``).
+    Nothing is written.
+    """
+    leave_types = list(LeaveType.objects.filter(is_active=True).prefetch_related('entitlement_rules'))
+    users = get_user_model().objects.filter(is_active=True).order_by('username')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    users = list(users.values_list('id', 'username', 'date_joined'))
+
+    closing = closing_balances(year - 1, user_ids)
+    current = opened_columns(year, user_ids)
+
+    lines = []
+    for user_id, username, date_joined in users:
+        years = years_of_service(date_joined, datetime.date(year, 1, 1))
+        for leave_type in leave_types:
+            closing_balance = closing.get((user_id, leave_type.pk), ZERO)
+            line = RolloverLine(
+                user_id=user_id,
+                username=username,
+                leave_type_id=leave_type.pk,
+                leave_type=leave_type.name,
+                closing_balance=closing_balance,
+                carried_forward=min(max(closing_balance, ZERO), leave_type.max_carry_forward),
+                entitlement=entitlement_for(leave_type, years),
+                current_carried_forward=current.get((user_id, leave_type.pk, 'carry_forward'), ZERO),
+                current_entitlement=current.get((user_id, leave_type.pk, 'entitlement'), ZERO),
+            )
+            if line.carried_forward or line.entitlement or line.changed:
+                lines.append(line)
+    return lines
+
+
+def apply_rollover(year, lines, created_by=None):
+    """Post the changed lines through the ledger; returns the entries written"""
+    targets = {}
+    for line in lines:
+        if line.changed:
+            targets[(line.user_id, line.leave_type_id, year, 'carry_forward')] = line.carried_forward
+            targets[(line.user_id, line.leave_type_id, year, 'entitlement')] = line.entitlement
+    entries = set_balance_columns(targets, note=f'Rollover into {year}', created_by=created_by)
+    logger.info(f'Leave rollover into {year}: {len(entries)} ledger entries')
+    return entries
+
+
+def rollover(year, user_ids=None, dry_run=False, created_by=None):
+    """Compute and, unless ``dry_run``, apply the rollover into ``year``; returns the changed lines"""
+    changed = [line for line in compute_rollover(year, user_ids) if line.changed]
+    if not dry_run:
+        apply_rollover(year, changed, created_by=created_by)
+    return changed
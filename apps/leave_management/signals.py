@@ -0,0 +1,105 @@
+"""
+Signal handlers keeping derived leave data in sync with applications:
+cached leave occupancy, cached pending counters, the balance ledger on
+approval changes, and the cached public holidays.
+
+Bulk status changes bypass these and invalidate the caches and post
+ledger entries themselves.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import ledger
+from .dashboard import invalidate_pending_counts
+from .models import LeaveApplication, PublicHoliday, SpecialLeaveApplication, SpecialWorkClaim
+from .occupancy import invalidate_occupancy
+from .public_holidays import invalidate_holidays
+
+
+@receiver(pre_save, sender=LeaveApplication)
+def remember_previous_state(sender, instance, **kwargs):
+    """Keep the dates and status the application had before an edit"""
+    instance._previous_interval = None
+    instance._previous_status = None
+    if instance.pk:
+        previous = LeaveApplication.objects.filter(
+            pk=instance.pk
+        ).values_list('date_from', 'date_to', 'status').first()
+        if previous:
+            instance._previous_interval = previous[:2]
+            instance._previous_status = previous[2]
+
+
+@receiver(post_save, sender=LeaveApplication)
+def invalidate_occupancy_on_save(sender, instance, **kwargs):
+    """Drop cached occupancy of the months the application did and does cover"""
+    intervals = [(instance.date_from, instance.date_to)]
+    if getattr(instance, '_previous_interval', None):
+        intervals.append(instance._previous_interval)
+    invalidate_occupancy(intervals)
+
+
+@receiver(post_save, sender=LeaveApplication)
+def post_leave_ledger_entries(sender, instance, **kwargs):
+    """Charge the balance on approval; give the days back when it is undone"""
+    previous_status = getattr(instance, '_previous_status', None)
+    if instance.status == 'approved':
+        if previous_status == 'approved' and getattr(instance, '_previous_interval', None) != (
+            instance.date_from, instance.date_to
+        ):
+            # Approved dates changed: recharge
+            ledger.release_leave_taken(instance, created_by=instance.approved_by)
+        ledger.record_leave_taken(instance, created_by=instance.approved_by)
+    elif previous_status == 'approved':
+        ledger.release_leave_taken(instance, created_by=instance.approved_by)
+
+
+@receiver(post_delete, sender=LeaveApplication)
+def invalidate_occupancy_on_delete(sender, instance, **kwargs):
+    invalidate_occupancy([(instance.date_from, instance.date_to)])
+
+
+@receiver(post_save, sender=LeaveApplication)
+@receiver(post_save, sender=SpecialWorkClaim)
+@receiver(post_save, sender=SpecialLeaveApplication)
+def invalidate_pending_on_status_change(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_previous_status', None) != instance.status:
+        invalidate_pending_counts()
+
+
+@receiver(post_delete, sender=LeaveApplication)
+@receiver(post_delete, sender=SpecialWorkClaim)
+@receiver(post_delete, sender=SpecialLeaveApplication)
+def invalidate_pending_on_delete(sender, instance, **kwargs):
+    if instance.status == 'pending':
+        invalidate_pending_counts()
+
+
+@receiver(pre_save, sender=SpecialWorkClaim)
+@receiver(pre_save, sender=SpecialLeaveApplication)
+def remember_previous_status(sender, instance, **kwargs):
+    instance._previous_status = None
+    if instance.pk:
+        instance._previous_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=SpecialWorkClaim)
+def post_special_credit_entries(sender, instance, **kwargs):
+    if instance.status == 'approved':
+        ledger.record_special_credit(instance, created_by=instance.approved_by)
+    elif getattr(instance, '_previous_status', None) == 'approved':
+        ledger.release_special_credit(instance, created_by=instance.approved_by)
+
+
+@receiver(post_save, sender=SpecialLeaveApplication)
+def post_special_leave_entries(sender, instance, **kwargs):
+    if instance.status == 'approved':
+        ledger.record_special_leave_taken(instance, created_by=instance.approved_by)
+    elif getattr(instance, '_previous_status', None) == 'approved':
+        ledger.release_special_leave_taken(instance, created_by=instance.approved_by)
+
+
+@receiver(post_save, sender=PublicHoliday)
+@receiver(post_delete, sender=PublicHoliday)
+def invalidate_holidays_on_change(sender, instance, **kwargs):
+    invalidate_holidays()
@@ -1,3 +1,757 @@
+"""
+Tests for leave management.
+"""
+
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.accounts.models import User
+from . import ledger, pdf, public_holidays
+from .approvals import apply_batch_decision, approval_queue
+from .business_days import BusinessCalendar, calendar_for_user, get_business_calendar, session_datetime
+from .conflicts import check_leave_conflicts
+from .dashboard import leave_dashboard, pending_counts
+from .forms import LeaveApplicationForm
+from .occupancy import month_occupancy
+from .rollover import compute_rollover, rollover, years_of_service
+from .models import (
+    LeaveApplication, LeaveBalance, LeaveEntitlementRule, LeaveLedgerEntry, LeaveType, PublicHoliday,
+    SpecialLeaveBalance, SpecialWorkClaim
+)
+
+# 2025-01-29..31 Lunar New Year in Hong Kong
+LUNAR_NEW_YEAR = {datetime.date(2025, 1, 29), datetime.date(2025, 1, 30), datetime.date(2025, 1, 31)}
+
+
+def fixed_holidays(region, year):
+    return LUNAR_NEW_YEAR if year == 2025 else ()
+
+
+def session(day, hour):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+
+
+class BusinessCalendarTests(TestCase):
+
+    def setUp(self):
+        self.calendar = BusinessCalendar('HK', holiday_provider=fixed_holidays)
+
+    def test_range_counts_skip_weekends_and_holidays(self):
+        self.assertEqual(self.calendar.working_days(datetime.date(2025, 1, 1), datetime.date(2025, 1, 31)), 20)
+        self.assertEqual(self.calendar.working_days(datetime.date(2025, 1, 1), datetime.date(2025, 12, 31)), 258)
+        # Across a year boundary, without holidays in 2024
+        self.assertEqual(self.calendar.working_days(datetime.date(2024, 12, 30), datetime.date(2025, 1, 3)), 5)
+        self.assertEqual(self.calendar.working_days(datetime.date(2025, 1, 4), datetime.date(2025, 1, 5)), 0)
+
+    def test_next_working_day(self):
+        self.assertEqual(self.calendar.next_working_day(datetime.date(2025, 1, 28)), datetime.date(2025, 2, 3))
+        self.assertEqual(self.calendar.next_working_day(datetime.date(2024, 12, 31)), datetime.date(2025, 1, 1))
+
+    def test_leave_days_with_half_sessions(self):
+        monday, friday = datetime.date(2025, 1, 6), datetime.date(2025, 1, 10)
+        self.assertEqual(self.calendar.leave_days(session(monday, 9), session(friday, 18)), 5.0)
+        self.assertEqual(self.calendar.leave_days(session(monday, 14), session(friday, 13)), 4.0)
+        self.assertEqual(self.calendar.leave_days(session(monday, 14), session(monday, 18)), 0.5)
+        # Leave spanning Lunar New Year counts the two working days around it
+        self.assertEqual(
+            self.calendar.leave_days(session(datetime.date(2025, 1, 28), 9), session(datetime.date(2025, 2, 3), 18)),
+            2.0,
+        )
+
+    def test_back_to_office(self):
+        self.assertEqual(self.calendar.back_to_office_date(session(datetime.date(2025, 1, 28), 13)),
+                         datetime.date(2025, 1, 28))
+        self.assertEqual(self.calendar.back_to_office_date(session(datetime.date(2025, 1, 28), 18)),
+                         datetime.date(2025, 2, 3))
+
+    def test_application_uses_calendar(self):
+        user = User.objects.create_user(username='employee', employee_id='E001', password='x')
+        application = LeaveApplication(
+            user=user,
+            leave_type=LeaveType.objects.create(name='Annual Leave'),
+            date_from=session(datetime.date(2025, 1, 3), 14),
+            date_to=session(datetime.date(2025, 1, 7), 18),
+        )
+        self.assertEqual(application.days_applied, 2.5)
+        self.assertEqual(application.back_to_office_date, datetime.date(2025, 1, 8))
+
+
+class LeaveCalendarTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.leave_type = LeaveType.objects.create(name='Annual Leave')
+        cls.users = [
+            User.objects.create_user(username=f'staff{index}', employee_id=f'E{index:03d}', department='Finance')
+            for index in range(30)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def apply(self, user, start, start_hour, end, end_hour, status='approved'):
+        return LeaveApplication.objects.create(
+            user=user, leave_type=self.leave_type, reason='Holiday', status=status,
+            date_from=session(start, start_hour), date_to=session(end, end_hour),
+        )
+
+    def test_sessions_and_cache_invalidation(self):
+        first, second = self.users[:2]
+        self.apply(first, datetime.date(2025, 1, 30), 14, datetime.date(2025, 2, 4), 13)
+        pending = self.apply(second, datetime.date(2025, 1, 6), 9, datetime.date(2025, 1, 6), 13, status='pending')
+
+        january = month_occupancy([first.pk, second.pk], 2025, 1)
+        self.assertEqual(january.sessions(first.pk, datetime.date(2025, 1, 30)), (None, 'approved'))
+        self.assertEqual(january.sessions(first.pk, datetime.date(2025, 1, 31)), ('approved', 'approved'))
+        self.assertEqual(january.sessions(second.pk, datetime.date(2025, 1, 6)), ('pending', None))
+        february = month_occupancy([first.pk], 2025, 2)
+        self.assertEqual(february.sessions(first.pk, datetime.date(2025, 2, 4)), ('approved', None))
+
+        # Cached: no queries until an application in the month changes
+        with self.assertNumQueries(0):
+            month_occupancy([first.pk, second.pk], 2025, 1)
+        pending.status = 'cancelled'
+        pending.save()
+        self.assertEqual(month_occupancy([second.pk], 2025, 1).sessions(second.pk, datetime.date(2025, 1, 6)),
+                         (None, None))
+
+    def test_month_view_uses_one_range_query(self):
+        for user in self.users[::3]:
+            self.apply(user, datetime.date(2025, 3, 10), 9, datetime.date(2025, 3, 12), 18)
+        viewer = self.users[0]
+        self.client.force_login(viewer, backend='django.contrib.auth.backends.ModelBackend')
+        url = reverse('leave_management:leave_calendar') + '?date=2025-03-01'
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in queries if 'leave_management_leaveapplication' in q['sql']]), 1)
+        self.assertEqual(len(response.context['rows']), 30)
+        off = {day.day: count for day, _, count in response.context['days']}
+        self.assertEqual((off[10], off[12], off[13]), (10, 10, 0))
+
+        # The week is served from the cached month bitmaps
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url + '&view=week&date=2025-03-10')
+        self.assertFalse([q for q in queries if 'leave_management_leaveapplication' in q['sql']])
+
+
+class LeaveConflictTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.leave_type = LeaveType.objects.create(name='Annual Leave')
+        cls.user = User.objects.create_user(username='applicant', employee_id='E001', department='Design')
+        cls.teammate = User.objects.create_user(username='teammate', employee_id='E002', department='Design')
+        today = timezone.localdate()
+        cls.monday = today + datetime.timedelta(days=14 - today.weekday())
+
+    def setUp(self):
+        cache.clear()
+
+    def form(self, start, end, start_session='AM', end_session='PM', instance=None):
+        return LeaveApplicationForm({
+            'leave_type': self.leave_type.pk,
+            'reason': 'Trip',
+            'start_date': start,
+            'start_session': start_session,
+            'end_date': end,
+            'end_session': end_session,
+        }, user=self.user, instance=instance)
+
+    def apply(self, user, start, end, status='pending'):
+        return LeaveApplication.objects.create(
+            user=user, leave_type=self.leave_type, reason='Trip', status=status,
+            date_from=session_datetime(start, 'AM'), date_to=session_datetime(end, 'PM', is_end=True),
+        )
+
+    def test_overlap_with_own_application(self):
+        existing = self.apply(self.user, self.monday, self.monday + datetime.timedelta(days=2))
+        form = self.form(self.monday + datetime.timedelta(days=2), self.monday + datetime.timedelta(days=3))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Overlaps your pending Annual Leave', form.non_field_errors()[0])
+
+        # Revising the application itself is not a conflict
+        self.assertTrue(self.form(self.monday, self.monday, instance=existing).is_valid())
+
+        # Adjacent half days do not overlap
+        self.assertTrue(self.form(self.monday + datetime.timedelta(days=3), self.monday + datetime.timedelta(days=3),
+                                  start_session='AM', end_session='AM').is_valid())
+
+    def test_team_limit_counts_approved_leave(self):
+        tuesday = self.monday + datetime.timedelta(days=1)
+        pending = self.apply(self.teammate, tuesday, tuesday)
+        self.assertTrue(self.form(self.monday, tuesday).is_valid())
+
+        pending.status = 'approved'
+        pending.save()
+        form = self.form(self.monday, tuesday)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Too many teammates', form.non_field_errors()[0])
+
+    def test_half_day_on_non_working_day_is_rejected(self):
+        # The business calendar counts such a half day as 0 days, so it never reaches it
+        wednesday = self.monday + datetime.timedelta(days=2)
+        saturday = self.monday + datetime.timedelta(days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            PublicHoliday.objects.create(region='HK', date=wednesday, name='Company Day')
+
+        for day, session in ((wednesday, 'AM'), (saturday, 'PM')):
+            with self.subTest(day=day):
+                form = self.form(day, day, start_session=session, end_session=session)
+                self.assertFalse(form.is_valid())
+                self.assertIn('weekends or public holidays', form.non_field_errors()[0])
+        self.assertTrue(self.form(self.monday, self.monday, start_session='PM', end_session='PM').is_valid())
+
+    def test_constant_query_count(self):
+        self.apply(self.teammate, self.monday, self.monday + datetime.timedelta(days=1), status='approved')
+        date_from = session_datetime(self.monday, 'AM')
+        date_to = session_datetime(self.monday + datetime.timedelta(days=90), 'PM', is_end=True)
+        # Public holidays are loaded once per year and process, not per check
+        get_business_calendar().working_days(date_from.date(), date_to.date())
+
+        # Own overlaps, teammates, then one occupancy query for all months
+        with self.assertNumQueries(3):
+            conflicts = check_leave_conflicts(self.user, date_from, date_to)
+        self.assertEqual([(day, approved) for day, approved, _ in conflicts.busy_days],
+                         [(self.monday, 1), (self.monday + datetime.timedelta(days=1), 1)])
+        with self.assertNumQueries(2):
+            check_leave_conflicts(self.user, date_from, date_to)
+
+    def test_json_pre_check(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        url = reverse('leave_management:leave_conflict_check')
+        friday = self.monday + datetime.timedelta(days=4)
+        response = self.client.get(url, {
+            'start_date': self.monday.isoformat(), 'start_session': 'PM',
+            'end_date': friday.isoformat(), 'end_session': 'PM',
+        })
+        data = response.json()
+        self.assertTrue(data['ok'])
+        self.assertEqual(data['days'], 4.5)
+        self.assertEqual(data['back_to_office'], (friday + datetime.timedelta(days=3)).isoformat())
+
+        self.assertEqual(self.client.get(url, {'start_date': 'soon'}).status_code, 400)
+
+
+class LeaveLedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.annual = LeaveType.objects.create(name='Annual Leave')
+        cls.sick = LeaveType.objects.create(name='Sick Leave')
+        cls.user = User.objects.create_user(username='ledger', employee_id='E010')
+        cls.manager = User.objects.create_user(username='boss', employee_id='E011', role='manager')
+
+    def setUp(self):
+        calendar = calendar_for_user(self.user)
+        calendar.clear()
+        patcher = mock.patch.object(
+            calendar, 'holiday_provider', lambda region, year: {datetime.date(2027, 1, 1)} if year == 2027 else ()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(calendar.clear)
+
+    def apply(self, date_from, date_to, leave_type=None):
+        return LeaveApplication.objects.create(
+            user=self.user, leave_type=leave_type or self.annual, reason='Trip',
+            date_from=date_from, date_to=date_to,
+        )
+
+    def balance(self, year, leave_type=None):
+        return LeaveBalance.objects.get(user=self.user, leave_type=leave_type or self.annual, year=year)
+
+    def test_approval_charges_and_cancel_releases(self):
+        ledger.set_balance_column(self.user, self.annual, 2026, 'entitlement', 14)
+        application = self.apply(session(datetime.date(2026, 3, 2), 9), session(datetime.date(2026, 3, 4), 13))
+        self.assertEqual(self.balance(2026).taken, 0)
+
+        application.status = 'approved'
+        application.approved_by = self.manager
+        application.save()
+        application.save()
+        self.assertEqual(self.balance(2026).taken, Decimal('2.5'))
+        self.assertEqual(self.balance(2026).balance, Decimal('11.5'))
+
+        application.status = 'cancelled'
+        application.save()
+        self.assertEqual(self.balance(2026).taken, 0)
+        self.assertEqual(
+            list(application.ledger_entries.values_list('amount', flat=True)), [Decimal('2.5'), Decimal('-2.5')]
+        )
+
+    def test_leave_across_year_end_is_split(self):
+        application = self.apply(session(datetime.date(2026, 12, 30), 14), session(datetime.date(2027, 1, 5), 13))
+        application.status = 'approved'
+        application.save()
+        self.assertEqual(self.balance(2026).taken, Decimal('1.5'))
+        self.assertEqual(self.balance(2027).taken, Decimal('1.5'))
+
+    def test_posting_increments_balances(self):
+        LeaveBalance.objects.create(user=self.user, leave_type=self.annual, year=2026, taken=Decimal('3'))
+        ledger.post_entries([
+            LeaveLedgerEntry(user=self.user, leave_type=self.annual, year=2026, kind='taken', amount=Decimal('1.5')),
+            LeaveLedgerEntry(user=self.user, leave_type=self.annual, year=2026, kind='taken', amount=Decimal('0.5')),
+        ])
+        # Added to what is stored, not overwritten with a value read earlier
+        self.assertEqual(self.balance(2026).taken, Decimal('5'))
+
+    def test_entitlement_keeps_days_taken(self):
+        LeaveBalance.objects.create(
+            user=self.user, leave_type=self.annual, year=2026, current_year_entitlement=Decimal('12'), taken=Decimal('3')
+        )
+        ledger.set_balance_column(self.user, self.annual, 2026, 'entitlement', 14)
+        balance = self.balance(2026)
+        self.assertEqual((balance.current_year_entitlement, balance.taken), (Decimal('14'), Decimal('3')))
+
+        ledger.rebuild_balances()
+        balance = self.balance(2026)
+        self.assertEqual((balance.current_year_entitlement, balance.taken), (Decimal('14'), Decimal('3')))
+
+    def test_first_approval_opens_balance_from_before_the_ledger(self):
+        LeaveBalance.objects.create(user=self.user, leave_type=self.annual, year=2026,
+                                    current_year_entitlement=Decimal('14'))
+        application = self.apply(session(datetime.date(2026, 3, 2), 9), session(datetime.date(2026, 3, 3), 18))
+        application.status = 'approved'
+        application.save()
+
+        call_command('rebuild_leave_balances', '--seed-from-balances', stdout=io.StringIO())
+
+        balance = self.balance(2026)
+        self.assertEqual((balance.current_year_entitlement, balance.taken, balance.balance),
+                         (Decimal('14'), Decimal('2'), Decimal('12')))
+
+    def test_special_leave_credits_are_decimal(self):
+        claim = SpecialWorkClaim.objects.create(
+            user=self.user, work_date=datetime.date(2026, 3, 7), session='AM', event_name='Expo', description='Booth',
+        )
+        claim.status = 'approved'
+        claim.save()
+        balance = SpecialLeaveBalance.objects.get(user=self.user)
+        self.assertEqual(balance.earned, Decimal('0.5'))
+
+        claim.status = 'rejected'
+        claim.save()
+        claim.status = 'approved'
+        claim.save()
+        balance.refresh_from_db()
+        self.assertEqual(balance.earned, Decimal('0.5'))
+
+    def test_rebuild_uses_one_grouped_query(self):
+        for leave_type in (self.annual, self.sick):
+            ledger.set_balance_column(self.user, leave_type, 2026, 'entitlement', 10)
+        self.apply(session(datetime.date(2026, 3, 2), 9), session(datetime.date(2026, 3, 2), 18), self.sick)
+        LeaveApplication.objects.update(status='approved')
+        ledger.record_leave_taken(LeaveApplication.objects.get())
+        LeaveBalance.objects.update(current_year_entitlement=0, taken=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(ledger.rebuild_balances(year=2026), (2, 0))
+        ledger_reads = [q for q in queries if 'FROM "leave_management_leaveledgerentry"' in q['sql']
+                        and 'GROUP BY' in q['sql'] and 'leave_type_id" IS NOT NULL' in q['sql']]
+        self.assertEqual(len(ledger_reads), 1)
+        self.assertEqual(self.balance(2026, self.sick).balance, Decimal('9'))
+        self.assertEqual(self.balance(2026).balance, Decimal('10'))
+
+
+class LeaveRolloverTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.annual = LeaveType.objects.create(name='Annual Leave', max_days_per_year=10, max_carry_forward=5)
+        LeaveEntitlementRule.objects.create(leave_type=cls.annual, min_years_of_service=3, days=12)
+        LeaveEntitlementRule.objects.create(leave_type=cls.annual, min_years_of_service=6, days=14)
+        cls.sick = LeaveType.objects.create(name='Sick Leave', max_days_per_year=10)
+        cls.junior = User.objects.create_user(username='junior', employee_id='E020')
+        cls.senior = User.objects.create_user(username='senior', employee_id='E021')
+        User.objects.filter(pk=cls.junior.pk).update(date_joined=session(datetime.date(2025, 6, 1), 9))
+        User.objects.filter(pk=cls.senior.pk).update(date_joined=session(datetime.date(2022, 1, 1), 9))
+
+        ledger.set_balance_columns({
+            (cls.junior.pk, cls.annual.pk, 2026, 'entitlement'): 10,
+            (cls.senior.pk, cls.annual.pk, 2026, 'entitlement'): 12,
+            (cls.senior.pk, cls.annual.pk, 2026, 'taken'): 4,
+            (cls.junior.pk, cls.annual.pk, 2026, 'taken'): 9,
+        })
+
+    def balance(self, user, leave_type, year=2027):
+        return LeaveBalance.objects.get(user=user, leave_type=leave_type, year=year)
+
+    def test_years_of_service(self):
+        new_year = datetime.date(2027, 1, 1)
+        self.assertEqual(years_of_service(datetime.date(2022, 1, 1), new_year), 5)
+        self.assertEqual(years_of_service(datetime.date(2022, 1, 2), new_year), 4)
+        self.assertEqual(years_of_service(datetime.date(2027, 3, 1), new_year), 0)
+
+    def test_dry_run_writes_nothing(self):
+        lines = rollover(2027, dry_run=True)
+        self.assertFalse(LeaveBalance.objects.filter(year=2027).exists())
+        by_key = {(line.username, line.leave_type): line for line in lines}
+        senior = by_key[('senior', 'Annual Leave')]
+        self.assertEqual((senior.closing_balance, senior.carried_forward, senior.entitlement),
+                         (Decimal('8'), Decimal('5'), Decimal('12')))
+        junior = by_key[('junior', 'Annual Leave')]
+        self.assertEqual((junior.carried_forward, junior.entitlement), (Decimal('1'), Decimal('10')))
+        self.assertEqual(by_key[('junior', 'Sick Leave')].carried_forward, 0)
+
+    def test_rollover_is_bulk_and_repeatable(self):
+        # A fresh year is inserted in bulk, never updated row by row
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(rollover(2027)), 4)
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+
+        senior = self.balance(self.senior, self.annual)
+        self.assertEqual((senior.carried_forward, senior.current_year_entitlement, senior.balance),
+                         (Decimal('5'), Decimal('12'), 17))
+        self.assertEqual(self.balance(self.junior, self.sick).current_year_entitlement, Decimal('10'))
+
+        self.assertEqual(rollover(2027), [])
+        self.assertTrue(all(not line.changed for line in compute_rollover(2027)))
+
+        # Late leave in the old year lowers the carry forward on the next run
+        ledger.set_balance_column(self.junior, self.annual, 2026, 'taken', 10)
+        lines = rollover(2027)
+        self.assertEqual([(line.username, line.carried_forward) for line in lines], [('junior', Decimal('0'))])
+        self.assertEqual(self.balance(self.junior, self.annual).carried_forward, 0)
+
+    def test_rollover_from_balances_before_the_ledger(self):
+        # 2025 was imported straight into LeaveBalance; one of them then had leave approved
+        LeaveBalance.objects.create(user=self.junior, leave_type=self.annual, year=2025,
+                                    current_year_entitlement=Decimal('10'), taken=Decimal('8'))
+        LeaveBalance.objects.create(user=self.senior, leave_type=self.annual, year=2025,
+                                    current_year_entitlement=Decimal('14'))
+        application = LeaveApplication.objects.create(
+            user=self.senior, leave_type=self.annual, reason='Trip',
+            date_from=session(datetime.date(2025, 3, 3), 9), date_to=session(datetime.date(2025, 3, 4), 18),
+        )
+        ledger.record_leave_taken(application)
+
+        by_user = {line.username: line for line in compute_rollover(2026) if line.leave_type == 'Annual Leave'}
+        self.assertEqual((by_user['junior'].closing_balance, by_user['junior'].carried_forward),
+                         (Decimal('2'), Decimal('2')))
+        self.assertEqual((by_user['senior'].closing_balance, by_user['senior'].carried_forward),
+                         (Decimal('12'), Decimal('5')))
+
+
+class LeaveDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.annual = LeaveType.objects.create(name='Annual Leave')
+        cls.user = User.objects.create_user(username='staff', employee_id='E030')
+        cls.manager = User.objects.create_user(username='manager', employee_id='E031', role='manager')
+        cls.year = timezone.localdate().year
+        ledger.set_balance_column(cls.user, cls.annual, cls.year, 'entitlement', 14)
+        monday = datetime.date(cls.year, 3, 2)
+        for offset in range(7):
+            day = monday + datetime.timedelta(days=7 * offset)
+            LeaveApplication.objects.create(
+                user=cls.user, leave_type=cls.annual, reason='Trip', status='approved' if offset else 'pending',
+                date_from=session(day, 9), date_to=session(day, 18),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_staff_summary_queries(self):
+        # Counts, balances, special balance, recent applications
+        with self.assertNumQueries(4):
+            dashboard = leave_dashboard(self.user)
+        self.assertEqual((dashboard.total_applications, dashboard.pending_applications), (7, 1))
+        self.assertEqual(dashboard.annual_leave.balance, Decimal('8'))
+        self.assertEqual(len(dashboard.recent_applications), 7)
+        self.assertFalse(dashboard.more_applications)
+        self.assertIsNone(dashboard.pending)
+
+        with mock.patch('apps.leave_management.dashboard.RECENT_APPLICATIONS', 5):
+            dashboard = leave_dashboard(self.user)
+        self.assertEqual(len(dashboard.recent_applications), 5)
+        self.assertTrue(dashboard.more_applications)
+
+    def test_manager_pending_counters_are_cached(self):
+        leave_dashboard(self.manager)
+        # No own applications to list, and the counters come from the cache
+        with self.assertNumQueries(3):
+            dashboard = leave_dashboard(self.manager)
+        self.assertEqual(dashboard.pending.leave_applications, 1)
+
+        claim = SpecialWorkClaim.objects.create(
+            user=self.user, work_date=datetime.date(self.year, 3, 7), session='FULL', event_name='Expo',
+            description='Booth',
+        )
+        self.assertEqual(leave_dashboard(self.manager).pending.special_claims, 1)
+        claim.status = 'approved'
+        claim.save()
+        self.assertEqual(leave_dashboard(self.manager).pending.total_special, 0)
+
+    def test_json_summary(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        data = self.client.get(reverse('leave_management:dashboard_summary')).json()
+        self.assertEqual(data['applications'], {'total': 7, 'pending': 1, 'this_year': 7})
+        self.assertEqual(data['balances'][0]['balance'], 8.0)
+
+        with mock.patch('apps.leave_management.dashboard.RECENT_APPLICATIONS', 5):
+            response = self.client.get(reverse('leave_management:dashboard'))
+        self.assertContains(response, 'View all 7 applications')
+
+
+class LeaveApprovalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.annual = LeaveType.objects.create(name='Annual Leave')
+        cls.manager = User.objects.create_user(username='lead', employee_id='E040', role='manager')
+        cls.team = [
+            User.objects.create_user(username=f'member{index}', employee_id=f'E05{index}', manager=cls.manager)
+            for index in range(10)
+        ]
+        cls.outsider = User.objects.create_user(username='outsider', employee_id='E049')
+        cls.year = timezone.localdate().year + 1
+        first_monday = datetime.date(cls.year, 1, 5)
+        first_monday += datetime.timedelta(days=-first_monday.weekday())
+        # Ten single working days per team member, created without signals
+        LeaveApplication.objects.bulk_create([
+            LeaveApplication(
+                user=member, leave_type=cls.annual, reason='Trip',
+                date_from=session(first_monday + datetime.timedelta(weeks=week), 9),
+                date_to=session(first_monday + datetime.timedelta(weeks=week), 18),
+            )
+            for member in cls.team
+            for week in range(10)
+        ])
+        cls.outsider_application = LeaveApplication.objects.create(
+            user=cls.outsider, leave_type=cls.annual, reason='Trip',
+            date_from=session(first_monday, 9), date_to=session(first_monday, 18),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_queue_is_scoped_to_managed_employees(self):
+        queue = approval_queue(self.manager)
+        self.assertEqual(queue.count(), 100)
+        self.assertFalse(queue.filter(user=self.outsider).exists())
+
+    def test_batch_of_hundred_in_one_transaction(self):
+        ids = list(approval_queue(self.manager).values_list('id', flat=True))
+        self.assertEqual(pending_counts().leave_applications, 101)
+
+        # Lock and load, status update, then ledger entries and balances in bulk;
+        # the entry insert may be split into a couple of batches
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                result = apply_batch_decision(self.manager, ids + [self.outsider_application.id], 'approve')
+        statements = [q for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertLessEqual(len(statements), 7)
+
+        self.assertEqual(len(result['processed']), 100)
+        self.assertEqual(result['skipped'], [self.outsider_application.id])
+        self.assertEqual(
+            set(LeaveBalance.objects.filter(year=self.year).values_list('taken', flat=True)), {Decimal('10')}
+        )
+        self.assertEqual(LeaveLedgerEntry.objects.filter(kind='taken').count(), 100)
+        self.assertEqual(pending_counts().leave_applications, 1)
+
+        # Already decided: nothing left to process
+        self.assertEqual(apply_batch_decision(self.manager, ids[:5], 'reject')['processed'], [])
+
+    def test_batch_view(self):
+        self.client.force_login(self.manager, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('leave_management:manager_dashboard'))
+        self.assertContains(response, '100 awaiting approval')
+
+        ids = list(approval_queue(self.manager).values_list('id', flat=True)[:3])
+        response = self.client.post(reverse('leave_management:batch_leave_approval'), {
+            'application_ids': ids, 'action': 'reject', 'comment': 'Busy season',
+        })
+        self.assertRedirects(response, reverse('leave_management:manager_dashboard'))
+        self.assertEqual(
+            list(LeaveApplication.objects.filter(id__in=ids).order_by().values_list('status', 'rejection_reason').distinct()),
+            [('rejected', 'Busy season')],
+        )
+
+        response = self.client.get(reverse('leave_management:approve_leave_application', args=[ids[0]]))
+        self.assertContains(response, 'This application is rejected.')
+
+        response = self.client.post(
+            reverse('leave_management:approve_leave_application', args=[self.outsider_application.id]),
+            {'action': 'approve'},
+        )
+        self.outsider_application.refresh_from_db()
+        self.assertEqual(self.outsider_application.status, 'pending')
+
+
+class LeavePdfTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.annual = LeaveType.objects.create(name='Annual Leave')
+        cls.user = User.objects.create_user(username='printer', employee_id='E060')
+        monday = datetime.date(timezone.localdate().year + 1, 3, 2)
+        cls.applications = [
+            LeaveApplication.objects.create(
+                user=cls.user, leave_type=cls.annual, reason='Trip',
+                date_from=session(monday + datetime.timedelta(weeks=week), 9),
+                date_to=session(monday + datetime.timedelta(weeks=week), 18),
+            )
+            for week in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+
+    def test_combined_print_lays_out_any_batch_two_per_sheet(self):
+        ids = [application.id for application in reversed(self.applications)]
+        response = self.client.get(
+            reverse('leave_management:combined_print') + '?ids=' + ','.join(map(str, ids))
+        )
+        self.assertContains(response, 'class="combined-container"', count=3)
+        self.assertContains(response, 'No application for this half', count=1)
+        self.assertEqual([form['application'].id for sheet in pdf.sheets(self.applications) for form in sheet],
+                         [application.id for application in self.applications])
+
+    def test_document_key_follows_updated_at(self):
+        application = self.applications[0]
+        key = pdf.document_key('form', [application])
+        self.assertEqual(key, pdf.document_key('form', [application]))
+        self.assertNotEqual(key, pdf.document_key('combined', [application]))
+
+        application.reason = 'Family trip'
+        application.save()
+        self.assertNotEqual(key, pdf.document_key('form', [application]))
+
+    def test_rendered_pdf_is_cached(self):
+        with mock.patch.object(pdf, 'PDF_WORKERS', 0), \
+                mock.patch.object(pdf, 'pdf_available', return_value=True), \
+                mock.patch.object(pdf, 'html_to_pdf', return_value=b'%PDF-form') as html_to_pdf:
+            url = reverse('leave_management:leave_form_pdf', args=[self.applications[0].id])
+            for _ in range(2):
+                response = self.client.get(url)
+                self.assertEqual(response.content, b'%PDF-form')
+        self.assertEqual(html_to_pdf.call_count, 1)
+
+    def test_slow_render_continues_in_pool(self):
+        release = threading.Event()
+
+        def slow_render(html, base_url):
+            release.wait(5)
+            return b'%PDF-combined'
+
+        pool = ThreadPoolExecutor(max_workers=1)
+        url = reverse('leave_management:combined_print_pdf') + f'?ids={self.applications[0].id},{self.applications[1].id}'
+        with mock.patch.object(pdf, '_pool', pool), \
+                mock.patch.object(pdf, 'PDF_WAIT_SECONDS', 0.05), \
+                mock.patch.object(pdf, 'pdf_available', return_value=True), \
+                mock.patch.object(pdf, 'html_to_pdf', side_effect=slow_render) as html_to_pdf:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response['Refresh'], str(pdf.PDF_RETRY_SECONDS))
+
+            # Asking again while it renders joins the render in flight
+            self.assertEqual(self.client.get(url).status_code, 202)
+
+            release.set()
+            pool.shutdown(wait=True)
+            response = self.client.get(url)
+        self.assertEqual(response.content, b'%PDF-combined')
+        self.assertEqual(html_to_pdf.call_count, 1)
+
+
+class PublicHolidayTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='hr', employee_id='E070', role='admin')
+        cls.staff = User.objects.create_user(username='clerk', employee_id='E071', location='hk')
+        # 2031-01-01 is a Wednesday
+        cls.new_year = datetime.date(2031, 1, 1)
+
+    def setUp(self):
+        cache.clear()
+
+    def write_file(self, content, suffix='.csv'):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_bulk_import_from_file(self):
+        path = self.write_file('date,name,region\n2031-01-01,New Year,HK\n2031-01-23,Lunar New Year,\n2031-05-01,Labour Day,CN\n')
+        holidays = public_holidays.read_holiday_file(path, region='HK')
+        self.assertEqual(holidays[1], ('HK', datetime.date(2031, 1, 23), 'Lunar New Year'))
+
+        # Lookup, insert
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            result = public_holidays.import_holidays(holidays)
+        self.assertLessEqual(len([q for q in queries if 'SAVEPOINT' not in q['sql']]), 2)
+        self.assertEqual((result.created, result.updated), (3, 0))
+
+        PublicHoliday.objects.create(region='HK', date=datetime.date(2031, 7, 2), name='Company Day')
+        json_path = self.write_file(json.dumps([{'date': '2031-01-01', 'name': "New Year's Day", 'region': 'HK'}]), '.json')
+        with self.captureOnCommitCallbacks(execute=True):
+            result = public_holidays.import_holidays(public_holidays.read_holiday_file(json_path), replace=True)
+        self.assertEqual((result.created, result.updated, result.removed), (0, 1, 1))
+        # Holidays added by hand survive a replacing import
+        self.assertEqual(
+            list(PublicHoliday.objects.filter(region='HK').values_list('name', flat=True)),
+            ["New Year's Day", 'Company Day'],
+        )
+
+        with self.assertRaisesMessage(ValueError, 'invalid date'):
+            public_holidays.read_holiday_file(self.write_file('date,name\n01/01/2031,New Year\n'), region='HK')
+
+    def test_leave_math_uses_cached_holidays(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            public_holidays.import_holidays([('HK', self.new_year, 'New Year')])
+        calendar = calendar_for_user(self.staff)
+        self.assertFalse(calendar.is_working_day(self.new_year))
+        self.assertEqual(public_holidays.holiday_dates('CN', 2031), frozenset())
+
+        # Built once per region and year, then answered from memory
+        with self.assertNumQueries(0):
+            calendar = calendar_for_user(self.staff)
+            self.assertEqual(calendar.working_days(self.new_year, datetime.date(2031, 1, 3)), 2)
+
+        # Any change bumps the version and the calendar picks it up
+        holiday = PublicHoliday.objects.get(region='HK', date=self.new_year)
+        holiday.is_active = False
+        holiday.save()
+        self.assertEqual(calendar_for_user(self.staff).working_days(self.new_year, datetime.date(2031, 1, 3)), 3)
+
+    def test_management_views(self):
+        self.client.force_login(self.staff, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertRedirects(self.client.get(reverse('leave_management:holiday_management')),
+                             reverse('leave_management:dashboard'), fetch_redirect_response=False)
+
+        self.client.force_login(self.admin, backend='django.contrib.auth.backends.ModelBackend')
+        self.client.post(reverse('leave_management:holiday_add'), {
+            'name': 'Company Day', 'date': '2031-07-02', 'region': 'HK',
+        })
+        holiday = PublicHoliday.objects.get(region='HK', date=datetime.date(2031, 7, 2))
+        self.assertFalse(holiday.is_imported)
+        self.assertFalse(calendar_for_user(self.staff).is_working_day(holiday.date))
+
+        response = self.client.get(reverse('leave_management:holiday_management'), {'region': 'HK', 'year': 2031})
+        self.assertContains(response, 'Company Day')
 
-# Create your tests here.
+        self.client.post(reverse('leave_management:holiday_delete', args=[holiday.pk]))
+        self.assertFalse(PublicHoliday.objects.exists())
+        self.assertTrue(calendar_for_user(self.staff).is_working_day(holiday.date))
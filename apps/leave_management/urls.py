@@ -13,12 +13,15 @@ urlpatterns = [
     path("logout/", views_auth.CustomLogoutView.as_view(), name="logout"),
     path("register/", views_auth.register, name="register"),
     path("dashboard/", views.leave_dashboard, name="dashboard"),
+    path("dashboard/summary/", views.leave_dashboard_summary, name="dashboard_summary"),
     path("apply-leave/", views.apply_leave, name="apply_leave"),
+    path("apply-leave/check/", views.leave_conflict_check, name="leave_conflict_check"),
     path("apply-leave/confirm/<int:application_id>/", views.apply_leave_confirm, name="apply_leave_confirm"),
     path("leave-applications/", views.leave_applications, name="leave_applications"),
     path("leave-applications/<int:application_id>/", views.leave_application_detail, name="leave_application_detail"),
     path("leave-applications/<int:application_id>/revise/", views.revise_leave_application, name="revise_leave_application"),
     path("leave-applications/<int:application_id>/withdraw/", views.withdraw_leave_application, name="withdraw_leave_application"),
+    path("calendar/", views.leave_calendar, name="leave_calendar"),
     path("holidays/", views.holiday_management, name="holiday_management"),
     path("holidays/import/", views.holiday_import, name="holiday_import"),
     path("holidays/add/", views.holiday_add, name="holiday_add"),
@@ -38,6 +41,8 @@ urlpatterns = [
     path("leave-applications/combined/pdf/", views.combined_print_pdf, name="combined_print_pdf"),
     # Manager approval URLs
     path("manager/", views.manager_dashboard, name="manager_dashboard"),
+    path("manager/batch/", views.leave_batch_approval, name="batch_leave_approval"),
+    path("manager/reject-leave/<int:application_id>/", views.leave_reject, name="reject_leave_application"),
     path("manager/approve-leave/<int:application_id>/", views.approve_leave_application, name="approve_leave_application"),
     path("manager/approve-claim/<int:claim_id>/", views.approve_special_work_claim, name="approve_special_work_claim"),
     path("manager/approve-special-leave/<int:application_id>/", views.approve_special_leave_application, name="approve_special_leave_application"),
@@ -4,109 +4,40 @@ Leave Management Views
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
-from django.db.models import Sum, Count, Q
-from .models import LeaveType, LeaveBalance, LeaveApplication, SpecialLeaveBalance, SpecialWorkClaim, SpecialLeaveApplication
-from datetime import datetime
-
-
-class SimpleBalance:
-    """Simple class to hold balance data"""
-    def __init__(self, earned=0.0, used=0.0):
-        self.earned = earned
-        self.used = used
-        self.balance = earned - used
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.db.models import Q
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .models import LeaveType, LeaveBalance, LeaveApplication, PublicHoliday
+from . import pdf, public_holidays
+from .business_days import calendar_for_user, get_business_calendar, session_datetime
+from .approvals import APPROVAL_PAGE_SIZE, apply_batch_decision, approval_queue, can_use_approval_queue
+from .conflicts import check_leave_conflicts
+from .dashboard import leave_dashboard as get_leave_dashboard
+from .occupancy import month_start, next_month_start, period_occupancy
+from datetime import date, datetime, timedelta
+
+User = get_user_model()
 
 
 @login_required
 def leave_dashboard(request):
     """Leave management dashboard showing user's leave balances and recent applications"""
-
-    # Get user's leave balances for current year
-    current_year = datetime.now().year
-
-    # Get all leave balances as a dictionary keyed by leave type name
-    leave_balance_objs = LeaveBalance.objects.filter(
-        user=request.user,
-        year=current_year
-    ).select_related('leave_type')
-
-    leave_balances = {}
-    annual_leave_details = None
-
-    for balance in leave_balance_objs:
-        leave_balances[balance.leave_type.name] = {
-            'opening_balance': balance.opening_balance,
-            'carried_forward': balance.carried_forward,
-            'current_year_entitlement': balance.current_year_entitlement,
-            'taken': balance.taken,
-            'balance': balance.balance
-        }
-
-        # Set annual leave details
-        if balance.leave_type.name == 'Annual Leave':
-            annual_leave_details = {
-                'carried_forward': balance.carried_forward,
-                'current_year_entitlement': balance.current_year_entitlement,
-                'taken_this_year': balance.taken,
-                'current_balance': balance.balance
-            }
-
-    # Get special leave balance if exists
-    try:
-        special_leave_balance = SpecialLeaveBalance.objects.get(user=request.user, year=current_year)
-    except SpecialLeaveBalance.DoesNotExist:
-        special_leave_balance = SimpleBalance()
-
-    # Get recent leave applications
-    applications = LeaveApplication.objects.filter(
-        user=request.user
-    ).select_related('leave_type', 'approved_by').order_by('-created_at')[:10]
-
-    # Calculate years of service
-    years_of_service = (datetime.now().year - request.user.date_joined.year) if request.user.date_joined else 0
-
-    # Get pending applications
-    pending_applications = LeaveApplication.objects.filter(
-        user=request.user,
-        status='pending'
-    ).count()
-
-    # Total applications this year
-    total_applications_this_year = LeaveApplication.objects.filter(
-        user=request.user,
-        created_at__year=current_year
-    ).count()
-
-    # For managers/admins - get pending special work claims and applications
-    pending_special_claims = 0
-    pending_special_applications = 0
-    if request.user.role in ['manager', 'admin']:
-        pending_special_claims = SpecialWorkClaim.objects.filter(status='pending').count()
-        pending_special_applications = SpecialLeaveApplication.objects.filter(status='pending').count()
-
-    stats = {
-        'years_of_service': years_of_service,
-        'total_applications_this_year': total_applications_this_year,
-        'pending_applications': pending_applications,
-        'pending_special_claims': pending_special_claims,
-        'pending_special_applications': pending_special_applications,
-        'total_pending_special': pending_special_claims + pending_special_applications,
-    }
-
     context = {
         'employee': request.user,  # Template expects 'employee' variable
-        'leave_balances': leave_balances,
-        'annual_leave_details': annual_leave_details,
-        'special_leave_balance': special_leave_balance,
-        'applications': applications,
-        'stats': stats,
-        'current_year': current_year,
+        'dashboard': get_leave_dashboard(request.user),
     }
-
     return render(request, 'leave/dashboard.html', context)
 
 
+@login_required
+def leave_dashboard_summary(request):
+    """The dashboard summary as JSON"""
+    return JsonResponse(get_leave_dashboard(request.user).as_dict())
+
+
 @login_required
 def leave_apply(request):
     """Apply for leave"""
@@ -139,10 +70,36 @@ def leave_apply(request):
     })
 
 
+@login_required
+def leave_conflict_check(request):
+    """JSON pre-check of a leave period for the application form"""
+    try:
+        start_date = datetime.strptime(request.GET.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.GET.get('end_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return JsonResponse({'error': 'start_date and end_date must be YYYY-MM-DD'}, status=400)
+    start_session = 'PM' if request.GET.get('start_session') == 'PM' else 'AM'
+    end_session = 'AM' if request.GET.get('end_session') == 'AM' else 'PM'
+
+    date_from = session_datetime(start_date, start_session)
+    date_to = session_datetime(end_date, end_session, is_end=True)
+    if date_to <= date_from:
+        return JsonResponse({'error': 'Leave cannot end before it starts'}, status=400)
+
+    exclude_id = request.GET.get('exclude')
+    conflicts = check_leave_conflicts(
+        request.user, date_from, date_to, exclude_id=int(exclude_id) if exclude_id and exclude_id.isdigit() else None
+    )
+    calendar = calendar_for_user(request.user)
+    data = conflicts.as_dict()
+    data['days'] = calendar.leave_days(date_from, date_to)
+    data['back_to_office'] = calendar.back_to_office_date(date_to).isoformat()
+    return JsonResponse(data)
+
+
 @login_required
 def my_leaves(request):
     """View all my leave applications with filtering and pagination"""
-    from django.core.paginator import Paginator
 
     # Base queryset
     applications = LeaveApplication.objects.filter(
@@ -252,42 +209,171 @@ def leave_balance(request):
 
 @login_required
 def leave_approval_list(request):
-    """Manager view for approving leave"""
-    if request.user.role not in ['manager', 'admin']:
-        return HttpResponse("<h1>Access Denied</h1><p>You need manager or admin role to access this page.</p>")
+    """Approval queue: pending leave of the employees the current user manages"""
+    if not can_use_approval_queue(request.user):
+        messages.error(request, 'You need manager or admin role to access this page.')
+        return redirect('leave_management:dashboard')
 
-    # Get pending applications from team members
-    pending = LeaveApplication.objects.filter(
-        status='pending'
-    ).select_related('user', 'leave_type').order_by('-created_at')
+    applications = approval_queue(request.user).select_related('user', 'leave_type')
+    paginator = Paginator(applications, APPROVAL_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-    return HttpResponse(f"""
-        <h1>Leave Approvals</h1>
-        <p>Pending approvals: {pending.count()}</p>
-        <ul>
-        {''.join([f'<li>{app.user.get_full_name()} - {app.leave_type.name} - {app.date_from.date()} to {app.date_to.date()}</li>' for app in pending[:10]])}
-        </ul>
-        <p><a href="/leave/dashboard/">Back to Dashboard</a></p>
-    """)
+    context = {
+        'page_obj': page_obj,
+        'applications': page_obj.object_list,
+    }
+    return render(request, 'leave/leave_approval_queue.html', context)
+
+
+@login_required
+def leave_batch_approval(request):
+    """Approve or reject the selected applications from the approval queue"""
+    if request.method != 'POST':
+        return redirect('leave_management:manager_dashboard')
+    if not can_use_approval_queue(request.user):
+        messages.error(request, 'You do not have permission to approve leave.')
+        return redirect('leave_management:dashboard')
+
+    application_ids = [
+        application_id for application_id in request.POST.getlist('application_ids') if application_id.isdigit()
+    ]
+    action = request.POST.get('action', '')
+    if not application_ids:
+        messages.error(request, 'Please select at least one application.')
+        return redirect('leave_management:manager_dashboard')
+
+    try:
+        result = apply_batch_decision(request.user, application_ids, action, request.POST.get('comment', '').strip())
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('leave_management:manager_dashboard')
+
+    verb = 'approved' if action == 'approve' else 'rejected'
+    messages.success(request, f"{len(result['processed'])} leave applications {verb}.")
+    if result['skipped']:
+        messages.warning(
+            request,
+            f"{len(result['skipped'])} applications were skipped because they are no longer awaiting your approval."
+        )
+    return redirect('leave_management:manager_dashboard')
+
+
+def _single_leave_decision(request, application_id, action):
+    """Show one application for a decision, or apply the posted decision to it"""
+    if not can_use_approval_queue(request.user):
+        messages.error(request, 'You do not have permission to approve leave.')
+        return redirect('leave_management:dashboard')
+
+    application = get_object_or_404(
+        LeaveApplication.objects.select_related('user', 'leave_type'), pk=application_id
+    )
+    if request.method != 'POST':
+        return render(request, 'leave/approve_leave_application.html', {'application': application})
+
+    action = request.POST.get('action', action)
+    try:
+        result = apply_batch_decision(request.user, [application.pk], action, request.POST.get('comment', '').strip())
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('leave_management:approve_leave_application', application_id=application.pk)
+
+    if not result['processed']:
+        messages.error(request, 'This application is not awaiting your approval.')
+    elif action == 'approve':
+        messages.success(request, f'Leave of {application.user.get_full_name()} approved.')
+    else:
+        messages.success(request, f'Leave of {application.user.get_full_name()} rejected.')
+    return redirect('leave_management:manager_dashboard')
 
 
 @login_required
 def leave_approve(request, application_id):
-    return redirect('leave_management:dashboard')
+    return _single_leave_decision(request, application_id, 'approve')
 
 
 @login_required
 def leave_reject(request, application_id):
-    return redirect('leave_management:dashboard')
+    return _single_leave_decision(request, application_id, 'reject')
+
+
+@login_required
+def special_approval(request, **kwargs):
+    """Special leave approvals are not handled here yet"""
+    return redirect('leave_management:manager_dashboard')
+
+
+def calendar_users(request, scope):
+    """Active users shown for a calendar scope, with the scope actually used"""
+    user = request.user
+    users = User.objects.filter(is_active=True)
+    if scope == 'company' and user.role in ['manager', 'admin']:
+        pass
+    elif scope == 'team' and user.role in ['manager', 'admin']:
+        users = users.filter(Q(manager=user) | Q(pk=user.pk))
+    elif user.department:
+        scope = 'department'
+        users = users.filter(department=user.department)
+    else:
+        scope = 'team'
+        users = users.filter(Q(manager=user) | Q(pk=user.pk))
+    return users.order_by('department', 'last_name', 'first_name', 'username'), scope
 
 
 @login_required
 def leave_calendar(request):
-    return HttpResponse("""
-        <h1>Leave Calendar</h1>
-        <p>Calendar view coming soon!</p>
-        <p><a href="/leave/dashboard/">Back to Dashboard</a></p>
-    """)
+    """Team leave calendar: who is off, by AM/PM session, for a month or week"""
+    view_mode = 'week' if request.GET.get('view') == 'week' else 'month'
+    try:
+        anchor = datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        anchor = timezone.localdate()
+
+    if view_mode == 'week':
+        first_day = anchor - timedelta(days=anchor.weekday())
+        last_day = first_day + timedelta(days=6)
+        previous_day, next_day = first_day - timedelta(days=7), first_day + timedelta(days=7)
+    else:
+        first_day = month_start(anchor)
+        last_day = next_month_start(first_day) - timedelta(days=1)
+        previous_day, next_day = month_start(first_day - timedelta(days=1)), next_month_start(first_day)
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+
+    users, scope = calendar_users(request, request.GET.get('scope', 'department'))
+    users = list(users.values('id', 'first_name', 'last_name', 'username', 'department'))
+    user_ids = [user['id'] for user in users]
+
+    # One cached bitmap set per month shown; a week can span two months
+    occupancies = period_occupancy(user_ids, first_day, last_day)
+
+    calendar = get_business_calendar()
+    working = [calendar.is_working_day(day) for day in days]
+    rows = []
+    for user in users:
+        cells = []
+        for day, is_working in zip(days, working):
+            am, pm = occupancies[month_start(day)].sessions(user['id'], day)
+            cells.append({'am': am, 'pm': pm, 'working': is_working})
+        name = f"{user['first_name']} {user['last_name']}".strip() or user['username']
+        rows.append({'name': name, 'department': user['department'], 'cells': cells})
+
+    off_counts = [
+        len(occupancies[month_start(day)].users_off(day)) if is_working else 0
+        for day, is_working in zip(days, working)
+    ]
+
+    context = {
+        'view_mode': view_mode,
+        'scope': scope,
+        'can_view_company': request.user.role in ['manager', 'admin'],
+        'first_day': first_day,
+        'last_day': last_day,
+        'days': list(zip(days, working, off_counts)),
+        'rows': rows,
+        'previous_day': previous_day,
+        'next_day': next_day,
+        'today': timezone.localdate(),
+    }
+    return render(request, 'leave/leave_calendar.html', context)
 
 
 @login_required
@@ -334,205 +420,80 @@ def special_leave_apply(request):
 @login_required
 def leave_form_print_view(request, application_id):
     """Print single leave application form"""
-    from django.utils import timezone as tz
-    from datetime import timedelta
-
     application = get_object_or_404(LeaveApplication, pk=application_id, user=request.user)
-
-    # Convert to local time
-    date_from_local = tz.localtime(application.date_from)
-    date_to_local = tz.localtime(application.date_to)
-
-    # Calculate return to work date
-    date_back = date_to_local.date()
-    if date_to_local.time().hour >= 14:  # PM end
-        date_back = date_back + timedelta(days=1)
-        # Skip weekends
-        while date_back.weekday() >= 5:
-            date_back = date_back + timedelta(days=1)
-
-    context = {
-        'application': application,
-        'date_from_local': date_from_local,
-        'date_to_local': date_to_local,
-        'date_back_to_work': date_back,
-        'is_pdf': False
-    }
-
-    return render(request, 'leave/leave_form_print.html', context)
+    return HttpResponse(pdf.leave_form_html(application))
 
 
 @login_required
 def leave_form_pdf_view(request, application_id):
     """Generate PDF for leave application"""
-    from django.utils import timezone as tz
-    from datetime import timedelta
-
-    application = get_object_or_404(LeaveApplication, pk=application_id, user=request.user)
-
-    # Convert to local time
-    date_from_local = tz.localtime(application.date_from)
-    date_to_local = tz.localtime(application.date_to)
+    application = get_object_or_404(
+        LeaveApplication.objects.select_related('leave_type', 'user'), pk=application_id, user=request.user
+    )
 
-    # Calculate return to work date
-    date_back = date_to_local.date()
-    if date_to_local.time().hour >= 14:  # PM end
-        date_back = date_back + timedelta(days=1)
-        # Skip weekends
-        while date_back.weekday() >= 5:
-            date_back = date_back + timedelta(days=1)
-
-    from django.template.loader import get_template
-    template = get_template('leave/leave_form_print.html')
-    context = {
-        'application': application,
-        'date_from_local': date_from_local,
-        'date_to_local': date_to_local,
-        'date_back_to_work': date_back,
-        'is_pdf': True
-    }
-    html = template.render(context)
-
-    try:
-        # Try to generate PDF using weasyprint if available
-        import weasyprint
-        pdf_file = weasyprint.HTML(string=html).write_pdf()
-
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        filename = f'leave_application_{application.user.get_full_name().replace(" ", "_")}_{application_id}.pdf'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-        return response
-    except ImportError:
-        # If weasyprint is not available, redirect to print view
+    if not pdf.pdf_available():
         messages.warning(request, 'PDF generation is not available. Please use the print function instead.')
         return redirect('leave_management:leave_form_print', application_id=application_id)
 
+    content = pdf.leave_form_pdf(application)
+    if content is None:
+        return _pdf_rendering(request)
 
-@login_required
-def combined_print_view(request):
-    """Print multiple leave applications on one page (A5 format, 2 per A4 page)"""
-    from django.utils import timezone as tz
-    from datetime import timedelta
+    response = HttpResponse(content, content_type='application/pdf')
+    filename = f'leave_application_{application.user.get_full_name().replace(" ", "_")}_{application_id}.pdf'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-    # Get the IDs from query parameter
-    ids = request.GET.get('ids', '')
-    if not ids:
-        messages.error(request, 'No applications selected for printing.')
-        return redirect('leave_management:leave_applications')
 
-    # Parse IDs
+def _selected_applications(request):
+    """The user's applications listed in ``?ids=``, in the order given"""
+    ids = request.GET.get('ids', '')
     application_ids = [int(id.strip()) for id in ids.split(',') if id.strip().isdigit()]
-
-    # Get applications (limit to 2 for combined printing)
     applications = LeaveApplication.objects.filter(
-        id__in=application_ids[:2],
+        id__in=application_ids,
         user=request.user
-    ).select_related('leave_type', 'user')
-
-    # Calculate return dates for each
-    apps_with_dates = []
-    for app in applications:
-        # Convert to local time
-        date_from_local = tz.localtime(app.date_from)
-        date_to_local = tz.localtime(app.date_to)
-
-        date_back = date_to_local.date()
-        if date_to_local.time().hour >= 14:  # PM end
-            date_back = date_back + timedelta(days=1)
-            # Skip weekends
-            while date_back.weekday() >= 5:
-                date_back = date_back + timedelta(days=1)
-        apps_with_dates.append({
-            'application': app,
-            'date_from_local': date_from_local,
-            'date_to_local': date_to_local,
-            'date_back_to_work': date_back
-        })
-
-    # Extract just the applications and dates for template
-    applications = [item['application'] for item in apps_with_dates]
-    dates_back_to_work = [item['date_back_to_work'] for item in apps_with_dates]
-    dates_from_local = [item['date_from_local'] for item in apps_with_dates]
-    dates_to_local = [item['date_to_local'] for item in apps_with_dates]
+    ).select_related('leave_type', 'user').in_bulk()
+    return [applications[pk] for pk in dict.fromkeys(application_ids) if pk in applications]
 
-    context = {
-        'applications': applications,
-        'dates_back_to_work': dates_back_to_work,
-        'dates_from_local': dates_from_local,
-        'dates_to_local': dates_to_local,
-        'apps_with_dates': apps_with_dates,  # Full data
-        'is_pdf': False
-    }
 
-    return render(request, 'leave/combined_print.html', context)
+@login_required
+def combined_print_view(request):
+    """Print leave applications as A5 forms, 2 per A4 page"""
+    applications = _selected_applications(request)
+    if not applications:
+        messages.error(request, 'No applications selected for printing.')
+        return redirect('leave_management:leave_applications')
+
+    return HttpResponse(pdf.combined_html(applications))
 
 
 @login_required
 def combined_print_pdf_view(request):
     """Generate combined PDF"""
-    from django.utils import timezone as tz
-    from datetime import timedelta
-
-    # Similar to combined_print_view but generates PDF
-    ids = request.GET.get('ids', '')
-    if not ids:
+    applications = _selected_applications(request)
+    if not applications:
         messages.error(request, 'No applications selected for PDF generation.')
         return redirect('leave_management:leave_applications')
 
-    application_ids = [int(id.strip()) for id in ids.split(',') if id.strip().isdigit()]
-    applications = LeaveApplication.objects.filter(
-        id__in=application_ids[:2],
-        user=request.user
-    ).select_related('leave_type', 'user')
-
-    apps_with_dates = []
-    for app in applications:
-        # Convert to local time
-        date_from_local = tz.localtime(app.date_from)
-        date_to_local = tz.localtime(app.date_to)
-
-        date_back = date_to_local.date()
-        if date_to_local.time().hour >= 14:
-            date_back = date_back + timedelta(days=1)
-            while date_back.weekday() >= 5:
-                date_back = date_back + timedelta(days=1)
-        apps_with_dates.append({
-            'application': app,
-            'date_from_local': date_from_local,
-            'date_to_local': date_to_local,
-            'date_back_to_work': date_back
-        })
-
-    # Extract just the applications and dates for template
-    applications = [item['application'] for item in apps_with_dates]
-    dates_back_to_work = [item['date_back_to_work'] for item in apps_with_dates]
-    dates_from_local = [item['date_from_local'] for item in apps_with_dates]
-    dates_to_local = [item['date_to_local'] for item in apps_with_dates]
-
-    from django.template.loader import get_template
-    template = get_template('leave/combined_print.html')
-    context = {
-        'applications': applications,
-        'dates_back_to_work': dates_back_to_work,
-        'dates_from_local': dates_from_local,
-        'dates_to_local': dates_to_local,
-        'apps_with_dates': apps_with_dates,  # Full data
-        'is_pdf': True
-    }
-    html = template.render(context)
+    if not pdf.pdf_available():
+        messages.warning(request, 'PDF generation is not available. Please use the print function instead.')
+        ids = ','.join(str(application.pk) for application in applications)
+        return redirect(reverse('leave_management:combined_print') + f'?ids={ids}')
 
-    try:
-        import weasyprint
-        pdf_file = weasyprint.HTML(string=html).write_pdf()
+    content = pdf.combined_pdf(applications)
+    if content is None:
+        return _pdf_rendering(request)
 
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="combined_leave_applications.pdf"'
+    response = HttpResponse(content, content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename="combined_leave_applications.pdf"'
+    return response
 
-        return response
-    except ImportError:
-        messages.warning(request, 'PDF generation is not available. Please use the print function instead.')
-        return redirect('leave_management:combined_print') + f'?ids={ids}'
+
+def _pdf_rendering(request):
+    """Ask the browser to come back for a PDF that is still being rendered"""
+    response = render(request, 'leave/pdf_rendering.html', {'retry_after': pdf.PDF_RETRY_SECONDS}, status=202)
+    response['Refresh'] = str(pdf.PDF_RETRY_SECONDS)
+    return response
 
 
 @login_required
@@ -605,28 +566,140 @@ def apply_leave_confirm(request, application_id):
     return render(request, 'leave/apply_leave_confirm.html', context)
 
 
+def can_manage_holidays(user):
+    return user.role == 'admin' or user.is_superuser
+
+
+def _holiday_page(region, year):
+    return redirect(reverse('leave_management:holiday_management') + f'?region={region}&year={year}')
+
+
+@login_required
+def holiday_management(request):
+    """Public holidays of a region and year"""
+    if not can_manage_holidays(request.user):
+        messages.error(request, 'You do not have permission to manage holidays.')
+        return redirect('leave_management:dashboard')
+
+    current_year = timezone.localdate().year
+    try:
+        year = int(request.GET.get('year', current_year))
+    except ValueError:
+        year = current_year
+    region = request.GET.get('region', '').upper()
+    if region not in public_holidays.REGIONS:
+        region = public_holidays.REGIONS[0]
+
+    holidays = PublicHoliday.objects.filter(
+        region=region, date__gte=date(year, 1, 1), date__lt=date(year + 1, 1, 1)
+    )
+    context = {
+        'holidays': holidays,
+        'years': range(current_year - 2, current_year + 3),
+        'regions': PublicHoliday.REGION_CHOICES,
+        'current_year': year,
+        'current_region': region,
+    }
+    return render(request, 'leave/holiday_management.html', context)
+
+
+@login_required
+def holiday_import(request):
+    """Import a region's holidays of a year from the holidays package"""
+    if not can_manage_holidays(request.user) or request.method != 'POST':
+        return redirect('leave_management:holiday_management')
+
+    region = request.POST.get('region', '').upper()
+    try:
+        year = int(request.POST.get('year', ''))
+    except ValueError:
+        year = None
+    if region not in public_holidays.REGIONS or year is None:
+        messages.error(request, 'Please choose a region and year to import.')
+        return redirect('leave_management:holiday_management')
+
+    try:
+        holidays = public_holidays.fetch_package_holidays(region, year)
+    except ImportError:
+        messages.error(request, 'Holiday import is not available: the holidays package is not installed.')
+        return _holiday_page(region, year)
+
+    result = public_holidays.import_holidays(holidays, replace=request.POST.get('overwrite') == 'true')
+    messages.success(
+        request,
+        f'Imported holidays for {region} {year}: {result.created} added, {result.updated} updated, '
+        f'{result.removed} removed.'
+    )
+    return _holiday_page(region, year)
+
+
+@login_required
+def holiday_add(request):
+    """Add a holiday by hand, or restore and rename the one already on that date"""
+    if not can_manage_holidays(request.user) or request.method != 'POST':
+        return redirect('leave_management:holiday_management')
+
+    region = request.POST.get('region', '').upper()
+    name = request.POST.get('name', '').strip()
+    try:
+        day = date.fromisoformat(request.POST.get('date', ''))
+    except ValueError:
+        day = None
+    if region not in public_holidays.REGIONS or not name or day is None:
+        messages.error(request, 'Please enter a name, date and region for the holiday.')
+        return redirect('leave_management:holiday_management')
+
+    PublicHoliday.objects.update_or_create(
+        region=region, date=day, defaults={'name': name, 'is_active': True, 'is_imported': False}
+    )
+    messages.success(request, f'Holiday "{name}" added for {region} on {day:%d %b %Y}.')
+    return _holiday_page(region, day.year)
+
+
+@login_required
+def holiday_edit(request, holiday_id):
+    if not can_manage_holidays(request.user):
+        return redirect('leave_management:dashboard')
+
+    holiday = get_object_or_404(PublicHoliday, pk=holiday_id)
+    if request.method == 'POST':
+        holiday.name = request.POST.get('name', '').strip() or holiday.name
+        holiday.is_active = request.POST.get('is_active') == 'on'
+        holiday.save()
+        messages.success(request, f'Holiday "{holiday.name}" updated.')
+        return _holiday_page(holiday.region, holiday.date.year)
+
+    return render(request, 'leave/holiday_edit.html', {'holiday': holiday})
+
+
+@login_required
+def holiday_delete(request, holiday_id):
+    if not can_manage_holidays(request.user) or request.method != 'POST':
+        return redirect('leave_management:holiday_management')
+
+    holiday = get_object_or_404(PublicHoliday, pk=holiday_id)
+    holiday.delete()
+    messages.success(request, f'Holiday "{holiday.name}" deleted.')
+    return _holiday_page(holiday.region, holiday.date.year)
+
+
 # Legacy view aliases for URL routing
 apply_leave = leave_apply
 leave_applications = my_leaves
 leave_application_detail = leave_detail
 revise_leave_application = revise_leave_application_view
 withdraw_leave_application = leave_cancel
-holiday_management = leave_calendar
-holiday_import = leave_calendar
-holiday_add = leave_calendar
 employee_import = leave_dashboard
 import_history = leave_dashboard
 view_import_content = leave_dashboard
 download_balances = leave_balance
 special_leave_apply_confirm = special_leave_apply
 special_leave_management = special_leave_list
-holiday_edit = leave_calendar
-holiday_delete = leave_calendar
 leave_form_print = leave_form_print_view
 leave_form_pdf = leave_form_pdf_view
 combined_print = combined_print_view
 combined_print_pdf = combined_print_pdf_view
 manager_dashboard = leave_approval_list
 approve_leave_application = leave_approve
-approve_special_work_claim = leave_approve
-approve_special_leave_application = leave_approve
+approve_special_work_claim = special_approval
+approve_special_leave_application = special_approval
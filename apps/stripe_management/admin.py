@@ -2,8 +2,9 @@
 Stripe Management Admin Configuration
 """
 from django.contrib import admin
+from django.db.models import Sum
 from django.utils.html import format_html
-from .models import StripeAccount, Transaction, MonthlyStatement
+from .models import StripeAccount, Transaction, LedgerEntry, MonthlyStatement, BankStatementLine, PayoutMatch
 
 
 @admin.register(StripeAccount)
@@ -25,10 +26,15 @@ class StripeAccountAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Count from the daily aggregates instead of one COUNT(*) per row
+        return super().get_queryset(request).annotate(aggregate_count=Sum('daily_aggregates__count'))
+
     def transaction_count(self, obj):
-        count = obj.transactions.count()
+        count = obj.aggregate_count or 0
         return format_html('<span style="font-weight: bold;">{}</span>', count)
     transaction_count.short_description = 'Transactions'
+    transaction_count.admin_order_field = 'aggregate_count'
 
 
 @admin.register(Transaction)
@@ -73,11 +79,28 @@ class TransactionAdmin(admin.ModelAdmin):
     net_display.short_description = 'Net Amount'
 
 
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['stripe_created', 'account', 'transaction', 'delta_display', 'balance_display']
+    list_filter = ['account']
+    search_fields = ['transaction__stripe_id']
+    raw_id_fields = ['transaction']
+    date_hierarchy = 'stripe_created'
+
+    def delta_display(self, obj):
+        return format_html('${}', f'{obj.delta / 100:.2f}')
+    delta_display.short_description = 'Change'
+
+    def balance_display(self, obj):
+        return format_html('<span style="font-weight: bold;">${}</span>', f'{obj.balance / 100:.2f}')
+    balance_display.short_description = 'Balance'
+
+
 @admin.register(MonthlyStatement)
 class MonthlyStatementAdmin(admin.ModelAdmin):
     list_display = ['account', 'period', 'opening_balance_display', 'closing_balance_display',
-                    'total_charges_display', 'is_reconciled', 'reconciled_by']
-    list_filter = ['is_reconciled', 'year', 'account']
+                    'total_charges_display', 'is_dirty', 'is_reconciled', 'reconciled_by']
+    list_filter = ['is_reconciled', 'is_dirty', 'year', 'account']
     search_fields = ['account__name', 'notes']
     readonly_fields = ['created_at', 'updated_at', 'opening_balance_display', 'closing_balance_display',
                       'total_charges_display', 'total_refunds_display', 'total_fees_display', 'total_payouts_display']
@@ -94,7 +117,7 @@ class MonthlyStatementAdmin(admin.ModelAdmin):
                       'total_fees', 'total_fees_display', 'total_payouts', 'total_payouts_display')
         }),
         ('Reconciliation', {
-            'fields': ('is_reconciled', 'reconciled_at', 'reconciled_by', 'notes')
+            'fields': ('is_dirty', 'is_reconciled', 'reconciled_at', 'reconciled_by', 'notes')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -129,3 +152,36 @@ class MonthlyStatementAdmin(admin.ModelAdmin):
     def total_payouts_display(self, obj):
         return format_html('<span style="color: blue;">${:.2f}</span>', obj.total_payouts_formatted)
     total_payouts_display.short_description = 'Total Payouts'
+
+
+@admin.register(BankStatementLine)
+class BankStatementLineAdmin(admin.ModelAdmin):
+    list_display = ['value_date', 'amount_display', 'description', 'reference', 'account', 'is_matched', 'source_file']
+    list_filter = ['account', 'source_file']
+    search_fields = ['description', 'reference']
+    date_hierarchy = 'value_date'
+    readonly_fields = ['line_hash', 'imported_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('account', 'payout_match')
+
+    def amount_display(self, obj):
+        return format_html('${}', f'{obj.amount / 100:.2f}')
+    amount_display.short_description = 'Amount'
+
+    def is_matched(self, obj):
+        return hasattr(obj, 'payout_match')
+    is_matched.boolean = True
+    is_matched.short_description = 'Matched'
+
+
+@admin.register(PayoutMatch)
+class PayoutMatchAdmin(admin.ModelAdmin):
+    list_display = ['payout', 'bank_line', 'day_offset', 'method', 'matched_at', 'matched_by']
+    list_filter = ['method', 'payout__account']
+    search_fields = ['payout__stripe_id', 'bank_line__description', 'bank_line__reference']
+    raw_id_fields = ['payout', 'bank_line']
+    readonly_fields = ['matched_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('payout', 'bank_line', 'matched_by')
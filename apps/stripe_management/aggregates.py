@@ -0,0 +1,213 @@
+"""
+Per-day Stripe aggregates
+
+DailyAccountAggregate holds count, gross, fee and net per account, local
+day, currency, type and status. Imports add the transactions they insert
+with a handful of queries per chunk; single edits recompute the days they
+touch. Range totals then sum at most one row per day and group instead of
+scanning the transactions table.
+"""
+import datetime
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .ledger import ledger_delta
+from .models import DailyAccountAggregate, Transaction
+from .statements import previous_month
+import logging
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_FIELDS = ['count', 'gross', 'fee', 'net']
+
+# Revenue is gross succeeded charges, as on the statements
+REVENUE_FILTER = Q(type='charge', status='succeeded')
+
+
+def aggregate_day(moment):
+    """Local date a transaction is counted on"""
+    return timezone.localtime(moment).date()
+
+
+def day_bounds(day):
+    """Half-open [start, end) of a local day"""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+    return start, end
+
+
+def add_to_daily_aggregates(account, transactions):
+    """
+    Add newly inserted transactions of ``account`` to its daily aggregates.
+
+    Callers must be the only writer for the account, e.g. the per-account
+    import writer, and call this inside the transaction that inserted them.
+    """
+    deltas = {}
+    for txn in transactions:
+        key = (aggregate_day(txn.stripe_created), txn.currency, txn.type, txn.status)
+        totals = deltas.setdefault(key, [0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += txn.amount
+        totals[2] += txn.fee or 0
+        totals[3] += ledger_delta(txn.type, txn.status, txn.amount, txn.fee)
+    if not deltas:
+        return
+
+    existing = {
+        (row.day, row.currency, row.type, row.status): row
+        for row in DailyAccountAggregate.objects.filter(account=account, day__in={key[0] for key in deltas})
+    }
+
+    changed = []
+    created = []
+    for key, (count, gross, fee, net) in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            day, currency, txn_type, status = key
+            created.append(DailyAccountAggregate(
+                account=account, day=day, currency=currency, type=txn_type, status=status,
+                count=count, gross=gross, fee=fee, net=net,
+            ))
+            continue
+        row.count += count
+        row.gross += gross
+        row.fee += fee
+        row.net += net
+        changed.append(row)
+
+    DailyAccountAggregate.objects.bulk_update(changed, AGGREGATE_FIELDS, batch_size=1000)
+    DailyAccountAggregate.objects.bulk_create(created, batch_size=1000)
+
+
+def _grouped_totals(transactions):
+    """Per (day, currency, type, status) totals of a transaction queryset in one query"""
+    rows = transactions.annotate(
+        day=TruncDate('stripe_created', tzinfo=timezone.get_current_timezone())
+    ).order_by().values('day', 'currency', 'type', 'status').annotate(
+        count=Count('id'),
+        gross=Sum('amount'),
+        fee_total=Sum('fee'),
+    )
+    for row in rows:
+        gross, fee = row['gross'] or 0, row['fee_total'] or 0
+        yield DailyAccountAggregate(
+            day=row['day'],
+            currency=row['currency'],
+            type=row['type'],
+            status=row['status'],
+            count=row['count'],
+            gross=gross,
+            fee=fee,
+            # ledger_delta is linear in amount and fee for a given type and status
+            net=ledger_delta(row['type'], row['status'], gross, fee),
+        )
+
+
+def refresh_daily_aggregates(account, days):
+    """Recompute the aggregates of ``account`` for the given local days"""
+    days = set(days)
+    if not days:
+        return
+
+    period = Q()
+    for day in days:
+        start, end = day_bounds(day)
+        period |= Q(stripe_created__gte=start, stripe_created__lt=end)
+
+    rows = list(_grouped_totals(Transaction.objects.filter(period, account=account)))
+    for row in rows:
+        row.account = account
+
+    DailyAccountAggregate.objects.filter(account=account, day__in=days).delete()
+    DailyAccountAggregate.objects.bulk_create(rows)
+
+
+def rebuild_daily_aggregates(account):
+    """Rebuild all daily aggregates of an account from its transactions"""
+    rows = list(_grouped_totals(Transaction.objects.filter(account=account)))
+    for row in rows:
+        row.account = account
+
+    DailyAccountAggregate.objects.filter(account=account).delete()
+    DailyAccountAggregate.objects.bulk_create(rows, batch_size=1000)
+    logger.info(f'Rebuilt {len(rows)} daily aggregates for {account.account_id}')
+    return len(rows)
+
+
+def aggregate_totals(account=None, txn_type=None, status=None, date_from=None, date_to=None):
+    """Count, gross, fee and net in cents over the days matching the filters"""
+    rows = DailyAccountAggregate.objects.all()
+    if account:
+        rows = rows.filter(account=account)
+    if txn_type:
+        rows = rows.filter(type=txn_type)
+    if status:
+        rows = rows.filter(status=status)
+    if date_from:
+        rows = rows.filter(day__gte=date_from)
+    if date_to:
+        rows = rows.filter(day__lte=date_to)
+
+    totals = rows.aggregate(**{name: Sum(name) for name in AGGREGATE_FIELDS})
+    return {name: value or 0 for name, value in totals.items()}
+
+
+def overall_totals():
+    """Transaction count and revenue in cents across all accounts"""
+    totals = DailyAccountAggregate.objects.aggregate(
+        count=Sum('count'),
+        revenue=Sum('gross', filter=REVENUE_FILTER),
+    )
+    return {name: value or 0 for name, value in totals.items()}
+
+
+def account_totals():
+    """Transaction count and revenue in cents per account id, in one grouped query"""
+    rows = DailyAccountAggregate.objects.order_by().values('account').annotate(
+        transaction_count=Sum('count'),
+        revenue=Sum('gross', filter=REVENUE_FILTER),
+    )
+    return {
+        row['account']: {'count': row['transaction_count'] or 0, 'revenue': row['revenue'] or 0}
+        for row in rows
+    }
+
+
+def monthly_revenue(months=12, account=None, today=None):
+    """
+    Revenue, fees and net of succeeded charges for the last ``months``
+    months, oldest first, with empty months filled in.
+    """
+    today = today or timezone.localdate()
+    year, month = today.year, today.month
+    keys = []
+    for _ in range(months):
+        keys.append((year, month))
+        year, month = previous_month(year, month)
+    keys.reverse()
+
+    rows = DailyAccountAggregate.objects.filter(
+        REVENUE_FILTER,
+        day__gte=datetime.date(keys[0][0], keys[0][1], 1),
+        day__lte=today,
+    )
+    if account:
+        rows = rows.filter(account=account)
+    rows = rows.annotate(period=TruncMonth('day')).order_by().values('period').annotate(
+        total_gross=Sum('gross'), total_fee=Sum('fee'), total_net=Sum('net'),
+    )
+    by_month = {(row['period'].year, row['period'].month): row for row in rows}
+
+    series = []
+    for key in keys:
+        row = by_month.get(key, {})
+        series.append({
+            'month': f'{key[0]}-{key[1]:02d}',
+            'revenue': (row.get('total_gross') or 0) / 100,
+            'fees': (row.get('total_fee') or 0) / 100,
+            'net': (row.get('total_net') or 0) / 100,
+        })
+    return series
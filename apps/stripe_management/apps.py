@@ -5,3 +5,6 @@ class StripeManagementConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.stripe_management"
     verbose_name = "Stripe Management"
+
+    def ready(self):
+        from . import signals  # noqa: F401
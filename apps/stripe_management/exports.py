@@ -0,0 +1,335 @@
+"""
+Statement exports
+
+Renders a materialized MonthlyStatement and its ledger entries to CSV, XLSX
+or PDF. Each rendered file is stored as a GeneratedDocument whose cache key
+includes the statement version, so an export is reused until the
+statement's figures change and older versions are removed when a new one
+is saved.
+
+Statement data is loaded into plain Python values first and rendered
+separately, which lets batch exports render in worker processes while the
+calling process does all database and storage writes.
+"""
+import csv
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from apps.documents.models import GeneratedDocument
+from .ledger import entries_between, sync_ledger
+from .models import MonthlyStatement
+from .statements import materialize_statements, month_bounds
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'csv': {'document_type': 'csv_export', 'content_type': 'text/csv'},
+    'xlsx': {
+        'document_type': 'excel_export',
+        'content_type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    },
+    'pdf': {'document_type': 'pdf_report', 'content_type': 'application/pdf'},
+}
+
+LINE_COLUMNS = ['Date', 'Stripe ID', 'Type', 'Status', 'Description', 'Customer', 'Amount', 'Fee', 'Change', 'Balance']
+
+# Concurrent exports requested from the web UI
+EXPORT_WORKERS = getattr(settings, 'STRIPE_EXPORT_WORKERS', 2)
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+
+@dataclass
+class ExportResult:
+    """Outcome of exporting one statement in one format"""
+    statement_id: int
+    account_name: str
+    format: str
+    document: GeneratedDocument = None
+    reused: bool = False
+    error: str = ''
+
+
+def statement_cache_key(statement, fmt):
+    return f'stripe_statement:{statement.pk}:{fmt}:v{statement.version}'
+
+
+def get_cached_export(statement, fmt):
+    """The stored export of the statement's current version, if any"""
+    document = GeneratedDocument.objects.filter(
+        cache_key=statement_cache_key(statement, fmt)
+    ).order_by('-generated_at').first()
+    if document and document.file and document.file.storage.exists(document.file.name):
+        return document
+    return None
+
+
+def ensure_materialized(statement):
+    """Rebuild the statement first if its transactions changed"""
+    if statement.is_dirty:
+        materialize_statements(statement.account)
+        statement.refresh_from_db()
+    return statement
+
+
+def build_statement_data(statement):
+    """Statement header and ledger lines as plain values, in cents"""
+    # Lines come from the ledger; add entries for transactions written around it
+    sync_ledger(statement.account)
+    start, end = month_bounds(statement.year, statement.month)
+    lines = []
+    for entry in entries_between(statement.account, start, end):
+        txn = entry.transaction
+        lines.append([
+            timezone.localtime(entry.stripe_created).strftime('%Y-%m-%d %H:%M'),
+            txn.stripe_id,
+            txn.get_type_display(),
+            txn.get_status_display(),
+            txn.description or '',
+            txn.customer_email or '',
+            txn.amount,
+            txn.fee or 0,
+            entry.delta,
+            entry.balance,
+        ])
+
+    return {
+        'account_name': statement.account.name,
+        'account_id': statement.account.account_id,
+        'period': f'{statement.year}-{statement.month:02d}',
+        'version': statement.version,
+        'opening_balance': statement.opening_balance,
+        'closing_balance': statement.closing_balance,
+        'total_charges': statement.total_charges,
+        'total_refunds': statement.total_refunds,
+        'total_fees': statement.total_fees,
+        'total_payouts': statement.total_payouts,
+        'lines': lines,
+        'generated_at': timezone.localtime().strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+def _summary_rows(data):
+    return [
+        ('Opening balance', data['opening_balance']),
+        ('Charges', data['total_charges']),
+        ('Refunds', data['total_refunds']),
+        ('Fees', data['total_fees']),
+        ('Payouts', data['total_payouts']),
+        ('Closing balance', data['closing_balance']),
+    ]
+
+
+def _money(cents):
+    return f'{cents / 100:.2f}'
+
+
+def render_csv(data):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Account', data['account_name'], data['account_id']])
+    writer.writerow(['Period', data['period']])
+    for label, cents in _summary_rows(data):
+        writer.writerow([label, _money(cents)])
+    writer.writerow([])
+    writer.writerow(LINE_COLUMNS)
+    for line in data['lines']:
+        writer.writerow(line[:6] + [_money(cents) for cents in line[6:]])
+    return buffer.getvalue().encode('utf-8')
+
+
+def render_xlsx(data):
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows instead of keeping every cell object
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(data['period'])
+    sheet.append(['Account', data['account_name'], data['account_id']])
+    sheet.append(['Period', data['period']])
+    for label, cents in _summary_rows(data):
+        sheet.append([label, cents / 100])
+    sheet.append([])
+    sheet.append(LINE_COLUMNS)
+    for line in data['lines']:
+        sheet.append(line[:6] + [cents / 100 for cents in line[6:]])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def render_pdf(data):
+    import weasyprint
+
+    html = render_to_string('stripe_management/statement_export.html', {
+        'data': data,
+        'summary': [(label, cents / 100) for label, cents in _summary_rows(data)],
+        'lines': [line[:6] + [cents / 100 for cents in line[6:]] for line in data['lines']],
+        'columns': LINE_COLUMNS,
+    })
+    return weasyprint.HTML(string=html, base_url=str(settings.BASE_DIR)).write_pdf()
+
+
+RENDERERS = {'csv': render_csv, 'xlsx': render_xlsx, 'pdf': render_pdf}
+
+
+def render_statement(data, fmt):
+    """Render statement data to file content; safe to call in a worker process"""
+    return RENDERERS[fmt](data)
+
+
+def save_export(statement, fmt, content, user=None):
+    """Store rendered content as the statement's current export and drop older versions"""
+    key = statement_cache_key(statement, fmt)
+    filename = f'stripe_statement_{statement.account.account_id}_{statement.year}_{statement.month:02d}_v{statement.version}.{fmt}'
+
+    document = GeneratedDocument(
+        document_type=EXPORT_FORMATS[fmt]['document_type'],
+        title=f'{statement.account.name} statement {statement.year}-{statement.month:02d} ({fmt.upper()})',
+        parameters={
+            'statement_id': statement.pk,
+            'account_id': statement.account.account_id,
+            'year': statement.year,
+            'month': statement.month,
+            'format': fmt,
+            'version': statement.version,
+        },
+        generated_by=user,
+        cache_key=key,
+    )
+    document.file.save(filename, ContentFile(content), save=False)
+    document.save()
+
+    stale = GeneratedDocument.objects.filter(
+        cache_key__startswith=f'stripe_statement:{statement.pk}:{fmt}:'
+    ).exclude(pk=document.pk)
+    for old in stale:
+        old.file.delete(save=False)
+        old.delete()
+    return document
+
+
+def export_statement(statement, fmt, user=None, force=False):
+    """
+    The statement's export in ``fmt``, rendering it only if no export of the
+    current version exists.
+
+    Returns:
+        (GeneratedDocument, reused)
+    """
+    statement = ensure_materialized(statement)
+    if not force:
+        document = get_cached_export(statement, fmt)
+        if document:
+            return document, True
+
+    content = render_statement(build_statement_data(statement), fmt)
+    return save_export(statement, fmt, content, user=user), False
+
+
+def _get_executor():
+    """Lazily create the shared export pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='stripe-export')
+    return _executor
+
+
+def submit_statement_export(statement, fmt, user=None):
+    """Queue a background export unless the same one is already running"""
+    key = statement_cache_key(statement, fmt)
+    with _executor_lock:
+        if key in _in_flight:
+            return key
+        _in_flight.add(key)
+
+    user_id = user.pk if user else None
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_worker, statement.pk, fmt, user_id, key))
+    logger.info(f'Queued {fmt} export of statement {statement.pk}')
+    return key
+
+
+def _run_in_worker(statement_pk, fmt, user_id, key):
+    """Executor entry point; worker threads need their own DB connections"""
+    close_old_connections()
+    try:
+        statement = MonthlyStatement.objects.select_related('account').get(pk=statement_pk)
+        user = get_user_model().objects.filter(pk=user_id).first() if user_id else None
+        export_statement(statement, fmt, user=user)
+    except Exception as e:
+        logger.error(f'Export of statement {statement_pk} as {fmt} failed: {e}')
+    finally:
+        with _executor_lock:
+            _in_flight.discard(key)
+        close_old_connections()
+
+
+def export_in_progress(statement, fmt):
+    with _executor_lock:
+        return statement_cache_key(statement, fmt) in _in_flight
+
+
+def export_statements(statements, formats, workers=None, force=False, user=None):
+    """
+    Export many statements in several formats.
+
+    Statements are materialized and their data loaded here; rendering runs
+    in a pool of ``workers`` processes (``workers=0`` renders in-process)
+    and the results are stored here as they complete.
+
+    Returns:
+        List of ExportResult ordered by statement and format
+    """
+    results = []
+    jobs = []
+    for statement in statements:
+        statement = ensure_materialized(statement)
+        data = None
+        for fmt in formats:
+            result = ExportResult(statement_id=statement.pk, account_name=statement.account.name, format=fmt)
+            results.append(result)
+            if not force:
+                result.document = get_cached_export(statement, fmt)
+                if result.document:
+                    result.reused = True
+                    continue
+            data = data or build_statement_data(statement)
+            jobs.append((statement, fmt, data, result))
+
+    def store(statement, fmt, result, render):
+        try:
+            result.document = save_export(statement, fmt, render(), user=user)
+        except Exception as e:
+            logger.error(f'Export of statement {statement.pk} as {fmt} failed: {e}')
+            result.error = str(e)
+
+    if workers == 0 or len(jobs) <= 1:
+        for statement, fmt, data, result in jobs:
+            store(statement, fmt, result, lambda: render_statement(data, fmt))
+        return results
+
+    # Workers set Django up themselves in case processes are spawned rather than forked
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        rendering = {
+            pool.submit(render_statement, data, fmt): (statement, fmt, result)
+            for statement, fmt, data, result in jobs
+        }
+        for future in as_completed(rendering):
+            statement, fmt, result = rendering[future]
+            store(statement, fmt, result, future.result)
+
+    return results
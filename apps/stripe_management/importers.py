@@ -0,0 +1,343 @@
+"""
+Stripe CSV import
+
+Streams a Stripe payments export in fixed-size chunks. For each chunk the
+already imported ``stripe_id``s are fetched with a single ``IN`` query and
+the new rows are written with one ``bulk_create`` inside the chunk's own
+transaction. Re-running an import is idempotent: rows that already exist are
+skipped, so an interrupted import simply resumes where it stopped. Once a
+file is written the account's running-balance ledger is brought up to date
+in one pass, which keeps newest-first exports from re-summing per chunk.
+
+Batches of files are parsed in a process pool while a single writer thread
+per account inserts the parsed chunks, so files for the same account never
+contend for the same rows and locks.
+"""
+import csv
+import datetime
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .aggregates import add_to_daily_aggregates
+from .ledger import sync_ledger
+from .models import Transaction
+from .statements import mark_transactions_dirty
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows parsed and written per transaction
+IMPORT_CHUNK_SIZE = getattr(settings, 'STRIPE_IMPORT_CHUNK_SIZE', 1000)
+
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+@dataclass
+class ImportStats:
+    """Counters for one CSV import"""
+    imported: int = 0
+    skipped: int = 0
+    errors: int = 0
+    rows: int = 0
+    elapsed: float = 0.0
+    error_messages: list = field(default_factory=list)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class FileImportResult:
+    """Outcome of one file in a batch import"""
+    path: str
+    account_id: str
+    stats: ImportStats
+
+
+def parse_cents(value):
+    """Convert a decimal amount string such as '1,234.56' to integer cents"""
+    value = (value or '').strip().replace(',', '')
+    if not value:
+        return 0
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value!r}')
+    return int((amount * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def parse_stripe_created(value):
+    """Parse the 'Created date (UTC)' column; falls back to now like the old importer"""
+    if value:
+        try:
+            return datetime.datetime.strptime(value, CSV_DATE_FORMAT).replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            pass
+    return timezone.now()
+
+
+def parse_status(value):
+    status_raw = (value or '').lower()
+    if status_raw == 'paid':
+        return 'succeeded'
+    return status_raw or 'pending'
+
+
+def transaction_fields(row):
+    """Map one CSV row to Transaction field values (without the account)"""
+    amount_str = row.get('Converted Amount', row.get('Amount', '0'))
+
+    if parse_cents(row.get('Amount Refunded')) > 0:
+        txn_type = 'refund'
+    else:
+        txn_type = 'charge'
+
+    return {
+        'stripe_id': row['id'],
+        'amount': parse_cents(amount_str),
+        'fee': parse_cents(row.get('Fee')),
+        'currency': (row.get('Converted Currency') or row.get('Currency') or 'hkd').lower(),
+        'status': parse_status(row.get('Status')),
+        'type': txn_type,
+        'stripe_created': parse_stripe_created(row.get('Created date (UTC)', '')),
+        'customer_email': row.get('Customer Email', ''),
+        'description': row.get('Description', ''),
+        'stripe_metadata': {
+            'customer_id': row.get('Customer ID', ''),
+            'card_id': row.get('Card ID', ''),
+            'invoice_id': row.get('Invoice ID', ''),
+            'subs_type': row.get('subs_type (metadata)', ''),
+            'site': row.get('site (metadata)', ''),
+        },
+    }
+
+
+def iter_chunks(rows, size):
+    """Yield lists of at most ``size`` rows without reading the whole file"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_chunk(rows, stats):
+    """Parse CSV rows into Transaction field dicts; empty and invalid rows are counted"""
+    parsed = []
+    for row in rows:
+        stats.rows += 1
+        stripe_id = row.get('id')
+
+        if not stripe_id:
+            stats.skipped += 1
+            continue
+
+        try:
+            parsed.append(transaction_fields(row))
+        except (ValueError, KeyError) as e:
+            stats.errors += 1
+            stats.error_messages.append(f'{stripe_id}: {e}')
+    return parsed
+
+
+def write_chunk(parsed, account, stats):
+    """Bulk insert parsed rows for ``account`` in one transaction; returns the created transactions"""
+    stripe_ids = {fields['stripe_id'] for fields in parsed}
+    existing = set(
+        Transaction.objects.filter(stripe_id__in=stripe_ids).values_list('stripe_id', flat=True)
+    )
+
+    to_create = []
+    seen = set()
+    for fields in parsed:
+        stripe_id = fields['stripe_id']
+        # Skip already imported rows and duplicates within the file
+        if stripe_id in existing or stripe_id in seen:
+            stats.skipped += 1
+            continue
+        seen.add(stripe_id)
+        to_create.append(Transaction(account=account, **fields))
+
+    with transaction.atomic():
+        Transaction.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_create:
+            # Another account's writer may have inserted the same stripe_id
+            # since the lookup above; keep only the rows that went in here
+            inserted = set(
+                Transaction.objects.filter(
+                    account=account, stripe_id__in=[txn.stripe_id for txn in to_create]
+                ).values_list('stripe_id', flat=True)
+            )
+            stats.skipped += len(to_create) - len(inserted)
+            to_create = [txn for txn in to_create if txn.stripe_id in inserted]
+        # bulk_create skips signals, so flag the affected statements and
+        # update the daily aggregates here
+        mark_transactions_dirty(account, [txn.stripe_created for txn in to_create])
+        add_to_daily_aggregates(account, to_create)
+
+    stats.imported += len(to_create)
+    return to_create
+
+
+def import_chunk(rows, account, stats):
+    """Parse and bulk insert one chunk of CSV rows; returns the created transactions"""
+    return write_chunk(parse_chunk(rows, stats), account, stats)
+
+
+def import_stripe_csv(csv_file, account, chunk_size=None, progress=None):
+    """
+    Import a Stripe CSV export into ``account``.
+
+    Args:
+        csv_file: Path to the CSV file
+        account: StripeAccount the transactions belong to
+        chunk_size: Rows per chunk, defaults to STRIPE_IMPORT_CHUNK_SIZE
+        progress: Optional callable receiving the ImportStats after each chunk
+
+    Returns:
+        ImportStats
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    stats = ImportStats()
+    started = time.monotonic()
+
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        for rows in iter_chunks(csv.DictReader(f), chunk_size):
+            import_chunk(rows, account, stats)
+            stats.elapsed = time.monotonic() - started
+            if progress:
+                progress(stats)
+
+    sync_ledger(account)
+    stats.elapsed = time.monotonic() - started
+    logger.info(
+        f'Imported {stats.imported} Stripe transactions from {csv_file} into {account.account_id} '
+        f'({stats.skipped} skipped, {stats.errors} errors, {stats.rows_per_second:.0f} rows/sec)'
+    )
+    return stats
+
+
+def parse_stripe_csv(csv_file, chunk_size=None):
+    """
+    Parse a whole CSV file into chunks of Transaction field dicts.
+
+    Runs in the batch import worker processes and never touches the database.
+
+    Returns:
+        (chunks, ImportStats)
+    """
+    chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+    stats = ImportStats()
+    started = time.monotonic()
+
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        chunks = [parse_chunk(rows, stats) for rows in iter_chunks(csv.DictReader(f), chunk_size)]
+
+    stats.elapsed = time.monotonic() - started
+    return chunks, stats
+
+
+def _write_parsed_file(chunks, account, stats):
+    """Writer thread entry point; each thread uses its own DB connection"""
+    close_old_connections()
+    try:
+        started = time.monotonic()
+        for parsed in chunks:
+            write_chunk(parsed, account, stats)
+        sync_ledger(account)
+        stats.elapsed += time.monotonic() - started
+    finally:
+        close_old_connections()
+
+
+def import_stripe_csv_files(files, workers=None, chunk_size=None):
+    """
+    Import many Stripe CSV files at once.
+
+    Files are parsed in a pool of ``workers`` processes. Parsed files are
+    handed to one writer thread per account, so inserts for an account are
+    serialised while different accounts are written concurrently (SQLite
+    gets a single shared writer). With ``workers=0`` everything runs in the
+    calling thread.
+
+    Args:
+        files: Iterable of ``(path, StripeAccount)`` pairs
+        workers: Parser processes, defaults to the CPU count
+        chunk_size: Rows per chunk, defaults to STRIPE_IMPORT_CHUNK_SIZE
+
+    Returns:
+        List of FileImportResult in the order of ``files``
+    """
+    files = list(files)
+    results = {
+        path: FileImportResult(path=path, account_id=account.account_id, stats=ImportStats())
+        for path, account in files
+    }
+
+    if workers == 0:
+        for path, account in files:
+            try:
+                chunks, stats = parse_stripe_csv(path, chunk_size)
+                for parsed in chunks:
+                    write_chunk(parsed, account, stats)
+                sync_ledger(account)
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                stats = ImportStats(errors=1, error_messages=[str(e)])
+            results[path].stats = stats
+        return [results[path] for path, _ in files]
+
+    writers = {}
+    writes = []
+    try:
+        # Workers set Django up themselves in case processes are spawned rather than forked
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            parsing = {pool.submit(parse_stripe_csv, path, chunk_size): (path, account) for path, account in files}
+
+            for future in as_completed(parsing):
+                path, account = parsing[future]
+                try:
+                    chunks, stats = future.result()
+                except (OSError, UnicodeDecodeError, csv.Error) as e:
+                    results[path].stats = ImportStats(errors=1, error_messages=[str(e)])
+                    continue
+
+                results[path].stats = stats
+                # SQLite allows a single writer, so all accounts share one there
+                writer_key = None if connection.vendor == 'sqlite' else account.pk
+                writer = writers.get(writer_key)
+                if writer is None:
+                    writer = writers[writer_key] = ThreadPoolExecutor(
+                        max_workers=1,
+                        thread_name_prefix='stripe-import-writer'
+                    )
+                writes.append((path, writer.submit(_write_parsed_file, chunks, account, stats)))
+
+        for path, future in writes:
+            try:
+                future.result()
+            except Exception as e:
+                # Chunks written before the error stay imported; report the rest per file
+                logger.error(f'Writing Stripe transactions from {path} failed: {e}')
+                results[path].stats.errors += 1
+                results[path].stats.error_messages.append(str(e))
+    finally:
+        for writer in writers.values():
+            writer.shutdown()
+
+    for result in results.values():
+        stats = result.stats
+        logger.info(
+            f'Imported {stats.imported} Stripe transactions from {result.path} into {result.account_id} '
+            f'({stats.skipped} skipped, {stats.errors} errors)'
+        )
+    return [results[path] for path, _ in files]
@@ -0,0 +1,200 @@
+"""
+Stripe running-balance ledger
+
+Keeps one LedgerEntry per transaction with the account balance after it.
+Imports append entries for the transactions they add; a backfill that lands
+before existing entries re-sums the overlapping range and shifts everything
+after it with one UPDATE. Single transactions saved or deleted through the
+ORM are kept in step by the signal handlers, which re-sum their entry and
+shift the later balances the same way.
+Statements then need the balance before the period (one index lookup) and
+the entries inside it (one range scan).
+"""
+from django.db import transaction as db_transaction
+from django.db.models import F, Q
+
+from .models import LedgerEntry, Transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+LEDGER_FIELDS = ('id', 'stripe_created', 'type', 'status', 'amount', 'fee')
+
+
+def ledger_delta(txn_type, status, amount, fee):
+    """Balance change of a transaction in cents, matching the statement rules"""
+    if txn_type == 'charge' and status == 'succeeded':
+        delta = amount
+    elif txn_type in ('refund', 'payout'):
+        delta = -amount
+    else:
+        delta = 0
+    return delta - (fee or 0)
+
+
+def balance_before(account, moment):
+    """Account balance in cents just before ``moment``"""
+    entry = LedgerEntry.objects.filter(
+        account=account,
+        stripe_created__lt=moment
+    ).order_by('-stripe_created', '-transaction_id').values_list('balance', flat=True).first()
+    return entry or 0
+
+
+def _before(stripe_created, transaction_id):
+    """Q for entries ordered before the (stripe_created, transaction) position"""
+    return Q(stripe_created__lt=stripe_created) | Q(stripe_created=stripe_created, transaction_id__lt=transaction_id)
+
+
+def _after(stripe_created, transaction_id):
+    """Q for entries ordered after the (stripe_created, transaction) position"""
+    return Q(stripe_created__gt=stripe_created) | Q(stripe_created=stripe_created, transaction_id__gt=transaction_id)
+
+
+def entries_between(account, start, end):
+    """Ledger entries in the half-open range ``[start, end)`` with their transactions"""
+    return LedgerEntry.objects.filter(
+        account=account,
+        stripe_created__gte=start,
+        stripe_created__lt=end
+    ).select_related('transaction').order_by('stripe_created', 'transaction_id')
+
+
+def shift_balances_after(account_id, stripe_created, transaction_id, change):
+    """Add ``change`` to the balance of every entry after the given position with one UPDATE"""
+    if change:
+        LedgerEntry.objects.filter(
+            _after(stripe_created, transaction_id),
+            account_id=account_id
+        ).update(balance=F('balance') + change)
+
+
+def sync_transaction(txn):
+    """
+    Bring the ledger in line with one transaction after it was saved.
+
+    An edit that keeps the transaction's account and time re-sums its entry
+    in place and shifts the later balances by the difference. A transaction
+    that moved, or has no entry yet, has its old entry taken out and is then
+    inserted by ``sync_ledger`` like a backfilled one.
+    """
+    delta = ledger_delta(txn.type, txn.status, txn.amount, txn.fee)
+    with db_transaction.atomic():
+        entry = LedgerEntry.objects.filter(transaction_id=txn.pk).only(
+            'id', 'account_id', 'stripe_created', 'delta'
+        ).first()
+
+        if entry is not None and (entry.account_id, entry.stripe_created) == (txn.account_id, txn.stripe_created):
+            change = delta - entry.delta
+            if change:
+                LedgerEntry.objects.filter(pk=entry.pk).update(
+                    delta=delta, balance=F('balance') + change
+                )
+                shift_balances_after(entry.account_id, entry.stripe_created, txn.pk, change)
+            return
+
+        if entry is not None:
+            entry.delete()
+            shift_balances_after(entry.account_id, entry.stripe_created, txn.pk, -entry.delta)
+        sync_ledger(txn.account)
+
+
+def sync_ledger(account):
+    """
+    Add ledger entries for all transactions of ``account`` that have none.
+
+    New entries usually come after the existing ones and are simply appended.
+    When they interleave with existing entries (a backfill), the entries in
+    the overlapping range are re-summed and every entry after it is shifted
+    by the net change with a single UPDATE. Picking up every transaction
+    without an entry means an interrupted import is repaired by the next one.
+
+    Callers must be the only writer for the account, e.g. the per-account
+    import writer.
+    """
+    rows = sorted(
+        Transaction.objects.filter(account=account, ledger_entry__isnull=True).values_list(*LEDGER_FIELDS),
+        key=lambda row: (row[1], row[0])
+    )
+    if not rows:
+        return 0
+
+    first_id, first_created = rows[0][0], rows[0][1]
+    last_id, last_created = rows[-1][0], rows[-1][1]
+
+    with db_transaction.atomic():
+        balance = LedgerEntry.objects.filter(
+            _before(first_created, first_id),
+            account=account
+        ).order_by('-stripe_created', '-transaction_id').values_list('balance', flat=True).first() or 0
+
+        overlap = list(LedgerEntry.objects.filter(
+            _after(first_created, first_id),
+            _before(last_created, last_id),
+            account=account
+        ).order_by('stripe_created', 'transaction_id').only('id', 'transaction_id', 'stripe_created', 'delta', 'balance'))
+
+        new_entries = []
+        changed = []
+        net_change = 0
+        position = 0
+        for txn_id, stripe_created, txn_type, status, amount, fee in rows:
+            # Re-sum existing entries that sort before this new one
+            while position < len(overlap) and (
+                (overlap[position].stripe_created, overlap[position].transaction_id) < (stripe_created, txn_id)
+            ):
+                entry = overlap[position]
+                balance += entry.delta
+                if entry.balance != balance:
+                    entry.balance = balance
+                    changed.append(entry)
+                position += 1
+
+            delta = ledger_delta(txn_type, status, amount, fee)
+            balance += delta
+            net_change += delta
+            new_entries.append(LedgerEntry(
+                account=account,
+                transaction_id=txn_id,
+                stripe_created=stripe_created,
+                delta=delta,
+                balance=balance,
+            ))
+
+        LedgerEntry.objects.bulk_create(new_entries, batch_size=1000)
+        LedgerEntry.objects.bulk_update(changed, ['balance'], batch_size=1000)
+
+        shift_balances_after(account.pk, last_created, last_id, net_change)
+
+    logger.info(
+        f'Added {len(new_entries)} ledger entries for {account.account_id} '
+        f'({len(changed)} re-summed)'
+    )
+    return len(new_entries)
+
+
+def rebuild_ledger(account):
+    """Rebuild the whole ledger of an account from its transactions"""
+    with db_transaction.atomic():
+        LedgerEntry.objects.filter(account=account).delete()
+
+        balance = 0
+        entries = []
+        rows = Transaction.objects.filter(account=account).order_by(
+            'stripe_created', 'id'
+        ).values_list(*LEDGER_FIELDS)
+
+        for txn_id, stripe_created, txn_type, status, amount, fee in rows.iterator(chunk_size=2000):
+            delta = ledger_delta(txn_type, status, amount, fee)
+            balance += delta
+            entries.append(LedgerEntry(
+                account=account,
+                transaction_id=txn_id,
+                stripe_created=stripe_created,
+                delta=delta,
+                balance=balance,
+            ))
+        LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+    logger.info(f'Rebuilt Stripe ledger for {account.account_id}: {len(entries)} entries')
+    return len(entries)
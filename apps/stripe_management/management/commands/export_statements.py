@@ -0,0 +1,74 @@
+"""
+Management command to export the monthly statements of a month
+
+Renders every account's statement for the month in each requested format,
+in parallel, and stores the files as generated documents. Exports of the
+current statement version are reused unless --force is given.
+"""
+from django.core.management.base import BaseCommand
+from apps.stripe_management.exports import EXPORT_FORMATS, export_statements
+from apps.stripe_management.models import MonthlyStatement, StripeAccount
+from apps.stripe_management.statements import materialize_statements
+import time
+
+
+class Command(BaseCommand):
+    help = 'Export monthly Stripe statements to CSV, XLSX and/or PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, required=True, help='Year')
+        parser.add_argument('--month', type=int, required=True, help='Month (1-12)')
+        parser.add_argument('--account', type=str, action='append',
+                            help='Account ID to export (repeatable; default: all active accounts)')
+        parser.add_argument('--format', type=str, nargs='+', choices=sorted(EXPORT_FORMATS),
+                            default=sorted(EXPORT_FORMATS), help='Formats to export (default: all)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Render processes (default: CPU count, 0 to run in-process)')
+        parser.add_argument('--force', action='store_true', help='Re-render even if a current export exists')
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+
+        accounts = StripeAccount.objects.filter(is_active=True)
+        if options['account']:
+            accounts = StripeAccount.objects.filter(account_id__in=options['account'])
+            missing = set(options['account']) - set(accounts.values_list('account_id', flat=True))
+            if missing:
+                self.stdout.write(self.style.ERROR(f'Account not found: {", ".join(sorted(missing))}'))
+                return
+
+        # Bring the statements up to date before exporting them
+        for account in accounts:
+            materialize_statements(account)
+
+        statements = list(MonthlyStatement.objects.filter(
+            account__in=accounts, year=year, month=month
+        ).select_related('account').order_by('account__name'))
+        if not statements:
+            self.stdout.write(self.style.WARNING(f'No statements for {year}-{month:02d}'))
+            return
+
+        self.stdout.write(f'Exporting {len(statements)} statements as {", ".join(options["format"])}...')
+        started = time.monotonic()
+        results = export_statements(
+            statements,
+            options['format'],
+            workers=options['workers'],
+            force=options['force'],
+        )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(f'\n{"Account":<30} {"Format":<7} {"Result":<10} File')
+        for result in results:
+            if result.error:
+                self.stdout.write(self.style.ERROR(f'{result.account_name:<30} {result.format:<7} {"failed":<10} {result.error}'))
+                continue
+            outcome = 'cached' if result.reused else 'rendered'
+            self.stdout.write(f'{result.account_name:<30} {result.format:<7} {outcome:<10} {result.document.file.name}')
+
+        failed = sum(1 for result in results if result.error)
+        summary = f'\nExported {len(results) - failed} files in {elapsed:.2f}s'
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{summary} ({failed} failed)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
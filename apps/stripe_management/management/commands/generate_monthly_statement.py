@@ -1,12 +1,16 @@
 """
 Management command to generate monthly statements for Stripe accounts
+
+Balances are read from the running-balance ledger, so the opening balance
+no longer has to be carried over from the previous month by hand.
 """
 from django.core.management.base import BaseCommand
+from django.db.models import F
 from django.utils import timezone
 from datetime import datetime
-from decimal import Decimal
-from apps.stripe_management.models import StripeAccount, Transaction, MonthlyStatement
-import csv
+from apps.core.periods import period_bounds
+from apps.stripe_management.ledger import balance_before, entries_between
+from apps.stripe_management.models import StripeAccount, MonthlyStatement
 
 
 class Command(BaseCommand):
@@ -16,13 +20,17 @@ class Command(BaseCommand):
         parser.add_argument('--year', type=int, required=True, help='Year for the statement')
         parser.add_argument('--month', type=int, required=True, help='Month for the statement (1-12)')
         parser.add_argument('--account', type=str, help='Account name or ID')
-        parser.add_argument('--opening-balance', type=float, default=0, help='Opening balance in HKD')
+        parser.add_argument(
+            '--opening-balance',
+            type=float,
+            default=None,
+            help='Override the ledger opening balance (HKD); later balances are shifted accordingly'
+        )
 
     def handle(self, *args, **options):
         year = options['year']
         month = options['month']
         account_name = options.get('account')
-        opening_balance_cents = int(options.get('opening_balance', 0) * 100)
 
         # Get account
         if account_name:
@@ -43,27 +51,32 @@ class Command(BaseCommand):
         start_date = datetime(year, month, 1)
         last_day = monthrange(year, month)[1]
         end_date = datetime(year, month, last_day, 23, 59, 59)
+        start, end = period_bounds('month', when=timezone.make_aware(start_date))
+
+        ledger_opening = balance_before(account, start)
+        if options.get('opening_balance') is None:
+            opening_balance_cents = ledger_opening
+        else:
+            opening_balance_cents = int(round(options['opening_balance'] * 100))
+        # Ledger balances are absolute; shift them when the opening balance is overridden
+        offset = opening_balance_cents - ledger_opening
 
         self.stdout.write(f'\n{"="*80}')
         self.stdout.write(self.style.SUCCESS(f'Generating Monthly Statement for {account.name}'))
         self.stdout.write(self.style.SUCCESS(f'Period: {start_date.strftime("%B %Y")}'))
         self.stdout.write(f'{"="*80}\n')
 
-        # Get transactions for the month
-        transactions = Transaction.objects.filter(
-            account=account,
-            stripe_created__gte=timezone.make_aware(start_date),
-            stripe_created__lte=timezone.make_aware(end_date)
-        ).order_by('stripe_created')
+        # Get ledger entries for the month
+        entries = list(entries_between(account, start, end))
 
-        txn_count = transactions.count()
+        txn_count = len(entries)
         self.stdout.write(f'Found {txn_count} transaction(s)\n')
 
         # If no transactions, we still generate a statement with opening = closing balance
         if txn_count == 0:
             self.stdout.write(self.style.WARNING(f'No transactions for this period - generating statement with carried forward balance\n'))
 
-        # Calculate statement
+        # Build statement lines from the ledger balances
         running_balance = opening_balance_cents
         total_gross_payments = 0
         total_fees = 0
@@ -73,7 +86,9 @@ class Command(BaseCommand):
         transaction_lines = []
         customer_transactions = []
 
-        for txn in transactions:
+        for entry in entries:
+            txn = entry.transaction
+            balance_after = entry.balance + offset
             line = {
                 'date': txn.stripe_created,
                 'nature': '',
@@ -91,7 +106,6 @@ class Command(BaseCommand):
                 line['nature'] = 'Gross Payment'
                 line['party'] = txn.customer_email or 'Unknown'
                 line['debit'] = txn.amount
-                running_balance += txn.amount
                 total_gross_payments += txn.amount
 
                 # Track customer transaction
@@ -106,18 +120,17 @@ class Command(BaseCommand):
                 line['nature'] = 'Refund'
                 line['party'] = 'Stripe'
                 line['credit'] = txn.amount
-                running_balance -= txn.amount
                 total_refunds += txn.amount
 
             elif txn.type == 'payout':
                 line['nature'] = 'Payout'
                 line['party'] = 'Stripe'
                 line['credit'] = txn.amount
-                running_balance -= txn.amount
                 total_payouts += txn.amount
                 line['description'] = 'BOC(HK)'
 
-            line['balance'] = running_balance
+            # Ledger balances are net of the fee, which gets its own line
+            line['balance'] = balance_after + (txn.fee or 0)
             transaction_lines.append(line)
 
             # Processing fee (separate line after payment)
@@ -132,11 +145,12 @@ class Command(BaseCommand):
                     'description': 'Stripe processing fee',
                     'transaction': txn
                 }
-                running_balance -= txn.fee
                 total_fees += txn.fee
-                fee_line['balance'] = running_balance
+                fee_line['balance'] = balance_after
                 transaction_lines.append(fee_line)
 
+            running_balance = balance_after
+
         closing_balance = running_balance
 
         # Print statement
@@ -233,10 +247,13 @@ class Command(BaseCommand):
                 'total_refunds': total_refunds,
                 'total_fees': total_fees,
                 'total_payouts': total_payouts,
+                'is_dirty': False,
             }
         )
 
+        if not created:
+            # Exports cached for the previous figures are stale now
+            MonthlyStatement.objects.filter(pk=statement.pk).update(version=F('version') + 1)
+
         action = 'Created' if created else 'Updated'
         self.stdout.write(f'\n{self.style.SUCCESS(f"{action} monthly statement in database")}')
-        self.stdout.write(f'\nUse this closing balance as opening balance for next month:')
-        self.stdout.write(self.style.SUCCESS(f'  --opening-balance {closing_balance/100:.2f}'))
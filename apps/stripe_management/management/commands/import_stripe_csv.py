@@ -1,13 +1,23 @@
 """
 Management command to import Stripe transactions from CSV files
+
+Rows are streamed and bulk inserted in chunks; re-running an import skips
+transactions that already exist, so interrupted imports can be resumed.
+
+Pass a directory or a glob pattern to import many files at once. Without
+--account/--create-account each file is assigned to the account whose
+account_id matches its parent directory or the start of its file name,
+e.g. ``exports/acct_hk/2024-01.csv`` or ``acct_hk_2024-01.csv``.
 """
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from apps.stripe_management.models import StripeAccount, Transaction
-import csv
+from apps.stripe_management.importers import (
+    IMPORT_CHUNK_SIZE, import_stripe_csv, import_stripe_csv_files
+)
+from apps.stripe_management.models import StripeAccount
+from apps.stripe_management.statements import materialize_statements
+import glob
 import os
-from datetime import datetime
-from decimal import Decimal
+import time
 
 
 class Command(BaseCommand):
@@ -17,7 +27,7 @@ class Command(BaseCommand):
         parser.add_argument(
             'csv_file',
             type=str,
-            help='Path to CSV file to import'
+            help='Path to CSV file, directory of CSV files or glob pattern to import'
         )
         parser.add_argument(
             '--account',
@@ -29,18 +39,48 @@ class Command(BaseCommand):
             type=str,
             help='Create account with this name if it doesn\'t exist'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help=f'Rows written per transaction (default: {IMPORT_CHUNK_SIZE})'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Parser processes for batch imports (default: CPU count, 0 to run in-process)'
+        )
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
-        account_id = options.get('account')
-        account_name = options.get('create_account')
 
-        # Check if file exists
-        if not os.path.exists(csv_file):
+        if os.path.isfile(csv_file):
+            account = self.get_account(options)
+            if account is None and not (options.get('account') or options.get('create_account')):
+                account = self.match_account(csv_file, StripeAccount.objects.all())
+            if account is None:
+                self.stdout.write(self.style.ERROR('Please specify --account or --create-account'))
+                return
+            self.import_file(csv_file, account, options)
+            return
+
+        if os.path.isdir(csv_file):
+            paths = sorted(glob.glob(os.path.join(csv_file, '**', '*.csv'), recursive=True))
+        else:
+            paths = sorted(glob.glob(csv_file, recursive=True))
+
+        if not paths:
             self.stdout.write(self.style.ERROR(f'File not found: {csv_file}'))
             return
 
-        # Get or create account
+        self.import_batch(paths, options)
+
+    def get_account(self, options):
+        """Resolve --account/--create-account; returns None if neither matches"""
+        account_id = options.get('account')
+        account_name = options.get('create_account')
+
         if account_name:
             account, created = StripeAccount.objects.get_or_create(
                 account_id=account_name.lower().replace(' ', '_'),
@@ -52,110 +92,106 @@ class Command(BaseCommand):
             )
             if created:
                 self.stdout.write(self.style.SUCCESS(f'Created account: {account.name}'))
-        elif account_id:
+            return account
+
+        if account_id:
             try:
-                account = StripeAccount.objects.get(account_id=account_id)
+                return StripeAccount.objects.get(account_id=account_id)
             except StripeAccount.DoesNotExist:
                 self.stdout.write(self.style.ERROR(f'Account not found: {account_id}'))
-                return
-        else:
-            self.stdout.write(self.style.ERROR('Please specify --account or --create-account'))
-            return
+        return None
+
+    def match_account(self, path, accounts):
+        """Find the account for a file from its parent directory or file name"""
+        parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        name = os.path.basename(path)
 
-        # Import CSV
-        imported_count = 0
-        skipped_count = 0
-        error_count = 0
+        # Longest account_id first so 'acct_hk_2' wins over 'acct_hk'
+        for account in sorted(accounts, key=lambda a: len(a.account_id), reverse=True):
+            if parent == account.account_id or name.startswith(account.account_id):
+                return account
+        return None
 
+    def import_file(self, csv_file, account, options):
         self.stdout.write(f'Importing from: {csv_file}')
         self.stdout.write(f'Target account: {account.name}')
 
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            
-            for row in reader:
-                try:
-                    # Skip empty rows
-                    if not row.get('id'):
-                        skipped_count += 1
-                        continue
-
-                    stripe_id = row['id']
-                    
-                    # Check if transaction already exists
-                    if Transaction.objects.filter(stripe_id=stripe_id).exists():
-                        skipped_count += 1
-                        continue
-
-                    # Parse amount (convert to cents)
-                    amount_str = row.get('Converted Amount', row.get('Amount', '0'))
-                    amount = int(float(amount_str or 0) * 100)
-
-                    # Parse fee
-                    fee_str = row.get('Fee', '0')
-                    fee = int(float(fee_str or 0) * 100)
-
-                    # Parse currency
-                    currency = row.get('Converted Currency', row.get('Currency', 'hkd')).lower()
-
-                    # Parse date
-                    date_str = row.get('Created date (UTC)', '')
-                    if date_str:
-                        try:
-                            stripe_created = datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-                            stripe_created = timezone.make_aware(stripe_created, timezone.utc)
-                        except ValueError:
-                            stripe_created = timezone.now()
-                    else:
-                        stripe_created = timezone.now()
-
-                    # Determine status
-                    status_raw = row.get('Status', '').lower()
-                    if status_raw == 'paid':
-                        status = 'succeeded'
-                    elif status_raw == 'canceled':
-                        status = 'canceled'
-                    else:
-                        status = status_raw or 'pending'
-
-                    # Determine type
-                    if row.get('Amount Refunded') and float(row['Amount Refunded'] or 0) > 0:
-                        txn_type = 'refund'
-                    else:
-                        txn_type = 'charge'
-
-                    # Create transaction
-                    Transaction.objects.create(
-                        stripe_id=stripe_id,
-                        account=account,
-                        amount=amount,
-                        fee=fee,
-                        currency=currency,
-                        status=status,
-                        type=txn_type,
-                        stripe_created=stripe_created,
-                        customer_email=row.get('Customer Email', ''),
-                        description=row.get('Description', ''),
-                        stripe_metadata={
-                            'customer_id': row.get('Customer ID', ''),
-                            'card_id': row.get('Card ID', ''),
-                            'invoice_id': row.get('Invoice ID', ''),
-                            'subs_type': row.get('subs_type (metadata)', ''),
-                            'site': row.get('site (metadata)', ''),
-                        }
-                    )
-
-                    imported_count += 1
-
-                    if imported_count % 100 == 0:
-                        self.stdout.write(f'Imported {imported_count} transactions...')
-
-                except Exception as e:
-                    error_count += 1
-                    self.stdout.write(self.style.WARNING(f'Error importing row: {str(e)}'))
-                    continue
+        def report_progress(stats):
+            self.stdout.write(
+                f'Processed {stats.rows} rows, imported {stats.imported} '
+                f'({stats.rows_per_second:.0f} rows/sec)...'
+            )
+
+        stats = import_stripe_csv(
+            csv_file,
+            account,
+            chunk_size=options['chunk_size'],
+            progress=report_progress
+        )
+
+        for message in stats.error_messages:
+            self.stdout.write(self.style.WARNING(f'Error importing row {message}'))
 
         self.stdout.write(self.style.SUCCESS(f'\nImport complete!'))
-        self.stdout.write(f'Imported: {imported_count}')
-        self.stdout.write(f'Skipped: {skipped_count}')
-        self.stdout.write(f'Errors: {error_count}')
+        self.stdout.write(f'Imported: {stats.imported}')
+        self.stdout.write(f'Skipped: {stats.skipped}')
+        self.stdout.write(f'Errors: {stats.errors}')
+        self.stdout.write(f'Time: {stats.elapsed:.2f}s ({stats.rows_per_second:.0f} rows/sec)')
+
+        self.materialize([account])
+
+    def import_batch(self, paths, options):
+        explicit = options.get('account') or options.get('create_account')
+        account = self.get_account(options)
+        if explicit and account is None:
+            return
+
+        files = []
+        accounts = list(StripeAccount.objects.all())
+        for path in paths:
+            file_account = account or self.match_account(path, accounts)
+            if file_account is None:
+                self.stdout.write(self.style.WARNING(f'Skipping {path}: no matching account'))
+                continue
+            files.append((path, file_account))
+
+        if not files:
+            self.stdout.write(self.style.ERROR('No files matched an account'))
+            return
+
+        self.stdout.write(f'Importing {len(files)} files...')
+        started = time.monotonic()
+        results = import_stripe_csv_files(
+            files,
+            workers=options['workers'],
+            chunk_size=options['chunk_size']
+        )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(f'\n{"File":<50} {"Account":<20} {"Imported":>9} {"Skipped":>8} {"Errors":>7}')
+        for result in results:
+            stats = result.stats
+            self.stdout.write(
+                f'{os.path.relpath(result.path):<50} {result.account_id:<20} '
+                f'{stats.imported:>9} {stats.skipped:>8} {stats.errors:>7}'
+            )
+            for message in stats.error_messages[:10]:
+                self.stdout.write(self.style.WARNING(f'    {message}'))
+
+        total_rows = sum(r.stats.rows for r in results)
+        self.stdout.write(self.style.SUCCESS(f'\nImport complete!'))
+        self.stdout.write(f'Imported: {sum(r.stats.imported for r in results)}')
+        self.stdout.write(f'Skipped: {sum(r.stats.skipped for r in results)}')
+        self.stdout.write(f'Errors: {sum(r.stats.errors for r in results)}')
+        self.stdout.write(
+            f'Time: {elapsed:.2f}s ({total_rows / elapsed if elapsed else 0:.0f} rows/sec)'
+        )
+
+        self.materialize({file_account.pk: file_account for _, file_account in files}.values())
+
+    def materialize(self, accounts):
+        """Rebuild the monthly statements touched by the import"""
+        for account in accounts:
+            rebuilt = materialize_statements(account)
+            if rebuilt:
+                self.stdout.write(f'Rebuilt {rebuilt} monthly statements for {account.name}')
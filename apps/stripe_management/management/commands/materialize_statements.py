@@ -0,0 +1,36 @@
+"""
+Management command to rebuild materialized monthly statements
+
+Only months marked dirty by imports or transaction edits are recomputed;
+balances are then carried forward through the later months.
+"""
+from django.core.management.base import BaseCommand
+from apps.stripe_management.models import MonthlyStatement, StripeAccount
+from apps.stripe_management.statements import materialize_statements
+
+
+class Command(BaseCommand):
+    help = 'Rebuild dirty monthly statements for Stripe accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=str, help='Account ID to rebuild (default: all accounts)')
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Mark every statement dirty first, forcing a full rebuild'
+        )
+
+    def handle(self, *args, **options):
+        accounts = StripeAccount.objects.all()
+        if options.get('account'):
+            accounts = accounts.filter(account_id=options['account'])
+            if not accounts.exists():
+                self.stdout.write(self.style.ERROR(f'Account not found: {options["account"]}'))
+                return
+
+        if options['all']:
+            MonthlyStatement.objects.filter(account__in=accounts).update(is_dirty=True)
+
+        for account in accounts:
+            rebuilt = materialize_statements(account)
+            self.stdout.write(self.style.SUCCESS(f'{account.name}: {rebuilt} statements rebuilt'))
@@ -0,0 +1,30 @@
+"""
+Management command to rebuild the per-day Stripe aggregates
+
+Imports and transaction edits keep the aggregates up to date; run this once
+for transactions imported before the aggregates existed.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from apps.stripe_management.aggregates import rebuild_daily_aggregates
+from apps.stripe_management.models import StripeAccount
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-day transaction aggregates for Stripe accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=str, help='Account ID to rebuild (default: all accounts)')
+
+    def handle(self, *args, **options):
+        accounts = StripeAccount.objects.all()
+        if options.get('account'):
+            accounts = accounts.filter(account_id=options['account'])
+            if not accounts.exists():
+                self.stdout.write(self.style.ERROR(f'Account not found: {options["account"]}'))
+                return
+
+        for account in accounts:
+            with transaction.atomic():
+                count = rebuild_daily_aggregates(account)
+            self.stdout.write(self.style.SUCCESS(f'{account.name}: {count} daily aggregates'))
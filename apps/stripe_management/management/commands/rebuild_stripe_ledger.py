@@ -0,0 +1,28 @@
+"""
+Management command to rebuild the running-balance ledger for Stripe accounts
+
+Imports keep the ledger up to date; run this once for transactions imported
+before the ledger existed, or after editing transactions by hand.
+"""
+from django.core.management.base import BaseCommand
+from apps.stripe_management.ledger import rebuild_ledger
+from apps.stripe_management.models import StripeAccount
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the running-balance ledger for Stripe accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--account', type=str, help='Account ID to rebuild (default: all accounts)')
+
+    def handle(self, *args, **options):
+        accounts = StripeAccount.objects.all()
+        if options.get('account'):
+            accounts = accounts.filter(account_id=options['account'])
+            if not accounts.exists():
+                self.stdout.write(self.style.ERROR(f'Account not found: {options["account"]}'))
+                return
+
+        for account in accounts:
+            count = rebuild_ledger(account)
+            self.stdout.write(self.style.SUCCESS(f'{account.name}: {count} ledger entries'))
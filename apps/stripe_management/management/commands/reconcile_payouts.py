@@ -0,0 +1,74 @@
+"""
+Management command to reconcile Stripe payouts against bank statements
+
+Imports bank statement CSVs (optional) and links each payout of the period
+to the bank credit of the same amount within a few days of it. Statements
+whose payouts are all matched are marked reconciled.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.stripe_management.models import StripeAccount
+from apps.stripe_management.reconciliation import DEFAULT_MATCH_WINDOW_DAYS, import_bank_csv, reconcile_payouts
+from apps.stripe_management.statements import month_bounds, next_month
+
+
+class Command(BaseCommand):
+    help = 'Import bank statement CSVs and match Stripe payouts to bank credits'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bank-csv', type=str, action='append', default=[],
+                          help='Bank statement CSV to import first (repeatable)')
+        parser.add_argument('--account', type=str, action='append',
+                          help='Account name (repeatable; default: all active accounts)')
+        parser.add_argument('--year', type=int, required=True, help='Year')
+        parser.add_argument('--month', type=int, help='Month (1-12; default: the whole year)')
+        parser.add_argument('--window', type=int, default=DEFAULT_MATCH_WINDOW_DAYS,
+                          help=f'Maximum days between payout and bank value date (default: {DEFAULT_MATCH_WINDOW_DAYS})')
+        parser.add_argument('--dry-run', action='store_true',
+                          help='Show the matches without saving them')
+
+    def handle(self, *args, **options):
+        if options['account']:
+            accounts = list(StripeAccount.objects.filter(name__in=options['account']))
+            missing = set(options['account']) - {account.name for account in accounts}
+            if missing:
+                self.stdout.write(self.style.ERROR(f'Account "{", ".join(sorted(missing))}" not found'))
+                return
+        else:
+            accounts = list(StripeAccount.objects.filter(is_active=True))
+
+        # Bank lines are tied to an account only when importing for exactly one
+        bank_account = accounts[0] if options['account'] and len(accounts) == 1 else None
+        for csv_file in options['bank_csv']:
+            stats = import_bank_csv(csv_file, account=bank_account)
+            self.stdout.write(f'{csv_file}: {stats.imported} lines imported, {stats.skipped} skipped, {stats.errors} errors')
+            for message in stats.error_messages[:10]:
+                self.stdout.write(self.style.WARNING(f'  {message}'))
+
+        year, month = options['year'], options['month']
+        if month:
+            start, end = month_bounds(year, month)
+        else:
+            start, end = month_bounds(year, 1)[0], month_bounds(*next_month(year, 12))[0]
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No matches will be saved\n'))
+
+        for account in accounts:
+            result = reconcile_payouts(account, start, end, window_days=options['window'], dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(
+                f'\n{account.name}: {len(result.matches)} matched, {len(result.unmatched_payouts)} unmatched payouts'
+            ))
+            for payout in result.unmatched_payouts:
+                self.stdout.write(
+                    f'  Unmatched payout {payout.stripe_id} '
+                    f'{timezone.localtime(payout.stripe_created):%Y-%m-%d} HK${payout.amount/100:,.2f}'
+                )
+            for period in result.reconciled_months:
+                self.stdout.write(f'  Statement {period[0]}-{period[1]:02d} reconciled')
+
+            first_day, last_day = timezone.localtime(start).date(), timezone.localtime(end).date()
+            for line in result.unmatched_lines:
+                if not first_day <= line.value_date < last_day:
+                    continue
+                self.stdout.write(f'  Unmatched bank credit {line.value_date} HK${line.amount/100:,.2f} {line.description}')
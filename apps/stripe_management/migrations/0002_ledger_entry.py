@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stripe_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stripe_created', models.DateTimeField(help_text='Transaction time from Stripe, copied for range scans')),
+                ('delta', models.IntegerField(help_text='Balance change in cents, net of fees')),
+                ('balance', models.IntegerField(help_text='Account balance in cents after this transaction')),
+                ('account', models.ForeignKey(help_text='Associated Stripe account', on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='stripe_management.stripeaccount')),
+                ('transaction', models.OneToOneField(help_text='Transaction this entry records', on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entry', to='stripe_management.transaction')),
+            ],
+            options={
+                'verbose_name': 'Ledger Entry',
+                'verbose_name_plural': 'Ledger Entries',
+                'db_table': 'stripe_ledger_entries',
+                'ordering': ['stripe_created', 'transaction_id'],
+                'indexes': [models.Index(fields=['account', 'stripe_created', 'transaction'], name='stripe_ledger_account_time_idx')],
+            },
+        ),
+    ]
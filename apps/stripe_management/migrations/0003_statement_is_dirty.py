@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stripe_management', '0002_ledger_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlystatement',
+            name='is_dirty',
+            field=models.BooleanField(default=True, help_text='Transactions in this month changed since the totals were last materialized'),
+        ),
+        migrations.AddIndex(
+            model_name='monthlystatement',
+            index=models.Index(fields=['account', 'is_dirty'], name='stripe_stmt_account_dirty_idx'),
+        ),
+    ]
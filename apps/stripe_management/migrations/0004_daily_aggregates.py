@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stripe_management', '0003_statement_is_dirty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAccountAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='Transaction date in the local timezone')),
+                ('currency', models.CharField(help_text='Currency code', max_length=3)),
+                ('type', models.CharField(choices=[('charge', 'Charge'), ('refund', 'Refund'), ('payout', 'Payout'), ('transfer', 'Transfer'), ('adjustment', 'Adjustment')], help_text='Transaction type', max_length=50)),
+                ('status', models.CharField(choices=[('succeeded', 'Succeeded'), ('pending', 'Pending'), ('failed', 'Failed'), ('refunded', 'Refunded'), ('canceled', 'Canceled')], help_text='Transaction status', max_length=20)),
+                ('count', models.IntegerField(default=0, help_text='Number of transactions')),
+                ('gross', models.BigIntegerField(default=0, help_text='Total amount in cents')),
+                ('fee', models.BigIntegerField(default=0, help_text='Total processing fees in cents')),
+                ('net', models.BigIntegerField(default=0, help_text='Total balance change in cents, net of fees')),
+            ],
+            options={
+                'verbose_name': 'Daily Aggregate',
+                'verbose_name_plural': 'Daily Aggregates',
+                'db_table': 'stripe_daily_aggregates',
+                'ordering': ['day'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account', 'type', 'status', 'stripe_created'], name='stripe_txn_filter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-stripe_created', '-id'], name='stripe_txn_cursor_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyaccountaggregate',
+            name='account',
+            field=models.ForeignKey(help_text='Associated Stripe account', on_delete=django.db.models.deletion.CASCADE, related_name='daily_aggregates', to='stripe_management.stripeaccount'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyaccountaggregate',
+            index=models.Index(fields=['day', 'type', 'status'], name='stripe_daily_day_type_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyaccountaggregate',
+            unique_together={('account', 'day', 'currency', 'type', 'status')},
+        ),
+    ]
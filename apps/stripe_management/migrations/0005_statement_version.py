@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stripe_management', '0004_daily_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlystatement',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented whenever the balances or totals change; keys exported documents'),
+        ),
+    ]
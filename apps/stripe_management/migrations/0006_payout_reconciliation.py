@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 21:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stripe_management', '0005_statement_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankStatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value_date', models.DateField(help_text='Date the credit was booked by the bank')),
+                ('amount', models.IntegerField(help_text='Credited amount in cents')),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('reference', models.CharField(blank=True, help_text='Bank reference', max_length=100)),
+                ('source_file', models.CharField(blank=True, help_text='Statement file the line was imported from', max_length=255)),
+                ('line_hash', models.CharField(help_text='Content hash making re-imports idempotent', max_length=64, unique=True)),
+                ('imported_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(blank=True, help_text='Stripe account paying into this bank account; empty to match any account', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bank_lines', to='stripe_management.stripeaccount')),
+            ],
+            options={
+                'verbose_name': 'Bank Statement Line',
+                'verbose_name_plural': 'Bank Statement Lines',
+                'db_table': 'stripe_bank_lines',
+                'ordering': ['value_date', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PayoutMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_offset', models.IntegerField(help_text='Days between the payout and the bank value date')),
+                ('method', models.CharField(choices=[('unique', 'Unique candidate'), ('assignment', 'Assignment'), ('greedy', 'Greedy'), ('manual', 'Manual')], max_length=20)),
+                ('matched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bank_line', models.OneToOneField(help_text='Matched bank credit', on_delete=django.db.models.deletion.CASCADE, related_name='payout_match', to='stripe_management.bankstatementline')),
+                ('matched_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stripe_payout_matches', to=settings.AUTH_USER_MODEL)),
+                ('payout', models.OneToOneField(help_text='Matched payout transaction', on_delete=django.db.models.deletion.CASCADE, related_name='bank_match', to='stripe_management.transaction')),
+            ],
+            options={
+                'verbose_name': 'Payout Match',
+                'verbose_name_plural': 'Payout Matches',
+                'db_table': 'stripe_payout_matches',
+                'ordering': ['-matched_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bankstatementline',
+            index=models.Index(fields=['value_date', 'amount'], name='stripe_bank_date_amount_idx'),
+        ),
+    ]
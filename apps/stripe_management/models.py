@@ -95,6 +95,8 @@ class Transaction(models.Model):
             models.Index(fields=['-stripe_created']),
             models.Index(fields=['status']),
             models.Index(fields=['type']),
+            models.Index(fields=['account', 'type', 'status', 'stripe_created'], name='stripe_txn_filter_idx'),
+            models.Index(fields=['-stripe_created', '-id'], name='stripe_txn_cursor_idx'),
         ]
 
     def __str__(self):
@@ -124,6 +126,80 @@ class Transaction(models.Model):
         return self.amount - (self.fee or 0)
 
 
+class LedgerEntry(models.Model):
+    """Running balance of a Stripe account after each transaction
+
+    One entry per transaction, ordered by (stripe_created, transaction).
+    ``delta`` is the net effect of the transaction on the balance and
+    ``balance`` the cumulative account balance after it, so the balance at
+    any moment is a single index lookup.
+    """
+    account = models.ForeignKey(
+        StripeAccount,
+        on_delete=models.CASCADE,
+        related_name='ledger_entries',
+        help_text="Associated Stripe account"
+    )
+    transaction = models.OneToOneField(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='ledger_entry',
+        help_text="Transaction this entry records"
+    )
+    stripe_created = models.DateTimeField(help_text="Transaction time from Stripe, copied for range scans")
+    delta = models.IntegerField(help_text="Balance change in cents, net of fees")
+    balance = models.IntegerField(help_text="Account balance in cents after this transaction")
+
+    class Meta:
+        db_table = 'stripe_ledger_entries'
+        ordering = ['stripe_created', 'transaction_id']
+        verbose_name = 'Ledger Entry'
+        verbose_name_plural = 'Ledger Entries'
+        indexes = [
+            models.Index(fields=['account', 'stripe_created', 'transaction'], name='stripe_ledger_account_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.account.account_id} {self.stripe_created:%Y-%m-%d}: {self.balance / 100:.2f}'
+
+
+class DailyAccountAggregate(models.Model):
+    """Per-day transaction totals of a Stripe account
+
+    One row per account, local day, currency, type and status, kept up to
+    date by imports and transaction edits. Totals over any date range are
+    a sum over days instead of a scan over transactions.
+    """
+    account = models.ForeignKey(
+        StripeAccount,
+        on_delete=models.CASCADE,
+        related_name='daily_aggregates',
+        help_text="Associated Stripe account"
+    )
+    day = models.DateField(help_text="Transaction date in the local timezone")
+    currency = models.CharField(max_length=3, help_text="Currency code")
+    type = models.CharField(max_length=50, choices=Transaction.TYPE_CHOICES, help_text="Transaction type")
+    status = models.CharField(max_length=20, choices=Transaction.STATUS_CHOICES, help_text="Transaction status")
+
+    count = models.IntegerField(default=0, help_text="Number of transactions")
+    gross = models.BigIntegerField(default=0, help_text="Total amount in cents")
+    fee = models.BigIntegerField(default=0, help_text="Total processing fees in cents")
+    net = models.BigIntegerField(default=0, help_text="Total balance change in cents, net of fees")
+
+    class Meta:
+        db_table = 'stripe_daily_aggregates'
+        ordering = ['day']
+        verbose_name = 'Daily Aggregate'
+        verbose_name_plural = 'Daily Aggregates'
+        unique_together = ['account', 'day', 'currency', 'type', 'status']
+        indexes = [
+            models.Index(fields=['day', 'type', 'status'], name='stripe_daily_day_type_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.account.account_id} {self.day} {self.type}/{self.status}: {self.count}'
+
+
 class MonthlyStatement(models.Model):
     """Monthly reconciliation statement for Stripe accounts"""
 
@@ -147,6 +223,14 @@ class MonthlyStatement(models.Model):
     total_payouts = models.IntegerField(default=0, help_text="Total payouts in cents")
 
     # Status
+    is_dirty = models.BooleanField(
+        default=True,
+        help_text="Transactions in this month changed since the totals were last materialized"
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text="Incremented whenever the balances or totals change; keys exported documents"
+    )
     is_reconciled = models.BooleanField(default=False, help_text="Whether statement is reconciled")
     reconciled_at = models.DateTimeField(null=True, blank=True)
     reconciled_by = models.ForeignKey(
@@ -171,6 +255,7 @@ class MonthlyStatement(models.Model):
         indexes = [
             models.Index(fields=['year', 'month']),
             models.Index(fields=['is_reconciled']),
+            models.Index(fields=['account', 'is_dirty'], name='stripe_stmt_account_dirty_idx'),
         ]
 
     def __str__(self):
@@ -199,3 +284,77 @@ class MonthlyStatement(models.Model):
     @property
     def total_payouts_formatted(self):
         return self.total_payouts / 100
+
+
+class BankStatementLine(models.Model):
+    """A credit line from an imported bank statement, e.g. a BOC(HK) deposit of a Stripe payout"""
+    account = models.ForeignKey(
+        StripeAccount,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='bank_lines',
+        help_text="Stripe account paying into this bank account; empty to match any account"
+    )
+    value_date = models.DateField(help_text="Date the credit was booked by the bank")
+    amount = models.IntegerField(help_text="Credited amount in cents")
+    description = models.CharField(max_length=255, blank=True)
+    reference = models.CharField(max_length=100, blank=True, help_text="Bank reference")
+    source_file = models.CharField(max_length=255, blank=True, help_text="Statement file the line was imported from")
+    line_hash = models.CharField(max_length=64, unique=True, help_text="Content hash making re-imports idempotent")
+    imported_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'stripe_bank_lines'
+        ordering = ['value_date', 'id']
+        verbose_name = 'Bank Statement Line'
+        verbose_name_plural = 'Bank Statement Lines'
+        indexes = [
+            models.Index(fields=['value_date', 'amount'], name='stripe_bank_date_amount_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.value_date} {self.amount / 100:.2f} {self.description}'
+
+
+class PayoutMatch(models.Model):
+    """Reconciliation link between a Stripe payout and the bank credit it produced"""
+
+    METHOD_CHOICES = [
+        ('unique', 'Unique candidate'),
+        ('assignment', 'Assignment'),
+        ('greedy', 'Greedy'),
+        ('manual', 'Manual'),
+    ]
+
+    payout = models.OneToOneField(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='bank_match',
+        help_text="Matched payout transaction"
+    )
+    bank_line = models.OneToOneField(
+        BankStatementLine,
+        on_delete=models.CASCADE,
+        related_name='payout_match',
+        help_text="Matched bank credit"
+    )
+    day_offset = models.IntegerField(help_text="Days between the payout and the bank value date")
+    method = models.CharField(max_length=20, choices=METHOD_CHOICES)
+    matched_at = models.DateTimeField(default=timezone.now)
+    matched_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stripe_payout_matches'
+    )
+
+    class Meta:
+        db_table = 'stripe_payout_matches'
+        ordering = ['-matched_at']
+        verbose_name = 'Payout Match'
+        verbose_name_plural = 'Payout Matches'
+
+    def __str__(self):
+        return f'{self.payout.stripe_id} -> {self.bank_line}'
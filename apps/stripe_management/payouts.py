@@ -0,0 +1,196 @@
+"""
+Payout simulation
+
+Simulates Stripe's rolling payouts from succeeded charges: each charge's net
+amount (amount minus fee) becomes available N days after the charge, and as
+soon as the available balance reaches the threshold the whole balance is
+paid out.
+
+Charges are loaded once per run as parallel lists of times and integer
+cents. The available balance is a prefix sum over those lists, so each
+payout is found with a binary search for the next threshold crossing
+instead of walking every charge. A multi-year run for several accounts is
+one query plus a few thousand bisections.
+"""
+import datetime
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+
+from .aggregates import add_to_daily_aggregates
+from .ledger import sync_ledger
+from .models import Transaction
+from .statements import mark_transactions_dirty
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTLEMENT_DAYS = 1
+PAYOUT_DESCRIPTION = 'BOC(HK)'
+
+
+@dataclass
+class SimulatedPayout:
+    """A payout the simulation would create"""
+    account: object
+    stripe_created: datetime.datetime
+    amount: int
+    charge_count: int
+    stripe_id: str = ''
+
+
+@dataclass
+class AccountSimulation:
+    """Simulation result of one account"""
+    account: object
+    charge_count: int = 0
+    charge_total: int = 0
+    payouts: list = field(default_factory=list)
+    remaining_balance: int = 0
+
+    @property
+    def payout_total(self):
+        return sum(payout.amount for payout in self.payouts)
+
+
+def load_charges(accounts, start, end):
+    """
+    Succeeded charges of ``accounts`` in ``[start, end)`` as per-account
+    ``(times, nets)`` lists ordered by time, with nets in cents.
+    """
+    charges = {account.pk: ([], []) for account in accounts}
+    rows = Transaction.objects.filter(
+        account__in=list(charges),
+        type='charge',
+        status='succeeded',
+        stripe_created__gte=start,
+        stripe_created__lt=end
+    ).order_by('account_id', 'stripe_created', 'id').values_list('account_id', 'stripe_created', 'amount', 'fee')
+
+    for account_id, stripe_created, amount, fee in rows.iterator(chunk_size=5000):
+        times, nets = charges[account_id]
+        times.append(stripe_created)
+        nets.append(amount - (fee or 0))
+    return charges
+
+
+def simulate_payouts(times, nets, threshold, settlement_days=DEFAULT_SETTLEMENT_DAYS, cutoff=None):
+    """
+    Payouts for one account's charges.
+
+    ``times`` must be sorted. Charges after ``cutoff`` still add to the
+    balance but cannot trigger a payout.
+
+    Returns:
+        (list of (payout time, amount in cents, charge count), remaining balance)
+    """
+    if not nets:
+        return [], 0
+
+    balances = list(accumulate(nets))
+    # Fees can exceed a tiny charge, so the balance is not monotonic. Its
+    # running maximum is, and first reaches a target exactly where the
+    # balance does, so it can be bisected.
+    peaks = list(accumulate(balances, max))
+
+    last = len(nets)
+    if cutoff is not None:
+        last = bisect_left(times, cutoff + datetime.timedelta(microseconds=1))
+
+    settlement = datetime.timedelta(days=settlement_days)
+    payouts = []
+    paid = 0
+    position = 0
+    while position < last:
+        index = bisect_left(peaks, paid + threshold, lo=position, hi=last)
+        if index >= last:
+            break
+        amount = balances[index] - paid
+        payouts.append((times[index] + settlement, amount, index - position + 1))
+        paid = balances[index]
+        position = index + 1
+
+    return payouts, balances[-1] - paid
+
+
+def run_payout_simulation(accounts, start, end, threshold, settlement_days=DEFAULT_SETTLEMENT_DAYS, cutoff=None):
+    """Simulate payouts for every account over ``[start, end)``"""
+    accounts = list(accounts)
+    charges = load_charges(accounts, start, end)
+
+    results = []
+    for account in accounts:
+        times, nets = charges[account.pk]
+        payouts, remaining = simulate_payouts(times, nets, threshold, settlement_days, cutoff)
+
+        result = AccountSimulation(
+            account=account,
+            charge_count=len(nets),
+            charge_total=sum(nets),
+            remaining_balance=remaining,
+        )
+        daily = {}
+        for payout_time, amount, charge_count in payouts:
+            day = timezone.localtime(payout_time).strftime('%Y%m%d')
+            daily[day] = daily.get(day, 0) + 1
+            result.payouts.append(SimulatedPayout(
+                account=account,
+                stripe_created=payout_time,
+                amount=amount,
+                charge_count=charge_count,
+                stripe_id=f'po_sim_{day}_{account.account_id}_{daily[day]:03d}',
+            ))
+        results.append(result)
+    return results
+
+
+def create_payouts(results):
+    """
+    Insert the simulated payouts with a single bulk insert.
+
+    Payout ids are derived from the payout date, so re-running a simulation
+    skips payouts that already exist. The ledger, monthly statements and
+    daily aggregates of the affected accounts are updated afterwards.
+
+    Returns:
+        Number of payouts created
+    """
+    payouts = [payout for result in results for payout in result.payouts]
+    if not payouts:
+        return 0
+
+    with transaction.atomic():
+        existing = set(Transaction.objects.filter(
+            stripe_id__in=[payout.stripe_id for payout in payouts]
+        ).values_list('stripe_id', flat=True))
+        new_payouts = [payout for payout in payouts if payout.stripe_id not in existing]
+
+        transactions = [
+            Transaction(
+                stripe_id=payout.stripe_id,
+                account=payout.account,
+                amount=payout.amount,
+                fee=0,
+                currency='hkd',
+                status='succeeded',
+                type='payout',
+                stripe_created=payout.stripe_created,
+                description=PAYOUT_DESCRIPTION,
+            )
+            for payout in new_payouts
+        ]
+        Transaction.objects.bulk_create(transactions, batch_size=1000, ignore_conflicts=True)
+
+        accounts = {}
+        for txn in transactions:
+            accounts.setdefault(txn.account.pk, (txn.account, []))[1].append(txn)
+        for account, created in accounts.values():
+            mark_transactions_dirty(account, [txn.stripe_created for txn in created])
+            add_to_daily_aggregates(account, created)
+            sync_ledger(account)
+
+    logger.info(f'Created {len(new_payouts)} simulated payouts ({len(existing)} already existed)')
+    return len(new_payouts)
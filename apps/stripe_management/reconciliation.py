@@ -0,0 +1,356 @@
+"""
+Payout reconciliation
+
+Imports bank statement CSVs and links Stripe payouts to the bank credits
+they produced, as described in STRIPE_PAYOUT_RECONCILIATION_FIX.md.
+
+Unmatched bank credits are hashed into ``(amount, value date)`` buckets, so
+the candidates of a payout are a few dictionary lookups, one per day of the
+matching window. Payouts with a single candidate that no other payout
+wants are linked directly. Ambiguous sets, such as several equal payouts
+in the same week, are solved as a small assignment problem that matches as
+many payouts as possible with the least total date difference, falling
+back to greedy nearest-date matching for unusually large sets.
+
+A month's statement is marked reconciled once every payout in it is linked.
+"""
+import csv
+import datetime
+import hashlib
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .importers import parse_cents
+from .models import BankStatementLine, MonthlyStatement, PayoutMatch, Transaction
+from .statements import month_bounds
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MATCH_WINDOW_DAYS = 3
+
+# Components larger than this are matched greedily. The exact assignment
+# has up to payouts << lines states and recurses once per payout.
+MAX_ASSIGNMENT_LINES = 16
+MAX_ASSIGNMENT_PAYOUTS = 16
+MAX_ASSIGNMENT_STATES = 1 << 14
+
+BANK_DATE_COLUMNS = ('Value Date', 'Date', 'Transaction Date', 'Posting Date')
+BANK_AMOUNT_COLUMNS = ('Credit', 'Deposit', 'Amount')
+BANK_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d %b %Y')
+
+
+@dataclass
+class BankImportStats:
+    imported: int = 0
+    skipped: int = 0
+    errors: int = 0
+    error_messages: list = field(default_factory=list)
+
+
+@dataclass
+class ReconciliationResult:
+    """Outcome of matching one account's payouts"""
+    matches: list = field(default_factory=list)
+    unmatched_payouts: list = field(default_factory=list)
+    unmatched_lines: list = field(default_factory=list)
+    reconciled_months: list = field(default_factory=list)
+
+
+def parse_bank_date(value):
+    value = (value or '').strip()
+    for date_format in BANK_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f'Invalid date: {value!r}')
+
+
+def _first(row, columns):
+    for column in columns:
+        if row.get(column, '').strip():
+            return row[column]
+    return ''
+
+
+def bank_line_fields(row):
+    """Model fields for a bank CSV row, or None for debits"""
+    amount = parse_cents(_first(row, BANK_AMOUNT_COLUMNS))
+    if amount <= 0:
+        return None
+    return {
+        'value_date': parse_bank_date(_first(row, BANK_DATE_COLUMNS)),
+        'amount': amount,
+        'description': (row.get('Description') or row.get('Details') or '')[:255],
+        'reference': (row.get('Reference') or row.get('Ref') or '')[:100],
+    }
+
+
+def import_bank_csv(csv_file, account=None):
+    """
+    Import the credit lines of a bank statement CSV.
+
+    Lines are identified by a hash of their content and position among
+    identical lines, so importing the same or an overlapping statement
+    again adds nothing.
+    """
+    stats = BankImportStats()
+    lines = []
+    occurrences = {}
+
+    with open(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+        for line_number, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                fields = bank_line_fields(row)
+            except ValueError as e:
+                stats.errors += 1
+                stats.error_messages.append(f'line {line_number}: {e}')
+                continue
+            if fields is None:
+                stats.skipped += 1
+                continue
+
+            identity = (account.pk if account else None, fields['value_date'].isoformat(), fields['amount'],
+                        fields['description'], fields['reference'])
+            occurrence = occurrences[identity] = occurrences.get(identity, 0) + 1
+            digest = hashlib.sha256(repr(identity + (occurrence,)).encode()).hexdigest()
+            lines.append(BankStatementLine(
+                account=account,
+                source_file=os.path.basename(csv_file),
+                line_hash=digest,
+                **fields
+            ))
+
+    existing = set(BankStatementLine.objects.filter(
+        line_hash__in=[line.line_hash for line in lines]
+    ).values_list('line_hash', flat=True))
+    new_lines = [line for line in lines if line.line_hash not in existing]
+    BankStatementLine.objects.bulk_create(new_lines, batch_size=1000, ignore_conflicts=True)
+
+    stats.imported = len(new_lines)
+    stats.skipped += len(lines) - len(new_lines)
+    logger.info(f'Imported {stats.imported} bank lines from {csv_file} ({stats.skipped} skipped, {stats.errors} errors)')
+    return stats
+
+
+def candidate_pairs(payouts, lines, window_days):
+    """
+    Feasible (payout, line, day offset) pairs via (amount, date) buckets.
+
+    ``payouts`` are (key, amount, date) and ``lines`` (key, amount, date).
+    """
+    buckets = {}
+    for line_key, amount, value_date in lines:
+        buckets.setdefault((amount, value_date), []).append(line_key)
+
+    pairs = []
+    for payout_key, amount, payout_date in payouts:
+        for offset in range(-window_days, window_days + 1):
+            for line_key in buckets.get((amount, payout_date + datetime.timedelta(days=offset)), ()):
+                pairs.append((payout_key, line_key, offset))
+    return pairs
+
+
+def _components(pairs):
+    """Group pairs into connected components of the payout/line graph"""
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for payout_key, line_key, _ in pairs:
+        parent[find(('p', payout_key))] = find(('l', line_key))
+
+    components = {}
+    for pair in pairs:
+        components.setdefault(find(('p', pair[0])), []).append(pair)
+    return list(components.values())
+
+
+def _assign(pairs):
+    """
+    Matching of one component with the most pairs, then the smallest total
+    |offset|. Exact over a bitmask of used lines for small components.
+    """
+    payout_keys = sorted({pair[0] for pair in pairs})
+    line_keys = sorted({pair[1] for pair in pairs})
+    if (
+        len(line_keys) > MAX_ASSIGNMENT_LINES
+        or len(payout_keys) > MAX_ASSIGNMENT_PAYOUTS
+        or len(payout_keys) << len(line_keys) > MAX_ASSIGNMENT_STATES
+    ):
+        return _greedy(pairs), 'greedy'
+
+    line_bits = {key: 1 << index for index, key in enumerate(line_keys)}
+    options = {key: [] for key in payout_keys}
+    for payout_key, line_key, offset in pairs:
+        options[payout_key].append((line_key, offset))
+
+    @lru_cache(maxsize=None)
+    def best(index, used):
+        """(matched count, -total offset, chosen pairs) for payouts[index:]"""
+        if index == len(payout_keys):
+            return 0, 0, ()
+        payout_key = payout_keys[index]
+        result = best(index + 1, used)
+        for line_key, offset in options[payout_key]:
+            bit = line_bits[line_key]
+            if used & bit:
+                continue
+            count, cost, chosen = best(index + 1, used | bit)
+            candidate = (count + 1, cost - abs(offset), ((payout_key, line_key, offset),) + chosen)
+            if candidate[:2] > result[:2]:
+                result = candidate
+        return result
+
+    return list(best(0, 0)[2]), 'assignment'
+
+
+def _greedy(pairs):
+    """Nearest-date first matching"""
+    chosen = []
+    used_payouts = set()
+    used_lines = set()
+    for payout_key, line_key, offset in sorted(pairs, key=lambda pair: (abs(pair[2]), pair[2], pair[0], pair[1])):
+        if payout_key in used_payouts or line_key in used_lines:
+            continue
+        used_payouts.add(payout_key)
+        used_lines.add(line_key)
+        chosen.append((payout_key, line_key, offset))
+    return chosen
+
+
+def match_pairs(payouts, lines, window_days=DEFAULT_MATCH_WINDOW_DAYS):
+    """
+    Match payouts to bank lines.
+
+    Returns:
+        List of (payout key, line key, day offset, method)
+    """
+    matches = []
+    for component in _components(candidate_pairs(payouts, lines, window_days)):
+        if len(component) == 1:
+            payout_key, line_key, offset = component[0]
+            matches.append((payout_key, line_key, offset, 'unique'))
+            continue
+        chosen, method = _assign(component)
+        matches.extend((payout_key, line_key, offset, method) for payout_key, line_key, offset in chosen)
+    return matches
+
+
+def reconcile_payouts(account, start, end, window_days=DEFAULT_MATCH_WINDOW_DAYS, user=None, dry_run=False):
+    """
+    Link the unmatched payouts of ``account`` in ``[start, end)`` to
+    unmatched bank credits and update the reconciliation status of the
+    statements of the months the period covers.
+    """
+    payouts = list(Transaction.objects.filter(
+        account=account,
+        type='payout',
+        status='succeeded',
+        stripe_created__gte=start,
+        stripe_created__lt=end,
+        bank_match__isnull=True,
+    ).order_by('stripe_created', 'id'))
+
+    first_day = timezone.localtime(start).date() - datetime.timedelta(days=window_days)
+    last_day = timezone.localtime(end).date() + datetime.timedelta(days=window_days)
+    # Lines imported without an account can match any account's payouts
+    lines = list(BankStatementLine.objects.filter(
+        Q(account=account) | Q(account__isnull=True),
+        value_date__gte=first_day,
+        value_date__lte=last_day,
+        payout_match__isnull=True,
+    ).order_by('value_date', 'id'))
+
+    payouts_by_id = {payout.pk: payout for payout in payouts}
+    lines_by_id = {line.pk: line for line in lines}
+    pairs = match_pairs(
+        [(payout.pk, payout.amount, timezone.localtime(payout.stripe_created).date()) for payout in payouts],
+        [(line.pk, line.amount, line.value_date) for line in lines],
+        window_days,
+    )
+
+    result = ReconciliationResult()
+    result.matches = [
+        PayoutMatch(
+            payout=payouts_by_id[payout_id],
+            bank_line=lines_by_id[line_id],
+            day_offset=offset,
+            method=method,
+            matched_by=user,
+        )
+        for payout_id, line_id, offset, method in pairs
+    ]
+    matched_payouts = {payout_id for payout_id, _, _, _ in pairs}
+    matched_lines = {line_id for _, line_id, _, _ in pairs}
+    result.unmatched_payouts = [payout for payout in payouts if payout.pk not in matched_payouts]
+    result.unmatched_lines = [line for line in lines if line.pk not in matched_lines]
+
+    if dry_run:
+        return result
+
+    with transaction.atomic():
+        PayoutMatch.objects.bulk_create(result.matches, batch_size=1000)
+        result.reconciled_months = update_reconciliation_status(account, start, end, user=user)
+
+    logger.info(
+        f'Matched {len(result.matches)} payouts for {account.account_id} '
+        f'({len(result.unmatched_payouts)} unmatched payouts, {len(result.unmatched_lines)} unmatched bank lines)'
+    )
+    return result
+
+
+def update_reconciliation_status(account, start, end, user=None):
+    """
+    Set ``is_reconciled`` on the statements of the months in ``[start, end)``
+    from whether all their payouts are matched.
+
+    Returns:
+        (year, month) of the statements newly marked reconciled
+    """
+    statements = MonthlyStatement.objects.filter(account=account).select_for_update()
+    local_start = timezone.localtime(start)
+    local_end = timezone.localtime(end - datetime.timedelta(microseconds=1))
+    months = []
+    year, month = local_start.year, local_start.month
+    while (year, month) <= (local_end.year, local_end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    newly_reconciled = []
+    now = timezone.now()
+    for statement in statements.filter(year__in={y for y, _ in months}):
+        if (statement.year, statement.month) not in months:
+            continue
+        month_start, month_end = month_bounds(statement.year, statement.month)
+        unmatched = Transaction.objects.filter(
+            account=account,
+            type='payout',
+            status='succeeded',
+            stripe_created__gte=month_start,
+            stripe_created__lt=month_end,
+            bank_match__isnull=True,
+        ).exists()
+
+        if not unmatched and not statement.is_reconciled:
+            statement.is_reconciled = True
+            statement.reconciled_at = now
+            statement.reconciled_by = user
+            statement.save(update_fields=['is_reconciled', 'reconciled_at', 'reconciled_by', 'updated_at'])
+            newly_reconciled.append((statement.year, statement.month))
+        elif unmatched and statement.is_reconciled:
+            statement.is_reconciled = False
+            statement.reconciled_at = None
+            statement.reconciled_by = None
+            statement.save(update_fields=['is_reconciled', 'reconciled_at', 'reconciled_by', 'updated_at'])
+    return newly_reconciled
@@ -0,0 +1,84 @@
+"""
+Signal handlers keeping the ledger, materialized statements and daily
+aggregates in sync with transactions.
+
+Bulk imports bypass these and update both themselves.
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .aggregates import aggregate_day, refresh_daily_aggregates
+from .ledger import shift_balances_after, sync_transaction
+from .models import LedgerEntry, StripeAccount, Transaction
+from .statements import mark_transactions_dirty
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_day(sender, instance, **kwargs):
+    """Keep the day the transaction was counted on before an edit"""
+    instance._previous_day = None
+    if instance.pk:
+        previous = Transaction.objects.filter(pk=instance.pk).values_list('stripe_created', flat=True).first()
+        if previous is not None:
+            instance._previous_day = aggregate_day(previous)
+
+
+@receiver(post_save, sender=Transaction)
+def sync_ledger_on_save(sender, instance, **kwargs):
+    """Re-sum the transaction's ledger entry and shift the balances after it"""
+    sync_transaction(instance)
+
+
+@receiver(post_save, sender=Transaction)
+def mark_statement_dirty_on_save(sender, instance, **kwargs):
+    """Flag the transaction's month for rebuild when it changes"""
+    mark_transactions_dirty(instance.account, [instance.stripe_created])
+
+
+@receiver(post_save, sender=Transaction)
+def refresh_aggregates_on_save(sender, instance, **kwargs):
+    """Recompute the days the transaction was and is counted on"""
+    days = {aggregate_day(instance.stripe_created)}
+    if getattr(instance, '_previous_day', None):
+        days.add(instance._previous_day)
+    refresh_daily_aggregates(instance.account, days)
+
+
+def deleted_with_account(origin):
+    """Whether a delete cascades from its account, whose statements go too"""
+    if isinstance(origin, StripeAccount):
+        return True
+    return getattr(origin, 'model', None) is StripeAccount
+
+
+@receiver(pre_delete, sender=Transaction)
+def remember_ledger_entry(sender, instance, origin=None, **kwargs):
+    """Keep the ledger entry's delta before it is deleted along with the transaction"""
+    instance._ledger_delta = None
+    if not deleted_with_account(origin):
+        instance._ledger_delta = LedgerEntry.objects.filter(
+            transaction_id=instance.pk
+        ).values_list('delta', flat=True).first()
+
+
+@receiver(post_delete, sender=Transaction)
+def shift_ledger_on_delete(sender, instance, **kwargs):
+    """Take the deleted transaction out of the balances after it"""
+    if getattr(instance, '_ledger_delta', None):
+        shift_balances_after(instance.account_id, instance.stripe_created, instance.pk, -instance._ledger_delta)
+
+
+@receiver(post_delete, sender=Transaction)
+def mark_statement_dirty_on_delete(sender, instance, origin=None, **kwargs):
+    """Flag the transaction's month for rebuild when it is deleted"""
+    if deleted_with_account(origin):
+        return
+    mark_transactions_dirty(instance.account, [instance.stripe_created])
+
+
+@receiver(post_delete, sender=Transaction)
+def refresh_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    """Recompute the day the transaction was counted on"""
+    if deleted_with_account(origin):
+        return
+    refresh_daily_aggregates(instance.account, [aggregate_day(instance.stripe_created)])
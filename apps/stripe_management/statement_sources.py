@@ -0,0 +1,210 @@
+"""
+Pluggable statement sources
+
+``generate_statement`` asks each backend listed in the
+STRIPE_STATEMENT_SOURCES setting for a statement and falls back to the
+database ledger when none has one. A source returns ``None`` when it has no
+data for the account and month, or a dict of cents amounts::
+
+    {
+        'opening_balance': 12345,
+        'closing_balance': 23456,
+        'transactions': [
+            {'date': datetime, 'nature': 'Gross Payment', 'party': '...',
+             'debit': 1000, 'credit': 0, 'description': '...', 'stripe_id': '...'},
+        ],
+    }
+
+The built-in CsvStatementSource reads Stripe balance history exports from
+the STRIPE_CSV_STATEMENT_DIR directory.
+"""
+import csv
+import datetime
+import os
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .importers import parse_cents
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATEMENT_SOURCES = ['apps.stripe_management.statement_sources.CsvStatementSource']
+
+# Account names whose export files use a different company code
+DEFAULT_COMPANY_CODES = {
+    'CGGE Media': 'cgge',
+    'Krystal Institute': 'krystal_institute',
+    'Krystal Technology': 'krystal_technology',
+}
+
+CSV_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M')
+
+
+class StatementSource:
+    """Base class for statement backends"""
+
+    def get_statement(self, account, year, month):
+        return None
+
+
+class CsvStatementSource(StatementSource):
+    """
+    Statements from a directory of Stripe balance history CSV exports.
+
+    Files for an account are ``<code>*.csv`` or ``<code>/*.csv`` where the
+    code comes from STRIPE_CSV_COMPANY_CODES or is the account_id. Each
+    account's files are parsed once into a per-month index; the index is
+    rebuilt only when a file is added, removed or modified.
+    """
+
+    def __init__(self, directory=None, company_codes=None):
+        self.directory = directory or getattr(settings, 'STRIPE_CSV_STATEMENT_DIR', None)
+        self.company_codes = company_codes or getattr(settings, 'STRIPE_CSV_COMPANY_CODES', DEFAULT_COMPANY_CODES)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get_statement(self, account, year, month):
+        if not self.directory or not os.path.isdir(self.directory):
+            return None
+
+        code = self.company_codes.get(account.name, account.account_id)
+        index = self.get_index(code)
+        if index is None or (year, month) not in index['months']:
+            return None
+
+        lines = index['months'][(year, month)]
+        opening = index['opening'][(year, month)]
+        return {
+            'opening_balance': opening,
+            'closing_balance': opening + sum(line['debit'] - line['credit'] for line in lines),
+            'transactions': lines,
+        }
+
+    def get_files(self, code):
+        paths = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.startswith(code) and entry.name.endswith('.csv'):
+                paths.append(entry.path)
+            elif entry.is_dir() and entry.name == code:
+                paths.extend(
+                    sub.path for sub in os.scandir(entry.path)
+                    if sub.is_file() and sub.name.endswith('.csv')
+                )
+        return sorted(paths)
+
+    def get_index(self, code):
+        """Per-month index of the company's files, rebuilt when their mtimes change"""
+        paths = self.get_files(code)
+        if not paths:
+            return None
+
+        signature = tuple((path, os.stat(path).st_mtime_ns) for path in paths)
+        with self._lock:
+            cached = self._cache.get(code)
+            if cached and cached['signature'] == signature:
+                return cached
+
+            index = build_month_index(paths)
+            index['signature'] = signature
+            self._cache[code] = index
+            logger.info(f'Indexed {len(paths)} Stripe CSV files for {code} ({len(index["months"])} months)')
+            return index
+
+
+def parse_csv_date(value):
+    for date_format in CSV_DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).replace(tzinfo=datetime.timezone.utc)
+        except ValueError:
+            continue
+    raise ValueError(f'Invalid date: {value!r}')
+
+
+def balance_lines(row):
+    """Statement lines (in cents) for one balance history row"""
+    txn_type = (row.get('Type') or row.get('Reporting Category') or '').lower()
+    amount = parse_cents(row.get('Amount'))
+    fee = parse_cents(row.get('Fee'))
+    date = parse_csv_date(row.get('Created (UTC)') or row.get('Created date (UTC)') or '')
+    base = {
+        'date': date,
+        'party': row.get('Customer Email') or 'Stripe',
+        'description': row.get('Description', ''),
+        'stripe_id': row.get('id', ''),
+    }
+
+    if txn_type in ('charge', 'payment'):
+        lines = [dict(base, nature='Gross Payment', debit=amount, credit=0)]
+    elif txn_type in ('refund', 'payment_refund'):
+        lines = [dict(base, nature='Refund', party='Stripe', debit=0, credit=-amount)]
+    elif txn_type == 'payout':
+        lines = [dict(base, nature='Payout', party='Stripe', debit=0, credit=-amount)]
+    elif txn_type in ('payout_failure', 'payout_cancel'):
+        lines = [dict(base, nature='Payout Reversal', party='Stripe', debit=amount, credit=0)]
+    else:
+        lines = [dict(base, nature='Adjustment', party='Stripe', debit=max(amount, 0), credit=max(-amount, 0))]
+
+    if fee:
+        lines.append(dict(
+            base, nature='Processing Fee', party='Stripe', debit=0, credit=fee,
+            description='Stripe processing fee'
+        ))
+    return lines
+
+
+def build_month_index(paths):
+    """Parse export files into statement lines grouped by local month, with opening balances"""
+    lines = []
+    seen = set()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                stripe_id = row.get('id')
+                # Overlapping exports repeat rows
+                if not stripe_id or stripe_id in seen:
+                    continue
+                seen.add(stripe_id)
+                try:
+                    lines.extend(balance_lines(row))
+                except ValueError as e:
+                    logger.warning(f'Skipping Stripe CSV row {stripe_id} in {path}: {e}')
+
+    lines.sort(key=lambda line: line['date'])
+
+    months = {}
+    for line in lines:
+        local = timezone.localtime(line['date'])
+        months.setdefault((local.year, local.month), []).append(line)
+
+    opening = {}
+    balance = 0
+    for key in sorted(months):
+        opening[key] = balance
+        balance += sum(line['debit'] - line['credit'] for line in months[key])
+
+    return {'months': months, 'opening': opening}
+
+
+@lru_cache(maxsize=None)
+def get_statement_sources():
+    """Instantiate the configured sources once per process"""
+    paths = getattr(settings, 'STRIPE_STATEMENT_SOURCES', DEFAULT_STATEMENT_SOURCES)
+    return [import_string(path)() for path in paths]
+
+
+def get_source_statement(account, year, month):
+    """First statement any configured source has for the account and month"""
+    for source in get_statement_sources():
+        try:
+            statement = source.get_statement(account, year, month)
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            logger.warning(f'{type(source).__name__} failed for {account.account_id} {year}-{month:02d}: {e}')
+            continue
+        if statement is not None:
+            return statement
+    return None
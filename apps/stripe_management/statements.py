@@ -0,0 +1,172 @@
+"""
+Monthly statement materialization
+
+Imports and transaction edits mark the affected months dirty. The
+materializer then rebuilds only the dirty months of an account, each with a
+single aggregate query, and carries every closing balance forward into the
+next month's opening balance. Clean months after a rebuilt one only have
+their balances shifted, so a late transaction in an old month costs one
+aggregate plus a cheap pass over the later statements. An account's first
+statement opens with the sum of the transactions before it, so statements
+never depend on the ledger.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from apps.core.periods import period_bounds
+from .models import MonthlyStatement, StripeAccount, Transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_BALANCE_FIELDS = ['opening_balance', 'closing_balance', 'version']
+STATEMENT_TOTAL_FIELDS = ['total_charges', 'total_refunds', 'total_fees', 'total_payouts', 'is_dirty']
+
+
+def month_of(moment):
+    """(year, month) of an aware datetime in the statement timezone"""
+    local = timezone.localtime(moment)
+    return local.year, local.month
+
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def previous_month(year, month):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+
+def month_bounds(year, month):
+    """Half-open [start, end) of a statement month"""
+    return period_bounds('month', when=timezone.make_aware(datetime.datetime(year, month, 1)))
+
+
+def mark_months_dirty(account, months):
+    """Flag the given (year, month) statements for rebuild, creating missing ones"""
+    months = set(months)
+    if not months:
+        return
+
+    period = Q()
+    for year, month in months:
+        period |= Q(year=year, month=month)
+    MonthlyStatement.objects.filter(period, account=account, is_dirty=False).update(is_dirty=True)
+
+    MonthlyStatement.objects.bulk_create(
+        [MonthlyStatement(account=account, year=year, month=month, is_dirty=True) for year, month in months],
+        ignore_conflicts=True
+    )
+
+
+def mark_transactions_dirty(account, moments):
+    """Flag the months containing the given transaction times"""
+    mark_months_dirty(account, {month_of(moment) for moment in moments})
+
+
+def transaction_totals(transactions):
+    """Charge, refund, fee and payout totals of a transaction queryset in one aggregate query"""
+    totals = transactions.aggregate(
+        charges=Sum('amount', filter=Q(type='charge', status='succeeded')),
+        refunds=Sum('amount', filter=Q(type='refund')),
+        payouts=Sum('amount', filter=Q(type='payout')),
+        fees=Sum('fee'),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def net_change(totals):
+    return totals['charges'] - totals['refunds'] - totals['payouts'] - totals['fees']
+
+
+def month_totals(account, year, month):
+    """Charge, refund, fee and payout totals of a month"""
+    start, end = month_bounds(year, month)
+    return transaction_totals(Transaction.objects.filter(
+        account=account,
+        stripe_created__gte=start,
+        stripe_created__lt=end
+    ))
+
+
+def opening_balance(account, year, month):
+    """Account balance at the start of a month, summed from the transactions before it"""
+    start = month_bounds(year, month)[0]
+    return net_change(transaction_totals(Transaction.objects.filter(account=account, stripe_created__lt=start)))
+
+
+def materialize_statements(account):
+    """
+    Rebuild the dirty statements of ``account`` and chain balances forward.
+
+    Returns:
+        Number of months whose totals were recomputed
+    """
+    with transaction.atomic():
+        statements = {
+            (statement.year, statement.month): statement
+            for statement in MonthlyStatement.objects.select_for_update().filter(account=account)
+        }
+        dirty = sorted(key for key, statement in statements.items() if statement.is_dirty)
+        if not dirty:
+            return 0
+
+        year, month = dirty[0]
+        previous = statements.get(previous_month(year, month))
+        if previous is not None:
+            opening = previous.closing_balance
+        else:
+            opening = opening_balance(account, year, month)
+
+        last = max(statements)
+        rebuilt = []
+        shifted = []
+        created = []
+
+        while (year, month) <= last:
+            statement = statements.get((year, month))
+            if statement is None:
+                # Gap month without transactions: carry the balance through
+                statement = MonthlyStatement(account=account, year=year, month=month, is_dirty=True)
+                created.append(statement)
+
+            if statement.is_dirty:
+                totals = month_totals(account, year, month)
+                statement.total_charges = totals['charges']
+                statement.total_refunds = totals['refunds']
+                statement.total_fees = totals['fees']
+                statement.total_payouts = totals['payouts']
+                statement.is_dirty = False
+                statement.version += 1
+                change = net_change(totals)
+                if statement.pk:
+                    rebuilt.append(statement)
+            else:
+                change = statement.closing_balance - statement.opening_balance
+                if statement.opening_balance != opening:
+                    statement.version += 1
+                    shifted.append(statement)
+
+            statement.opening_balance = opening
+            statement.closing_balance = opening + change
+            opening = statement.closing_balance
+            year, month = next_month(year, month)
+
+        MonthlyStatement.objects.bulk_update(rebuilt, STATEMENT_BALANCE_FIELDS + STATEMENT_TOTAL_FIELDS)
+        MonthlyStatement.objects.bulk_update(shifted, STATEMENT_BALANCE_FIELDS)
+        MonthlyStatement.objects.bulk_create(created)
+
+    logger.info(
+        f'Materialized {len(rebuilt) + len(created)} statements for {account.account_id} '
+        f'({len(shifted)} carried forward)'
+    )
+    return len(rebuilt) + len(created)
+
+
+def materialize_all_statements():
+    """Rebuild dirty statements of every account that has any"""
+    accounts = StripeAccount.objects.filter(statements__is_dirty=True).distinct()
+    return {account: materialize_statements(account) for account in accounts}
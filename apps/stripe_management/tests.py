@@ -1,3 +1,600 @@
-from django.test import TestCase
+import csv
+import datetime
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.documents.models import GeneratedDocument
+
+from .aggregates import aggregate_totals, rebuild_daily_aggregates
+from .exports import export_statement, export_statements
+from .importers import import_stripe_csv, import_stripe_csv_files, parse_cents
+from .ledger import balance_before, rebuild_ledger
+from .models import (
+    BankStatementLine, DailyAccountAggregate, LedgerEntry, MonthlyStatement, PayoutMatch, StripeAccount, Transaction,
+)
+from .payouts import create_payouts, run_payout_simulation, simulate_payouts
+from .reconciliation import import_bank_csv, match_pairs, reconcile_payouts
+from .statement_sources import CsvStatementSource, build_month_index
+from .statements import materialize_statements
+
+CSV_HEADER = ['id', 'Created date (UTC)', 'Amount', 'Amount Refunded', 'Currency', 'Fee', 'Status', 'Customer Email']
+
+
+def write_csv(rows):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+    return path
+
+
+class StripeCsvImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+
+    def setUp(self):
+        self.path = write_csv([
+            ['ch_1', '2025-01-02 10:00:00', '100.10', '0', 'HKD', '3.49', 'Paid', 'a@example.com'],
+            ['ch_2', '2025-01-03 10:00:00', '1,234.56', '1234.56', 'HKD', '0', 'Paid', ''],
+            ['', '', '', '', '', '', '', ''],
+            ['ch_3', '2025-01-04 10:00:00', 'oops', '0', 'HKD', '0', 'Failed', ''],
+            ['ch_1', '2025-01-02 10:00:00', '100.10', '0', 'HKD', '3.49', 'Paid', 'a@example.com'],
+        ])
+        self.addCleanup(os.remove, self.path)
+
+    def test_parse_cents_uses_decimal(self):
+        self.assertEqual(parse_cents('0.29'), 29)
+        self.assertEqual(parse_cents('1,234.56'), 123456)
+        self.assertEqual(parse_cents(''), 0)
+
+    def test_import_is_chunked_and_idempotent(self):
+        stats = import_stripe_csv(self.path, self.account, chunk_size=2)
+
+        self.assertEqual((stats.imported, stats.skipped, stats.errors), (2, 2, 1))
+        ch_1 = Transaction.objects.get(stripe_id='ch_1')
+        self.assertEqual((ch_1.amount, ch_1.fee, ch_1.status), (10010, 349, 'succeeded'))
+        self.assertEqual(Transaction.objects.get(stripe_id='ch_2').type, 'refund')
+
+        stats = import_stripe_csv(self.path, self.account, chunk_size=2)
+        self.assertEqual(stats.imported, 0)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_batch_import_reports_per_file(self):
+        other = StripeAccount.objects.create(name='Other', account_id='acct_other', api_key='imported')
+        other_path = write_csv([['ch_9', '2025-02-01 00:00:00', '5.00', '0', 'HKD', '0', 'Paid', '']])
+        self.addCleanup(os.remove, other_path)
+
+        results = import_stripe_csv_files([(self.path, self.account), (other_path, other)], workers=0)
+
+        self.assertEqual([r.path for r in results], [self.path, other_path])
+        self.assertEqual(results[0].stats.imported, 2)
+        self.assertEqual(results[0].stats.errors, 1)
+        self.assertEqual(results[1].stats.imported, 1)
+        self.assertEqual(Transaction.objects.get(stripe_id='ch_9').account, other)
+
+    def test_rows_taken_by_another_account_are_not_counted(self):
+        other = StripeAccount.objects.create(name='Other', account_id='acct_other', api_key='imported')
+        bulk_create = Transaction.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            # The other account's writer inserts ch_1 after this writer looked it up
+            bulk_create([Transaction(
+                account=other, stripe_id='ch_1', amount=500, currency='hkd', status='succeeded', type='charge',
+                stripe_created=datetime.datetime(2025, 1, 2, tzinfo=datetime.timezone.utc),
+            )])
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Transaction.objects, 'bulk_create', side_effect=racing_bulk_create):
+            stats = import_stripe_csv(self.path, self.account)
+
+        self.assertEqual((stats.imported, stats.skipped, stats.errors), (1, 3, 1))
+        self.assertEqual(Transaction.objects.get(stripe_id='ch_1').account, other)
+        self.assertEqual(
+            list(DailyAccountAggregate.objects.filter(account=self.account).values_list('count', flat=True)), [1]
+        )
+        self.assertFalse(DailyAccountAggregate.objects.filter(account=other).exists())
+
+    def test_batch_import_reports_writer_errors_per_file(self):
+        other = StripeAccount.objects.create(name='Other', account_id='acct_other', api_key='imported')
+        other_path = write_csv([['ch_9', '2025-02-01 00:00:00', '5.00', '0', 'HKD', '0', 'Paid', '']])
+        self.addCleanup(os.remove, other_path)
+
+        def write_parsed_file(chunks, account, stats):
+            if account == other:
+                raise DatabaseError('database is locked')
+            stats.imported += 2
+
+        with mock.patch('apps.stripe_management.importers._write_parsed_file', side_effect=write_parsed_file):
+            results = import_stripe_csv_files([(self.path, self.account), (other_path, other)], workers=1)
+
+        self.assertEqual((results[0].stats.imported, results[0].stats.errors), (2, 1))
+        self.assertEqual(results[1].stats.errors, 1)
+        self.assertEqual(results[1].stats.error_messages, ['database is locked'])
+
+
+class LedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+
+    def import_rows(self, rows):
+        path = write_csv(rows)
+        self.addCleanup(os.remove, path)
+        return import_stripe_csv(path, self.account)
+
+    def balances(self):
+        return list(LedgerEntry.objects.filter(account=self.account).values_list('transaction__stripe_id', 'balance'))
+
+    def test_import_appends_running_balances(self):
+        self.import_rows([
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+            ['ch_2', '2025-01-05 10:00:00', '50.00', '0', 'HKD', '1.00', 'Paid', ''],
+        ])
+        self.assertEqual(self.balances(), [('ch_1', 9700), ('ch_2', 14600)])
+
+    def test_backfill_resums_later_entries(self):
+        self.import_rows([
+            ['ch_2', '2025-02-05 10:00:00', '50.00', '0', 'HKD', '1.00', 'Paid', ''],
+            ['ch_4', '2025-03-01 10:00:00', '10.00', '0', 'HKD', '0', 'Paid', ''],
+        ])
+        self.import_rows([
+            ['ch_3', '2025-02-10 10:00:00', '5.00', '0', 'HKD', '0', 'Paid', ''],
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+        ])
+
+        self.assertEqual(self.balances(), [('ch_1', 9700), ('ch_2', 14600), ('ch_3', 15100), ('ch_4', 16100)])
+        self.assertEqual(balance_before(self.account, datetime.datetime(2025, 2, 1, tzinfo=datetime.timezone.utc)), 9700)
+
+    def test_rebuild_matches_incremental(self):
+        self.import_rows([
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+            ['re_1', '2025-01-03 10:00:00', '20.00', '20.00', 'HKD', '0', 'Paid', ''],
+        ])
+        incremental = self.balances()
+        rebuild_ledger(self.account)
+        self.assertEqual(self.balances(), incremental)
+        self.assertEqual(incremental[-1], ('re_1', 7700))
+
+    def test_edits_resum_entry_and_shift_later_balances(self):
+        self.import_rows([
+            ['ch_1', '2025-01-02 10:00:00', '5.00', '0', 'HKD', '0', 'Paid', ''],
+            ['ch_2', '2025-01-05 10:00:00', '10.00', '0', 'HKD', '0', 'Pending', ''],
+            ['ch_3', '2025-02-01 10:00:00', '1.00', '0', 'HKD', '0', 'Paid', ''],
+        ])
+        self.assertEqual(self.balances(), [('ch_1', 500), ('ch_2', 500), ('ch_3', 600)])
+
+        txn = Transaction.objects.get(stripe_id='ch_2')
+        txn.status = 'succeeded'
+        txn.save()
+        self.assertEqual(self.balances(), [('ch_1', 500), ('ch_2', 1500), ('ch_3', 1600)])
+
+        # Moving a transaction re-sums the entries it passes
+        txn.stripe_created = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        txn.save()
+        self.assertEqual(self.balances(), [('ch_2', 1000), ('ch_1', 1500), ('ch_3', 1600)])
+
+        Transaction.objects.get(stripe_id='ch_1').delete()
+        self.assertEqual(self.balances(), [('ch_2', 1000), ('ch_3', 1100)])
+
+        incremental = self.balances()
+        rebuild_ledger(self.account)
+        self.assertEqual(self.balances(), incremental)
+
+    def test_transaction_created_outside_importer_gets_entry(self):
+        self.import_rows([['ch_2', '2025-01-05 10:00:00', '10.00', '0', 'HKD', '0', 'Paid', '']])
+
+        Transaction.objects.create(
+            stripe_id='ch_1', account=self.account, amount=500, fee=20, currency='hkd', status='succeeded',
+            type='charge', stripe_created=datetime.datetime(2025, 1, 2, tzinfo=datetime.timezone.utc),
+        )
+
+        self.assertEqual(self.balances(), [('ch_1', 480), ('ch_2', 1480)])
+
+
+class StatementMaterializationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+
+    def import_rows(self, rows):
+        path = write_csv(rows)
+        self.addCleanup(os.remove, path)
+        return import_stripe_csv(path, self.account)
+
+    def statements(self):
+        return list(MonthlyStatement.objects.filter(account=self.account).order_by('year', 'month').values_list(
+            'month', 'opening_balance', 'total_charges', 'closing_balance', 'is_dirty'
+        ))
+
+    def test_import_marks_months_dirty(self):
+        self.import_rows([['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', '']])
+
+        self.assertEqual(self.statements(), [(1, 0, 0, 0, True)])
+
+    def test_late_transaction_propagates_forward(self):
+        self.import_rows([
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+            ['ch_3', '2025-03-02 10:00:00', '10.00', '0', 'HKD', '0', 'Paid', ''],
+        ])
+        self.assertEqual(materialize_statements(self.account), 3)
+        self.assertEqual(self.statements(), [
+            (1, 0, 10000, 9700, False),
+            (2, 9700, 0, 9700, False),
+            (3, 9700, 1000, 10700, False),
+        ])
+
+        # A late January charge only rebuilds January; later months are shifted
+        self.import_rows([['ch_2', '2025-01-20 10:00:00', '5.00', '0', 'HKD', '0', 'Paid', '']])
+        with self.assertNumQueries(7):
+            self.assertEqual(materialize_statements(self.account), 1)
+        self.assertEqual(self.statements(), [
+            (1, 0, 10500, 10200, False),
+            (2, 10200, 0, 10200, False),
+            (3, 10200, 1000, 11200, False),
+        ])
+
+    def test_first_statement_opens_from_transactions_not_ledger(self):
+        self.import_rows([
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+            ['ch_2', '2025-03-02 10:00:00', '10.00', '0', 'HKD', '0', 'Paid', ''],
+        ])
+        MonthlyStatement.objects.filter(account=self.account, month=1).delete()
+        LedgerEntry.objects.filter(account=self.account).delete()
+
+        materialize_statements(self.account)
+
+        self.assertEqual(self.statements(), [(3, 9700, 1000, 10700, False)])
+
+
+class CsvStatementSourceTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.account = StripeAccount(name='Krystal Institute', account_id='acct_ki', api_key='imported')
+        self.path = os.path.join(self.directory, 'krystal_institute_2025.csv')
+        self.write([
+            ['txn_1', 'charge', '100.00', '3.40', '2025-01-02 10:00:00'],
+            ['txn_2', 'payout', '-96.60', '0', '2025-01-05 10:00:00'],
+            ['txn_3', 'charge', '0.29', '0', '2025-02-01 10:00:00'],
+        ])
+        self.source = CsvStatementSource(directory=self.directory)
+
+    def write(self, rows):
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'Type', 'Amount', 'Fee', 'Created (UTC)'])
+            writer.writerows(rows)
+
+    def test_months_chain_opening_balances(self):
+        january = self.source.get_statement(self.account, 2025, 1)
+        self.assertEqual(
+            [(line['nature'], line['debit'], line['credit']) for line in january['transactions']],
+            [('Gross Payment', 10000, 0), ('Processing Fee', 0, 340), ('Payout', 0, 9660)]
+        )
+        self.assertEqual((january['opening_balance'], january['closing_balance']), (0, 0))
+
+        february = self.source.get_statement(self.account, 2025, 2)
+        self.assertEqual((february['opening_balance'], february['closing_balance']), (0, 29))
+        self.assertIsNone(self.source.get_statement(self.account, 2025, 3))
+
+    def test_index_is_cached_until_file_changes(self):
+        with mock.patch('apps.stripe_management.statement_sources.build_month_index',
+                        wraps=build_month_index) as build:
+            self.source.get_statement(self.account, 2025, 1)
+            self.source.get_statement(self.account, 2025, 2)
+            self.assertEqual(build.call_count, 1)
+
+            self.write([['txn_4', 'charge', '1.00', '0', '2025-03-01 10:00:00']])
+            stat = os.stat(self.path)
+            os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            self.assertEqual(self.source.get_statement(self.account, 2025, 3)['closing_balance'], 100)
+            self.assertEqual(build.call_count, 2)
+
+
+class PayoutSimulationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+
+    def test_threshold_crossings_with_settlement_delay(self):
+        start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        times = [start + datetime.timedelta(hours=hour) for hour in range(5)]
+        # The third charge's fee exceeds its amount
+        nets = [5000, 3000, -100, 2000, 9500]
+
+        payouts, remaining = simulate_payouts(times, nets, threshold=9000, settlement_days=2)
+
+        self.assertEqual(payouts, [
+            (times[3] + datetime.timedelta(days=2), 9900, 4),
+            (times[4] + datetime.timedelta(days=2), 9500, 1),
+        ])
+        self.assertEqual(remaining, 0)
+
+        payouts, remaining = simulate_payouts(times, nets, threshold=9000, cutoff=times[2])
+        self.assertEqual((payouts, remaining), ([], 19400))
+
+    def test_create_payouts_is_idempotent(self):
+        path = write_csv([
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+            ['ch_2', '2025-01-03 10:00:00', '50.00', '0', 'HKD', '0', 'Paid', ''],
+        ])
+        self.addCleanup(os.remove, path)
+        import_stripe_csv(path, self.account)
+        start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+        end = datetime.datetime(2025, 2, 1, tzinfo=datetime.timezone.utc)
+
+        results = run_payout_simulation([self.account], start, end, threshold=5000)
+        self.assertEqual([(p.stripe_id, p.amount) for p in results[0].payouts], [
+            ('po_sim_20250103_acct_test_001', 9700),
+            ('po_sim_20250104_acct_test_001', 5000),
+        ])
+        self.assertEqual(create_payouts(results), 2)
+        self.assertEqual(create_payouts(run_payout_simulation([self.account], start, end, threshold=5000)), 0)
+        self.assertEqual(balance_before(self.account, end), 0)
+
+
+class TransactionBrowserTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+        cls.user = get_user_model().objects.create_user(username='finance', employee_id='F001', password='x')
+        path = write_csv([
+            # ch_1 and ch_2 share a timestamp, so paging relies on the id tiebreak
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+            ['ch_2', '2025-01-02 10:00:00', '50.00', '0', 'HKD', '1.00', 'Paid', ''],
+            ['ch_3', '2025-01-03 10:00:00', '20.00', '0', 'HKD', '0', 'Failed', ''],
+            ['re_1', '2025-01-04 10:00:00', '10.00', '10.00', 'HKD', '0', 'Paid', ''],
+            ['ch_4', '2025-02-01 10:00:00', '5.00', '0', 'HKD', '0', 'Paid', ''],
+        ])
+        import_stripe_csv(path, cls.account)
+        os.remove(path)
+
+    def setUp(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+
+    def test_cursor_pages_cover_every_transaction_once(self):
+        url = reverse('stripe_management:transaction_list')
+        seen = []
+        response = self.client.get(url, {'per_page': 2})
+        while True:
+            seen.extend(txn.stripe_id for txn in response.context['transactions'])
+            if not response.context['next_url']:
+                break
+            response = self.client.get(url + response.context['next_url'])
+
+        self.assertEqual(seen, ['ch_4', 're_1', 'ch_3', 'ch_2', 'ch_1'])
+
+        response = self.client.get(url + response.context['previous_url'])
+        self.assertEqual([txn.stripe_id for txn in response.context['transactions']], ['ch_3', 'ch_2'])
+
+    def test_filtered_totals_come_from_daily_aggregates(self):
+        url = reverse('stripe_management:transaction_list')
+        response = self.client.get(url, {'type': 'charge', 'status': 'succeeded', 'date_to': '2025-01-31'})
+
+        self.assertEqual([txn.stripe_id for txn in response.context['transactions']], ['ch_2', 'ch_1'])
+        self.assertEqual(response.context['totals'], {'count': 2, 'gross': 150.0, 'fee': 4.0, 'net': 146.0})
+
+    def test_aggregates_follow_edits_and_match_rebuild(self):
+        txn = Transaction.objects.get(stripe_id='ch_4')
+        txn.stripe_created = datetime.datetime(2025, 3, 1, 2, tzinfo=datetime.timezone.utc)
+        txn.save()
+        Transaction.objects.get(stripe_id='ch_3').delete()
+
+        incremental = list(DailyAccountAggregate.objects.order_by('day', 'type', 'status').values_list(
+            'day', 'type', 'status', 'count', 'gross', 'fee', 'net'
+        ))
+        rebuild_daily_aggregates(self.account)
+        rebuilt = list(DailyAccountAggregate.objects.order_by('day', 'type', 'status').values_list(
+            'day', 'type', 'status', 'count', 'gross', 'fee', 'net'
+        ))
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(aggregate_totals(date_from=datetime.date(2025, 3, 1))['gross'], 500)
+        self.assertEqual(aggregate_totals(account=self.account)['net'], balance_before(
+            self.account, datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        ))
+
+
+class StripeDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+        cls.user = get_user_model().objects.create_user(username='finance', employee_id='F001', password='x')
+        path = write_csv([
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', ''],
+            ['ch_2', '2025-03-02 10:00:00', '50.00', '0', 'HKD', '1.00', 'Paid', ''],
+            ['ch_3', '2025-03-03 10:00:00', '20.00', '0', 'HKD', '0', 'Failed', ''],
+        ])
+        import_stripe_csv(path, cls.account)
+        os.remove(path)
+
+    def setUp(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+
+    def test_dashboard_totals_read_aggregates(self):
+        with mock.patch('apps.stripe_management.aggregates.timezone.localdate', return_value=datetime.date(2025, 3, 31)):
+            response = self.client.get(reverse('stripe_management:dashboard'))
+
+        self.assertEqual(response.context['total_transactions'], 3)
+        self.assertEqual(response.context['total_revenue'], 150.0)
+        series = response.context['revenue_series']
+        self.assertEqual(len(series), 12)
+        self.assertEqual(series[-3:], [
+            {'month': '2025-01', 'revenue': 100.0, 'fees': 3.0, 'net': 97.0},
+            {'month': '2025-02', 'revenue': 0.0, 'fees': 0.0, 'net': 0.0},
+            {'month': '2025-03', 'revenue': 50.0, 'fees': 1.0, 'net': 49.0},
+        ])
+
+    def test_account_list_counts_from_aggregates(self):
+        response = self.client.get(reverse('stripe_management:account_list'))
+
+        account = response.context['accounts'][0]
+        self.assertEqual((account.transaction_count, account.total_revenue), (3, 150.0))
+
+
+class StatementExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+        path = write_csv([
+            ['ch_1', '2025-01-02 10:00:00', '100.00', '0', 'HKD', '3.00', 'Paid', 'a@example.com'],
+            ['re_1', '2025-01-03 10:00:00', '20.00', '20.00', 'HKD', '0', 'Paid', ''],
+        ])
+        import_stripe_csv(path, cls.account)
+        os.remove(path)
+        materialize_statements(cls.account)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.statement = MonthlyStatement.objects.get(account=self.account, year=2025, month=1)
+
+    def test_csv_export_is_reused_until_statement_changes(self):
+        document, reused = export_statement(self.statement, 'csv')
+        self.assertFalse(reused)
+        content = document.file.read().decode()
+        self.assertIn('Closing balance,77.00', content)
+        self.assertIn('ch_1,Charge,Succeeded,,a@example.com,100.00,3.00,97.00,97.00', content)
+
+        self.assertEqual(export_statement(self.statement, 'csv'), (document, True))
+
+        # A late transaction bumps the version; the stale export is replaced
+        Transaction.objects.create(
+            stripe_id='ch_2', account=self.account, amount=500, fee=0, currency='hkd', status='succeeded',
+            type='charge', stripe_created=datetime.datetime(2025, 1, 5, tzinfo=datetime.timezone.utc),
+        )
+        self.statement.refresh_from_db()
+        new_document, reused = export_statement(self.statement, 'csv')
+        self.assertFalse(reused)
+        self.assertIn(':v2', new_document.cache_key)
+        content = new_document.file.read().decode()
+        self.assertIn('ch_2,Charge,Succeeded,,,5.00,0.00,5.00,82.00', content)
+        self.assertIn('Closing balance,82.00', content)
+        self.assertEqual(GeneratedDocument.objects.filter(cache_key__startswith='stripe_statement:').count(), 1)
+
+    def test_export_lists_transactions_written_around_the_ledger(self):
+        Transaction.objects.bulk_create([Transaction(
+            stripe_id='ch_9', account=self.account, amount=1000, fee=0, currency='hkd', status='succeeded',
+            type='charge', stripe_created=datetime.datetime(2025, 1, 10, tzinfo=datetime.timezone.utc),
+        )])
+        MonthlyStatement.objects.filter(pk=self.statement.pk).update(is_dirty=True)
+        self.statement.refresh_from_db()
+
+        document, _ = export_statement(self.statement, 'csv')
+
+        content = document.file.read().decode()
+        self.assertIn('ch_9,Charge,Succeeded,,,10.00,0.00,10.00,87.00', content)
+        self.assertIn('Closing balance,87.00', content)
+
+    def test_batch_export_reports_each_format(self):
+        results = export_statements([self.statement], ['csv'], workers=0)
+        self.assertEqual([(r.format, r.reused, r.error) for r in results], [('csv', False, '')])
+
+        results = export_statements([self.statement], ['csv'], workers=0)
+        self.assertTrue(results[0].reused)
+
+
+class ReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = StripeAccount.objects.create(name='Test', account_id='acct_test', api_key='imported')
+        for stripe_id, day, amount in [('po_1', 3, 10000), ('po_2', 10, 5000), ('po_3', 11, 5000)]:
+            Transaction.objects.create(
+                stripe_id=stripe_id, account=cls.account, amount=amount, fee=0, currency='hkd',
+                status='succeeded', type='payout',
+                stripe_created=datetime.datetime(2025, 1, day, 2, tzinfo=datetime.timezone.utc),
+            )
+        materialize_statements(cls.account)
+
+    def write_bank_csv(self, rows):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Date', 'Description', 'Debit', 'Credit'])
+            writer.writerows(rows)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_ambiguous_amounts_use_nearest_dates(self):
+        # Equal amounts on consecutive days: nearest-first alone would pair p2 with l1
+        matches = match_pairs(
+            [('p1', 500, datetime.date(2025, 1, 10)), ('p2', 500, datetime.date(2025, 1, 11))],
+            [('l1', 500, datetime.date(2025, 1, 11)), ('l2', 500, datetime.date(2025, 1, 14))],
+            window_days=3,
+        )
+        self.assertEqual(sorted(matches), [('p1', 'l1', 1, 'assignment'), ('p2', 'l2', 3, 'assignment')])
+
+    def test_large_components_fall_back_to_greedy(self):
+        start = datetime.date(2025, 1, 1)
+        # Twelve equal daily payouts and credits: within the line limit, but
+        # 12 << 12 assignment states
+        daily = match_pairs(
+            [(f'p{day}', 500, start + datetime.timedelta(days=day)) for day in range(12)],
+            [(f'l{day}', 500, start + datetime.timedelta(days=day)) for day in range(12)],
+            window_days=3,
+        )
+        self.assertEqual(sorted(daily), sorted((f'p{day}', f'l{day}', 0, 'greedy') for day in range(12)))
+
+        # Many payouts competing for one line would recurse once per payout
+        crowded = match_pairs(
+            [(f'p{index}', 500, start) for index in range(2000)],
+            [('l1', 500, start)],
+            window_days=3,
+        )
+        self.assertEqual(crowded, [('p0', 'l1', 0, 'greedy')])
+
+    def test_import_is_idempotent_and_skips_debits(self):
+        path = self.write_bank_csv([
+            ['04/01/2025', 'STRIPE PAYMENTS', '', '100.00'],
+            ['04/01/2025', 'STRIPE PAYMENTS', '', '100.00'],
+            ['05/01/2025', 'RENT', '2,000.00', ''],
+        ])
+        stats = import_bank_csv(path, account=self.account)
+        self.assertEqual((stats.imported, stats.skipped, stats.errors), (2, 1, 0))
+        self.assertEqual(import_bank_csv(path, account=self.account).imported, 0)
+        self.assertEqual(BankStatementLine.objects.count(), 2)
+
+    def test_reconcile_month_marks_statement(self):
+        path = self.write_bank_csv([
+            ['04/01/2025', 'STRIPE', '', '100.00'],
+            ['11/01/2025', 'STRIPE', '', '50.00'],
+            ['13/01/2025', 'STRIPE', '', '50.00'],
+        ])
+        import_bank_csv(path)
+        start = datetime.datetime(2024, 12, 31, 16, tzinfo=datetime.timezone.utc)
+        end = datetime.datetime(2025, 1, 31, 16, tzinfo=datetime.timezone.utc)
+
+        dry_run = reconcile_payouts(self.account, start, end, dry_run=True)
+        self.assertEqual(len(dry_run.matches), 3)
+        self.assertFalse(PayoutMatch.objects.exists())
+
+        result = reconcile_payouts(self.account, start, end)
+        self.assertEqual(result.reconciled_months, [(2025, 1)])
+        self.assertEqual(
+            sorted(PayoutMatch.objects.values_list('payout__stripe_id', 'day_offset')),
+            [('po_1', 1), ('po_2', 1), ('po_3', 2)],
+        )
+        self.assertTrue(MonthlyStatement.objects.get(account=self.account, year=2025, month=1).is_reconciled)
+
+        # Nothing left to match on a second run
+        self.assertEqual(len(reconcile_payouts(self.account, start, end).matches), 0)
@@ -8,8 +8,10 @@ app_name = 'stripe_management'
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
+    path('revenue-data/', views.revenue_data, name='revenue_data'),
     path('accounts/', views.account_list, name='account_list'),
     path('transactions/', views.transaction_list, name='transaction_list'),
     path('statements/', views.statement_list, name='statement_list'),
     path('statements/generate/', views.generate_statement, name='statement_generate'),
+    path('statements/<int:pk>/export/<str:fmt>/', views.statement_export, name='statement_export'),
 ]
@@ -1,76 +1,192 @@
 """
 Stripe Management Views
 """
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, Q
-from datetime import datetime
+from django.db.models import Q
+from datetime import datetime, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from apps.core.periods import period_bounds
+from .aggregates import account_totals, aggregate_totals, day_bounds, monthly_revenue, overall_totals
+from .exports import EXPORT_FORMATS, get_cached_export, submit_statement_export
+from .ledger import balance_before, entries_between, ledger_delta
 from .models import StripeAccount, Transaction, MonthlyStatement
+from .statement_sources import get_source_statement
 
 
 @login_required
 def dashboard(request):
     """Stripe management dashboard"""
     accounts = StripeAccount.objects.filter(is_active=True)
-    
-    # Get summary statistics
-    total_transactions = Transaction.objects.count()
-    total_revenue = Transaction.objects.filter(
-        type='charge',
-        status='succeeded'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
+
+    # Summary statistics come from the daily aggregates, not the transactions table
+    totals = overall_totals()
+
     recent_transactions = Transaction.objects.select_related('account').order_by('-stripe_created')[:10]
-    
+
     context = {
         'accounts': accounts,
-        'total_transactions': total_transactions,
-        'total_revenue': total_revenue / 100,  # Convert to dollars
+        'total_transactions': totals['count'],
+        'total_revenue': totals['revenue'] / 100,  # Convert to dollars
         'recent_transactions': recent_transactions,
+        'revenue_series': monthly_revenue(),
     }
-    
+
     return render(request, 'stripe_management/dashboard.html', context)
 
 
+@login_required
+def revenue_data(request):
+    """Monthly revenue series for charts, optionally for one account"""
+    try:
+        months = min(max(int(request.GET.get('months', 12)), 1), 120)
+    except ValueError:
+        months = 12
+    account = None
+    if request.GET.get('account'):
+        account = get_object_or_404(StripeAccount, id=request.GET['account'])
+
+    return JsonResponse({'series': monthly_revenue(months=months, account=account)})
+
+
 @login_required
 def account_list(request):
     """List all Stripe accounts"""
-    accounts = StripeAccount.objects.annotate(
-        transaction_count=Count('transactions')
-    ).order_by('-created_at')
-    
+    accounts = list(StripeAccount.objects.order_by('-created_at'))
+    totals = account_totals()
+    for account in accounts:
+        account_summary = totals.get(account.id, {})
+        account.transaction_count = account_summary.get('count', 0)
+        account.total_revenue = account_summary.get('revenue', 0) / 100
+
     context = {
         'accounts': accounts,
     }
-    
+
     return render(request, 'stripe_management/account_list.html', context)
 
 
+TRANSACTION_PAGE_SIZE = 50
+MAX_TRANSACTION_PAGE_SIZE = 200
+
+
+def _encode_cursor(txn):
+    """Opaque cursor for a (stripe_created, id) position"""
+    position = f'{int(txn.stripe_created.timestamp() * 1_000_000)}:{txn.id}'
+    return urlsafe_base64_encode(position.encode())
+
+
+def _decode_cursor(cursor):
+    """(stripe_created, id) from a cursor, or None if it is malformed"""
+    try:
+        micros, txn_id = urlsafe_base64_decode(cursor).decode().split(':')
+        moment = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+        return moment, int(txn_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+
 @login_required
 def transaction_list(request):
-    """List transactions with filtering"""
-    transactions = Transaction.objects.select_related('account').order_by('-stripe_created')
-    
+    """
+    Browse transactions newest first with cursor pagination.
+
+    Pages are keyed on (stripe_created, id) rather than an offset, so each
+    page is an index range scan however deep into the history it is.
+    Totals for the filters come from the daily aggregates.
+    """
+    transactions = Transaction.objects.select_related('account')
+
     # Apply filters
     account_id = request.GET.get('account')
     status = request.GET.get('status')
     transaction_type = request.GET.get('type')
-    
+    date_from = _parse_date(request.GET.get('date_from'))
+    date_to = _parse_date(request.GET.get('date_to'))
+
     if account_id:
         transactions = transactions.filter(account_id=account_id)
     if status:
         transactions = transactions.filter(status=status)
     if transaction_type:
         transactions = transactions.filter(type=transaction_type)
-    
+    if date_from:
+        transactions = transactions.filter(stripe_created__gte=day_bounds(date_from)[0])
+    if date_to:
+        transactions = transactions.filter(stripe_created__lt=day_bounds(date_to)[1])
+
+    try:
+        page_size = min(int(request.GET.get('per_page', TRANSACTION_PAGE_SIZE)), MAX_TRANSACTION_PAGE_SIZE)
+    except ValueError:
+        page_size = TRANSACTION_PAGE_SIZE
+    page_size = max(page_size, 1)
+
+    after = _decode_cursor(request.GET.get('after', ''))
+    before = _decode_cursor(request.GET.get('before', '')) if not after else None
+
+    if before:
+        # Walk forward in time from the cursor, then flip back to newest first
+        moment, txn_id = before
+        page = list(transactions.filter(
+            Q(stripe_created__gt=moment) | Q(stripe_created=moment, id__gt=txn_id)
+        ).order_by('stripe_created', 'id')[:page_size + 1])
+        has_newer = len(page) > page_size
+        page = page[:page_size][::-1]
+        has_older = True
+    else:
+        if after:
+            moment, txn_id = after
+            transactions = transactions.filter(
+                Q(stripe_created__lt=moment) | Q(stripe_created=moment, id__lt=txn_id)
+            )
+        page = list(transactions.order_by('-stripe_created', '-id')[:page_size + 1])
+        has_older = len(page) > page_size
+        page = page[:page_size]
+        has_newer = after is not None
+
+    def page_url(direction, txn):
+        # Keep the filters when paging
+        params = request.GET.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[direction] = _encode_cursor(txn)
+        return f'?{params.urlencode()}'
+
+    next_url = page_url('after', page[-1]) if page and has_older else None
+    previous_url = page_url('before', page[0]) if page and has_newer else None
+
+    totals = aggregate_totals(
+        account=account_id or None,
+        txn_type=transaction_type,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
     context = {
-        'transactions': transactions[:100],  # Limit for performance
+        'transactions': page,
+        'next_url': next_url,
+        'previous_url': previous_url,
+        'totals': {name: value / 100 if name != 'count' else value for name, value in totals.items()},
         'accounts': StripeAccount.objects.filter(is_active=True),
+        'status_choices': Transaction.STATUS_CHOICES,
+        'type_choices': Transaction.TYPE_CHOICES,
         'selected_account': account_id,
         'selected_status': status,
         'selected_type': transaction_type,
+        'date_from': date_from,
+        'date_to': date_to,
     }
-    
+
     return render(request, 'stripe_management/transaction_list.html', context)
 
 
@@ -103,14 +219,43 @@ def statement_list(request):
     return render(request, 'stripe_management/statement_list.html', context)
 
 
+@login_required
+def statement_export(request, pk, fmt):
+    """
+    Download a statement as CSV, XLSX or PDF.
+
+    Serves the stored export of the statement's current version when there
+    is one; otherwise queues a background export and asks the browser to
+    retry.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise Http404('Unknown export format')
+    statement = get_object_or_404(MonthlyStatement.objects.select_related('account'), pk=pk)
+
+    document = None if statement.is_dirty else get_cached_export(statement, fmt)
+    if document:
+        document.record_access()
+        return FileResponse(
+            document.file.open('rb'),
+            as_attachment=True,
+            filename=document.file.name.rsplit('/', 1)[-1],
+            content_type=EXPORT_FORMATS[fmt]['content_type'],
+        )
+
+    submit_statement_export(statement, fmt, user=request.user)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'status': 'pending'}, status=202)
+
+    return render(request, 'stripe_management/statement_export_pending.html', {
+        'statement': statement,
+        'format': fmt.upper(),
+    }, status=202)
+
+
 @login_required
 def generate_statement(request):
     """Generate monthly statement"""
-    from django.db.models import Sum
-    from datetime import date
     from calendar import monthrange
-    import sys
-    import os
 
     # Get parameters
     year = int(request.GET.get('year', datetime.now().year))
@@ -122,53 +267,15 @@ def generate_statement(request):
     if account_id:
         account = get_object_or_404(StripeAccount, id=account_id)
 
-    # Try to use CompleteCsvService for CSV-based data
+    # Use a configured statement source (e.g. the CSV exports) when it has this month
     csv_statement = None
-    try:
-        # Add stripe-dashboard to path
-        stripe_dashboard_path = '/Users/wongivan/ai_tools/business_tools/stripe-dashboard'
-        if stripe_dashboard_path not in sys.path:
-            sys.path.insert(0, stripe_dashboard_path)
-
-        from app.services.complete_csv_service import CompleteCsvService
-
-        # Map account names to company codes
-        company_code_map = {
-            'CGGE Media': 'cgge',
-            'Krystal Institute': 'krystal_institute',
-            'Krystal Technology': 'krystal_technology'
-        }
-
-        if account and account.name in company_code_map:
-            # Specify the correct CSV directory
-            csv_dir = os.path.join(stripe_dashboard_path, 'complete_csv')
-            service = CompleteCsvService(csv_directory=csv_dir)
-            company_code = company_code_map[account.name]
-            # Generate monthly statement (will use transaction dates by default)
-            csv_statement = service.generate_monthly_statement(year, month, company_code)
-    except Exception as e:
-        # Fall back to database if CSV service fails
-        print(f"CSV service error: {e}")
-        csv_statement = None
-    
+    if account:
+        csv_statement = get_source_statement(account, year, month)
+
     # Calculate date range
-    start_date = datetime(year, month, 1).date()
+    start, end = period_bounds('month', when=timezone.make_aware(datetime(year, month, 1)))
     last_day = monthrange(year, month)[1]
-    end_date = datetime(year, month, last_day, 23, 59, 59)
-    
-    # Get transactions for the month
-    # Use CSV transactions if available, otherwise fall back to database
-    if csv_statement:
-        transactions = []  # CSV statement already has transactions processed
-    else:
-        transactions = Transaction.objects.filter(
-            stripe_created__gte=start_date,
-            stripe_created__lte=end_date
-        ).order_by('stripe_created')
 
-        if account:
-            transactions = transactions.filter(account=account)
-    
     # Prepare month names (needed for descriptions)
     month_names = [
         'January', 'February', 'March', 'April', 'May', 'June',
@@ -177,28 +284,27 @@ def generate_statement(request):
 
     # Get or calculate opening balance
     opening_balance = 0
+    transactions = []
 
     # Use CSV statement data if available
     if csv_statement:
-        # Convert from HKD to cents for consistency with database
-        opening_balance = int(csv_statement.get('opening_balance', 0) * 100)
+        opening_balance = csv_statement['opening_balance']
+    elif account:
+        # Opening balance and running balances come straight from the ledger
+        opening_balance = balance_before(account, start)
+        transactions = [(entry.transaction, entry.balance) for entry in entries_between(account, start, end)]
     else:
-        try:
-            previous_month = month - 1 if month > 1 else 12
-            previous_year = year if month > 1 else year - 1
-
-            prev_statement = MonthlyStatement.objects.filter(
-                year=previous_year,
-                month=previous_month
-            )
-            if account:
-                prev_statement = prev_statement.filter(account=account)
-
-            prev_statement = prev_statement.first()
-            if prev_statement:
-                opening_balance = prev_statement.closing_balance
-        except:
-            pass
+        # All accounts: sum the per-account opening balances and walk the month once
+        opening_balance = sum(
+            balance_before(acc, start) for acc in StripeAccount.objects.all()
+        )
+        balance = opening_balance
+        for txn in Transaction.objects.filter(
+            stripe_created__gte=start,
+            stripe_created__lt=end
+        ).order_by('stripe_created', 'id'):
+            balance += ledger_delta(txn.type, txn.status, txn.amount, txn.fee)
+            transactions.append((txn, balance))
 
     # Calculate totals and build statement lines (matching August format)
     total_charges = 0
@@ -231,70 +337,72 @@ def generate_statement(request):
 
     # Use CSV transactions if available
     if csv_statement and csv_statement.get('transactions'):
-        # Process CSV transactions
+        # Process CSV transactions (amounts in cents)
         for csv_tx in csv_statement['transactions']:
-            debit = float(csv_tx.get('debit', 0))
-            credit = float(csv_tx.get('credit', 0))
+            debit = csv_tx.get('debit', 0)
+            credit = csv_tx.get('credit', 0)
+            nature = csv_tx.get('nature', '')
 
             # Update running balance (debits increase, credits decrease)
-            running_balance += int((debit - credit) * 100)
+            running_balance += debit - credit
 
             # Track totals
-            if debit > 0 and csv_tx.get('nature', '').startswith('Gross'):
-                total_charges += int(debit * 100)
+            if debit > 0 and nature.startswith('Gross'):
+                total_charges += debit
                 charge_count += 1
 
                 # Track customer transaction for succeeded charges
                 customer_transactions.append({
                     'date': csv_tx.get('date'),
                     'email': csv_tx.get('party', ''),
-                    'amount': debit,
+                    'amount': debit / 100,
                     'stripe_id': csv_tx.get('stripe_id', ''),
                     'description': csv_tx.get('description', ''),
                 })
 
-            if credit > 0 and 'Fee' in csv_tx.get('nature', ''):
-                total_fees += int(credit * 100)
+            if credit > 0 and 'Fee' in nature:
+                total_fees += credit
 
             # Track refunds
-            if 'Refund' in csv_tx.get('nature', ''):
-                total_refunds += int(debit * 100)
+            if 'Refund' in nature:
+                total_refunds += credit
                 refund_count += 1
 
             # Track payout reversals (failed payouts)
-            if 'Payout Failure' in csv_tx.get('nature', '') or 'Payout Reversal' in csv_tx.get('nature', ''):
-                payout_reversal_amount += int(debit * 100)
+            if 'Payout Failure' in nature or 'Payout Reversal' in nature:
+                payout_reversal_amount += debit
                 payout_reversal_count += 1
 
             # Track payouts
-            if 'Payout' in csv_tx.get('nature', '') and credit > 0:
-                total_payouts += int(credit * 100)
+            if 'Payout' in nature and credit > 0:
+                total_payouts += credit
 
             statement_lines.append({
                 'date': csv_tx.get('date'),
-                'nature': csv_tx.get('nature', ''),
+                'nature': nature,
                 'party': csv_tx.get('party', ''),
-                'debit': debit,
-                'credit': credit,
+                'debit': debit / 100,
+                'credit': credit / 100,
                 'balance': running_balance / 100,
                 'acknowledged': 'No',
                 'description': csv_tx.get('description', ''),
             })
     else:
-        # Use database transactions
-        for txn in transactions:
+        # Use database transactions; balance_after is net of the transaction's fee
+        for txn, balance_after in transactions:
+            gross_balance = balance_after + (txn.fee or 0)
+
             # Process each transaction with separate line for fees
             if txn.type == 'charge' and txn.status == 'succeeded':
                 # Gross Payment line
                 total_charges += txn.amount
-                running_balance += txn.amount
                 statement_lines.append({
                     'date': txn.stripe_created,
                     'nature': 'Gross Payment',
                     'party': txn.customer_email or 'Unknown',
                     'debit': txn.amount / 100,
                     'credit': 0,
-                    'balance': running_balance / 100,
+                    'balance': gross_balance / 100,
                     'acknowledged': 'No',
                     'description': txn.customer_email or '',
                 })
@@ -308,28 +416,26 @@ def generate_statement(request):
 
             elif txn.type == 'refund':
                 total_refunds += txn.amount
-                running_balance -= txn.amount
                 statement_lines.append({
                     'date': txn.stripe_created,
                     'nature': 'Refund',
                     'party': 'Stripe',
                     'debit': 0,
                     'credit': txn.amount / 100,
-                    'balance': running_balance / 100,
+                    'balance': gross_balance / 100,
                     'acknowledged': 'No',
                     'description': f'Refund for {txn.stripe_id}',
                 })
 
             elif txn.type == 'payout':
                 total_payouts += txn.amount
-                running_balance -= txn.amount
                 statement_lines.append({
                     'date': txn.stripe_created,
                     'nature': 'Payout',
                     'party': 'Stripe',
                     'debit': 0,
                     'credit': txn.amount / 100,
-                    'balance': running_balance / 100,
+                    'balance': gross_balance / 100,
                     'acknowledged': 'No',
                     'description': 'BOC(HK)',
                 })
@@ -337,21 +443,22 @@ def generate_statement(request):
             # Processing fee (if any) - separate line
             if txn.fee and txn.fee > 0:
                 total_fees += txn.fee
-                running_balance -= txn.fee
                 statement_lines.append({
                     'date': txn.stripe_created,
                     'nature': 'Processing Fee',
                     'party': 'Stripe',
                     'debit': 0,
                     'credit': txn.fee / 100,
-                    'balance': running_balance / 100,
+                    'balance': balance_after / 100,
                     'acknowledged': 'No',
                     'description': 'Stripe processing fee',
                 })
 
+            running_balance = balance_after
+
     # Use CSV closing balance if available, otherwise use calculated running balance
     if csv_statement and 'closing_balance' in csv_statement:
-        closing_balance = int(csv_statement.get('closing_balance', 0) * 100)
+        closing_balance = csv_statement['closing_balance']
     else:
         closing_balance = running_balance
 
@@ -54,9 +54,8 @@ LOCAL_APPS = [
     "apps.documents",
     "apps.reports",
     "apps.core",
-    # NOTE: leave_management and stripe_management moved to separate apps
-    # - Leave system: company-leave-system (port 8002)
-    # - Stripe dashboard: stripe-dashboard (port 8081)
+    "apps.leave_management",
+    "apps.stripe_management",
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -226,16 +225,32 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # Redis Configuration for Caching and Celery
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'business_platform_cache',
-        'TIMEOUT': 3600,  # Default timeout 1 hour
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+# Cached leave dashboards, pending counters, holiday calendars and leave
+# PDFs are invalidated through version keys in the default cache, so every
+# web and worker process must share it. Set CACHE_BACKEND=redis whenever
+# more than one process serves the site; the local-memory cache is per
+# process and only suits a single development server.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 3600,  # Default timeout 1 hour
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'business_platform_cache',
+            'TIMEOUT': 3600,  # Default timeout 1 hour
+            'OPTIONS': {
+                'MAX_ENTRIES': 1000,
+            }
         }
     }
-}
 
 # Session configuration for performance
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
@@ -345,3 +360,14 @@ SESSION_SAVE_EVERY_REQUEST = True
 # SSO Integration Settings
 SSO_BASE_URL = config('SSO_BASE_URL', default='http://localhost:8080')
 SSO_SECRET_KEY = config('SSO_SECRET_KEY', default='default-secret-key')
+
+# Stripe statement sources (checked in order before the database ledger)
+STRIPE_CSV_STATEMENT_DIR = config('STRIPE_CSV_STATEMENT_DIR', default=str(BASE_DIR / 'stripe_exports' / 'complete_csv'))
+STRIPE_STATEMENT_SOURCES = [
+    'apps.stripe_management.statement_sources.CsvStatementSource',
+]
+
+# Leave management: holiday region for users without a HK/CN location
+LEAVE_DEFAULT_REGION = config('LEAVE_DEFAULT_REGION', default='HK')
+# Share of a team that may be on approved leave at the same time
+LEAVE_MAX_TEAM_ABSENCE_RATIO = config('LEAVE_MAX_TEAM_ABSENCE_RATIO', default=0.5, cast=float)
@@ -12,6 +12,15 @@ from django.shortcuts import render, redirect
 from django.utils import timezone
 from apps.core.monitoring import health_check, performance_metrics, system_info
 
+def get_user_claim_stats(user):
+    """Read the user's denormalized claim statistics, building them on first use."""
+    from apps.expense_claims.models import UserClaimStats
+
+    stats = UserClaimStats.objects.filter(user=user).first()
+    if stats is None:
+        stats = UserClaimStats.refresh_for_user(user.id)
+    return stats.as_display_stats()
+
 def home_view(request):
     """Enhanced platform home view showing all available apps."""
     context = {
@@ -79,12 +88,7 @@ def home_view(request):
             user_claims = ExpenseClaim.objects.filter(claimant=request.user)
 
             context.update({
-                'user_stats': {
-                    'total_claims': user_claims.count(),
-                    'approved_claims': user_claims.filter(status='approved').count(),
-                    'pending_claims': user_claims.filter(status='pending').count(),
-                    'total_amount': sum(float(claim.total_amount or 0) for claim in user_claims),
-                },
+                'user_stats': get_user_claim_stats(request.user),
                 'recent_claims': user_claims.select_related('company').order_by('-created_at')[:5],
                 'notifications': []  # Add notifications logic later
             })
@@ -119,17 +123,7 @@ def dashboard_view(request):
         from apps.expense_claims.models import ExpenseClaim
         user_claims = ExpenseClaim.objects.filter(claimant=request.user)
 
-        context['expense_stats'] = {
-            'total_claims': user_claims.count(),
-            'approved_claims': user_claims.filter(status='approved').count(),
-            'pending_claims': user_claims.filter(status='pending').count(),
-            'rejected_claims': user_claims.filter(status='rejected').count(),
-            'total_amount': sum(float(claim.total_amount or 0) for claim in user_claims),
-            'this_month_amount': sum(float(claim.total_amount or 0) for claim in user_claims.filter(
-                created_at__year=datetime.now().year,
-                created_at__month=datetime.now().month
-            )),
-        }
+        context['expense_stats'] = get_user_claim_stats(request.user)
         context['recent_claims'] = user_claims.select_related('company').order_by('-created_at')[:5]
     except Exception as e:
         context['expense_stats'] = {
@@ -241,9 +235,8 @@ urlpatterns = [
     path("documents/", include("apps.documents.urls")),
     path("accounts/", include("apps.accounts.urls")),
     path("reports/", include("apps.reports.urls")),
-    # NOTE: Leave and Stripe are now separate apps accessed via main platform
-    # path("leave/", include("apps.leave_management.urls")),  # Removed - use company-leave-system
-    # path("stripe/", include("apps.stripe_management.urls")),  # Removed - use stripe-dashboard
+    path("leave/", include("apps.leave_management.urls")),
+    path("stripe/", include("apps.stripe_management.urls")),
 
     # Monitoring endpoints
     path("monitoring/health/", health_check, name="health_check"),